@@ -19,5 +19,7 @@
 #define MAX_BUF_SIZE 256										// maximum number of bytes to publish/receive
 #define MAX_SUB 15 												// maximum number of subscribe
 #define CMD_TIME_OUT 200										// maximum time to wait for feedback from AR9331, 200 = 10 sec
+#define MAX_NUM_KEY 8											// maximum number of keys in one multi-key JSON request
+#define MAX_NUM_BATCH 8											// maximum number of commands in one batch
 
 #endif
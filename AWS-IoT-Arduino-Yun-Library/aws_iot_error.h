@@ -58,7 +58,9 @@ typedef enum {
 	JSON_KEY_NOT_FOUND = -38,
 	JSON_GENERIC_ERROR = -39,
 	PUBLISH_QUEUE_FULL = -40,
-	PUBLISH_QUEUE_DISABLED = -41
+	PUBLISH_QUEUE_DISABLED = -41,
+	BATCH_ERROR = -42,
+	OUT_OF_SKETCH_BATCH_MEMORY = -43
 } IoT_Error_t;
 
 #endif
@@ -25,7 +25,11 @@
 #define LINUX_BAUD_LININO 115200
 #define RETURN_KEY 13 // ASCII code for '\r'
 #define NEXTLINE_KEY 10 // ASCII code for '\n'
-#define MAX_NUM_PARA 6 // Maximum number of parameters in protocol communication
+#define FRAME_START_KEY 2 // ASCII code for STX, start of a frame in framed mode
+#define NUM_FRAME_CMD 34 // Number of command IDs in framed mode
+#define MAX_NUM_RESEND 3 // Number of resend requests for ONE feedback frame in reliable mode
+#define NUM_FAST_POLL 10 // Number of 5 ms polls for a feedback frame before polling at 50 ms, as the echo wait of the line protocol
+#define MAX_NUM_PARA (MAX_NUM_KEY + 5) // Maximum number of parameters in protocol communication
 #define NUM_ATTEMPT_BEFORE_EXIT MAX_NUM_PARA/2+1 // Number of '~' to fully exit the protocol command
 
 // PGM_P is defined as const char*
@@ -36,6 +40,8 @@ PGM_P EMPTY_STRING = "";
 PGM_P CMD_CHECK_LINUX_LIVE = "uname\n";
 PGM_P CMD_CD_TO_PY_RUNTIME = "cd /usr/lib/python2.7/AWS-IoT-Python-Runtime/runtime/\n";
 PGM_P CMD_START_PY_RUNTIME = "python run.py\n";
+// Protocol names by command ID in framed mode, shared with the Python runtime
+PGM_P FRAME_CMD_NAMES[NUM_FRAME_CMD] = {"", "i", "g", "c", "d", "p", "s", "u", "y", "z", "si", "sg", "su", "sd", "s_rd", "s_ud", "j", "jm", "bf", "pq", "di", "bs", "fm", "~", "b", "e", "pb", "pg", "yb", "yd", "yw", "yc", "ra", "dm"};
 
 // Choose different baudrate for different version of openWRT OS
 Baud_t aws_iot_mqtt_client::find_baud_type() {
@@ -56,11 +62,27 @@ Baud_t aws_iot_mqtt_client::find_baud_type() {
 	return rc_type;
 }
 
-IoT_Error_t aws_iot_mqtt_client::setup_exec(const char* client_id, bool clean_session, MQTTv_t MQTT_version, bool useWebsocket) {
+// Is a python runtime kept running in daemon mode still there, ready for this sketch to reattach
+bool aws_iot_mqtt_client::reattach(long baudrate) {
+	Serial1.begin(baudrate);
+	while(!Serial1);
+	exec_cmd("1\n", false, false);
+	exec_cmd("ra\n", true, false);
+	bool rc = strncmp_P(rw_buf, PSTR("RA T"), 4) == 0;
+	if(!rc) { // forget whatever the shell said
+		delay(100);
+		while(Serial1.available()) {Serial1.read();}
+	}
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::setup_exec(const char* client_id, bool clean_session, MQTTv_t MQTT_version, bool useWebsocket, bool start_runtime) {
 	// Serial1 is started before this call
 	IoT_Error_t rc = NONE_ERROR;
-	exec_cmd(CMD_CD_TO_PY_RUNTIME, false, false);
-	exec_cmd(CMD_START_PY_RUNTIME, false, false);
+	if(start_runtime) {
+		exec_cmd(CMD_CD_TO_PY_RUNTIME, false, false);
+		exec_cmd(CMD_START_PY_RUNTIME, false, false);
+	}
 
 	// Create obj
 	exec_cmd("5\n", false, false);
@@ -93,14 +115,24 @@ IoT_Error_t aws_iot_mqtt_client::setup_exec(const char* client_id, bool clean_se
 IoT_Error_t aws_iot_mqtt_client::setup(const char* client_id, bool clean_session, MQTTv_t MQTT_version, bool useWebsocket) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(client_id == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(client_id) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(client_id) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	// No input error below this line
 	else {
-		Baud_t baud_type = find_baud_type(); // Find out baud type
-		// Communication failed due to baud rate issue
-		if(BAUD_TYPE_UNKNOWN == baud_type) {rc = SERIAL1_COMMUNICATION_ERROR;}
+		framed_mode = false; // always start over with the line protocol
+		reliable_mode = false;
+		frame_left = 0;
+		batch_mode = false;
+		// A runtime kept running in daemon mode keeps its connection for this sketch, no need to start over
+		if(reattach(LINUX_BAUD_DEFAULT)) {
+			rc = setup_exec(client_id, clean_session, MQTT_version, useWebsocket, false);
+		}
 		else {
-			rc = setup_exec(client_id, clean_session, MQTT_version, useWebsocket);
+			Baud_t baud_type = find_baud_type(); // Find out baud type
+			// Communication failed due to baud rate issue
+			if(BAUD_TYPE_UNKNOWN == baud_type) {rc = SERIAL1_COMMUNICATION_ERROR;}
+			else {
+				rc = setup_exec(client_id, clean_session, MQTT_version, useWebsocket, true);
+			}
 		}
 	}
 
@@ -114,10 +146,10 @@ IoT_Error_t aws_iot_mqtt_client::configWss(const char* host, unsigned int port,
 IoT_Error_t aws_iot_mqtt_client::config(const char* host, unsigned int port, const char* cafile_path, const char* keyfile_path, const char* certfile_path) {
 	IoT_Error_t rc = NONE_ERROR;
 
-	if(host != NULL && strlen(host) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
-	else if(cafile_path != NULL && strlen(cafile_path) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
-	else if(keyfile_path != NULL && strlen(keyfile_path) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
-	else if(certfile_path != NULL && strlen(certfile_path) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	if(host != NULL && strlen(host) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else if(cafile_path != NULL && strlen(cafile_path) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else if(keyfile_path != NULL && strlen(keyfile_path) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else if(certfile_path != NULL && strlen(certfile_path) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		PGM_P helper = "";
 
@@ -229,6 +261,331 @@ IoT_Error_t aws_iot_mqtt_client::configDrainingInterval(float numberOfSeconds) {
 	return rc;
 }
 
+IoT_Error_t aws_iot_mqtt_client::configBurstSize(unsigned int numberOfChunks) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(numberOfChunks == 0) {rc = WRONG_PARAMETER_ERROR;}
+	else {
+		exec_cmd("2\n", false, false);
+
+		exec_cmd("bs\n", false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), numberOfChunks);
+		exec_cmd(rw_buf, true, false);
+
+		if(strncmp_P(rw_buf, PSTR("BS T"), 4) == 0) {burst_size = numberOfChunks;}
+		else {
+			if(strncmp_P(rw_buf, PSTR("BS1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("BS2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("BS3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("BSFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+			else rc = GENERIC_ERROR;
+		}
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configFramedMode(bool enable, bool reliable) {
+	IoT_Error_t rc = NONE_ERROR;
+	exec_cmd("2\n", false, false);
+
+	exec_cmd("fm\n", false, false);
+
+	snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), enable ? (reliable ? 2 : 1) : 0);
+	exec_cmd(rw_buf, true, false);
+
+	if(strncmp_P(rw_buf, PSTR("FM T"), 4) == 0) {
+		// the feedback above is the last one in the previous mode
+		framed_mode = enable;
+		reliable_mode = enable && reliable;
+		frame_tx_seq = 0;
+		frame_rx_seq = 0;
+		delay(10); // let the Python runtime switch its terminal
+	}
+	else {
+		if(strncmp_P(rw_buf, PSTR("FM1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("FM2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("FM3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("FMFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+		else rc = GENERIC_ERROR;
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configPublishBatch(unsigned int windowMillis, unsigned int byteLimit, PublishBatch_t format, message_callback cb) {
+	IoT_Error_t rc = NONE_ERROR;
+	int i = MAX_SUB; // no flush status
+	if(format != PUBLISH_BATCH_NONE && cb != NULL) {
+		i = publish_batch_slot >= 0 ? publish_batch_slot : find_unused_subgroup(); // reuse the slot for flush status
+	}
+	if(format != PUBLISH_BATCH_NONE && cb != NULL && i >= MAX_SUB) {rc = OUT_OF_SKETCH_SUBSCRIBE_MEMORY;}
+	else {
+		int slot = i < MAX_SUB ? i : -1;
+
+		exec_cmd("5\n", false, false);
+
+		exec_cmd("pb\n", false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), windowMillis);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), byteLimit);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), format);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), slot);
+		exec_cmd(rw_buf, true, false);
+
+		if(strncmp_P(rw_buf, PSTR("PB T"), 4) == 0) {
+			if(publish_batch_slot >= 0 && publish_batch_slot != slot) { // flush status no longer goes there
+				sub_group[publish_batch_slot].is_used = false;
+				sub_group[publish_batch_slot].callback = NULL;
+			}
+			if(slot >= 0) {
+				sub_group[slot].is_used = true;
+				sub_group[slot].is_shadow_gud = false;
+				sub_group[slot].callback = cb;
+			}
+			publish_batch_slot = slot;
+		}
+		else {
+			if(strncmp_P(rw_buf, PSTR("PB1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("PB2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("PB3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("PBFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+			else rc = GENERIC_ERROR;
+		}
+	}
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configPublishBatchGroup(const char* topicFilter, const char* groupTopic) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(topicFilter == NULL || groupTopic == NULL) {rc = NULL_VALUE_ERROR;}
+	else if(strlen(topicFilter) >= MAX_BUF_SIZE - 1 || strlen(groupTopic) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else {
+		exec_cmd("3\n", false, false);
+
+		exec_cmd("pg\n", false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), topicFilter);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), groupTopic);
+		exec_cmd(rw_buf, true, false);
+
+		if(strncmp_P(rw_buf, PSTR("PG T"), 4) != 0) {
+			if(strncmp_P(rw_buf, PSTR("PG1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("PG2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("PGFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+			else rc = GENERIC_ERROR;
+		}
+	}
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configYieldQueue(unsigned int maxMessages, unsigned long maxBytes, unsigned int slotQuota, YieldDropPolicy_t policy) {
+	IoT_Error_t rc = NONE_ERROR;
+	exec_cmd("5\n", false, false);
+
+	exec_cmd("yb\n", false, false);
+
+	snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), maxMessages);
+	exec_cmd(rw_buf, false, false);
+
+	snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%lu\n"), maxBytes);
+	exec_cmd(rw_buf, false, false);
+
+	snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), slotQuota);
+	exec_cmd(rw_buf, false, false);
+
+	snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), policy);
+	exec_cmd(rw_buf, true, false);
+
+	if(strncmp_P(rw_buf, PSTR("YB T"), 4) != 0) {
+		if(strncmp_P(rw_buf, PSTR("YB1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("YB2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("YB3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("YBFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+		else rc = GENERIC_ERROR;
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::getYieldDropCount(unsigned long* numberOfDrops) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(numberOfDrops == NULL) {rc = NULL_VALUE_ERROR;}
+	else {
+		exec_cmd("1\n", false, false);
+
+		exec_cmd("yd\n", true, false);
+
+		if(strncmp_P(rw_buf, PSTR("YD T"), 4) == 0) {*numberOfDrops = strtoul(rw_buf + 4, NULL, 10);}
+		else {
+			if(strncmp_P(rw_buf, PSTR("YD1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YDFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+			else rc = GENERIC_ERROR;
+		}
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configYieldPriority(const char* topic, unsigned int priority, unsigned int weight) {
+	return yield_priority_cmd(topic, false, priority, weight);
+}
+
+IoT_Error_t aws_iot_mqtt_client::configShadowDeltaPriority(const char* thingName, unsigned int priority, unsigned int weight) {
+	return yield_priority_cmd(thingName, true, priority, weight);
+}
+
+IoT_Error_t aws_iot_mqtt_client::yield_priority_cmd(const char* name, bool is_shadow_delta, unsigned int priority, unsigned int weight) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(name == NULL) {rc = NULL_VALUE_ERROR;}
+	else if(strlen(name) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else if(weight == 0) {rc = WRONG_PARAMETER_ERROR;}
+	else {
+		exec_cmd("5\n", false, false);
+
+		exec_cmd("yw\n", false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), name);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), is_shadow_delta ? 1 : 0);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), priority);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), weight);
+		exec_cmd(rw_buf, true, false);
+
+		if(strncmp_P(rw_buf, PSTR("YW T"), 4) != 0) {
+			if(strncmp_P(rw_buf, PSTR("YW1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YW2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YW3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YWFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+			else rc = GENERIC_ERROR;
+		}
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configConflation(const char* topic, Conflation_t mode) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(topic == NULL) {rc = NULL_VALUE_ERROR;}
+	else if(strlen(topic) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else {
+		exec_cmd("3\n", false, false);
+
+		exec_cmd("yc\n", false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), topic);
+		exec_cmd(rw_buf, false, false);
+
+		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), mode);
+		exec_cmd(rw_buf, true, false);
+
+		if(strncmp_P(rw_buf, PSTR("YC T"), 4) != 0) {
+			if(strncmp_P(rw_buf, PSTR("YC1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YC2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YC3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+			else if(strncmp_P(rw_buf, PSTR("YCFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+			else rc = GENERIC_ERROR;
+		}
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::configDaemonMode(bool enabled) {
+	IoT_Error_t rc = NONE_ERROR;
+	exec_cmd("2\n", false, false);
+
+	exec_cmd("dm\n", false, false);
+
+	int num_temp = enabled ? 1 : 0;
+	snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), num_temp);
+	exec_cmd(rw_buf, true, false);
+
+	if(strncmp_P(rw_buf, PSTR("DM T"), 4) != 0) {
+		if(strncmp_P(rw_buf, PSTR("DM1F"), 4) == 0) {rc = NO_SET_UP_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("DM2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("DM3F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(rw_buf, PSTR("DMFF"), 4) == 0) {rc = CONFIG_GENERIC_ERROR;}
+		else rc = GENERIC_ERROR;
+	}
+
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::beginBatch() {
+	IoT_Error_t rc = NONE_ERROR;
+	if(batch_mode) {rc = BATCH_ERROR;}
+	else {
+		exec_cmd("1\n", false, false);
+		exec_cmd("b\n", false, false);
+		batch_mode = true;
+		batch_cnt = 0;
+	}
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::endBatch(IoT_Error_t* results, unsigned int numberOfResults) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(!batch_mode) {rc = BATCH_ERROR;}
+	else {
+		bool has_yield = batch_has_yield();
+		batch_mode = false;
+		exec_cmd("1\n", false, false);
+		exec_cmd("e\n", true, has_yield); // yield messages come after the combined feedback
+
+		// Combined feedback: "B T <result code>;<result code>;...", in the order of the commands
+		// yield is sent as 2 commands (lock size, yield), with 2 result codes
+		if(strncmp_P(rw_buf, PSTR("B T"), 3) != 0) {rc = BATCH_ERROR;}
+		char* saveptr;
+		char* p = NULL;
+		if(rc == NONE_ERROR) {p = strtok_r(rw_buf + 3, ";", &saveptr);}
+		unsigned int idx;
+		for(idx = 0; idx < batch_cnt; idx++) {
+			IoT_Error_t cmd_rc = BATCH_ERROR; // no feedback for this command
+			if(p != NULL && *p == ' ') {p++;}
+			if(batch_cmd[idx] == 'p') {
+				if(p != NULL) {cmd_rc = publish_feedback_rc(p);}
+			}
+			else if(batch_cmd[idx] == 'u') {
+				if(p != NULL) {cmd_rc = shadow_update_feedback_rc(p);}
+				if(cmd_rc != NONE_ERROR) { // free the slot taken for this shadow update
+					sub_group[(int)batch_slot[idx]].is_used = false;
+					sub_group[(int)batch_slot[idx]].is_shadow_gud = false;
+					sub_group[(int)batch_slot[idx]].callback = NULL;
+				}
+			}
+			else { // 'y', always the last one
+				if(p != NULL && strncmp_P(p, PSTR("Z T"), 3) == 0) {
+					p = strtok_r(NULL, ";", &saveptr);
+					// messages from the first burst on
+					if(p != NULL && strncmp_P(p, PSTR("Y T"), 3) == 0) {cmd_rc = yield_loop(true);}
+					else {cmd_rc = YIELD_ERROR;}
+				}
+				else {cmd_rc = YIELD_ERROR;}
+				if(cmd_rc == YIELD_ERROR) {clear_burst();}
+				p = NULL; // rw_buf is taken by the yield messages
+			}
+			if(results != NULL && idx < numberOfResults) {results[idx] = cmd_rc;}
+			if(p != NULL) {p = strtok_r(NULL, ";", &saveptr);}
+		}
+		batch_cnt = 0;
+	}
+	return rc;
+}
+
 IoT_Error_t aws_iot_mqtt_client::connect(unsigned int keepalive_interval) {
 	IoT_Error_t rc = NONE_ERROR;
 	exec_cmd("2\n", false, false);
@@ -256,7 +613,8 @@ IoT_Error_t aws_iot_mqtt_client::connect(unsigned int keepalive_interval) {
 IoT_Error_t aws_iot_mqtt_client::publish(const char* topic, const char* payload, unsigned int payload_len, unsigned int qos, bool retain) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(topic == NULL || payload == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(topic) >= MAX_BUF_SIZE || payload_len >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(topic) >= MAX_BUF_SIZE - 1 || payload_len >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else if(batch_mode && (batch_cnt >= MAX_NUM_BATCH || batch_has_yield())) {rc = OUT_OF_SKETCH_BATCH_MEMORY;}
 	else {
 		exec_cmd("5\n", false, false);
 
@@ -273,31 +631,49 @@ IoT_Error_t aws_iot_mqtt_client::publish(const char* topic, const char* payload,
 
 		int num_temp = retain ? 1 : 0;
 		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), num_temp);
-		exec_cmd(rw_buf, true, false);
+		exec_cmd(rw_buf, !batch_mode, false);
 
-		if(strncmp_P(rw_buf, PSTR("P T"), 3) != 0) {
-			if(strncmp_P(rw_buf, PSTR("P1F"), 3) == 0) {rc = NO_SET_UP_ERROR;}
-			else if(strncmp_P(rw_buf, PSTR("P2F"), 3) == 0) {rc = WRONG_PARAMETER_ERROR;}
-			else if(strncmp_P(rw_buf, PSTR("P3F"), 3) == 0) {rc = PUBLISH_ERROR;}
-			else if(strncmp_P(rw_buf, PSTR("P4F"), 3) == 0) {rc = PUBLISH_TIMEOUT;}
-			else if(strncmp_P(rw_buf, PSTR("P5F"), 3) == 0) {rc = PUBLISH_QUEUE_FULL;}
-			else if(strncmp_P(rw_buf, PSTR("P6F"), 3) == 0) {rc = PUBLISH_QUEUE_DISABLED;}
-			else if(strncmp_P(rw_buf, PSTR("PFF"), 3) == 0) {rc = PUBLISH_GENERIC_ERROR;}
-			else rc = GENERIC_ERROR;
-		}
+		if(batch_mode) {batch_cmd[batch_cnt++] = 'p';} // feedback comes with the batch
+		else {rc = publish_feedback_rc(rw_buf);}
 	}
 	return rc;
 }
 
-IoT_Error_t aws_iot_mqtt_client::subscribe(const char* topic, unsigned int qos, message_callback cb) {
+IoT_Error_t aws_iot_mqtt_client::publish_feedback_rc(const char* feedback) {
 	IoT_Error_t rc = NONE_ERROR;
-	if(topic == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(topic) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	if(strncmp_P(feedback, PSTR("P T"), 3) != 0) {
+		if(strncmp_P(feedback, PSTR("P1F"), 3) == 0) {rc = NO_SET_UP_ERROR;}
+		else if(strncmp_P(feedback, PSTR("P2F"), 3) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(feedback, PSTR("P3F"), 3) == 0) {rc = PUBLISH_ERROR;}
+		else if(strncmp_P(feedback, PSTR("P4F"), 3) == 0) {rc = PUBLISH_TIMEOUT;}
+		else if(strncmp_P(feedback, PSTR("P5F"), 3) == 0) {rc = PUBLISH_QUEUE_FULL;}
+		else if(strncmp_P(feedback, PSTR("P6F"), 3) == 0) {rc = PUBLISH_QUEUE_DISABLED;}
+		else if(strncmp_P(feedback, PSTR("PFF"), 3) == 0) {rc = PUBLISH_GENERIC_ERROR;}
+		else rc = GENERIC_ERROR;
+	}
+	return rc;
+}
+
+IoT_Error_t aws_iot_mqtt_client::subscribe(const char* topic, unsigned int qos, message_callback cb, const char* filter, const char** keys, unsigned int numberOfKeys, Projection_t format) {
+	IoT_Error_t rc = NONE_ERROR;
+	unsigned int k;
+	if(topic == NULL || (numberOfKeys != 0 && keys == NULL)) {rc = NULL_VALUE_ERROR;}
+	else if(strlen(topic) >= MAX_BUF_SIZE - 1 || numberOfKeys > MAX_NUM_KEY) {rc = OVERFLOW_ERROR;}
+	else if(filter != NULL && strlen(filter) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
+		for(k = 0; k < numberOfKeys; k++) {
+			if(keys[k] == NULL) {rc = NULL_VALUE_ERROR;}
+			else if(strlen(keys[k]) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+		}
+	}
+	if(rc == NONE_ERROR) {
 		// find unused slots for new subscribe
 		int i = find_unused_subgroup();
 		if(i < MAX_SUB) {
-			exec_cmd("4\n", false, false);
+			// filter is sent if there is a filter or a projection, projection format and keys follow it
+			if(numberOfKeys != 0) {snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), numberOfKeys + 6);}
+			else {snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), filter != NULL ? 5 : 4);}
+			exec_cmd(rw_buf, false, false);
 
 			exec_cmd("s\n", false, false);
 
@@ -308,7 +684,22 @@ IoT_Error_t aws_iot_mqtt_client::subscribe(const char* topic, unsigned int qos,
 			exec_cmd(rw_buf, false, false);
 
 			snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), i); // ino_id
-			exec_cmd(rw_buf, true, false);
+			exec_cmd(rw_buf, filter == NULL && numberOfKeys == 0, false);
+
+			if(filter != NULL || numberOfKeys != 0) {
+				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), filter != NULL ? filter : "");
+				exec_cmd(rw_buf, numberOfKeys == 0, false);
+			}
+
+			if(numberOfKeys != 0) {
+				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), format);
+				exec_cmd(rw_buf, false, false);
+
+				for(k = 0; k < numberOfKeys; k++) {
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), keys[k]);
+					exec_cmd(rw_buf, k == numberOfKeys - 1, false);
+				}
+			}
 
 			if(strncmp_P(rw_buf, PSTR("S T"), 3) == 0) {
 				sub_group[i].is_used = true;
@@ -332,7 +723,7 @@ IoT_Error_t aws_iot_mqtt_client::subscribe(const char* topic, unsigned int qos,
 IoT_Error_t aws_iot_mqtt_client::unsubscribe(const char* topic) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(topic == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(topic) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(topic) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		exec_cmd("2\n", false, false);
 
@@ -368,94 +759,130 @@ IoT_Error_t aws_iot_mqtt_client::unsubscribe(const char* topic) {
 
 IoT_Error_t aws_iot_mqtt_client::yield() {
 	IoT_Error_t rc = NONE_ERROR;
-	exec_cmd("1\n", false, false);
-	exec_cmd("z\n", true, false); // tell the python runtime to lock the current msg queue size
-	if(strncmp_P(rw_buf, PSTR("Z T"), 3) != 0) {rc = YIELD_ERROR;} // broken protocol
-	else { // start the BIG yield loop
-		while(true) {
+	if(batch_mode) { // lock and request the first burst in the batch, messages are handled when the batch ends
+		if(batch_cnt >= MAX_NUM_BATCH || batch_has_yield()) {rc = OUT_OF_SKETCH_BATCH_MEMORY;}
+		else {
 			exec_cmd("1\n", false, false);
-			exec_cmd("y\n", true, false);
-			if(strncmp_P(rw_buf, PSTR("Y F"), 3) == 0) {break;}
-			if(rw_buf[0] != 'Y') { // filter out garbage feedback
-				rc = YIELD_ERROR;
-				break;
-			}
-			// From here, there is a new message chunk in rw_buf
-			char* saveptr;
-			char* p;
-			p = strtok_r(rw_buf, " ", &saveptr); // 'Y'
-			p = strtok_r(NULL, " ", &saveptr); // ino_id
-			if(p != NULL) {
-			  	int ino_id = is_num(p) ? atoi(p) : -1;
-			    size_t id_len = strlen(p);
-			    p = strtok_r(NULL, " ", &saveptr); // more chunks?
-			    if(p != NULL) {
-			      	int more = is_num(p) ? atoi(p) : -1;
-			      	if(more != 1 && more != 0) { // broken protocol
-			      		rc = YIELD_ERROR;
-			      		break;
-			      	}
-			      	else if(ino_id == -1) {
-			      		rc = YIELD_ERROR;
-			      		break;
-			      	}
-			      	else {
-			      		char* payload = rw_buf + id_len + 5; // step over the protocol and get payload
-			      		if(strlen(msg_buf) + strlen(payload) > MAX_BUF_SIZE) {
-			      			rc = OVERFLOW_ERROR; // if it is exceeding MAX_BUF_SIZE, return the corresponding error code
-			      		}
-			      		else {strcat(msg_buf, payload);}
-			      		if(more == 0) { // This is the end of this message, do callback and clean up
-						    // user callback, watch out for ino_id boundary issue and callback registration
-						    if(ino_id >= 0 && ino_id < MAX_SUB && sub_group[ino_id].is_used) {
+			exec_cmd("z\n", false, false);
+			exec_cmd("1\n", false, false);
+			exec_cmd("y\n", false, false);
+			batch_cmd[batch_cnt++] = 'y';
+		}
+	}
+	else {
+		exec_cmd("1\n", false, false);
+		exec_cmd("z\n", true, false); // tell the python runtime to lock the current msg queue size
+		if(strncmp_P(rw_buf, PSTR("Z T"), 3) != 0) {rc = YIELD_ERROR;} // broken protocol
+		else {rc = yield_loop(false);} // start the BIG yield loop
+	}
+	return rc;
+}
+
+// The BIG yield loop, after the msg queue size is locked
+// If first_burst_requested, the first burst is already on its way and is read from here
+// A burst ends with the last chunk of a message, so callbacks run with nothing left to read on Serial1
+IoT_Error_t aws_iot_mqtt_client::yield_loop(bool first_burst_requested) {
+	IoT_Error_t rc = NONE_ERROR;
+	unsigned int line_cnt = first_burst_requested ? 0 : burst_size; // request a new burst in the first round, unless it is already requested
+	while(true) {
+		if(line_cnt >= burst_size) { // all chunks of the previous burst are consumed
+			exec_cmd("1\n", false, false);
+			exec_cmd("y\n", true, burst_size > 1);
+			line_cnt = 1;
+		}
+		else { // next chunk in the current burst
+			read_line();
+			line_cnt++;
+		}
+		if(strncmp_P(rw_buf, PSTR("Y F"), 3) == 0) {break;}
+		if(rw_buf[0] != 'Y') { // filter out garbage feedback
+			rc = YIELD_ERROR;
+			break;
+		}
+		// From here, there is a new message chunk in rw_buf
+		char* saveptr;
+		char* p;
+		p = strtok_r(rw_buf, " ", &saveptr); // 'Y'
+		p = strtok_r(NULL, " ", &saveptr); // ino_id
+		if(p != NULL) {
+		  	int ino_id = is_num(p) ? atoi(p) : -1;
+		    size_t id_len = strlen(p);
+		    p = strtok_r(NULL, " ", &saveptr); // more chunks?
+		    if(p != NULL) {
+		      	int more = is_num(p) ? atoi(p) : -1;
+		      	if(more != 1 && more != 0 && more != 2) { // broken protocol
+		      		rc = YIELD_ERROR;
+		      		break;
+		      	}
+		      	else if(ino_id == -1) {
+		      		rc = YIELD_ERROR;
+		      		break;
+		      	}
+		      	else if(more == 2) { // Messages for this slot were dropped in the runtime, msg_buf is left untouched
+		      		if(ino_id < MAX_SUB && sub_group[ino_id].is_used && sub_group[ino_id].callback != NULL) {
+		      			char* payload = rw_buf + id_len + 5;
+		      			sub_group[ino_id].callback(payload, (unsigned int)strlen(payload), STATUS_MESSAGE_DROPPED);
+		      		}
+		      		line_cnt = burst_size; // the burst ends with this message
+		      	}
+		      	else {
+		      		char* payload = rw_buf + id_len + 5; // step over the protocol and get payload
+		      		if(strlen(msg_buf) + strlen(payload) >= MAX_BUF_SIZE) {
+		      			rc = OVERFLOW_ERROR; // if it is exceeding MAX_BUF_SIZE, return the corresponding error code
+		      		}
+		      		else {strcat(msg_buf, payload);}
+		      		if(more == 0) { // This is the end of this message, do callback and clean up
+					    // user callback, watch out for ino_id boundary issue and callback registration
+					    if(ino_id >= 0 && ino_id < MAX_SUB && sub_group[ino_id].is_used) {
                                 // User callback
                                 if(sub_group[ino_id].callback != NULL) {
-									if(rc == NONE_ERROR) {
-										if(sub_group[ino_id].is_shadow_gud) {
-											// See if it is timeout
-											if(strncmp_P(msg_buf, PSTR("JSON-X"), 6) == 0) {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_SHADOW_TIMEOUT);}
+								if(rc == NONE_ERROR) {
+									if(sub_group[ino_id].is_shadow_gud) {
+										// See if it is timeout
+										if(strncmp_P(msg_buf, PSTR("JSON-X"), 6) == 0) {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_SHADOW_TIMEOUT);}
+										else {
+											// See if it is accepted/rejected
+											// Delta is treated as normal MQTT messages
+											int type_num = atoi(msg_buf+5);
+											if(type_num%3 == 0) {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_SHADOW_ACCEPTED);} // accepted
+											else if(type_num%3 == 1) {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_SHADOW_REJECTED);} // rejected
 											else {
-												// See if it is accepted/rejected
-												// Delta is treated as normal MQTT messages
-												int type_num = atoi(msg_buf+5);
-												if(type_num%3 == 0) {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_SHADOW_ACCEPTED);} // accepted
-												else if(type_num%3 == 1) {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_SHADOW_REJECTED);} // rejected
-												else {
-													rc = YIELD_ERROR;
-													break;
-												}
+												rc = YIELD_ERROR;
+												break;
 											}
 										}
-										else {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_NORMAL);}
-									}
-									if(rc == OVERFLOW_ERROR) {
-										sub_group[ino_id].callback((char*)(OUT_OF_BUFFER_ERR_MSG), (unsigned int)strlen(OUT_OF_BUFFER_ERR_MSG), STATUS_MESSAGE_OVERFLOW);
 									}
+									else {sub_group[ino_id].callback(msg_buf, (unsigned int)strlen(msg_buf), STATUS_NORMAL);}
 								}
-								// always free the shadow slot and recover the context
-								if(sub_group[ino_id].is_shadow_gud) {
-									sub_group[ino_id].is_used = false;
-									sub_group[ino_id].is_shadow_gud = false;
-									sub_group[ino_id].callback = NULL;
+								if(rc == OVERFLOW_ERROR) {
+									sub_group[ino_id].callback((char*)(OUT_OF_BUFFER_ERR_MSG), (unsigned int)strlen(OUT_OF_BUFFER_ERR_MSG), STATUS_MESSAGE_OVERFLOW);
 								}
-						    }
-						    // clean up
-						    msg_buf[0] = '\0'; // mark msg_buf as 'unused', ready for the next flush
-			      		}
-			      		// more to come? do NOTHING to msg_buf and DO NOT call callback
-			      	}
-			    }
-			    else {
-			      	rc = YIELD_ERROR;
-			      	break;
-			    }
-			}
-			else {
-			    rc = YIELD_ERROR;
-			    break;
-			}
+							}
+							// always free the shadow slot and recover the context
+							if(sub_group[ino_id].is_shadow_gud) {
+								sub_group[ino_id].is_used = false;
+								sub_group[ino_id].is_shadow_gud = false;
+								sub_group[ino_id].callback = NULL;
+							}
+					    }
+					    // clean up
+					    msg_buf[0] = '\0'; // mark msg_buf as 'unused', ready for the next flush
+					    line_cnt = burst_size; // the burst ends with this message
+		      		}
+		      		// more to come? do NOTHING to msg_buf and DO NOT call callback
+		      	}
+		    }
+		    else {
+		      	rc = YIELD_ERROR;
+		      	break;
+		    }
+		}
+		else {
+		    rc = YIELD_ERROR;
+		    break;
 		}
 	}
+	if(rc == YIELD_ERROR) {clear_burst();} // drop the rest of a broken burst
 	return rc;
 }
 
@@ -479,7 +906,7 @@ IoT_Error_t aws_iot_mqtt_client::disconnect() {
 IoT_Error_t aws_iot_mqtt_client::shadow_init(const char* thingName) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(thingName == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(thingName) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(thingName) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		exec_cmd("3\n", false, false);
 
@@ -501,7 +928,7 @@ IoT_Error_t aws_iot_mqtt_client::shadow_init(const char* thingName) {
 IoT_Error_t aws_iot_mqtt_client::shadow_register_delta_func(const char* thingName, message_callback cb) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(thingName == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(thingName) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(thingName) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		// find unused slots for new subscribe
 		int i = find_unused_subgroup();
@@ -536,7 +963,7 @@ IoT_Error_t aws_iot_mqtt_client::shadow_register_delta_func(const char* thingNam
 IoT_Error_t aws_iot_mqtt_client::shadow_unregister_delta_func(const char* thingName) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(thingName == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(thingName) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(thingName) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		exec_cmd("2\n", false, false);
 
@@ -572,7 +999,7 @@ IoT_Error_t aws_iot_mqtt_client::shadow_unregister_delta_func(const char* thingN
 IoT_Error_t aws_iot_mqtt_client::shadow_get(const char* thingName, message_callback cb, unsigned int timeout) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(thingName == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(thingName) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(thingName) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		// find unused slots for new subscribe
 		int i = find_unused_subgroup();	    
@@ -616,7 +1043,8 @@ IoT_Error_t aws_iot_mqtt_client::shadow_get(const char* thingName, message_callb
 IoT_Error_t aws_iot_mqtt_client::shadow_update(const char* thingName, const char* payload, unsigned int payload_len, message_callback cb, unsigned int timeout) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(thingName == NULL || payload == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(thingName) >= MAX_BUF_SIZE || payload_len >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(thingName) >= MAX_BUF_SIZE - 1 || payload_len >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else if(batch_mode && (batch_cnt >= MAX_NUM_BATCH || batch_has_yield())) {rc = OUT_OF_SKETCH_BATCH_MEMORY;}
 	else {
 		// find unused slots for new subscribe
 		int i = find_unused_subgroup();
@@ -635,25 +1063,22 @@ IoT_Error_t aws_iot_mqtt_client::shadow_update(const char* thingName, const char
 			exec_cmd(rw_buf, false, false);
 
 			snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), timeout);
-			exec_cmd(rw_buf, true, false);
+			exec_cmd(rw_buf, !batch_mode, false);
 
-			if(strncmp_P(rw_buf, PSTR("SU T"), 4) == 0) {
+			if(batch_mode) { // slot is taken until the feedback comes with the batch
 				sub_group[i].is_used = true;
 				sub_group[i].is_shadow_gud = true;
 				sub_group[i].callback = cb;
+				batch_slot[batch_cnt] = (char)i;
+				batch_cmd[batch_cnt++] = 'u';
 			}
 			else {
-				if(strncmp_P(rw_buf, PSTR("SU1F"), 4) == 0) {rc = NO_SHADOW_INIT_ERROR;}
-				else if(strncmp_P(rw_buf, PSTR("SU2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
-				else if(strncmp_P(rw_buf, PSTR("SU3F"), 4) == 0) {rc = SHADOW_UPDATE_INVALID_JSON_ERROR;}
-				else if(strncmp_P(rw_buf, PSTR("SU4F"), 4) == 0) {rc = SUBSCRIBE_ERROR;}
-				else if(strncmp_P(rw_buf, PSTR("SU5F"), 4) == 0) {rc = SUBSCRIBE_TIMEOUT;}
-				else if(strncmp_P(rw_buf, PSTR("SU6F"), 4) == 0) {rc = PUBLISH_ERROR;}
-				else if(strncmp_P(rw_buf, PSTR("SU7F"), 4) == 0) {rc = PUBLISH_TIMEOUT;}
-				else if(strncmp_P(rw_buf, PSTR("SU8F"), 4) == 0) {rc = PUBLISH_QUEUE_FULL;}
-				else if(strncmp_P(rw_buf, PSTR("SU9F"), 4) == 0) {rc = PUBLISH_QUEUE_DISABLED;}
-				else if(strncmp_P(rw_buf, PSTR("SUFF"), 4) == 0) {rc = SHADOW_UPDATE_GENERIC_ERROR;}
-				else rc = GENERIC_ERROR;
+				rc = shadow_update_feedback_rc(rw_buf);
+				if(rc == NONE_ERROR) {
+					sub_group[i].is_used = true;
+					sub_group[i].is_shadow_gud = true;
+					sub_group[i].callback = cb;
+				}
 			}
 		}	        
 		else {rc = OUT_OF_SKETCH_SUBSCRIBE_MEMORY;}
@@ -661,10 +1086,28 @@ IoT_Error_t aws_iot_mqtt_client::shadow_update(const char* thingName, const char
 	return rc;
 }
 
+IoT_Error_t aws_iot_mqtt_client::shadow_update_feedback_rc(const char* feedback) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(strncmp_P(feedback, PSTR("SU T"), 4) != 0) {
+		if(strncmp_P(feedback, PSTR("SU1F"), 4) == 0) {rc = NO_SHADOW_INIT_ERROR;}
+		else if(strncmp_P(feedback, PSTR("SU2F"), 4) == 0) {rc = WRONG_PARAMETER_ERROR;}
+		else if(strncmp_P(feedback, PSTR("SU3F"), 4) == 0) {rc = SHADOW_UPDATE_INVALID_JSON_ERROR;}
+		else if(strncmp_P(feedback, PSTR("SU4F"), 4) == 0) {rc = SUBSCRIBE_ERROR;}
+		else if(strncmp_P(feedback, PSTR("SU5F"), 4) == 0) {rc = SUBSCRIBE_TIMEOUT;}
+		else if(strncmp_P(feedback, PSTR("SU6F"), 4) == 0) {rc = PUBLISH_ERROR;}
+		else if(strncmp_P(feedback, PSTR("SU7F"), 4) == 0) {rc = PUBLISH_TIMEOUT;}
+		else if(strncmp_P(feedback, PSTR("SU8F"), 4) == 0) {rc = PUBLISH_QUEUE_FULL;}
+		else if(strncmp_P(feedback, PSTR("SU9F"), 4) == 0) {rc = PUBLISH_QUEUE_DISABLED;}
+		else if(strncmp_P(feedback, PSTR("SUFF"), 4) == 0) {rc = SHADOW_UPDATE_GENERIC_ERROR;}
+		else rc = GENERIC_ERROR;
+	}
+	return rc;
+}
+
 IoT_Error_t aws_iot_mqtt_client::shadow_delete(const char* thingName, message_callback cb, unsigned int timeout) {
 	IoT_Error_t rc = NONE_ERROR;
 	if(thingName == NULL) {rc = NULL_VALUE_ERROR;}
-	else if(strlen(thingName) >= MAX_BUF_SIZE) {rc = OVERFLOW_ERROR;}
+	else if(strlen(thingName) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
 	else {
 		// find unused slots for new subscribe
 		int i = find_unused_subgroup();
@@ -729,37 +1172,49 @@ IoT_Error_t aws_iot_mqtt_client::getValueByKey(const char* JSONIdentifier, const
 IoT_Error_t aws_iot_mqtt_client::getJSONValueLoop(const char* JSONIdentifier, const char* key, char* externalJSONBuf, unsigned int bufSize, KV_access_t accessType) {
 	IoT_Error_t rc = NONE_ERROR;
 	int chunk_cnt = 0;
-	while(true) {
-		exec_cmd("4\n", false, false);
+	unsigned int line_cnt = burst_size; // request a new burst in the first round
+	// key goes out behind its section, with room left for the line break
+	unsigned int section_len = accessType == DESIRED_SECTION ? 14 : (accessType == REPORTED_SECTION ? 15 : (accessType == DELTA_SECTION ? 6 : 0));
+	if(JSONIdentifier == NULL || key == NULL || externalJSONBuf == NULL) {rc = NULL_VALUE_ERROR;}
+	else if(strlen(JSONIdentifier) >= MAX_BUF_SIZE - 1 || section_len + strlen(key) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	while(rc == NONE_ERROR) {
+		if(line_cnt < burst_size) { // next chunk in the current burst
+			read_line();
+			line_cnt++;
+		}
+		else { // all chunks of the previous burst are consumed
+			exec_cmd("4\n", false, false);
 
-		exec_cmd("j\n", false, false);
+			exec_cmd("j\n", false, false);
 		
-		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), JSONIdentifier);
-		exec_cmd(rw_buf, false, false);
+			snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), JSONIdentifier);
+			exec_cmd(rw_buf, false, false);
 
-		switch(accessType) {
-			case DESIRED_SECTION:
-				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("state\"desired\"%s\n"), key);
-				break;
-			case REPORTED_SECTION:
-				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("state\"reported\"%s\n"), key);
-				break;
-			case DELTA_SECTION:
-				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("state\"%s\n"), key);
-				break;
-			case GENERAL_SECTION:
-				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), key);
-				break;
-			default:
-				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), key);
-		}
-		exec_cmd(rw_buf, false, false);
+			switch(accessType) {
+				case DESIRED_SECTION:
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("state\"desired\"%s\n"), key);
+					break;
+				case REPORTED_SECTION:
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("state\"reported\"%s\n"), key);
+					break;
+				case DELTA_SECTION:
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("state\"%s\n"), key);
+					break;
+				case GENERAL_SECTION:
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), key);
+					break;
+				default:
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), key);
+			}
+			exec_cmd(rw_buf, false, false);
 
-		int isFirst = chunk_cnt == 0 ? 1 : 0;
-		chunk_cnt++;
-		if(isFirst == 1) {snprintf_P(externalJSONBuf, bufSize, PSTR("%s"), "");} // Clear the external buffer
-		snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), isFirst);
-		exec_cmd(rw_buf, true, false);
+			int isFirst = chunk_cnt == 0 ? 1 : 0;
+			chunk_cnt++;
+			if(isFirst == 1) {snprintf_P(externalJSONBuf, bufSize, PSTR("%s"), "");} // Clear the external buffer
+			snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%d\n"), isFirst);
+			exec_cmd(rw_buf, true, burst_size > 1);
+			line_cnt = 1;
+		}
 
 		if(strncmp_P(rw_buf, PSTR("J0F"), 3) == 0) {break;} // End of JSON value string transmission
 		else if(strncmp_P(rw_buf, PSTR("J1F"), 3) == 0) {
@@ -787,7 +1242,7 @@ IoT_Error_t aws_iot_mqtt_client::getJSONValueLoop(const char* JSONIdentifier, co
 		p = strtok_r(rw_buf, " ", &saveptr); // J
 		p += (strlen(p) + 1); // Get the rest of the JSON chunk
 		if(p != NULL) {
-			if(strlen(p) + strlen(externalJSONBuf) > bufSize) {
+			if(strlen(p) + strlen(externalJSONBuf) >= bufSize) { // leave room for the terminator
 				rc = OVERFLOW_ERROR;
 				break;
 			}
@@ -798,11 +1253,131 @@ IoT_Error_t aws_iot_mqtt_client::getJSONValueLoop(const char* JSONIdentifier, co
 			break;
 		}
 	}
+	if(rc != NONE_ERROR && chunk_cnt != 0) {clear_burst();} // drop the rest of a broken burst
+	return rc;
+}
+
+// Send ONE request for the values of several keys in the JSON document with this identifier
+// Values are stored one after another in an external buffer provided by the user, each terminated by '\0'
+// Status of each key goes into keyStatus, in the same order as keys
+IoT_Error_t aws_iot_mqtt_client::getValuesByKeys(const char* JSONIdentifier, const char** keys, unsigned int numberOfKeys, char* externalJSONBuf, unsigned int bufSize, IoT_Error_t* keyStatus) {
+	IoT_Error_t rc = NONE_ERROR;
+	if(JSONIdentifier == NULL || keys == NULL || externalJSONBuf == NULL || keyStatus == NULL) {rc = NULL_VALUE_ERROR;}
+	else if(numberOfKeys == 0) {rc = WRONG_PARAMETER_ERROR;}
+	else if(numberOfKeys > MAX_NUM_KEY || strlen(JSONIdentifier) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+	else {
+		unsigned int i;
+		for(i = 0; i < numberOfKeys; i++) {
+			if(keys[i] == NULL) {rc = NULL_VALUE_ERROR;}
+			else if(strlen(keys[i]) >= MAX_BUF_SIZE - 1) {rc = OVERFLOW_ERROR;}
+			keyStatus[i] = JSON_KEY_NOT_FOUND;
+		}
+	}
+	if(rc == NONE_ERROR) {
+		// Each value comes back as a record: <status><length>:<value>
+		unsigned int key_idx = 0; // key that the current record belongs to
+		unsigned int buf_ptr = 0; // next free byte in externalJSONBuf
+		unsigned int value_left = 0; // number of bytes left in the current value
+		int decode_state = 0; // 0: status, 1: length, 2: value
+		char key_status = 'E';
+		bool is_first = true;
+		unsigned int line_cnt = burst_size; // request a new burst in the first round
+		while(true) {
+			if(line_cnt < burst_size) { // next chunk in the current burst
+				read_line();
+				line_cnt++;
+			}
+			else { // all chunks of the previous burst are consumed
+				if(is_first) {
+					snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%u\n"), numberOfKeys + 3);
+					exec_cmd(rw_buf, false, false);
+				}
+				else {exec_cmd("3\n", false, false);} // keys are only sent in the first round
+
+				exec_cmd("jm\n", false, false);
+
+				snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), JSONIdentifier);
+				exec_cmd(rw_buf, false, false);
+
+				if(is_first) {
+					exec_cmd("1\n", false, false);
+					unsigned int i;
+					for(i = 0; i < numberOfKeys; i++) {
+						bool is_last = i == numberOfKeys - 1;
+						snprintf_P(rw_buf, MAX_BUF_SIZE, PSTR("%s\n"), keys[i]);
+						exec_cmd(rw_buf, is_last, is_last && burst_size > 1);
+					}
+					is_first = false;
+				}
+				else {exec_cmd("0\n", true, burst_size > 1);}
+				line_cnt = 1;
+			}
+
+			if(strncmp_P(rw_buf, PSTR("J0F"), 3) == 0) {break;} // End of JSON value string transmission
+			else if(strncmp_P(rw_buf, PSTR("J1F"), 3) == 0) {
+				rc = NO_SET_UP_ERROR;
+				break;
+			}
+			else if(strncmp_P(rw_buf, PSTR("J2F"), 3) == 0) {
+				rc = JSON_FILE_NOT_FOUND;
+				break;
+			}
+			else if(strncmp_P(rw_buf, PSTR("JFF"), 3) == 0) {
+				rc = JSON_GENERIC_ERROR;
+				break;
+			}
+			else if(strncmp_P(rw_buf, PSTR("J "), 2) != 0) {
+				rc = GENERIC_ERROR;
+				break;
+			}
+			// Decode the incoming records below this line, they can be split at any byte
+			char* p = rw_buf + 2; // step over "J "
+			while(*p != '\0' && rc == NONE_ERROR) {
+				if(decode_state == 0) {
+					key_status = *p++;
+					value_left = 0;
+					decode_state = 1;
+				}
+				else if(decode_state == 1) {
+					if(*p == ':') {decode_state = 2;}
+					else if(isdigit((int)(*p))) {value_left = value_left * 10 + (*p - '0');}
+					else {rc = JSON_GENERIC_ERROR;}
+					p++;
+				}
+				else {
+					if(buf_ptr + 1 >= bufSize) {rc = OVERFLOW_ERROR;} // leave room for the terminator
+					else {
+						externalJSONBuf[buf_ptr++] = *p++;
+						value_left--;
+					}
+				}
+				if(decode_state == 2 && value_left == 0 && rc == NONE_ERROR) { // end of this record
+					if(key_idx >= numberOfKeys || buf_ptr >= bufSize) {rc = JSON_GENERIC_ERROR;}
+					else {
+						externalJSONBuf[buf_ptr++] = '\0';
+						if(key_status == 'T') {keyStatus[key_idx] = NONE_ERROR;}
+						else if(key_status == 'N') {keyStatus[key_idx] = JSON_KEY_NOT_FOUND;}
+						else {keyStatus[key_idx] = JSON_GENERIC_ERROR;}
+						key_idx++;
+						decode_state = 0;
+					}
+				}
+			}
+			if(rc != NONE_ERROR) {break;}
+		}
+		if(rc == NONE_ERROR && key_idx != numberOfKeys) {rc = JSON_GENERIC_ERROR;} // broken protocol
+		if(rc != NONE_ERROR) {clear_burst();} // drop the rest of a broken burst
+	}
 	return rc;
 }
 
 // Exec command and get feedback into rw_buf
 void aws_iot_mqtt_client::exec_cmd(const char* cmd, bool wait, bool single_line) {
+	if(framed_mode) { // no echo, ONE frame per feedback
+		write_frame_line(cmd);
+		if(wait) {receive_frame(false);}
+		return;
+	}
 	// Write cmd
 	int cnt = Serial1.write(cmd) + 1;
 	timeout_flag = false;
@@ -851,6 +1426,196 @@ void aws_iot_mqtt_client::exec_cmd(const char* cmd, bool wait, bool single_line)
 	rw_buf[ptr] = '\0'; // add terminator in case of garbage data in rw_buf
 }
 
+// Read the next line of a burst feedback into rw_buf
+void aws_iot_mqtt_client::read_line() {
+	if(framed_mode) {
+		receive_frame(true);
+		return;
+	}
+	int timeout_sec = 0;
+	int ptr = 0;
+	while(timeout_sec < CMD_TIME_OUT) {
+		int cc = Serial1.read();
+		if(cc == -1) { // next chunk is still on its way
+			delay(5);
+			timeout_sec++;
+		}
+		else if(cc == NEXTLINE_KEY) {break;} // end of this chunk
+		else if(cc != RETURN_KEY && ptr < MAX_BUF_SIZE - 1) {
+			rw_buf[ptr++] = (char)cc;
+		}
+	}
+	rw_buf[ptr] = '\0'; // add terminator in case of garbage data in rw_buf
+}
+
+// CRC-16/CCITT (0x1021, initial value 0xFFFF) of frames in reliable mode
+static uint16_t crc16_update(uint16_t crc, uint8_t data) {
+	crc ^= (uint16_t)data << 8;
+	int i;
+	for(i = 0; i < 8; i++) {crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;}
+	return crc;
+}
+
+// Send ONE byte of the current frame, keeping track of its CRC
+void aws_iot_mqtt_client::write_frame_byte(uint8_t data) {
+	Serial1.write(data);
+	frame_crc = crc16_update(frame_crc, data);
+}
+
+// Start a new frame: <STX> [<sequence> <ack>] <command ID> <number of parameters>
+void aws_iot_mqtt_client::write_frame_header(uint8_t id, uint8_t num_para) {
+	Serial1.write((uint8_t)FRAME_START_KEY);
+	frame_crc = 0xFFFF;
+	if(reliable_mode) {
+		write_frame_byte(++frame_tx_seq);
+		write_frame_byte(frame_rx_seq); // cumulative ack
+	}
+	write_frame_byte(id);
+	write_frame_byte(num_para);
+}
+
+// End the current frame: [<CRC>]
+void aws_iot_mqtt_client::write_frame_end() {
+	if(reliable_mode) {
+		uint16_t crc = frame_crc;
+		Serial1.write((uint8_t)(crc >> 8));
+		Serial1.write((uint8_t)(crc & 0xFF));
+	}
+}
+
+// Put the lines of a protocol command into ONE frame, as they come in:
+// <STX> [<sequence> <ack>] <command ID> <number of parameters> (<length> <parameter>)* [<CRC>]
+// All lengths are 2-byte big endian, sequence/ack/CRC are only there in reliable mode
+void aws_iot_mqtt_client::write_frame_line(const char* line) {
+	size_t len = strlen(line);
+	if(len > 0 && line[len - 1] == NEXTLINE_KEY) {len--;} // line ending is not part of the parameter
+	if(frame_left == 0) { // number of lines of a new protocol command, nothing to send yet
+		frame_left = (unsigned int)atoi(line);
+		frame_header = true;
+	}
+	else {
+		if(frame_header) { // protocol name, start the frame
+			int id = NUM_FRAME_CMD - 1;
+			while(id > 0 && (strncmp(line, FRAME_CMD_NAMES[id], len) != 0 || FRAME_CMD_NAMES[id][len] != '\0')) {id--;} // 0 for unknown
+			write_frame_header((uint8_t)id, (uint8_t)(frame_left - 1));
+			frame_header = false;
+			frame_rx_sync = true; // feedback for a new command, which acknowledges everything received before
+		}
+		else { // parameter
+			write_frame_byte((uint8_t)(len >> 8));
+			write_frame_byte((uint8_t)(len & 0xFF));
+			size_t i;
+			for(i = 0; i < len; i++) {frame_crc = crc16_update(frame_crc, (uint8_t)line[i]);}
+			Serial1.write((const uint8_t*)line, len);
+		}
+		frame_left--;
+		if(frame_left == 0) {write_frame_end();}
+	}
+}
+
+// Read ONE feedback frame into rw_buf: <STX> [<sequence>] <length> <message> [<CRC>]
+// Only store the message with the limit of MAX_BUF_SIZE
+// If in_burst, the frame is the next chunk of a burst and comes fast, as in read_line
+// Return false if the frame is incomplete, or damaged/out of order in reliable mode
+bool aws_iot_mqtt_client::read_frame(bool in_burst) {
+	int timeout_sec = 0;
+	int ptr = 0;
+	unsigned int len = 0;
+	long left = 0;
+	uint8_t seq = 0;
+	uint16_t crc = 0xFFFF;
+	uint16_t rx_crc = 0;
+	int state = 0; // 0: waiting for STX, 1: sequence, 2/3: length, 4: message, 5/6: CRC, 7: done
+	while(timeout_sec < CMD_TIME_OUT && state != 7) {
+		int cc = Serial1.read();
+		if(cc == -1) {
+			// feedback may take a while, the rest of the frame and the burst come fast
+			delay(state == 0 && !in_burst && timeout_sec >= NUM_FAST_POLL ? 50 : 5);
+			timeout_sec++;
+		}
+		else {
+			if(state >= 1 && state <= 4) {crc = crc16_update(crc, (uint8_t)cc);}
+			if(state == 0) {
+				if(cc == FRAME_START_KEY) {state = reliable_mode ? 1 : 2;} // skip garbage before the frame
+			}
+			else if(state == 1) {
+				seq = (uint8_t)cc;
+				state = 2;
+			}
+			else if(state == 2) {
+				len = (unsigned int)cc << 8;
+				state = 3;
+			}
+			else if(state == 3) {
+				len |= (unsigned int)cc;
+				left = (long)len;
+				state = 4;
+			}
+			else if(state == 4) {
+				if(ptr < MAX_BUF_SIZE - 1) {rw_buf[ptr++] = (char)cc;}
+				left--;
+			}
+			else if(state == 5) {
+				rx_crc = (uint16_t)cc << 8;
+				state = 6;
+			}
+			else {
+				rx_crc |= (uint16_t)cc;
+				state = 7;
+			}
+			if(state == 4 && left == 0) {state = reliable_mode ? 5 : 7;} // end of message
+		}
+	}
+	bool rc = state == 7;
+	if(rc && reliable_mode) {
+		rc = rx_crc == crc && (frame_rx_sync || seq == (uint8_t)(frame_rx_seq + 1));
+		if(rc) {
+			frame_rx_seq = seq;
+			frame_rx_sync = false;
+		}
+	}
+	if(!rc) {ptr = 0;}
+	rw_buf[ptr] = '\0'; // add terminator in case of garbage data in rw_buf
+	return rc;
+}
+
+// Read ONE feedback frame into rw_buf
+// In reliable mode, lost/damaged frames are asked again, together with the frames after them
+// A command frame rejected by the Python runtime comes back as "R F <sequence expected>: <reason>"
+void aws_iot_mqtt_client::receive_frame(bool in_burst) {
+	int attempt = 0;
+	bool rc = read_frame(in_burst);
+	while(!rc && reliable_mode && attempt < MAX_NUM_RESEND) {
+		// drop what is left of the broken burst, it will be resent
+		bool is_quiet = false;
+		while(!is_quiet) {
+			delay(6);
+			is_quiet = !Serial1.available();
+			while(Serial1.available()) {Serial1.read();}
+		}
+		write_frame_header(0, 0); // resend request, with the cumulative ack
+		write_frame_end();
+		attempt++;
+		rc = read_frame(false); // resent frames answer the resend request
+	}
+	if(rc && reliable_mode && strncmp_P(rw_buf, PSTR("R F "), 4) == 0) {
+		frame_tx_seq = (uint8_t)(atoi(rw_buf + 4) - 1); // the next frame takes the sequence number of the rejected one
+	}
+}
+
+// Discard whatever is left from a burst feedback
+void aws_iot_mqtt_client::clear_burst() {
+	if(burst_size > 1) {
+		delay(6);
+		while(Serial1.available()) {Serial1.read();}
+	}
+}
+
+// Is there a yield in the current batch, which must be the last command
+bool aws_iot_mqtt_client::batch_has_yield() {
+	return batch_cnt > 0 && batch_cmd[batch_cnt - 1] == 'y';
+}
+
 int aws_iot_mqtt_client::find_unused_subgroup() {
 	int i = 0;
 	for(i = 0; i < MAX_SUB; i++) {
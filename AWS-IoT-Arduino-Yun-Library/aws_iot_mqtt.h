@@ -40,7 +40,8 @@ typedef enum {
 	STATUS_SHADOW_TIMEOUT = 1,
 	STATUS_SHADOW_ACCEPTED = 2,
 	STATUS_SHADOW_REJECTED = 3,
-	STATUS_MESSAGE_OVERFLOW = 4
+	STATUS_MESSAGE_OVERFLOW = 4,
+	STATUS_MESSAGE_DROPPED = 5
 } Message_status_t;
 
 // JSON key-value pair access type
@@ -57,12 +58,51 @@ typedef enum {
 	DROP_NEWEST = 1
 } DropBehavior_t;
 
+// Publish batch format
+typedef enum {
+	PUBLISH_BATCH_NONE = 0,
+	PUBLISH_BATCH_JSON_ARRAY = 1,
+	PUBLISH_BATCH_NDJSON = 2
+} PublishBatch_t;
+
+// Yield queue drop policy
+typedef enum {
+	YIELD_DROP_OLDEST = 0,
+	YIELD_DROP_NEWEST = 1,
+	YIELD_REJECT = 2
+} YieldDropPolicy_t;
+
+// Latest-value conflation for subscriptions
+typedef enum {
+	CONFLATION_NONE = 0,
+	CONFLATION_IN_PLACE = 1,
+	CONFLATION_TO_BACK = 2
+} Conflation_t;
+
+// JSON projection format for subscriptions
+typedef enum {
+	PROJECTION_OBJECT = 0,
+	PROJECTION_LIST = 1
+} Projection_t;
+
 typedef void(*message_callback)(char*, unsigned int, Message_status_t);
 
 class aws_iot_mqtt_client {
 	public:
 		aws_iot_mqtt_client() {
 			timeout_flag = false;
+			burst_size = 1;
+			framed_mode = false;
+			reliable_mode = false;
+			frame_tx_seq = 0;
+			frame_rx_seq = 0;
+			frame_rx_sync = false;
+			frame_crc = 0xFFFF;
+			frame_left = 0;
+			frame_header = false;
+			batch_mode = false;
+			batch_cnt = 0;
+			publish_batch_slot = -1;
 			memset(rw_buf, '\0', MAX_BUF_SIZE);
 			memset(msg_buf, '\0', MAX_BUF_SIZE);
 			int i;
@@ -77,7 +117,7 @@ class aws_iot_mqtt_client {
 		IoT_Error_t configWss(const char* host, unsigned int port, const char* cafile_path);
 		IoT_Error_t connect(unsigned int keepalive_interval=60);
 		IoT_Error_t publish(const char* topic, const char* payload, unsigned int payload_len, unsigned int qos, bool retain);
-		IoT_Error_t subscribe(const char* topic, unsigned int qos, message_callback cb);
+		IoT_Error_t subscribe(const char* topic, unsigned int qos, message_callback cb, const char* filter=NULL, const char** keys=NULL, unsigned int numberOfKeys=0, Projection_t format=PROJECTION_OBJECT);
 		IoT_Error_t unsubscribe(const char* topic);
 		IoT_Error_t yield();
 		IoT_Error_t disconnect();
@@ -93,12 +133,33 @@ class aws_iot_mqtt_client {
 		IoT_Error_t getReportedValueByKey(const char* JSONIdentifier, const char* key, char* externalJSONBuf, unsigned int bufSize);
 		IoT_Error_t getDeltaValueByKey(const char* JSONIdentifier, const char* key, char* externalJSONBuf, unsigned int bufSize);
 		IoT_Error_t getValueByKey(const char* JSONIdentifier, const char* key, char* externalJSONBuf, unsigned int bufSize);
+		IoT_Error_t getValuesByKeys(const char* JSONIdentifier, const char** keys, unsigned int numberOfKeys, char* externalJSONBuf, unsigned int bufSize, IoT_Error_t* keyStatus);
 		// Progressive backoff configuration
 		IoT_Error_t configBackoffTiming(unsigned int baseReconnectQuietTimeSecond, unsigned int maxReconnectQuietTimeSecond, unsigned int stableConnectionTimeSecond);
 		// Offline publish queue configuration
 		IoT_Error_t configOfflinePublishQueue(unsigned int queueSize, DropBehavior_t behavior);
 		// Draining interval configuration
 		IoT_Error_t configDrainingInterval(float numberOfSeconds);
+		// Burst transfer configuration
+		IoT_Error_t configBurstSize(unsigned int numberOfChunks);
+		// Framing mode configuration
+		IoT_Error_t configFramedMode(bool enable, bool reliable=false);
+		// Publish batching configuration
+		IoT_Error_t configPublishBatch(unsigned int windowMillis, unsigned int byteLimit, PublishBatch_t format, message_callback cb);
+		IoT_Error_t configPublishBatchGroup(const char* topicFilter, const char* groupTopic);
+		// Yield queue bounds configuration
+		IoT_Error_t configYieldQueue(unsigned int maxMessages, unsigned long maxBytes, unsigned int slotQuota, YieldDropPolicy_t policy);
+		IoT_Error_t getYieldDropCount(unsigned long* numberOfDrops);
+		// Yield priority configuration
+		IoT_Error_t configYieldPriority(const char* topic, unsigned int priority, unsigned int weight);
+		IoT_Error_t configShadowDeltaPriority(const char* thingName, unsigned int priority, unsigned int weight);
+		// Latest-value conflation configuration
+		IoT_Error_t configConflation(const char* topic, Conflation_t mode);
+		// Daemon mode configuration, to keep the connection through idle gaps and sketch resets
+		IoT_Error_t configDaemonMode(bool enabled);
+		// Batch of commands with ONE combined feedback
+		IoT_Error_t beginBatch();
+		IoT_Error_t endBatch(IoT_Error_t* results, unsigned int numberOfResults);
 
 	private:
 		typedef struct {
@@ -110,10 +171,38 @@ class aws_iot_mqtt_client {
 		char msg_buf[MAX_BUF_SIZE]; // To store message chunks
 		mqtt_sub_element sub_group[MAX_SUB];
 		bool timeout_flag; // Is there a timeout when executing RPC
+		unsigned int burst_size; // Number of chunks received for each yield/JSON request
+		bool framed_mode; // Are protocol commands/feedback exchanged as length-prefixed frames
+		unsigned int frame_left; // Number of lines left to be framed for the current protocol command
+		bool frame_header; // Is the next line the protocol name of the current protocol command
+		bool reliable_mode; // Are frames exchanged with sequence numbers and CRC, lost/damaged ones resent
+		uint8_t frame_tx_seq; // Sequence number of the last frame sent
+		uint8_t frame_rx_seq; // Sequence number of the last feedback frame received in order, as the cumulative ack
+		bool frame_rx_sync; // Is the next feedback frame the first one for a new command, with any sequence number
+		uint16_t frame_crc; // CRC of the frame being sent
+		bool batch_mode; // Are commands queued in a batch, with their feedback coming when the batch ends
+		unsigned int batch_cnt; // Number of commands in the current batch
+		char batch_cmd[MAX_NUM_BATCH]; // Command of each one in the current batch: 'p' publish, 'u' shadow update, 'y' yield
+		char batch_slot[MAX_NUM_BATCH]; // Slot taken by each shadow update in the current batch
+		int publish_batch_slot; // Slot taken for the flush status of publish batches, -1 for none
 		Baud_t find_baud_type();
 		IoT_Error_t getJSONValueLoop(const char* JSONIdentifier, const char* key, char* externalJSONBuf, unsigned int bufSize, KV_access_t accessType);
-		IoT_Error_t setup_exec(const char* client_id, bool clean_session, MQTTv_t MQTT_version, bool useWebsocket);
+		IoT_Error_t yield_loop(bool first_burst_requested);
+		IoT_Error_t yield_priority_cmd(const char* name, bool is_shadow_delta, unsigned int priority, unsigned int weight);
+		IoT_Error_t publish_feedback_rc(const char* feedback);
+		IoT_Error_t shadow_update_feedback_rc(const char* feedback);
+		IoT_Error_t setup_exec(const char* client_id, bool clean_session, MQTTv_t MQTT_version, bool useWebsocket, bool start_runtime);
+		bool reattach(long baudrate);
 		void exec_cmd(const char* cmd, bool wait, bool single_line);
+		void read_line();
+		void write_frame_byte(uint8_t data);
+		void write_frame_header(uint8_t id, uint8_t num_para);
+		void write_frame_end();
+		void write_frame_line(const char* line);
+		bool read_frame(bool in_burst);
+		void receive_frame(bool in_burst);
+		void clear_burst();
+		bool batch_has_yield();
 		int find_unused_subgroup();
 		void clearProtocolOnSerialBegin(long baudrate);
 		bool is_num(char* src);
@@ -0,0 +1,375 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import gc
+import json
+import getopt
+import struct
+import tempfile
+import timeit
+_benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_benchmarkDirectory, "..", "lib"))
+sys.path.insert(0, os.path.join(_benchmarkDirectory, "..", "runtime"))
+from comm.serialCommunicationServer import serialCommunicationServer
+from util.jsonManager import jsonManager
+from runtimeHub import runtimeHub
+
+# Microbenchmarks of the hot functions of the Python runtime, run in this process on the runtime modules as they are
+# Each benchmark times a number of operations, several times, and keeps the fastest run (least disturbed)
+# The number of operations is raised until one run lasts the minimum run time, so that sub-microsecond operations
+# are not measured at the resolution and the jitter of the timer
+# Numbers are scaled to the CPU class of the Yun (Atheros AR9331, 400 MHz MIPS 24Kc) by a calibration loop:
+# Yun-class time = host time * (Yun calibration time / host calibration time)
+# The calibration loop is timed around each run of each benchmark, so that the scale follows the host speed
+# The default Yun calibration time is an estimate. Run "python microBenchmark.py -k" on the board to measure it
+# Results are compared with the stored baseline, in Yun-class microseconds per operation, so that baselines taken
+# on different hosts stay comparable. Any benchmark slower than the baseline by more than the threshold fails the run,
+# unless it is slower by less than the noise floor: for operations of about a microsecond on the host, the run-to-run
+# jitter of the host (CPU frequency, cache and memory layout of the process) is well over the threshold
+# Runs under Python 2.7, as the runtime
+_baselinePath = os.path.join(_benchmarkDirectory, "microBenchmarkBaseline.json")
+_yunCalibrationSecond = 0.9  # Estimated, about 45 times the calibration time on a current x86 core
+_noiseFloorMicrosecond = 40.0  # Yun-class, about 1 us of host time on a current x86 core
+_shadowDocument = json.dumps({"state": {"desired": {"temperature": 21, "mode": "auto"},
+                                        "reported": {"temperature": 20.5, "mode": "auto", "name": "livingRoom",
+                                                     "sensors": [{"id": i, "value": i * 1.5} for i in range(0, 16)]}},
+                              "metadata": {"reported": {"temperature": {"timestamp": 1500000000}}},
+                              "version": 42, "timestamp": 1500000000, "clientToken": "microBenchmark-0"})
+
+
+class _memorySerialCommunicationServer(serialCommunicationServer):
+    # serialCommunicationServer with in-memory I/O: input is read from a prepared buffer, output goes to a list
+
+    def __init__(self):
+        serialCommunicationServer.__init__(self)
+        self.pendingInput = []  # Contents to be read, last one first
+        self.output = []
+
+    def _receive(self, srcTimeoutSecond):
+        if len(self.pendingInput) == 0:
+            return ""  # EOF
+        return self.pendingInput.pop()
+
+    def _basicOutput(self, srcContent):
+        self.output.append(srcContent)
+
+    def _basicWrite(self, srcContent):
+        self.output.append(srcContent)
+
+    def feed(self, srcContent):
+        # In reads of up to 4096 bytes, as from the stdin file descriptor
+        self.pendingInput = [srcContent[i:i + 4096] for i in range(0, len(srcContent), 4096)]
+        self.pendingInput.reverse()
+
+    def setFramedModeNow(self, srcFramedMode):
+        # Framed mode without touching the terminal
+        self._framedMode = srcFramedMode
+        self._reliableMode = False
+
+
+def _calibrationLoop():
+    # Fixed mix of what the runtime does most: string slicing/concatenation, dict lookups, list appends, calls
+    table = dict(("key" + str(i), i) for i in range(0, 64))
+    chunks = []
+    payload = "x" * 200
+    total = 0
+    for i in range(0, 20000):
+        total += table.get("key" + str(i % 64), 0)
+        chunks.append("Y " + str(i % 8) + " 0 " + payload[i % 150:i % 150 + 44])
+        if len(chunks) > 32:
+            chunks = []
+    return total
+
+
+class microBenchmark:
+
+    _usage = """Usage:
+
+    Run the microbenchmarks of the Python runtime against the stored baseline:
+    python microBenchmark.py
+
+    Type "python microBenchmark.py -h" for detailed command line options.
+
+
+    """
+
+    _helpInfo = """Available command line options:
+    -t, --threshold: Slowdown over the baseline that fails the run, 0.3 (30%) by default
+    -a, --noise-floor: Slowdown in Yun-class microseconds per operation under which the threshold is not applied, 40 by default
+    -r, --repeats: Number of timed runs per benchmark, the fastest one counts, 7 by default
+    -m, --min-run-time: Shortest timed run in seconds, operations are added until a run lasts this long, 0.05 by default
+    -n, --retries: Number of times a benchmark over the threshold is timed again before it fails, 2 by default
+    -f, --filter: Only run the benchmarks whose name starts with this
+    -b, --baseline: Baseline file, microBenchmarkBaseline.json by default
+    -w, --write-baseline: Store the results as the new baseline instead of comparing
+    -y, --yun-calibration: Calibration time on the Yun in seconds, as measured with -k on the board
+    -k, --calibrate: Only time the calibration loop on this machine
+    -h, --help: Help infomation
+
+
+    """
+
+    def __init__(self):
+        self._threshold = 0.3
+        self._noiseFloorMicrosecond = _noiseFloorMicrosecond
+        self._numberOfRepeats = 7
+        self._minimumRunSecond = 0.05
+        self._numberOfRetries = 2
+        self._nameFilter = ""
+        self._baselinePath = _baselinePath
+        self._isWritingBaseline = False
+        self._yunCalibrationSecond = _yunCalibrationSecond
+        self._isCalibratingOnly = False
+        # (name, benchmark function, parameter, least number of operations), the function returns the seconds for these operations
+        self._benchmarks = []
+        for payloadLength in [16, 256, 4096, 65536]:
+            self._benchmarks.append(("formatPayloadForYield/" + str(payloadLength), self._benchFormatPayloadForYield, payloadLength, 2000))
+        self._benchmarks.append(("accept/line", self._benchAcceptLine, None, 5000))
+        self._benchmarks.append(("accept/framed", self._benchAcceptFramed, None, 5000))
+        for burstSize in [1, 8]:
+            self._benchmarks.append(("writeToExternalYield/burst" + str(burstSize), self._benchWriteToExternalYield, burstSize, 8000))
+        self._benchmarks.append(("storeNewJSON", self._benchStoreNewJSON, None, 5000))
+        self._benchmarks.append(("getValueByKeyInJSON", self._benchGetValueByKeyInJSON, None, 2000))
+        for protocolName in ["y", "p", "x"]:
+            self._benchmarks.append(("findCommand/" + protocolName, self._benchFindCommand, protocolName, 20000))
+        self._hub = None
+
+    # Return False if the command line inputs are malformed, or only help is requested
+    def checkInputs(self):
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "ht:a:r:m:n:f:b:wy:k", ["threshold=", "noise-floor=", "repeats=", "min-run-time=", "retries=", "filter=", "baseline=", "write-baseline", "yun-calibration=", "calibrate", "help"])
+            for opt, arg in opts:
+                if opt in ("-t", "--threshold"):
+                    self._threshold = float(arg)
+                if opt in ("-a", "--noise-floor"):
+                    self._noiseFloorMicrosecond = float(arg)
+                if opt in ("-r", "--repeats"):
+                    self._numberOfRepeats = int(arg)
+                if opt in ("-m", "--min-run-time"):
+                    self._minimumRunSecond = float(arg)
+                if opt in ("-n", "--retries"):
+                    self._numberOfRetries = int(arg)
+                if opt in ("-f", "--filter"):
+                    self._nameFilter = arg
+                if opt in ("-b", "--baseline"):
+                    self._baselinePath = arg
+                if opt in ("-w", "--write-baseline"):
+                    self._isWritingBaseline = True
+                if opt in ("-y", "--yun-calibration"):
+                    self._yunCalibrationSecond = float(arg)
+                if opt in ("-k", "--calibrate"):
+                    self._isCalibratingOnly = True
+                if opt in ("-h", "--help"):
+                    print(self._helpInfo)
+                    return False
+        except (getopt.GetoptError, ValueError):
+            print(self._usage)
+            return False
+        return self._numberOfRepeats > 0 and self._threshold >= 0 and self._noiseFloorMicrosecond >= 0 and self._minimumRunSecond >= 0 and self._numberOfRetries >= 0 and self._yunCalibrationSecond > 0
+
+    # Benchmarks
+    def _getHub(self):
+        # ONE runtimeHub, as created by run.py, with its startup report in the temporary directory (never written)
+        if self._hub is None:
+            self._hub = runtimeHub("microBenchmark", tempfile.gettempdir())
+        return self._hub
+
+    def _benchFormatPayloadForYield(self, srcPayloadLength, srcNumberOfOperations):
+        formatPayloadForYield = self._getHub()._formatPayloadForYield
+        payload = "x" * srcPayloadLength
+        startTime = timeit.default_timer()
+        for i in range(0, srcNumberOfOperations):
+            formatPayloadForYield(payload, 3)
+        return timeit.default_timer() - startTime
+
+    def _timeAccept(self, srcServer, srcInput, srcNumberOfOperations):
+        srcServer.feed(srcInput * srcNumberOfOperations)
+        startTime = timeit.default_timer()
+        for i in range(0, srcNumberOfOperations):
+            srcServer.accept()
+        return timeit.default_timer() - startTime
+
+    def _benchAcceptLine(self, srcParameter, srcNumberOfOperations):
+        # Publish, as the sketch sends it in the line protocol
+        return self._timeAccept(_memorySerialCommunicationServer(), "5\np\nsensors/livingRoom\n" + "x" * 40 + "\n1\n0\n", srcNumberOfOperations)
+
+    def _benchAcceptFramed(self, srcParameter, srcNumberOfOperations):
+        # Publish, as the sketch sends it in the framed mode
+        frame = "\x02" + struct.pack("BB", 5, 4)
+        for parameter in ["sensors/livingRoom", "x" * 40, "1", "0"]:
+            frame += struct.pack(">H", len(parameter)) + parameter
+        currentServer = _memorySerialCommunicationServer()
+        currentServer.setFramedModeNow(True)
+        return self._timeAccept(currentServer, frame, srcNumberOfOperations)
+
+    def _benchWriteToExternalYield(self, srcBurstSize, srcNumberOfOperations):
+        # Operations are chunks sent, from messages of 4 chunks each
+        currentServer = _memorySerialCommunicationServer()
+        currentServer.setBurstSize(srcBurstSize)
+        chunks = ["Y 3 1 " + "x" * 44] * 3 + ["Y 3 0 " + "x" * 20]
+        for i in range(0, srcNumberOfOperations // len(chunks)):
+            currentServer.writeToInternalYield(chunks, 3)
+        currentServer.updateLockedQueueSize()
+        startTime = timeit.default_timer()
+        while currentServer.getLockedQueueSize() > 0:
+            currentServer.writeToExternalYield()
+        return timeit.default_timer() - startTime
+
+    def _benchStoreNewJSON(self, srcParameter, srcNumberOfOperations):
+        # Accepted responses, as the default JSON history of the runtime keeps them, beyond its limits
+        currentJSONManager = jsonManager(512, 512, 512, 2*1024*1024)
+        startTime = timeit.default_timer()
+        for i in range(0, srcNumberOfOperations):
+            currentJSONManager.storeNewJSON(_shadowDocument, "accepted")
+        return timeit.default_timer() - startTime
+
+    def _benchGetValueByKeyInJSON(self, srcParameter, srcNumberOfOperations):
+        currentJSONManager = jsonManager(512, 512, 512, 2*1024*1024)
+        startTime = timeit.default_timer()
+        for i in range(0, srcNumberOfOperations):
+            currentJSONManager.getValueByKeyInJSON(_shadowDocument, "$.state.reported.sensors[3].value")
+        return timeit.default_timer() - startTime
+
+    def _benchFindCommand(self, srcProtocolName, srcNumberOfOperations):
+        # y: hot command, preconstructed, p: command module loaded on first use, x: unsupported protocol
+        findCommand = self._getHub()._findCommand
+        protocolMessage = {"y": ["y"], "p": ["p", "sensors/livingRoom", "x" * 40, "1", "0"], "x": ["x"]}[srcProtocolName]
+        findCommand(list(protocolMessage))  # Command module loaded once, outside the timing
+        startTime = timeit.default_timer()
+        for i in range(0, srcNumberOfOperations):
+            findCommand(list(protocolMessage))
+        return timeit.default_timer() - startTime
+
+    # Runs
+    def _timeBest(self, srcFunction, *args):
+        # Fastest of the repeats for the function, and the least ratio of a run to the calibration loop around it
+        # The calibration loop is timed before and after each run, so that the ratio follows the host speed of the moment
+        # Garbage collector is off, as timeit does
+        bestSecond = None
+        bestRatio = None
+        isGCEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            calibrationSecond = self._timeCalibration()
+            for i in range(0, self._numberOfRepeats):
+                currentSecond = srcFunction(*args)
+                nextCalibrationSecond = self._timeCalibration()
+                currentRatio = currentSecond * 2 / (calibrationSecond + nextCalibrationSecond)
+                calibrationSecond = nextCalibrationSecond
+                bestSecond = currentSecond if bestSecond is None else min(bestSecond, currentSecond)
+                bestRatio = currentRatio if bestRatio is None else min(bestRatio, currentRatio)
+        finally:
+            if isGCEnabled:
+                gc.enable()
+        return bestSecond, bestRatio
+
+    def _scaleNumberOfOperations(self, srcFunction, srcParameter, srcNumberOfOperations):
+        # Least number of operations, from the given one up, for ONE run to last the minimum run time
+        numberOfOperations = srcNumberOfOperations
+        while True:
+            currentSecond = srcFunction(srcParameter, numberOfOperations)
+            if currentSecond >= self._minimumRunSecond:
+                return numberOfOperations
+            # Aim 20% over the minimum, at least doubling when the run is too short to be measured
+            numberOfOperations = max(numberOfOperations * 2, int(numberOfOperations * 1.2 * self._minimumRunSecond / max(currentSecond, 1e-6)))
+
+    def _readBaseline(self):
+        # Return the results in the baseline, None if there is none
+        try:
+            with open(self._baselinePath) as baselineFile:
+                return json.load(baselineFile)["results"]
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def _writeBaseline(self, srcResults, srcHostCalibrationSecond):
+        baseline = {"python": sys.version.split()[0], "hostCalibrationSecond": round(srcHostCalibrationSecond, 4),
+                    "yunCalibrationSecond": self._yunCalibrationSecond, "results": srcResults}
+        with open(self._baselinePath, "w") as baselineFile:
+            json.dump(baseline, baselineFile, indent=2, sort_keys=True, separators=(",", ": "))
+            baselineFile.write("\n")
+
+    def _timeCalibration(self):
+        # Seconds for ONE calibration loop, looped for the minimum run time
+        numberOfLoops = 0
+        startTime = timeit.default_timer()
+        while True:
+            _calibrationLoop()
+            numberOfLoops += 1
+            currentSecond = timeit.default_timer() - startTime
+            if currentSecond >= self._minimumRunSecond:
+                return currentSecond / numberOfLoops
+
+    def _isRegression(self, srcYunMicrosecond, srcBaselineMicrosecond):
+        # Slower than the baseline by more than the threshold, and by more than the noise floor
+        isOverThreshold = srcYunMicrosecond / srcBaselineMicrosecond - 1 > self._threshold
+        return isOverThreshold and srcYunMicrosecond - srcBaselineMicrosecond > self._noiseFloorMicrosecond
+
+    def run(self):
+        # Return the exit code
+        hostCalibrationSecond = self._timeBest(self._timeCalibration)[0]
+        print("Calibration loop: %.4fs on this machine, %.4fs on the Yun, scale %.1f" %
+              (hostCalibrationSecond, self._yunCalibrationSecond, self._yunCalibrationSecond / hostCalibrationSecond))
+        if self._isCalibratingOnly:
+            return 0
+        baselineResults = None if self._isWritingBaseline else self._readBaseline()
+        if not self._isWritingBaseline and baselineResults is None:
+            print("No baseline in " + self._baselinePath + ", results are not compared.")
+        results = dict()
+        regressions = []
+        print("%-32s %12s %12s %12s %8s" % ("Benchmark", "host us/op", "Yun us/op", "baseline", "change"))
+        for name, benchmarkFunction, parameter, numberOfOperations in self._benchmarks:
+            if not name.startswith(self._nameFilter):
+                continue
+            numberOfOperations = self._scaleNumberOfOperations(benchmarkFunction, parameter, numberOfOperations)
+            baselineMicrosecond = None if baselineResults is None else baselineResults.get(name)
+            hostMicrosecond = None
+            yunMicrosecond = None
+            # A benchmark over the threshold is timed again before it fails, the fastest timing counts
+            for i in range(0, 1 + self._numberOfRetries):
+                hostSecond, calibrationRatio = self._timeBest(benchmarkFunction, parameter, numberOfOperations)
+                currentHostMicrosecond = hostSecond * 1000000 / numberOfOperations
+                currentYunMicrosecond = round(calibrationRatio * self._yunCalibrationSecond * 1000000 / numberOfOperations, 2)
+                hostMicrosecond = currentHostMicrosecond if hostMicrosecond is None else min(hostMicrosecond, currentHostMicrosecond)
+                yunMicrosecond = currentYunMicrosecond if yunMicrosecond is None else min(yunMicrosecond, currentYunMicrosecond)
+                if baselineMicrosecond is None or not self._isRegression(yunMicrosecond, baselineMicrosecond):
+                    break
+            results[name] = yunMicrosecond
+            if baselineMicrosecond is None:
+                print("%-32s %12.2f %12.2f %12s %8s" % (name, hostMicrosecond, yunMicrosecond, "-", "-"))
+                continue
+            change = yunMicrosecond / baselineMicrosecond - 1
+            print("%-32s %12.2f %12.2f %12.2f %+7.1f%%" % (name, hostMicrosecond, yunMicrosecond, baselineMicrosecond, change * 100))
+            if self._isRegression(yunMicrosecond, baselineMicrosecond):
+                regressions.append(name)
+        if self._isWritingBaseline:
+            self._writeBaseline(results, hostCalibrationSecond)
+            print("Baseline written to " + self._baselinePath)
+            return 0
+        if len(regressions) != 0:
+            print("FAILED: slower than the baseline by more than %d%% and %.0f us: %s" % (self._threshold * 100, self._noiseFloorMicrosecond, ", ".join(regressions)))
+            return 1
+        print("PASSED")
+        return 0
+
+# Main
+if __name__ == '__main__':
+    thisMicroBenchmark = microBenchmark()
+    if not thisMicroBenchmark.checkInputs():
+        sys.exit(2)
+    sys.exit(thisMicroBenchmark.run())
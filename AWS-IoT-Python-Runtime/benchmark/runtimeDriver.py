@@ -0,0 +1,199 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import pty
+import time
+import errno
+import select
+import subprocess
+
+# Drive the Python runtime through its line protocol on stdin/stdout, as the sketch does over the Bridge
+# The runtime is started with unbuffered output, from its own directory, the way setup_exec does
+# Bytes sent to and received from the runtime are counted, as what would go over the serial link
+# Optionally, the runtime runs on a terminal (pseudo-terminal), as on the Linux console of the Yun: input is echoed and
+# line breaks come out as "\r\n" until the runtime switches the terminal to raw mode, output is line buffered
+_benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+runtimeDirectory = os.path.join(_benchmarkDirectory, "..", "runtime")
+standInDirectory = os.path.join(_benchmarkDirectory, "standIn")
+
+
+class runtimeDriver:
+
+    def __init__(self, srcPythonPath=sys.executable, srcSDKPath=standInDirectory, srcReplyTimeoutSecond=30, srcLinkSpec=None, srcIsOnTerminal=False):
+        # srcSDKPath: directory to look for AWSIoTPythonSDK first, None for the installed SDK
+        # srcLinkSpec: model of the serial link of the Yun for the runtime to run behind (see yunBridgeTransport), None for none
+        # srcIsOnTerminal: run the runtime on a terminal instead of pipes
+        self._pythonPath = srcPythonPath
+        self._sdkPath = srcSDKPath
+        self._replyTimeoutSecond = srcReplyTimeoutSecond
+        self._linkSpec = srcLinkSpec
+        self._isOnTerminal = srcIsOnTerminal
+        self._runtimeProcess = None
+        self._terminalFileDescriptor = None  # Master side of the terminal of the runtime, if on a terminal
+        self._rxBuf = b""
+        self.numberOfBytesToRuntime = 0
+        self.numberOfBytesFromRuntime = 0
+        self.numberOfRequests = 0
+        self.startTime = None
+
+    def start(self):
+        environment = dict(os.environ)
+        if self._sdkPath is not None:
+            environment["PYTHONPATH"] = os.path.abspath(self._sdkPath) + os.pathsep + environment.get("PYTHONPATH", "")
+        # Unbuffered output on pipes, line buffered on a terminal as "python run.py" on the Yun
+        arguments = [self._pythonPath, "run.py"] if self._isOnTerminal else [self._pythonPath, "-u", "run.py"]
+        if self._linkSpec is not None:
+            arguments += ["-l", self._linkSpec]
+        self.startTime = time.time()
+        if self._isOnTerminal:
+            self._terminalFileDescriptor, slaveFileDescriptor = pty.openpty()
+            self._runtimeProcess = subprocess.Popen(arguments, cwd=runtimeDirectory, env=environment,
+                                                    stdin=slaveFileDescriptor, stdout=slaveFileDescriptor, bufsize=0)
+            os.close(slaveFileDescriptor)  # EOF once the runtime is gone
+        else:
+            self._runtimeProcess = subprocess.Popen(arguments, cwd=runtimeDirectory, env=environment,
+                                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self._rxBuf = b""
+
+    def stop(self):
+        # Ask the runtime to exit, kill it if it does not
+        if self._runtimeProcess is None:
+            return
+        try:
+            self.sendLines(["~"])
+            if not self._isOnTerminal:
+                self._runtimeProcess.stdin.close()
+        except (IOError, OSError):
+            pass
+        deadline = time.time() + 5
+        while self._runtimeProcess.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+        if self._runtimeProcess.poll() is None:
+            self._runtimeProcess.kill()
+        self._runtimeProcess.wait()
+        self._runtimeProcess = None
+        if self._terminalFileDescriptor is not None:
+            os.close(self._terminalFileDescriptor)
+            self._terminalFileDescriptor = None
+
+    def resetCounters(self):
+        self.numberOfBytesToRuntime = 0
+        self.numberOfBytesFromRuntime = 0
+        self.numberOfRequests = 0
+
+    def sendLines(self, srcLines):
+        # ONE protocol message: the number of lines, then the lines
+        content = (str(len(srcLines)) + "\n" + "".join(str(line) + "\n" for line in srcLines)).encode("utf-8")
+        self._write(content)
+        self.numberOfBytesToRuntime += len(content)
+        self.numberOfRequests += 1
+
+    def _write(self, srcContent):
+        if self._isOnTerminal:
+            while len(srcContent) != 0:
+                srcContent = srcContent[os.write(self._terminalFileDescriptor, srcContent):]
+        else:
+            self._runtimeProcess.stdin.write(srcContent)
+            self._runtimeProcess.stdin.flush()
+
+    def _outputFileDescriptor(self):
+        return self._terminalFileDescriptor if self._isOnTerminal else self._runtimeProcess.stdout.fileno()
+
+    def _read(self, srcFileDescriptor):
+        # b"" on EOF, as the terminal tells once the runtime is gone
+        try:
+            return os.read(srcFileDescriptor, 65536)
+        except OSError as e:
+            if e.errno == errno.EIO:
+                return b""
+            raise
+
+    def readLine(self, srcTimeoutSecond=None):
+        # Next line from the runtime without the line break, None if it does not come in time
+        timeoutSecond = self._replyTimeoutSecond if srcTimeoutSecond is None else srcTimeoutSecond
+        deadline = time.time() + timeoutSecond
+        outputFileDescriptor = self._outputFileDescriptor()
+        while b"\n" not in self._rxBuf:
+            remainingSecond = deadline - time.time()
+            if remainingSecond <= 0 or len(select.select([outputFileDescriptor], [], [], remainingSecond)[0]) == 0:
+                return None
+            content = self._read(outputFileDescriptor)
+            if not content:
+                return None
+            self._rxBuf += content
+            self.numberOfBytesFromRuntime += len(content)
+        line, self._rxBuf = self._rxBuf.split(b"\n", 1)
+        return line.decode("utf-8", "replace")
+
+    def isRunning(self):
+        return self._runtimeProcess is not None and self._runtimeProcess.poll() is None
+
+    def writeRaw(self, srcContent):
+        # Bytes as they are, for clients that do their own line handling
+        self._write(srcContent)
+        self.numberOfBytesToRuntime += len(srcContent)
+
+    def readRaw(self, srcTimeoutSecond):
+        # Whatever the runtime has written so far, b"" on EOF, None if nothing comes in time
+        if len(self._rxBuf) != 0:
+            content, self._rxBuf = self._rxBuf, b""
+            return content
+        outputFileDescriptor = self._outputFileDescriptor()
+        if len(select.select([outputFileDescriptor], [], [], srcTimeoutSecond)[0]) == 0:
+            return None
+        content = self._read(outputFileDescriptor)
+        self.numberOfBytesFromRuntime += len(content)
+        return content
+
+    def command(self, srcProtocolName, srcParameters=(), srcTimeoutSecond=None):
+        # Send ONE command and return its ONE line reply, None if there is none in time
+        self.sendLines([srcProtocolName] + list(srcParameters))
+        return self.readLine(srcTimeoutSecond)
+
+    def setUp(self, srcClientID, srcHost, srcPort, srcKeepAliveSecond=60):
+        # MQTT init, config and connect, return the list of replies
+        replies = [self.command("i", [srcClientID, 1, 4, 0])]
+        replies.append(self.command("g", [srcHost, srcPort, "rootCA", "private.key", "certificate.pem"]))
+        replies.append(self.command("c", [srcKeepAliveSecond]))
+        return replies
+
+    def yieldBurst(self, srcBurstSize=1):
+        # ONE yield request, return the chunks (lines) and whether the queue ran out ("Y F" received)
+        # The burst ends early with the last chunk of a message
+        self.sendLines(["y"])
+        chunks = []
+        while len(chunks) < srcBurstSize:
+            line = self.readLine()
+            if line is None or line.startswith("Y F"):
+                return chunks, True
+            chunks.append(line)
+            if line.split(" ", 3)[2:3] != ["1"]:
+                break
+        return chunks, False
+
+    def drainYield(self, srcBurstSize=1):
+        # Lock the queue size and yield until there is nothing left, as the sketch does, return all the chunks
+        if self.command("z") != "Z T":
+            return []
+        chunks = []
+        isDrained = False
+        while not isDrained:
+            burstChunks, isDrained = self.yieldBurst(srcBurstSize)
+            chunks.extend(burstChunks)
+        return chunks
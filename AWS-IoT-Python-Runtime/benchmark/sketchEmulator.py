@@ -0,0 +1,1227 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import time
+import threading
+from runtimeDriver import runtimeDriver
+
+# Emulate the sketch side of the line protocol: aws_iot_mqtt_client of the Arduino library, on the Linino console
+# Command sequences, buffer limits, delays and timeouts follow aws_iot_mqtt.cpp, one method for each of its functions
+# Several emulated sketches can run at the same time, each with its own console and runtime, for load tests
+# The runtime runs on a terminal, which it switches to raw mode for framed/reliable mode, as on the Linux console
+
+# aws_iot_config_SDK.h
+MAX_BUF_SIZE = 256
+MAX_SUB = 15
+CMD_TIME_OUT = 200  # 200 rounds of delay(5) for the echo, or delay(50) for the feedback
+MAX_NUM_KEY = 8
+MAX_NUM_BATCH = 8
+MAX_NUM_PARA = 8
+LINUX_BAUD_DEFAULT = 250000
+LINUX_BAUD_LININO = 115200
+NUM_ATTEMPT_BEFORE_EXIT = (MAX_NUM_PARA + 5) // 2 + 1
+
+# aws_iot_error.h
+NONE_ERROR = 0
+GENERIC_ERROR = -1
+NULL_VALUE_ERROR = -2
+OVERFLOW_ERROR = -3
+OUT_OF_SKETCH_SUBSCRIBE_MEMORY = -4
+SERIAL1_COMMUNICATION_ERROR = -5
+SET_UP_ERROR = -6
+NO_SET_UP_ERROR = -7
+WRONG_PARAMETER_ERROR = -8
+CONFIG_GENERIC_ERROR = -9
+CONNECT_SSL_ERROR = -10
+CONNECT_ERROR = -11
+CONNECT_TIMEOUT = -12
+CONNECT_CREDENTIAL_NOT_FOUND = -13
+CONNECT_GENERIC_ERROR = -14
+PUBLISH_ERROR = -15
+PUBLISH_TIMEOUT = -16
+PUBLISH_GENERIC_ERROR = -17
+SUBSCRIBE_ERROR = -18
+SUBSCRIBE_TIMEOUT = -19
+SUBSCRIBE_GENERIC_ERROR = -20
+UNSUBSCRIBE_ERROR = -21
+UNSUBSCRIBE_TIMEOUT = -22
+UNSUBSCRIBE_GENERIC_ERROR = -23
+DISCONNECT_ERROR = -24
+DISCONNECT_TIMEOUT = -25
+DISCONNECT_GENERIC_ERROR = -26
+SHADOW_INIT_ERROR = -27
+NO_SHADOW_INIT_ERROR = -28
+SHADOW_GET_GENERIC_ERROR = -29
+SHADOW_UPDATE_GENERIC_ERROR = -30
+SHADOW_UPDATE_INVALID_JSON_ERROR = -31
+SHADOW_DELETE_GENERIC_ERROR = -32
+SHADOW_REGISTER_DELTA_CALLBACK_GENERIC_ERROR = -33
+SHADOW_UNREGISTER_DELTA_CALLBACK_GENERIC_ERROR = -34
+YIELD_ERROR = -35
+WEBSOCKET_CREDENTIAL_NOT_FOUND = -36
+JSON_FILE_NOT_FOUND = -37
+JSON_KEY_NOT_FOUND = -38
+JSON_GENERIC_ERROR = -39
+PUBLISH_QUEUE_FULL = -40
+PUBLISH_QUEUE_DISABLED = -41
+BATCH_ERROR = -42
+OUT_OF_SKETCH_BATCH_MEMORY = -43
+
+# aws_iot_mqtt.h
+MQTTv31 = 3
+MQTTv311 = 4
+BAUD_TYPE_UNKNOWN = -1
+BAUD_TYPE_ARDUINO = 0
+BAUD_TYPE_LININO = 1
+STATUS_DEBUG = -1
+STATUS_NORMAL = 0
+STATUS_SHADOW_TIMEOUT = 1
+STATUS_SHADOW_ACCEPTED = 2
+STATUS_SHADOW_REJECTED = 3
+STATUS_MESSAGE_OVERFLOW = 4
+STATUS_MESSAGE_DROPPED = 5
+GENERAL_SECTION = 0
+DESIRED_SECTION = 1
+REPORTED_SECTION = 2
+DELTA_SECTION = 3
+DROP_OLDEST = 0
+DROP_NEWEST = 1
+PUBLISH_BATCH_NONE = 0
+PUBLISH_BATCH_JSON_ARRAY = 1
+PUBLISH_BATCH_NDJSON = 2
+YIELD_DROP_OLDEST = 0
+YIELD_DROP_NEWEST = 1
+YIELD_REJECT = 2
+CONFLATION_NONE = 0
+CONFLATION_IN_PLACE = 1
+CONFLATION_TO_BACK = 2
+PROJECTION_OBJECT = 0
+PROJECTION_LIST = 1
+
+# aws_iot_mqtt.cpp
+_RETURN_KEY = 13
+_NEXTLINE_KEY = 10
+_FRAME_START_KEY = 2
+_MAX_NUM_RESEND = 3
+_NUM_FAST_POLL = 10  # Number of 5 ms polls for a feedback frame before polling at 50 ms
+_OUT_OF_BUFFER_ERR_MSG = "OUT OF BUFFER SIZE"
+_CMD_CD_TO_PY_RUNTIME = "cd /usr/lib/python2.7/AWS-IoT-Python-Runtime/runtime/\n"
+_CMD_START_PY_RUNTIME = "python run.py\n"
+_CMD_CHECK_LINUX_LIVE = "uname\n"
+# Protocol names by command ID in framed mode, shared with the Python runtime
+_FRAME_CMD_NAMES = ["", "i", "g", "c", "d", "p", "s", "u", "y", "z", "si", "sg", "su", "sd", "s_rd", "s_ud", "j", "jm", "bf", "pq", "di", "bs", "fm", "~",
+                    "b", "e", "pb", "pg", "yb", "yd", "yw", "yc", "ra", "dm"]
+
+# Linino console
+_shellPrompt = b"root@Arduino:~# "
+
+
+def delay(srcMillisecond):
+    time.sleep(srcMillisecond / 1000.0)
+
+
+def _crc16Update(srcCRC, srcByte):
+    # CRC-16/CCITT (0x1021, initial value 0xFFFF) of frames in reliable mode
+    crc = srcCRC ^ (srcByte << 8)
+    for i in range(0, 8):
+        crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+    return crc
+
+
+class linuxConsolePort:
+    # This is Serial1 of the sketch, wired to the Linux console of the Yun
+    # Lines go to a minimal shell until "python run.py" starts the runtime, and again once the runtime exits
+    # The shell echoes bytes with '\n' as "\r\n", as the tty does
+    # The runtime is started through a runtimeDriver on a terminal, that is not started yet: the terminal echoes the bytes
+    # and turns line breaks into "\r\n" until the runtime switches it to raw mode for frames, as on the board
+    # At a baud rate other than the one of the console, nothing goes through
+
+    def __init__(self, srcRuntimeDriver, srcConsoleBaud=LINUX_BAUD_DEFAULT):
+        self._runtimeDriver = srcRuntimeDriver
+        self._consoleBaud = srcConsoleBaud
+        self._baud = None
+        self._rxBuf = bytearray()
+        self._shellLine = bytearray()
+        self._isRuntimeRunning = False
+        self._isClosed = False
+        self._lock = threading.Lock()
+        self._readerThread = threading.Thread(target=self._readFromRuntime)
+        self._readerThread.daemon = True
+        self._readerThread.start()
+
+    def begin(self, srcBaud):
+        with self._lock:
+            self._baud = srcBaud
+            self._rxBuf = bytearray()
+
+    def close(self):
+        # Stop the reader and the runtime, if any
+        self._isClosed = True
+        self._readerThread.join()
+        if self._isRuntimeRunning:
+            self._runtimeDriver.stop()
+            self._isRuntimeRunning = False
+
+    def isRuntimeRunning(self):
+        return self._isRuntimeRunning
+
+    def write(self, srcContent):
+        # Return the number of bytes written, as Serial1.write
+        content = bytearray(srcContent if isinstance(srcContent, bytes) else srcContent.encode("latin-1"))
+        with self._lock:
+            if self._baud != self._consoleBaud:
+                return len(content)
+            if self._isRuntimeRunning:
+                self._writeToRuntime(content)
+            else:
+                for index in range(0, len(content)):
+                    if self._isRuntimeRunning:  # the rest is input for the runtime just started
+                        self._writeToRuntime(content[index:])
+                        break
+                    self._rxBuf += content[index:index + 1].replace(b"\n", b"\r\n")  # tty echo
+                    self._writeToShell(content[index:index + 1])
+        return len(content)
+
+    def available(self):
+        return len(self._rxBuf)
+
+    def read(self):
+        # Next byte, -1 if there is none
+        with self._lock:
+            if len(self._rxBuf) == 0:
+                return -1
+            byte = self._rxBuf[0]
+            del self._rxBuf[0]
+            return byte
+
+    def _writeToRuntime(self, srcContent):
+        try:
+            self._runtimeDriver.writeRaw(bytes(srcContent))
+        except (IOError, OSError):
+            pass  # runtime is on its way out
+
+    def _writeToShell(self, srcByte):
+        if srcByte != b"\n":
+            if srcByte != b"\r":
+                self._shellLine += srcByte
+            return
+        commandLine = self._shellLine.decode("latin-1").strip()
+        self._shellLine = bytearray()
+        if commandLine == "python run.py":
+            self._runtimeDriver.start()
+            self._isRuntimeRunning = True
+            return
+        if commandLine == "uname":
+            self._rxBuf += b"Linux\r\n"
+        elif commandLine == "~":
+            self._rxBuf += b"-ash: /root: Permission denied\r\n"
+        elif commandLine != "" and not commandLine.startswith("cd "):
+            self._rxBuf += ("-ash: " + commandLine.split()[0] + ": not found\r\n").encode("latin-1")
+        self._rxBuf += _shellPrompt
+
+    def _readFromRuntime(self):
+        while not self._isClosed:
+            if not self._isRuntimeRunning:
+                time.sleep(0.01)
+                continue
+            content = self._runtimeDriver.readRaw(0.01)
+            if content is None:
+                continue
+            with self._lock:
+                if content == b"":  # back to the shell
+                    self._runtimeDriver.stop()
+                    self._isRuntimeRunning = False
+                    content = _shellPrompt
+                if self._baud == self._consoleBaud:
+                    self._rxBuf += content
+
+
+class _subscribeSlot:
+
+    def __init__(self):
+        self.isUsed = False
+        self.isShadowGud = False
+        self.callback = None
+
+    def clear(self):
+        self.isUsed = False
+        self.isShadowGud = False
+        self.callback = None
+
+
+class sketchEmulator:
+    # This is aws_iot_mqtt_client, driving the runtime over a linuxConsolePort as Serial1
+    # Return values are the IoT_Error_t codes, callbacks are called as callback(payload, status)
+
+    def __init__(self, srcSerial1):
+        self._serial1 = srcSerial1
+        self._rwBuf = ""
+        self._msgBuf = ""
+        self._burstSize = 1
+        self._subGroup = [_subscribeSlot() for i in range(0, MAX_SUB)]
+        self._framedMode = False  # Are protocol commands/feedback exchanged as length-prefixed frames
+        self._frameLeft = 0  # Number of lines left to be framed for the current protocol command
+        self._frameHeader = False  # Is the next line the protocol name of the current protocol command
+        self._reliableMode = False  # Are frames exchanged with sequence numbers and CRC, lost/damaged ones resent
+        self._frameTxSequence = 0  # Sequence number of the last frame sent
+        self._frameRxSequence = 0  # Sequence number of the last feedback frame received in order, as the cumulative ack
+        self._frameRxSync = False  # Is the next feedback frame the first one for a new command, with any sequence number
+        self._frameCRC = 0xFFFF  # CRC of the frame being sent
+        self._batchMode = False  # Are commands queued in a batch, with their feedback coming when the batch ends
+        self._batchCommands = []  # Command of each one in the current batch: 'p' publish, 'u' shadow update, 'y' yield
+        self._batchSlots = []  # Slot taken by each shadow update in the current batch, -1 for the other commands
+        self._publishBatchSlot = -1  # Slot taken for the flush status of publish batches, -1 for none
+
+    # Reattach to a runtime kept running in daemon mode, or start one from the shell
+    def setup(self, srcClientID, srcCleanSession=True, srcMQTTVersion=MQTTv311, srcUseWebsocket=False):
+        if srcClientID is None:
+            return NULL_VALUE_ERROR
+        if len(srcClientID) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        self._burstSize = 1
+        self._framedMode = False  # always start over with the line protocol
+        self._reliableMode = False
+        self._frameLeft = 0
+        self._batchMode = False
+        if self._reattach(LINUX_BAUD_DEFAULT):
+            return self._setupExec(srcClientID, srcCleanSession, srcMQTTVersion, srcUseWebsocket, False)
+        if self._findBaudType() == BAUD_TYPE_UNKNOWN:
+            return SERIAL1_COMMUNICATION_ERROR
+        return self._setupExec(srcClientID, srcCleanSession, srcMQTTVersion, srcUseWebsocket, True)
+
+    def config(self, srcHost, srcPort, srcCAFilePath, srcKeyFilePath, srcCertFilePath):
+        for parameter in (srcHost, srcCAFilePath, srcKeyFilePath, srcCertFilePath):
+            if parameter is not None and len(parameter) >= MAX_BUF_SIZE - 1:
+                return OVERFLOW_ERROR
+        self._execCmd("6\n", False, False)
+        self._execCmd("g\n", False, False)
+        self._execCmd(self._format("" if srcHost is None else srcHost), False, False)
+        self._execCmd(self._format(srcPort), False, False)
+        self._execCmd(self._format("" if srcCAFilePath is None else srcCAFilePath), False, False)
+        self._execCmd(self._format("" if srcKeyFilePath is None else srcKeyFilePath), False, False)
+        self._execCmd(self._format("" if srcCertFilePath is None else srcCertFilePath), True, False)
+        return self._feedbackRC("G T", [("G1F", NO_SET_UP_ERROR), ("G2F", WRONG_PARAMETER_ERROR), ("GFF", CONFIG_GENERIC_ERROR)])
+
+    def configWss(self, srcHost, srcPort, srcCAFilePath):
+        return self.config(srcHost, srcPort, srcCAFilePath, "", "")  # No need for key and cert, IAM credentials are used
+
+    def configBackoffTiming(self, srcBaseReconnectQuietTimeSecond, srcMaxReconnectQuietTimeSecond, srcStableConnectionTimeSecond):
+        self._execCmd("4\n", False, False)
+        self._execCmd("bf\n", False, False)
+        self._execCmd(self._format(srcBaseReconnectQuietTimeSecond), False, False)
+        self._execCmd(self._format(srcMaxReconnectQuietTimeSecond), False, False)
+        self._execCmd(self._format(srcStableConnectionTimeSecond), True, False)
+        return self._feedbackRC("BF T", [("BF1F", NO_SET_UP_ERROR), ("BF2F", WRONG_PARAMETER_ERROR), ("BF3F", WRONG_PARAMETER_ERROR), ("BFFF", CONFIG_GENERIC_ERROR)])
+
+    def configOfflinePublishQueue(self, srcQueueSize, srcBehavior):
+        self._execCmd("3\n", False, False)
+        self._execCmd("pq\n", False, False)
+        self._execCmd(self._format(srcQueueSize), False, False)
+        self._execCmd(self._format(srcBehavior), True, False)
+        return self._feedbackRC("PQ T", [("PQ1F", NO_SET_UP_ERROR), ("PQ2F", WRONG_PARAMETER_ERROR), ("PQ3F", WRONG_PARAMETER_ERROR), ("PQFF", CONFIG_GENERIC_ERROR)])
+
+    def configDrainingInterval(self, srcNumberOfSeconds):
+        self._execCmd("2\n", False, False)
+        self._execCmd("di\n", False, False)
+        self._execCmd("%5.2f\n" % srcNumberOfSeconds, True, False)  # dtostrf(numberOfSeconds, 5, 2, rw_buf)
+        return self._feedbackRC("DI T", [("DI1F", NO_SET_UP_ERROR), ("DI2F", WRONG_PARAMETER_ERROR), ("DI3F", WRONG_PARAMETER_ERROR), ("DIFF", CONFIG_GENERIC_ERROR)])
+
+    def configBurstSize(self, srcNumberOfChunks):
+        if srcNumberOfChunks == 0:
+            return WRONG_PARAMETER_ERROR
+        self._execCmd("2\n", False, False)
+        self._execCmd("bs\n", False, False)
+        self._execCmd(self._format(srcNumberOfChunks), True, False)
+        rc = self._feedbackRC("BS T", [("BS1F", NO_SET_UP_ERROR), ("BS2F", WRONG_PARAMETER_ERROR), ("BS3F", WRONG_PARAMETER_ERROR), ("BSFF", CONFIG_GENERIC_ERROR)])
+        if rc == NONE_ERROR:
+            self._burstSize = srcNumberOfChunks
+        return rc
+
+    def configFramedMode(self, srcEnable, srcReliable=False):
+        self._execCmd("2\n", False, False)
+        self._execCmd("fm\n", False, False)
+        self._execCmd(self._format((2 if srcReliable else 1) if srcEnable else 0), True, False)
+        rc = self._feedbackRC("FM T", [("FM1F", NO_SET_UP_ERROR), ("FM2F", WRONG_PARAMETER_ERROR), ("FM3F", WRONG_PARAMETER_ERROR), ("FMFF", CONFIG_GENERIC_ERROR)])
+        if rc == NONE_ERROR:  # the feedback above is the last one in the previous mode
+            self._framedMode = srcEnable
+            self._reliableMode = srcEnable and srcReliable
+            self._frameTxSequence = 0
+            self._frameRxSequence = 0
+            delay(10)  # let the Python runtime switch its terminal
+        return rc
+
+    def configPublishBatch(self, srcWindowMillis, srcByteLimit, srcFormat, srcCallback):
+        i = MAX_SUB  # no flush status
+        if srcFormat != PUBLISH_BATCH_NONE and srcCallback is not None:
+            i = self._publishBatchSlot if self._publishBatchSlot >= 0 else self._findUnusedSubgroup()  # reuse the slot for flush status
+            if i >= MAX_SUB:
+                return OUT_OF_SKETCH_SUBSCRIBE_MEMORY
+        slot = i if i < MAX_SUB else -1
+        self._execCmd("5\n", False, False)
+        self._execCmd("pb\n", False, False)
+        self._execCmd(self._format(srcWindowMillis), False, False)
+        self._execCmd(self._format(srcByteLimit), False, False)
+        self._execCmd(self._format(srcFormat), False, False)
+        self._execCmd(self._format(slot), True, False)
+        rc = self._feedbackRC("PB T", [("PB1F", NO_SET_UP_ERROR), ("PB2F", WRONG_PARAMETER_ERROR), ("PB3F", WRONG_PARAMETER_ERROR), ("PBFF", CONFIG_GENERIC_ERROR)])
+        if rc == NONE_ERROR:
+            if self._publishBatchSlot >= 0 and self._publishBatchSlot != slot:  # flush status no longer goes there
+                self._subGroup[self._publishBatchSlot].isUsed = False
+                self._subGroup[self._publishBatchSlot].callback = None
+            if slot >= 0:
+                self._subGroup[slot].isUsed = True
+                self._subGroup[slot].isShadowGud = False
+                self._subGroup[slot].callback = srcCallback
+            self._publishBatchSlot = slot
+        return rc
+
+    def configPublishBatchGroup(self, srcTopicFilter, srcGroupTopic):
+        if srcTopicFilter is None or srcGroupTopic is None:
+            return NULL_VALUE_ERROR
+        if len(srcTopicFilter) >= MAX_BUF_SIZE - 1 or len(srcGroupTopic) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        self._execCmd("3\n", False, False)
+        self._execCmd("pg\n", False, False)
+        self._execCmd(self._format(srcTopicFilter), False, False)
+        self._execCmd(self._format(srcGroupTopic), True, False)
+        return self._feedbackRC("PG T", [("PG1F", NO_SET_UP_ERROR), ("PG2F", WRONG_PARAMETER_ERROR), ("PGFF", CONFIG_GENERIC_ERROR)])
+
+    def configYieldQueue(self, srcMaxMessages, srcMaxBytes, srcSlotQuota, srcPolicy):
+        self._execCmd("5\n", False, False)
+        self._execCmd("yb\n", False, False)
+        self._execCmd(self._format(srcMaxMessages), False, False)
+        self._execCmd(self._format(srcMaxBytes), False, False)
+        self._execCmd(self._format(srcSlotQuota), False, False)
+        self._execCmd(self._format(srcPolicy), True, False)
+        return self._feedbackRC("YB T", [("YB1F", NO_SET_UP_ERROR), ("YB2F", WRONG_PARAMETER_ERROR), ("YB3F", WRONG_PARAMETER_ERROR), ("YBFF", CONFIG_GENERIC_ERROR)])
+
+    # Number of drops comes back as (rc, number of drops)
+    def getYieldDropCount(self):
+        self._execCmd("1\n", False, False)
+        self._execCmd("yd\n", True, False)
+        if self._rwBuf.startswith("YD T"):
+            return NONE_ERROR, self._atoi(self._rwBuf[4:])
+        return self._feedbackRC(None, [("YD1F", NO_SET_UP_ERROR), ("YDFF", CONFIG_GENERIC_ERROR)]), None
+
+    def configYieldPriority(self, srcTopic, srcPriority, srcWeight):
+        return self._yieldPriorityCmd(srcTopic, False, srcPriority, srcWeight)
+
+    def configShadowDeltaPriority(self, srcThingName, srcPriority, srcWeight):
+        return self._yieldPriorityCmd(srcThingName, True, srcPriority, srcWeight)
+
+    def configConflation(self, srcTopic, srcMode):
+        if srcTopic is None:
+            return NULL_VALUE_ERROR
+        if len(srcTopic) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        self._execCmd("3\n", False, False)
+        self._execCmd("yc\n", False, False)
+        self._execCmd(self._format(srcTopic), False, False)
+        self._execCmd(self._format(srcMode), True, False)
+        return self._feedbackRC("YC T", [("YC1F", NO_SET_UP_ERROR), ("YC2F", WRONG_PARAMETER_ERROR), ("YC3F", WRONG_PARAMETER_ERROR), ("YCFF", CONFIG_GENERIC_ERROR)])
+
+    def configDaemonMode(self, srcEnabled):
+        self._execCmd("2\n", False, False)
+        self._execCmd("dm\n", False, False)
+        self._execCmd(self._format(1 if srcEnabled else 0), True, False)
+        return self._feedbackRC("DM T", [("DM1F", NO_SET_UP_ERROR), ("DM2F", WRONG_PARAMETER_ERROR), ("DM3F", WRONG_PARAMETER_ERROR), ("DMFF", CONFIG_GENERIC_ERROR)])
+
+    def beginBatch(self):
+        if self._batchMode:
+            return BATCH_ERROR
+        self._execCmd("1\n", False, False)
+        self._execCmd("b\n", False, False)
+        self._batchMode = True
+        self._batchCommands = []
+        self._batchSlots = []
+        return NONE_ERROR
+
+    # Results come back as (rc, results), with the IoT_Error_t of each command in the batch, in order
+    def endBatch(self):
+        if not self._batchMode:
+            return BATCH_ERROR, []
+        hasYield = self._batchHasYield()
+        self._batchMode = False
+        self._execCmd("1\n", False, False)
+        self._execCmd("e\n", True, hasYield)  # yield messages come after the combined feedback
+        # Combined feedback: "B T <result code>;<result code>;...", in the order of the commands
+        # yield is sent as 2 commands (lock size, yield), with 2 result codes
+        rc = NONE_ERROR if self._rwBuf.startswith("B T") else BATCH_ERROR
+        feedbacks = [feedback for feedback in self._rwBuf[3:].split(";") if feedback != ""] if rc == NONE_ERROR else []  # strtok_r
+        feedbackIndex = 0
+        results = []
+        for index in range(0, len(self._batchCommands)):
+            commandRC = BATCH_ERROR  # no feedback for this command
+            feedback = feedbacks[feedbackIndex] if feedbackIndex < len(feedbacks) else None
+            if feedback is not None and feedback.startswith(" "):
+                feedback = feedback[1:]
+            if self._batchCommands[index] == "p":
+                if feedback is not None:
+                    commandRC = self._publishFeedbackRC(feedback)
+            elif self._batchCommands[index] == "u":
+                if feedback is not None:
+                    commandRC = self._shadowUpdateFeedbackRC(feedback)
+                if commandRC != NONE_ERROR:  # free the slot taken for this shadow update
+                    self._subGroup[self._batchSlots[index]].clear()
+            else:  # 'y', always the last one
+                if feedback is not None and feedback.startswith("Z T"):
+                    feedbackIndex += 1
+                    feedback = feedbacks[feedbackIndex] if feedbackIndex < len(feedbacks) else None
+                    # messages from the first burst on
+                    commandRC = self._yieldLoop(True) if feedback is not None and feedback.startswith("Y T") else YIELD_ERROR
+                else:
+                    commandRC = YIELD_ERROR
+                if commandRC == YIELD_ERROR:
+                    self._clearBurst()
+                feedbackIndex = len(feedbacks)  # rw_buf is taken by the yield messages
+            results.append(commandRC)
+            feedbackIndex += 1
+        self._batchCommands = []
+        self._batchSlots = []
+        return rc, results
+
+    def connect(self, srcKeepAliveInterval=60):
+        self._execCmd("2\n", False, False)
+        self._execCmd("c\n", False, False)
+        self._execCmd(self._format(srcKeepAliveInterval), True, False)
+        return self._feedbackRC("C T", [("C1F", NO_SET_UP_ERROR), ("C2F", WRONG_PARAMETER_ERROR), ("C3F", CONNECT_SSL_ERROR), ("C4F", CONNECT_ERROR),
+                                        ("C5F", CONNECT_TIMEOUT), ("C6F", CONNECT_CREDENTIAL_NOT_FOUND), ("C7F", WEBSOCKET_CREDENTIAL_NOT_FOUND),
+                                        ("CFF", CONNECT_GENERIC_ERROR)])
+
+    def publish(self, srcTopic, srcPayload, srcQoS, srcRetain=False):
+        if srcTopic is None or srcPayload is None:
+            return NULL_VALUE_ERROR
+        if len(srcTopic) >= MAX_BUF_SIZE - 1 or len(srcPayload) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        if self._batchMode and (len(self._batchCommands) >= MAX_NUM_BATCH or self._batchHasYield()):
+            return OUT_OF_SKETCH_BATCH_MEMORY
+        self._execCmd("5\n", False, False)
+        self._execCmd("p\n", False, False)
+        self._execCmd(self._format(srcTopic), False, False)
+        self._execCmd(self._format(srcPayload), False, False)
+        self._execCmd(self._format(srcQoS), False, False)
+        self._execCmd(self._format(1 if srcRetain else 0), not self._batchMode, False)
+        if self._batchMode:  # feedback comes with the batch
+            self._batchCommands.append("p")
+            self._batchSlots.append(-1)
+            return NONE_ERROR
+        return self._publishFeedbackRC(self._rwBuf)
+
+    def _publishFeedbackRC(self, srcFeedback):
+        return self._feedbackRC("P T", [("P1F", NO_SET_UP_ERROR), ("P2F", WRONG_PARAMETER_ERROR), ("P3F", PUBLISH_ERROR), ("P4F", PUBLISH_TIMEOUT),
+                                        ("P5F", PUBLISH_QUEUE_FULL), ("P6F", PUBLISH_QUEUE_DISABLED), ("PFF", PUBLISH_GENERIC_ERROR)], srcFeedback)
+
+    def subscribe(self, srcTopic, srcQoS, srcCallback, srcFilter=None, srcKeys=(), srcFormat=PROJECTION_OBJECT):
+        if srcTopic is None or None in srcKeys:
+            return NULL_VALUE_ERROR
+        if len(srcTopic) >= MAX_BUF_SIZE - 1 or len(srcKeys) > MAX_NUM_KEY:
+            return OVERFLOW_ERROR
+        if (srcFilter is not None and len(srcFilter) >= MAX_BUF_SIZE - 1) or any(len(key) >= MAX_BUF_SIZE - 1 for key in srcKeys):
+            return OVERFLOW_ERROR
+        i = self._findUnusedSubgroup()
+        if i >= MAX_SUB:
+            return OUT_OF_SKETCH_SUBSCRIBE_MEMORY
+        # filter is sent if there is a filter or a projection, projection format and keys follow it
+        if len(srcKeys) != 0:
+            self._execCmd(self._format(len(srcKeys) + 6), False, False)
+        else:
+            self._execCmd(self._format(5 if srcFilter is not None else 4), False, False)
+        self._execCmd("s\n", False, False)
+        self._execCmd(self._format(srcTopic), False, False)
+        self._execCmd(self._format(srcQoS), False, False)
+        self._execCmd(self._format(i), srcFilter is None and len(srcKeys) == 0, False)
+        if srcFilter is not None or len(srcKeys) != 0:
+            self._execCmd(self._format("" if srcFilter is None else srcFilter), len(srcKeys) == 0, False)
+        if len(srcKeys) != 0:
+            self._execCmd(self._format(srcFormat), False, False)
+            for k in range(0, len(srcKeys)):
+                self._execCmd(self._format(srcKeys[k]), k == len(srcKeys) - 1, False)
+        rc = self._feedbackRC("S T", [("S1F", NO_SET_UP_ERROR), ("S2F", WRONG_PARAMETER_ERROR), ("S3F", SUBSCRIBE_ERROR), ("S4F", SUBSCRIBE_TIMEOUT),
+                                      ("SFF", SUBSCRIBE_GENERIC_ERROR)])
+        if rc == NONE_ERROR:
+            self._subGroup[i].isUsed = True
+            self._subGroup[i].isShadowGud = False
+            self._subGroup[i].callback = srcCallback
+        return rc
+
+    def unsubscribe(self, srcTopic):
+        if srcTopic is None:
+            return NULL_VALUE_ERROR
+        if len(srcTopic) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        self._execCmd("2\n", False, False)
+        self._execCmd("u\n", False, False)
+        self._execCmd(self._format(srcTopic), True, False)
+        # Unsubscribe to a topic never subscribed, ignore
+        if self._rwBuf.startswith("U T"):
+            return NONE_ERROR
+        inoID = self._getSlotNumber()
+        if 0 <= inoID < MAX_SUB:
+            self._subGroup[inoID].clear()
+            return NONE_ERROR
+        return self._feedbackRC(None, [("U1F", NO_SET_UP_ERROR), ("U2F", WRONG_PARAMETER_ERROR), ("U3F", UNSUBSCRIBE_ERROR), ("U4F", UNSUBSCRIBE_TIMEOUT),
+                                       ("UFF", UNSUBSCRIBE_GENERIC_ERROR)])
+
+    # yield
+    def yieldMessages(self):
+        if self._batchMode:  # lock and request the first burst in the batch, messages are handled when the batch ends
+            if len(self._batchCommands) >= MAX_NUM_BATCH or self._batchHasYield():
+                return OUT_OF_SKETCH_BATCH_MEMORY
+            self._execCmd("1\n", False, False)
+            self._execCmd("z\n", False, False)
+            self._execCmd("1\n", False, False)
+            self._execCmd("y\n", False, False)
+            self._batchCommands.append("y")
+            self._batchSlots.append(-1)
+            return NONE_ERROR
+        self._execCmd("1\n", False, False)
+        self._execCmd("z\n", True, False)  # tell the python runtime to lock the current msg queue size
+        if not self._rwBuf.startswith("Z T"):
+            return YIELD_ERROR  # broken protocol
+        return self._yieldLoop(False)
+
+    def disconnect(self):
+        self._execCmd("1\n", False, False)
+        self._execCmd("d\n", True, False)
+        return self._feedbackRC("D T", [("D1F", NO_SET_UP_ERROR), ("D2F", DISCONNECT_ERROR), ("D3F", DISCONNECT_TIMEOUT), ("DFF", DISCONNECT_GENERIC_ERROR)])
+
+    # shadow_init
+    def shadowInit(self, srcThingName):
+        if srcThingName is None:
+            return NULL_VALUE_ERROR
+        if len(srcThingName) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        self._execCmd("3\n", False, False)
+        self._execCmd("si\n", False, False)
+        self._execCmd(self._format(srcThingName), False, False)
+        self._execCmd("1\n", True, False)  # isPersistentSubscribe, always true
+        return self._feedbackRC("SI T", [("SI F", SHADOW_INIT_ERROR)])
+
+    # shadow_register_delta_func
+    def shadowRegisterDeltaFunc(self, srcThingName, srcCallback):
+        if srcThingName is None:
+            return NULL_VALUE_ERROR
+        if len(srcThingName) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        i = self._findUnusedSubgroup()
+        if i >= MAX_SUB:
+            return NONE_ERROR  # no error code for it in the library
+        self._execCmd("3\n", False, False)
+        self._execCmd("s_rd\n", False, False)
+        self._execCmd(self._format(srcThingName), False, False)
+        self._execCmd(self._format(i), True, False)
+        rc = self._feedbackRC("S_RD T", [("S_RD1F", NO_SHADOW_INIT_ERROR), ("S_RD2F", WRONG_PARAMETER_ERROR), ("S_RD3F", SUBSCRIBE_ERROR),
+                                         ("S_RD4F", SUBSCRIBE_TIMEOUT), ("S_RDFF", SHADOW_REGISTER_DELTA_CALLBACK_GENERIC_ERROR)])
+        if rc == NONE_ERROR:
+            self._subGroup[i].isUsed = True
+            self._subGroup[i].callback = srcCallback
+        return rc
+
+    # shadow_unregister_delta_func
+    def shadowUnregisterDeltaFunc(self, srcThingName):
+        if srcThingName is None:
+            return NULL_VALUE_ERROR
+        if len(srcThingName) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        self._execCmd("2\n", False, False)
+        self._execCmd("s_ud\n", False, False)
+        self._execCmd(self._format(srcThingName), True, False)
+        # Unsubscribe to a topic never subscribed, ignore
+        if self._rwBuf.startswith("S_UD T"):
+            return NONE_ERROR
+        inoID = self._getSlotNumber()
+        if 0 <= inoID < MAX_SUB:
+            self._subGroup[inoID].isUsed = False
+            self._subGroup[inoID].callback = None
+            return NONE_ERROR
+        return self._feedbackRC(None, [("S_UD1F", NO_SHADOW_INIT_ERROR), ("S_UD2F", WRONG_PARAMETER_ERROR), ("S_UD3F", UNSUBSCRIBE_ERROR),
+                                       ("S_UD4F", UNSUBSCRIBE_TIMEOUT), ("S_UDFF", SHADOW_UNREGISTER_DELTA_CALLBACK_GENERIC_ERROR)])
+
+    # shadow_get
+    def shadowGet(self, srcThingName, srcCallback, srcTimeout):
+        return self._shadowRequest("sg", srcThingName, None, srcCallback, srcTimeout, SHADOW_GET_GENERIC_ERROR)
+
+    # shadow_update
+    def shadowUpdate(self, srcThingName, srcPayload, srcCallback, srcTimeout):
+        if srcPayload is None:
+            return NULL_VALUE_ERROR
+        if len(srcPayload) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        return self._shadowRequest("su", srcThingName, srcPayload, srcCallback, srcTimeout, SHADOW_UPDATE_GENERIC_ERROR)
+
+    # shadow_delete
+    def shadowDelete(self, srcThingName, srcCallback, srcTimeout):
+        return self._shadowRequest("sd", srcThingName, None, srcCallback, srcTimeout, SHADOW_DELETE_GENERIC_ERROR)
+
+    # Values come back as (rc, value), in place of the external buffer of bufSize bytes
+    def getDesiredValueByKey(self, srcJSONIdentifier, srcKey, srcBufSize=MAX_BUF_SIZE):
+        return self._getJSONValueLoop(srcJSONIdentifier, srcKey, srcBufSize, DESIRED_SECTION)
+
+    def getReportedValueByKey(self, srcJSONIdentifier, srcKey, srcBufSize=MAX_BUF_SIZE):
+        return self._getJSONValueLoop(srcJSONIdentifier, srcKey, srcBufSize, REPORTED_SECTION)
+
+    def getDeltaValueByKey(self, srcJSONIdentifier, srcKey, srcBufSize=MAX_BUF_SIZE):
+        return self._getJSONValueLoop(srcJSONIdentifier, srcKey, srcBufSize, DELTA_SECTION)
+
+    def getValueByKey(self, srcJSONIdentifier, srcKey, srcBufSize=MAX_BUF_SIZE):
+        return self._getJSONValueLoop(srcJSONIdentifier, srcKey, srcBufSize, GENERAL_SECTION)
+
+    # Values of several keys in ONE request come back as (rc, values, key status), in the order of the keys
+    # Values take their length and a terminator each in the external buffer of bufSize bytes
+    def getValuesByKeys(self, srcJSONIdentifier, srcKeys, srcBufSize=MAX_BUF_SIZE):
+        if srcJSONIdentifier is None or srcKeys is None:
+            return NULL_VALUE_ERROR, [], []
+        if len(srcKeys) == 0:
+            return WRONG_PARAMETER_ERROR, [], []
+        if len(srcKeys) > MAX_NUM_KEY or len(srcJSONIdentifier) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR, [], []
+        rc = NONE_ERROR
+        for key in srcKeys:
+            if key is None:
+                rc = NULL_VALUE_ERROR
+            elif len(key) >= MAX_BUF_SIZE - 1:
+                rc = OVERFLOW_ERROR
+        keyStatus = [JSON_KEY_NOT_FOUND] * len(srcKeys)
+        if rc != NONE_ERROR:
+            return rc, [], keyStatus
+        # Each value comes back as a record: <status><length>:<value>
+        values = []
+        keyIndex = 0  # key that the current record belongs to
+        bufPointer = 0  # next free byte in the external buffer
+        valueLeft = 0  # number of bytes left in the current value
+        value = ""
+        decodeState = 0  # 0: status, 1: length, 2: value
+        statusCharacter = "E"
+        isFirst = True
+        lineCount = self._burstSize  # request a new burst in the first round
+        while True:
+            if lineCount < self._burstSize:  # next chunk in the current burst
+                self._readLine()
+                lineCount += 1
+            else:  # all chunks of the previous burst are consumed
+                if isFirst:
+                    self._execCmd(self._format(len(srcKeys) + 3), False, False)
+                else:
+                    self._execCmd("3\n", False, False)  # keys are only sent in the first round
+                self._execCmd("jm\n", False, False)
+                self._execCmd(self._format(srcJSONIdentifier), False, False)
+                if isFirst:
+                    self._execCmd("1\n", False, False)
+                    for k in range(0, len(srcKeys)):
+                        isLast = k == len(srcKeys) - 1
+                        self._execCmd(self._format(srcKeys[k]), isLast, isLast and self._burstSize > 1)
+                    isFirst = False
+                else:
+                    self._execCmd("0\n", True, self._burstSize > 1)
+                lineCount = 1
+            if self._rwBuf.startswith("J0F"):  # End of JSON value string transmission
+                break
+            if self._rwBuf[:3] in ("J1F", "J2F", "JFF") or not self._rwBuf.startswith("J "):
+                rc = self._feedbackRC(None, [("J1F", NO_SET_UP_ERROR), ("J2F", JSON_FILE_NOT_FOUND), ("JFF", JSON_GENERIC_ERROR)])
+                break
+            # Decode the incoming records below this line, they can be split at any byte
+            for character in self._rwBuf[2:]:  # step over "J "
+                if decodeState == 0:
+                    statusCharacter = character
+                    valueLeft = 0
+                    value = ""
+                    decodeState = 1
+                elif decodeState == 1:
+                    if character == ":":
+                        decodeState = 2
+                    elif character.isdigit():
+                        valueLeft = valueLeft * 10 + int(character)
+                    else:
+                        rc = JSON_GENERIC_ERROR
+                elif bufPointer + 1 >= srcBufSize:  # leave room for the terminator
+                    rc = OVERFLOW_ERROR
+                else:
+                    value += character
+                    bufPointer += 1
+                    valueLeft -= 1
+                if decodeState == 2 and valueLeft == 0 and rc == NONE_ERROR:  # end of this record
+                    if keyIndex >= len(srcKeys) or bufPointer >= srcBufSize:
+                        rc = JSON_GENERIC_ERROR
+                    else:
+                        bufPointer += 1
+                        values.append(value)
+                        keyStatus[keyIndex] = {"T": NONE_ERROR, "N": JSON_KEY_NOT_FOUND}.get(statusCharacter, JSON_GENERIC_ERROR)
+                        keyIndex += 1
+                        decodeState = 0
+                if rc != NONE_ERROR:
+                    break
+            if rc != NONE_ERROR:
+                break
+        if rc == NONE_ERROR and keyIndex != len(srcKeys):
+            rc = JSON_GENERIC_ERROR  # broken protocol
+        if rc != NONE_ERROR:
+            self._clearBurst()  # drop the rest of a broken burst
+        return rc, values, keyStatus
+
+    def _format(self, srcValue):
+        # snprintf(rw_buf, MAX_BUF_SIZE, "%s\n", value), values are checked to leave room for the line break
+        return (str(srcValue) + "\n")[:MAX_BUF_SIZE - 1]
+
+    def _feedbackRC(self, srcSuccessFeedback, srcFailures, srcFeedback=None):
+        # srcFailures: (feedback prefix, IoT_Error_t) pairs, anything else is a GENERIC_ERROR
+        # Feedback is the one in rw_buf, unless given
+        feedback = self._rwBuf if srcFeedback is None else srcFeedback
+        if srcSuccessFeedback is not None and feedback.startswith(srcSuccessFeedback):
+            return NONE_ERROR
+        for failureFeedback, rc in srcFailures:
+            if feedback.startswith(failureFeedback):
+                return rc
+        return GENERIC_ERROR
+
+    def _getTokens(self):
+        # strtok(rw_buf, " ")
+        return [token for token in self._rwBuf.split(" ") if token != ""]
+
+    def _getSlotNumber(self):
+        # ino_id of a "<name> <ino_id>" feedback, -1 if there is none
+        tokens = self._getTokens()
+        if len(tokens) < 2 or not tokens[1].isdigit():
+            return -1
+        return int(tokens[1])
+
+    # Is there a yield in the current batch, which must be the last command
+    def _batchHasYield(self):
+        return len(self._batchCommands) > 0 and self._batchCommands[-1] == "y"
+
+    def _yieldPriorityCmd(self, srcName, srcIsShadowDelta, srcPriority, srcWeight):
+        if srcName is None:
+            return NULL_VALUE_ERROR
+        if len(srcName) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        if srcWeight == 0:
+            return WRONG_PARAMETER_ERROR
+        self._execCmd("5\n", False, False)
+        self._execCmd("yw\n", False, False)
+        self._execCmd(self._format(srcName), False, False)
+        self._execCmd(self._format(1 if srcIsShadowDelta else 0), False, False)
+        self._execCmd(self._format(srcPriority), False, False)
+        self._execCmd(self._format(srcWeight), True, False)
+        return self._feedbackRC("YW T", [("YW1F", NO_SET_UP_ERROR), ("YW2F", WRONG_PARAMETER_ERROR), ("YW3F", WRONG_PARAMETER_ERROR), ("YWFF", CONFIG_GENERIC_ERROR)])
+
+    # find_unused_subgroup, MAX_SUB if not found
+    def _findUnusedSubgroup(self):
+        for i in range(0, MAX_SUB):
+            if not self._subGroup[i].isUsed:
+                return i
+        return MAX_SUB
+
+    def _shadowRequest(self, srcProtocolName, srcThingName, srcPayload, srcCallback, srcTimeout, srcGenericError):
+        # shadow_get, shadow_update and shadow_delete: one slot for the accepted/rejected/timeout feedback
+        # Only shadow_update goes into a batch
+        if srcThingName is None:
+            return NULL_VALUE_ERROR
+        if len(srcThingName) >= MAX_BUF_SIZE - 1:
+            return OVERFLOW_ERROR
+        isBatched = self._batchMode and srcPayload is not None
+        if isBatched and (len(self._batchCommands) >= MAX_NUM_BATCH or self._batchHasYield()):
+            return OUT_OF_SKETCH_BATCH_MEMORY
+        i = self._findUnusedSubgroup()
+        if i >= MAX_SUB:
+            return OUT_OF_SKETCH_SUBSCRIBE_MEMORY
+        self._execCmd("5\n" if srcPayload is not None else "4\n", False, False)
+        self._execCmd(srcProtocolName + "\n", False, False)
+        self._execCmd(self._format(srcThingName), False, False)
+        if srcPayload is not None:
+            self._execCmd(self._format(srcPayload), False, False)
+        self._execCmd(self._format(i), False, False)
+        self._execCmd(self._format(srcTimeout), not isBatched, False)
+        if isBatched:  # slot is taken until the feedback comes with the batch
+            self._subGroup[i].isUsed = True
+            self._subGroup[i].isShadowGud = True
+            self._subGroup[i].callback = srcCallback
+            self._batchCommands.append("u")
+            self._batchSlots.append(i)
+            return NONE_ERROR
+        rc = self._shadowFeedbackRC(srcProtocolName, srcPayload is not None, srcGenericError)
+        if rc == NONE_ERROR:
+            self._subGroup[i].isUsed = True
+            self._subGroup[i].isShadowGud = True
+            self._subGroup[i].callback = srcCallback
+        return rc
+
+    def _shadowUpdateFeedbackRC(self, srcFeedback):
+        return self._shadowFeedbackRC("su", True, SHADOW_UPDATE_GENERIC_ERROR, srcFeedback)
+
+    def _shadowFeedbackRC(self, srcProtocolName, srcHasPayload, srcGenericError, srcFeedback=None):
+        name = srcProtocolName.upper()
+        if srcHasPayload:
+            failures = [("1F", NO_SHADOW_INIT_ERROR), ("2F", WRONG_PARAMETER_ERROR), ("3F", SHADOW_UPDATE_INVALID_JSON_ERROR), ("4F", SUBSCRIBE_ERROR),
+                        ("5F", SUBSCRIBE_TIMEOUT), ("6F", PUBLISH_ERROR), ("7F", PUBLISH_TIMEOUT), ("8F", PUBLISH_QUEUE_FULL), ("9F", PUBLISH_QUEUE_DISABLED)]
+        else:
+            failures = [("1F", NO_SHADOW_INIT_ERROR), ("2F", WRONG_PARAMETER_ERROR), ("3F", SUBSCRIBE_ERROR), ("4F", SUBSCRIBE_TIMEOUT),
+                        ("5F", PUBLISH_ERROR), ("6F", PUBLISH_TIMEOUT), ("7F", PUBLISH_QUEUE_FULL), ("8F", PUBLISH_QUEUE_DISABLED)]
+        failures = [(name + suffix, rc) for suffix, rc in failures] + [(name + "FF", srcGenericError)]
+        return self._feedbackRC(name + " T", failures, srcFeedback)
+
+    # The BIG yield loop, after the msg queue size is locked
+    # If srcIsFirstBurstRequested, the first burst is already on its way and is read from here
+    # A burst ends with the last chunk of a message, so callbacks run with nothing left to read on Serial1
+    def _yieldLoop(self, srcIsFirstBurstRequested):
+        rc = NONE_ERROR
+        lineCount = 0 if srcIsFirstBurstRequested else self._burstSize  # request a new burst in the first round, unless it is already requested
+        while True:
+            if lineCount >= self._burstSize:  # all chunks of the previous burst are consumed
+                self._execCmd("1\n", False, False)
+                self._execCmd("y\n", True, self._burstSize > 1)
+                lineCount = 1
+            else:  # next chunk in the current burst
+                self._readLine()
+                lineCount += 1
+            if self._rwBuf.startswith("Y F"):
+                break
+            if not self._rwBuf.startswith("Y"):  # filter out garbage feedback
+                rc = YIELD_ERROR
+                break
+            # From here, there is a new message chunk in rw_buf
+            tokens = self._getTokens()
+            if len(tokens) < 3:
+                rc = YIELD_ERROR
+                break
+            inoID = int(tokens[1]) if tokens[1].isdigit() else -1
+            more = int(tokens[2]) if tokens[2].isdigit() else -1
+            payload = self._rwBuf[len(tokens[1]) + 5:]  # step over the protocol and get payload
+            if more not in (0, 1, 2) or inoID == -1:  # broken protocol
+                rc = YIELD_ERROR
+                break
+            if more == 2:  # Messages for this slot were dropped in the runtime, msg_buf is left untouched
+                if inoID < MAX_SUB and self._subGroup[inoID].isUsed and self._subGroup[inoID].callback is not None:
+                    self._subGroup[inoID].callback(payload, STATUS_MESSAGE_DROPPED)
+                lineCount = self._burstSize  # the burst ends with this message
+                continue
+            if len(self._msgBuf) + len(payload) >= MAX_BUF_SIZE:
+                rc = OVERFLOW_ERROR
+            else:
+                self._msgBuf += payload
+            if more == 1:  # more to come? do NOTHING to msg_buf and DO NOT call callback
+                continue
+            # This is the end of this message, do callback and clean up
+            if inoID < MAX_SUB and self._subGroup[inoID].isUsed:
+                currentSlot = self._subGroup[inoID]
+                if currentSlot.callback is not None:
+                    if rc == NONE_ERROR:
+                        if currentSlot.isShadowGud:
+                            if self._msgBuf.startswith("JSON-X"):
+                                currentSlot.callback(self._msgBuf, STATUS_SHADOW_TIMEOUT)
+                            else:
+                                # Delta is treated as normal MQTT messages
+                                typeNumber = self._atoi(self._msgBuf[5:])
+                                if typeNumber % 3 == 0:
+                                    currentSlot.callback(self._msgBuf, STATUS_SHADOW_ACCEPTED)
+                                elif typeNumber % 3 == 1:
+                                    currentSlot.callback(self._msgBuf, STATUS_SHADOW_REJECTED)
+                                else:
+                                    rc = YIELD_ERROR
+                                    break
+                        else:
+                            currentSlot.callback(self._msgBuf, STATUS_NORMAL)
+                    if rc == OVERFLOW_ERROR:
+                        currentSlot.callback(_OUT_OF_BUFFER_ERR_MSG, STATUS_MESSAGE_OVERFLOW)
+                # always free the shadow slot and recover the context
+                if currentSlot.isShadowGud:
+                    currentSlot.clear()
+            self._msgBuf = ""  # mark msg_buf as 'unused', ready for the next flush
+            lineCount = self._burstSize  # the burst ends with this message
+        if rc == YIELD_ERROR:
+            self._clearBurst()  # drop the rest of a broken burst
+        return rc
+
+    def _atoi(self, srcString):
+        digits = ""
+        for character in srcString.lstrip():
+            if not character.isdigit():
+                break
+            digits += character
+        return int(digits) if digits != "" else 0
+
+    def _getJSONValueLoop(self, srcJSONIdentifier, srcKey, srcBufSize, srcAccessType):
+        rc = NONE_ERROR
+        value = ""
+        chunkCount = 0
+        lineCount = self._burstSize  # request a new burst in the first round
+        # key goes out behind its section, with room left for the line break
+        sectionLength = {DESIRED_SECTION: 14, REPORTED_SECTION: 15, DELTA_SECTION: 6}.get(srcAccessType, 0)
+        if srcJSONIdentifier is None or srcKey is None:
+            rc = NULL_VALUE_ERROR
+        elif len(srcJSONIdentifier) >= MAX_BUF_SIZE - 1 or sectionLength + len(srcKey) >= MAX_BUF_SIZE - 1:
+            rc = OVERFLOW_ERROR
+        while rc == NONE_ERROR:
+            if lineCount < self._burstSize:  # next chunk in the current burst
+                self._readLine()
+                lineCount += 1
+            else:  # all chunks of the previous burst are consumed
+                self._execCmd("4\n", False, False)
+                self._execCmd("j\n", False, False)
+                self._execCmd(self._format(srcJSONIdentifier), False, False)
+                if srcAccessType == DESIRED_SECTION:
+                    self._execCmd(self._format("state\"desired\"" + srcKey), False, False)
+                elif srcAccessType == REPORTED_SECTION:
+                    self._execCmd(self._format("state\"reported\"" + srcKey), False, False)
+                elif srcAccessType == DELTA_SECTION:
+                    self._execCmd(self._format("state\"" + srcKey), False, False)
+                else:
+                    self._execCmd(self._format(srcKey), False, False)
+                isFirst = 1 if chunkCount == 0 else 0
+                chunkCount += 1
+                self._execCmd(self._format(isFirst), True, self._burstSize > 1)
+                lineCount = 1
+            if self._rwBuf.startswith("J0F"):  # End of JSON value string transmission
+                break
+            if self._rwBuf[:3] in ("J1F", "J2F", "J3F", "JFF") or not self._rwBuf.startswith("J"):
+                rc = self._feedbackRC(None, [("J1F", NO_SET_UP_ERROR), ("J2F", JSON_FILE_NOT_FOUND), ("J3F", JSON_KEY_NOT_FOUND), ("JFF", JSON_GENERIC_ERROR)])
+                break
+            # Accumulate the incoming JSON chunks below this line
+            chunk = self._rwBuf[len(self._getTokens()[0]) + 1:]
+            if len(chunk) + len(value) >= srcBufSize:  # leave room for the terminator
+                rc = OVERFLOW_ERROR
+                break
+            value += chunk  # Concatinate the JSON value string
+        if rc != NONE_ERROR and chunkCount != 0:
+            self._clearBurst()  # drop the rest of a broken burst
+        return rc, value
+
+    # Exec command and get feedback into rw_buf
+    def _execCmd(self, srcCmd, srcWait, srcSingleLine):
+        if self._framedMode:  # no echo, ONE frame per feedback
+            self._writeFrameLine(srcCmd)
+            if srcWait:
+                self._receiveFrame(False)
+            return
+        count = self._serial1.write(srcCmd) + 1
+        timeoutCount = 0
+        rwBuf = []
+        # step1: forget the echo
+        while timeoutCount < CMD_TIME_OUT and count != 0:
+            if self._serial1.read() != -1:
+                count -= 1
+            else:  # only start counting the timer when the serial1 is keeping us waiting...
+                delay(5)
+                timeoutCount += 1
+        if timeoutCount != CMD_TIME_OUT:  # step 1 clear
+            timeoutCount = 0
+            # step2: waiting
+            delay(6)
+            if srcWait:
+                while timeoutCount < CMD_TIME_OUT and not self._serial1.available():
+                    delay(50)
+                    timeoutCount += 1
+            if timeoutCount != CMD_TIME_OUT:  # step 2 clear
+                # will read all the available data in Serial1 but only store the message with the limit of MAX_BUF_SIZE
+                isStopped = False
+                while self._serial1.available():
+                    cc = self._serial1.read()
+                    if cc != -1:
+                        if cc == _NEXTLINE_KEY or len(rwBuf) == MAX_BUF_SIZE - 1:
+                            isStopped = True
+                            if srcSingleLine:
+                                break
+                        if not isStopped and cc != _RETURN_KEY:
+                            rwBuf.append(chr(cc))
+        self._rwBuf = "".join(rwBuf)
+
+    # Read the next line of a burst feedback into rw_buf
+    def _readLine(self):
+        if self._framedMode:
+            self._receiveFrame(True)
+            return
+        timeoutCount = 0
+        rwBuf = []
+        while timeoutCount < CMD_TIME_OUT:
+            cc = self._serial1.read()
+            if cc == -1:  # next chunk is still on its way
+                delay(5)
+                timeoutCount += 1
+            elif cc == _NEXTLINE_KEY:  # end of this chunk
+                break
+            elif cc != _RETURN_KEY and len(rwBuf) < MAX_BUF_SIZE - 1:
+                rwBuf.append(chr(cc))
+        self._rwBuf = "".join(rwBuf)
+
+    # Send bytes of the current frame, keeping track of their CRC
+    def _writeFrameBytes(self, srcBytes):
+        self._serial1.write(bytes(srcBytes))
+        for byte in bytearray(srcBytes):
+            self._frameCRC = _crc16Update(self._frameCRC, byte)
+
+    # Start a new frame: <STX> [<sequence> <ack>] <command ID> <number of parameters>
+    def _writeFrameHeader(self, srcID, srcNumberOfParameters):
+        self._serial1.write(bytes(bytearray([_FRAME_START_KEY])))
+        self._frameCRC = 0xFFFF
+        if self._reliableMode:
+            self._frameTxSequence = (self._frameTxSequence + 1) & 0xFF
+            self._writeFrameBytes(bytearray([self._frameTxSequence, self._frameRxSequence]))  # cumulative ack
+        self._writeFrameBytes(bytearray([srcID, srcNumberOfParameters]))
+
+    # End the current frame: [<CRC>]
+    def _writeFrameEnd(self):
+        if self._reliableMode:
+            self._serial1.write(bytes(bytearray([self._frameCRC >> 8, self._frameCRC & 0xFF])))
+
+    # Put the lines of a protocol command into ONE frame, as they come in:
+    # <STX> [<sequence> <ack>] <command ID> <number of parameters> (<length> <parameter>)* [<CRC>]
+    # All lengths are 2-byte big endian, sequence/ack/CRC are only there in reliable mode
+    def _writeFrameLine(self, srcLine):
+        line = srcLine[:-1] if srcLine.endswith("\n") else srcLine  # line ending is not part of the parameter
+        if self._frameLeft == 0:  # number of lines of a new protocol command, nothing to send yet
+            self._frameLeft = self._atoi(line)
+            self._frameHeader = True
+            return
+        if self._frameHeader:  # protocol name, start the frame
+            commandID = _FRAME_CMD_NAMES.index(line) if line in _FRAME_CMD_NAMES else 0  # 0 for unknown
+            self._writeFrameHeader(commandID, self._frameLeft - 1)
+            self._frameHeader = False
+            self._frameRxSync = True  # feedback for a new command, which acknowledges everything received before
+        else:  # parameter
+            content = line.encode("latin-1")
+            self._writeFrameBytes(bytearray([len(content) >> 8, len(content) & 0xFF]) + bytearray(content))
+        self._frameLeft -= 1
+        if self._frameLeft == 0:
+            self._writeFrameEnd()
+
+    # Read ONE feedback frame into rw_buf: <STX> [<sequence>] <length> <message> [<CRC>]
+    # Only store the message with the limit of MAX_BUF_SIZE
+    # If srcIsInBurst, the frame is the next chunk of a burst and comes fast, as in _readLine
+    # Return False if the frame is incomplete, or damaged/out of order in reliable mode
+    def _readFrame(self, srcIsInBurst):
+        timeoutCount = 0
+        rwBuf = []
+        length = 0
+        left = 0
+        sequence = 0
+        crc = 0xFFFF
+        rxCRC = 0
+        state = 0  # 0: waiting for STX, 1: sequence, 2/3: length, 4: message, 5/6: CRC, 7: done
+        while timeoutCount < CMD_TIME_OUT and state != 7:
+            cc = self._serial1.read()
+            if cc == -1:
+                # feedback may take a while, the rest of the frame and the burst come fast
+                delay(50 if state == 0 and not srcIsInBurst and timeoutCount >= _NUM_FAST_POLL else 5)
+                timeoutCount += 1
+                continue
+            if 1 <= state <= 4:
+                crc = _crc16Update(crc, cc)
+            if state == 0:
+                if cc == _FRAME_START_KEY:  # skip garbage before the frame
+                    state = 1 if self._reliableMode else 2
+            elif state == 1:
+                sequence = cc
+                state = 2
+            elif state == 2:
+                length = cc << 8
+                state = 3
+            elif state == 3:
+                length |= cc
+                left = length
+                state = 4
+            elif state == 4:
+                if len(rwBuf) < MAX_BUF_SIZE - 1:
+                    rwBuf.append(chr(cc))
+                left -= 1
+            elif state == 5:
+                rxCRC = cc << 8
+                state = 6
+            else:
+                rxCRC |= cc
+                state = 7
+            if state == 4 and left == 0:  # end of message
+                state = 5 if self._reliableMode else 7
+        rc = state == 7
+        if rc and self._reliableMode:
+            rc = rxCRC == crc and (self._frameRxSync or sequence == (self._frameRxSequence + 1) & 0xFF)
+            if rc:
+                self._frameRxSequence = sequence
+                self._frameRxSync = False
+        self._rwBuf = "".join(rwBuf) if rc else ""
+        return rc
+
+    # Read ONE feedback frame into rw_buf
+    # In reliable mode, lost/damaged frames are asked again, together with the frames after them
+    # A command frame rejected by the Python runtime comes back as "R F <sequence expected>: <reason>"
+    def _receiveFrame(self, srcIsInBurst):
+        attempt = 0
+        rc = self._readFrame(srcIsInBurst)
+        while not rc and self._reliableMode and attempt < _MAX_NUM_RESEND:
+            # drop what is left of the broken burst, it will be resent
+            isQuiet = False
+            while not isQuiet:
+                delay(6)
+                isQuiet = not self._serial1.available()
+                while self._serial1.available():
+                    self._serial1.read()
+            self._writeFrameHeader(0, 0)  # resend request, with the cumulative ack
+            self._writeFrameEnd()
+            attempt += 1
+            rc = self._readFrame(False)  # resent frames answer the resend request
+        if rc and self._reliableMode and self._rwBuf.startswith("R F "):
+            self._frameTxSequence = (self._atoi(self._rwBuf[4:]) - 1) & 0xFF  # the next frame takes the sequence number of the rejected one
+
+    # Discard whatever is left from a burst feedback
+    def _clearBurst(self):
+        if self._burstSize > 1:
+            delay(6)
+            while self._serial1.available():
+                self._serial1.read()
+
+    # Is a python runtime kept running in daemon mode still there, ready for this sketch to reattach
+    def _reattach(self, srcBaudrate):
+        self._serial1.begin(srcBaudrate)
+        self._execCmd("1\n", False, False)
+        self._execCmd("ra\n", True, False)
+        if self._rwBuf.startswith("RA T"):
+            return True
+        delay(100)  # forget whatever the shell said
+        while self._serial1.available():
+            self._serial1.read()
+        return False
+
+    # Choose different baudrate for different version of openWRT OS
+    def _findBaudType(self):
+        self._clearProtocolOnSerialBegin(LINUX_BAUD_DEFAULT)
+        self._execCmd(_CMD_CHECK_LINUX_LIVE, True, False)  # check OS version
+        if self._rwBuf.startswith("Linux"):
+            return BAUD_TYPE_ARDUINO
+        self._clearProtocolOnSerialBegin(LINUX_BAUD_LININO)
+        self._execCmd(_CMD_CHECK_LINUX_LIVE, True, False)
+        if self._rwBuf.startswith("Linux"):
+            return BAUD_TYPE_LININO
+        return BAUD_TYPE_UNKNOWN
+
+    def _clearProtocolOnSerialBegin(self, srcBaudrate):
+        self._serial1.begin(srcBaudrate)
+        self._execCmd("\n", True, False)  # jump over the welcoming prompt for Open WRT
+        delay(1000)  # in case this is the first boot-up
+        for i in range(0, NUM_ATTEMPT_BEFORE_EXIT):
+            # exit the previous python process and jump over the half-baked protocol communication
+            self._execCmd("1\n", False, False)
+            self._execCmd("~\n", True, False)
+        delay(1500)  # delay 1500 ms for all related python script to exit
+
+    def _setupExec(self, srcClientID, srcCleanSession, srcMQTTVersion, srcUseWebsocket, srcStartRuntime):
+        if srcStartRuntime:
+            self._execCmd(_CMD_CD_TO_PY_RUNTIME, False, False)
+            self._execCmd(_CMD_START_PY_RUNTIME, False, False)
+        self._execCmd("5\n", False, False)
+        self._execCmd("i\n", False, False)
+        self._execCmd(self._format(srcClientID), False, False)
+        self._execCmd(self._format(1 if srcCleanSession else 0), False, False)
+        self._execCmd(self._format(srcMQTTVersion), False, False)
+        self._execCmd(self._format(1 if srcUseWebsocket else 0), True, False)
+        return self._feedbackRC("I T", [("I F", SET_UP_ERROR)])
@@ -0,0 +1,309 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import getopt
+import time
+import json
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "standIn"))
+from brokerStandIn import brokerStandIn
+from runtimeDriver import runtimeDriver
+import sketchEmulator
+
+# Run several emulated sketches at the same time, each one with its own console and runtime, against ONE localhost
+# stand-in for AWS IoT, and report what the sketches see:
+# setup time: from setup() to its return, shell handling and runtime start included
+# call time: time spent in publish, yield and shadow_update, echo handling and delays of the library included
+# delivery: messages each sketch publishes to its own topic and gets back through yield, with their latency
+# shadow round trip: from shadow_update to the accepted callback in a later yield, with the value read back after it
+# Calls of each loop can go into ONE batch, and the console can carry frames instead of lines
+# Errors are counted by call with their IoT_Error_t code
+
+
+class _sketchRecord:
+
+    def __init__(self, srcIndex):
+        self.index = srcIndex
+        self.setupSecond = None
+        self.setupError = None
+        self.numberOfLoops = 0
+        self.numberOfPublishes = 0
+        self.callSeconds = {"publish": [], "yield": [], "shadow_update": [], "batch": []}
+        self.deliverySeconds = []
+        self.shadowRoundTripSeconds = []
+        self.errors = {}  # "<call> <IoT_Error_t>": count
+
+    def addError(self, srcCallName, srcRC):
+        key = srcCallName + " " + str(srcRC)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+
+class sketchLoadTest:
+
+    _usage = """Usage:
+
+    Run several emulated sketches against the Python runtime and a localhost stand-in for AWS IoT:
+    python sketchLoadTest.py -n <number of sketches> -d <duration in seconds>
+
+    Type "python sketchLoadTest.py -h" for detailed command line options.
+
+
+    """
+
+    _helpInfo = """Available command line options:
+    -n, --sketches: Number of emulated sketches, 4 by default
+    -d, --duration: Seconds of sketch loop after setup, 20 by default
+    -l, --length: Payload length in bytes, up to 254, 100 by default
+    -q, --qos: QoS for publishes and the subscription, 0 by default
+    -b, --burst-size: Chunks per yield request, 1 by default
+    -i, --interval: Delay at the end of each sketch loop in milliseconds, 100 by default
+    -s, --shadow-every: Shadow update every this many loops, 0 for none, 5 by default
+    -f, --framed: Console protocol, 0 for lines, 1 for frames, 2 for frames with sequence numbers and CRC, 0 by default
+    -a, --batch: Put publish, shadow update and yield of each loop into ONE batch
+    -j, --multi-key: Read back the shadow value and version in ONE request, with getValuesByKeys
+    -k, --link: Model of the serial link of the Yun in front of each runtime, e.g. "yun" or "baud=115200,loss=0.0001",
+                none by default (see yunBridgeTransport)
+    -p, --python: Python interpreter for the runtimes, this one by default
+    -h, --help: Help infomation
+
+
+    """
+
+    def __init__(self):
+        self._numberOfSketches = 4
+        self._durationSecond = 20.0
+        self._payloadLength = 100
+        self._qos = 0
+        self._burstSize = 1
+        self._intervalMillisecond = 100
+        self._shadowEvery = 5
+        self._framedMode = 0
+        self._isBatched = False
+        self._isMultiKey = False
+        self._pythonPath = sys.executable
+        self._linkSpec = None
+        self._brokerPort = None
+
+    # Return False if the command line inputs are malformed, or only help is requested
+    def checkInputs(self):
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "hn:d:l:q:b:i:s:f:ajk:p:", ["sketches=", "duration=", "length=", "qos=", "burst-size=", "interval=", "shadow-every=", "framed=", "batch",
+                                                                                 "multi-key", "link=", "python=", "help"])
+            for opt, arg in opts:
+                if opt in ("-n", "--sketches"):
+                    self._numberOfSketches = int(arg)
+                if opt in ("-d", "--duration"):
+                    self._durationSecond = float(arg)
+                if opt in ("-l", "--length"):
+                    self._payloadLength = int(arg)
+                if opt in ("-q", "--qos"):
+                    self._qos = int(arg)
+                if opt in ("-b", "--burst-size"):
+                    self._burstSize = int(arg)
+                if opt in ("-i", "--interval"):
+                    self._intervalMillisecond = int(arg)
+                if opt in ("-s", "--shadow-every"):
+                    self._shadowEvery = int(arg)
+                if opt in ("-f", "--framed"):
+                    self._framedMode = int(arg)
+                if opt in ("-a", "--batch"):
+                    self._isBatched = True
+                if opt in ("-j", "--multi-key"):
+                    self._isMultiKey = True
+                if opt in ("-k", "--link"):
+                    self._linkSpec = arg
+                if opt in ("-p", "--python"):
+                    self._pythonPath = arg
+                if opt in ("-h", "--help"):
+                    print(self._helpInfo)
+                    return False
+        except (getopt.GetoptError, ValueError):
+            print(self._usage)
+            return False
+        # Time stamp in each payload takes 18 bytes, the library takes payloads of up to MAX_BUF_SIZE-2 bytes, with room for the line break
+        return self._numberOfSketches > 0 and 18 <= self._payloadLength < sketchEmulator.MAX_BUF_SIZE - 1 and self._qos in [0, 1] and self._burstSize > 0 \
+            and self._framedMode in [0, 1, 2]
+
+    def _formatPayload(self):
+        # Send time first, padded to the payload length
+        return ("%.6f " % time.time()).ljust(self._payloadLength, "x")
+
+    def _timeCall(self, srcRecord, srcCallName, srcFunction, *srcArgs):
+        startTime = time.time()
+        rc = srcFunction(*srcArgs)
+        srcRecord.callSeconds[srcCallName].append(time.time() - startTime)
+        if rc != sketchEmulator.NONE_ERROR:
+            srcRecord.addError(srcCallName, rc)
+        return rc
+
+    def _isShadowLoop(self, srcRecord):
+        return self._shadowEvery > 0 and srcRecord.numberOfLoops % self._shadowEvery == 0
+
+    def _formatShadowPayload(self, srcRecord):
+        return json.dumps({"state": {"reported": {"count": srcRecord.numberOfLoops}}})
+
+    def _runBatchLoop(self, srcRecord, srcSketch, srcClientID, srcTopic, srcShadowUpdateTimes, srcShadowCallback):
+        # Publish, shadow update and yield of ONE loop in ONE batch, errors counted by call from the results
+        startTime = time.time()
+        callNames = ["publish"]
+        srcSketch.beginBatch()
+        rcs = [srcSketch.publish(srcTopic, self._formatPayload(), self._qos)]
+        if self._isShadowLoop(srcRecord):
+            callNames.append("shadow_update")
+            srcShadowUpdateTimes.append(time.time())
+            rcs.append(srcSketch.shadowUpdate(srcClientID, self._formatShadowPayload(srcRecord), srcShadowCallback, 5))
+        callNames.append("yield")
+        rcs.append(srcSketch.yieldMessages())
+        rc, results = srcSketch.endBatch()
+        srcRecord.callSeconds["batch"].append(time.time() - startTime)
+        if rc != sketchEmulator.NONE_ERROR:
+            srcRecord.addError("batch", rc)
+        # Calls kept out of the batch have no result in it
+        results = iter(results)
+        for callName, callRC in zip(callNames, rcs):
+            if callRC == sketchEmulator.NONE_ERROR:
+                callRC = next(results, sketchEmulator.BATCH_ERROR)
+            if callRC != sketchEmulator.NONE_ERROR:
+                srcRecord.addError(callName, callRC)
+                if callName == "shadow_update":
+                    srcShadowUpdateTimes.pop()
+            elif callName == "publish":
+                srcRecord.numberOfPublishes += 1
+
+    def _runSketch(self, srcRecord, srcStartTime):
+        # setup() and loop() of ONE sketch
+        clientID = "sketchLoadTest-" + str(srcRecord.index)
+        topic = "sketchLoadTest/" + str(srcRecord.index)
+        serial1 = sketchEmulator.linuxConsolePort(runtimeDriver(self._pythonPath, srcLinkSpec=self._linkSpec, srcIsOnTerminal=True))
+        thisSketch = sketchEmulator.sketchEmulator(serial1)
+        shadowUpdateTimes = []
+
+        def messageCallback(srcPayload, srcStatus):
+            if srcStatus == sketchEmulator.STATUS_NORMAL:
+                srcRecord.deliverySeconds.append(time.time() - float(srcPayload.split(" ", 1)[0]))
+            else:
+                srcRecord.addError("message_callback", srcStatus)
+
+        def shadowCallback(srcPayload, srcStatus):
+            if srcStatus == sketchEmulator.STATUS_SHADOW_ACCEPTED and len(shadowUpdateTimes) != 0:
+                srcRecord.shadowRoundTripSeconds.append(time.time() - shadowUpdateTimes.pop(0))
+                # Read back from the callback, as the ThingShadowEcho example does
+                if self._isMultiKey:
+                    rc, values, keyStatus = thisSketch.getValuesByKeys(srcPayload, ["state\"reported\"count", "version"])
+                    for status in keyStatus:
+                        if rc == sketchEmulator.NONE_ERROR and status != sketchEmulator.NONE_ERROR:
+                            srcRecord.addError("getValuesByKeys key", status)
+                    if rc != sketchEmulator.NONE_ERROR:
+                        srcRecord.addError("getValuesByKeys", rc)
+                else:
+                    rc, value = thisSketch.getReportedValueByKey(srcPayload, "count")
+                    if rc != sketchEmulator.NONE_ERROR:
+                        srcRecord.addError("getReportedValueByKey", rc)
+            else:
+                srcRecord.addError("shadow_callback", srcStatus)
+
+        try:
+            startTime = time.time()
+            for callName, rc in [("setup", thisSketch.setup(clientID)),
+                                 ("config", thisSketch.config("127.0.0.1", self._brokerPort, "rootCA", "private.key", "certificate.pem")),
+                                 ("connect", thisSketch.connect()),
+                                 ("configBurstSize", thisSketch.configBurstSize(self._burstSize)),
+                                 ("configFramedMode", thisSketch.configFramedMode(self._framedMode != 0, self._framedMode == 2)),
+                                 ("subscribe", thisSketch.subscribe(topic, self._qos, messageCallback)),
+                                 ("shadow_init", thisSketch.shadowInit(clientID))]:
+                if rc != sketchEmulator.NONE_ERROR:
+                    srcRecord.setupError = callName + " " + str(rc)
+                    return
+            srcRecord.setupSecond = time.time() - startTime
+            deadline = max(time.time(), srcStartTime) + self._durationSecond
+            while time.time() < deadline:
+                srcRecord.numberOfLoops += 1
+                if self._isBatched:
+                    self._runBatchLoop(srcRecord, thisSketch, clientID, topic, shadowUpdateTimes, shadowCallback)
+                    sketchEmulator.delay(self._intervalMillisecond)
+                    continue
+                if self._timeCall(srcRecord, "publish", thisSketch.publish, topic, self._formatPayload(), self._qos) == sketchEmulator.NONE_ERROR:
+                    srcRecord.numberOfPublishes += 1
+                if self._isShadowLoop(srcRecord):
+                    shadowUpdateTimes.append(time.time())
+                    if self._timeCall(srcRecord, "shadow_update", thisSketch.shadowUpdate, clientID, self._formatShadowPayload(srcRecord), shadowCallback, 5) \
+                            != sketchEmulator.NONE_ERROR:
+                        shadowUpdateTimes.pop()
+                self._timeCall(srcRecord, "yield", thisSketch.yieldMessages)
+                sketchEmulator.delay(self._intervalMillisecond)
+            thisSketch.disconnect()
+        finally:
+            serial1.close()
+
+    def _formatSeconds(self, srcSeconds):
+        # "median <ms>, p95 <ms>, max <ms>" of a list of seconds
+        if len(srcSeconds) == 0:
+            return "none"
+        seconds = sorted(srcSeconds)
+        return "median %.1f ms, p95 %.1f ms, max %.1f ms" % (seconds[len(seconds) // 2] * 1000,
+                                                           seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)] * 1000, seconds[-1] * 1000)
+
+    def run(self):
+        # Return the exit code
+        broker = brokerStandIn()
+        self._brokerPort = broker.start()
+        records = [_sketchRecord(i) for i in range(0, self._numberOfSketches)]
+        # Sketch loops start together, once the slowest setup is expected to be over
+        loopStartTime = time.time() + 5 + 0.5 * self._numberOfSketches
+        sketchThreads = [threading.Thread(target=self._runSketch, args=(record, loopStartTime)) for record in records]
+        try:
+            for sketchThread in sketchThreads:
+                sketchThread.start()
+            for sketchThread in sketchThreads:
+                sketchThread.join()
+        finally:
+            broker.stop()
+        failedRecords = [record for record in records if record.setupError is not None]
+        for record in failedRecords:
+            print("Sketch " + str(record.index) + " failed to set up: " + record.setupError)
+        records = [record for record in records if record.setupError is None]
+        if len(records) == 0:
+            print("FAILED: no sketch set up.")
+            return 2
+        numberOfPublishes = sum(record.numberOfPublishes for record in records)
+        numberOfDeliveries = sum(len(record.deliverySeconds) for record in records)
+        print("Sketches: %d running, %d loops, setup %s" % (len(records), sum(record.numberOfLoops for record in records),
+                                                            self._formatSeconds([record.setupSecond for record in records])))
+        print("Publish: %.1f msg/s in total (%d messages of %d bytes, QoS %d)" %
+              (numberOfPublishes / self._durationSecond, numberOfPublishes, self._payloadLength, self._qos))
+        print("Delivery: %d/%d messages back through yield, latency %s" %
+              (numberOfDeliveries, numberOfPublishes, self._formatSeconds(sum((record.deliverySeconds for record in records), []))))
+        for callName in ["batch"] if self._isBatched else ["publish", "yield", "shadow_update"]:
+            print("Call " + callName + ": " + self._formatSeconds(sum((record.callSeconds[callName] for record in records), [])))
+        if self._shadowEvery > 0:
+            print("Shadow round trip: " + self._formatSeconds(sum((record.shadowRoundTripSeconds for record in records), [])))
+        errors = {}
+        for record in records:
+            for key, count in record.errors.items():
+                errors[key] = errors.get(key, 0) + count
+        if len(errors) != 0:
+            print("Errors: " + ", ".join(key + " x" + str(errors[key]) for key in sorted(errors)))
+        return 1 if len(failedRecords) != 0 or len(errors) != 0 else 0
+
+# Main
+if __name__ == '__main__':
+    thisSketchLoadTest = sketchLoadTest()
+    if not thisSketchLoadTest.checkInputs():
+        sys.exit(2)
+    sys.exit(thisSketchLoadTest.run())
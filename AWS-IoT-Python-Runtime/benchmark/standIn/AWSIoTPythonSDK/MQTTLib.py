@@ -0,0 +1,338 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import json
+import time
+import uuid
+import heapq
+import socket
+import threading
+import mqttPacket
+
+# Stand-in for AWSIoTPythonSDK.MQTTLib, with the API the runtime uses, over plain TCP to the brokerStandIn
+# Credentials, websocket, backoff, offline queueing and draining settings are accepted and ignored
+# QoS 1 publish/subscribe/unsubscribe block until acknowledged, or raise ValueError after the operation timeout
+# Callbacks run in the network thread of the client, as with the SDK
+MQTTv3_1 = 3
+MQTTv3_1_1 = 4
+DROP_OLDEST = 0
+DROP_NEWEST = 1
+
+
+class _message:
+    # What a subscribe callback gets, as the paho MQTTMessage
+
+    def __init__(self, srcTopic, srcPayload, srcQoS):
+        self.topic = srcTopic
+        self.payload = srcPayload
+        self.qos = srcQoS
+
+
+class AWSIoTMQTTClient:
+
+    def __init__(self, clientID, protocolType=MQTTv3_1_1, useWebsocket=False, cleanSession=True):
+        self._clientID = clientID
+        self._protocolType = protocolType
+        self._cleanSession = cleanSession
+        self._host = None
+        self._port = None
+        self._connectDisconnectTimeoutSecond = 30
+        self._operationTimeoutSecond = 5
+        self._socket = None
+        self._sendLock = threading.Lock()
+        self._ackLock = threading.Lock()
+        self._pendingAcks = dict()  # packet ID -> threading.Event
+        self._nextPacketID = 1
+        self._subscriptions = dict()  # topic filter -> callback
+        self._connackEvent = threading.Event()
+
+    # Configuration
+    def configureEndpoint(self, hostName, portNumber):
+        self._host = hostName
+        self._port = portNumber
+
+    def configureCredentials(self, CAFilePath, KeyPath="", CertificatePath=""):
+        pass
+
+    def configureAutoReconnectBackoffTime(self, baseReconnectQuietTimeSecond, maxReconnectQuietTimeSecond, stableConnectionTimeSecond):
+        pass
+
+    def configureOfflinePublishQueueing(self, queueSize, dropBehavior=DROP_NEWEST):
+        pass
+
+    def configureDrainingFrequency(self, frequencyInHz):
+        pass
+
+    def configureConnectDisconnectTimeout(self, timeoutSecond):
+        self._connectDisconnectTimeoutSecond = timeoutSecond
+
+    def configureMQTTOperationTimeout(self, timeoutSecond):
+        self._operationTimeoutSecond = timeoutSecond
+
+    # MQTT operations
+    def connect(self, keepAliveIntervalSecond=30):
+        self._socket = socket.create_connection((self._host, self._port), self._connectDisconnectTimeoutSecond)
+        self._socket.settimeout(None)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._connackEvent.clear()
+        networkThread = threading.Thread(target=self._networkLoop, args=(self._socket,))
+        networkThread.daemon = True
+        networkThread.start()
+        self._send(mqttPacket.encodeConnect(self._clientID, keepAliveIntervalSecond, self._protocolType, self._cleanSession))
+        if not self._connackEvent.wait(self._connectDisconnectTimeoutSecond):
+            raise ValueError("Connect timed out.")
+        return True
+
+    def disconnect(self):
+        if self._socket is not None:
+            self._send(mqttPacket.encodePacket(mqttPacket.DISCONNECT, 0, b""))
+            try:
+                self._socket.close()
+            except socket.error:
+                pass
+            self._socket = None
+        return True
+
+    def publish(self, topic, payload, QoS):
+        packetID = self._getPacketID() if QoS > 0 else 0
+        self._sendAndWait(mqttPacket.encodePublish(topic, payload, QoS, packetID), packetID)
+        return True
+
+    def subscribe(self, topic, QoS, callback):
+        self._subscriptions[topic] = callback
+        packetID = self._getPacketID()
+        self._sendAndWait(mqttPacket.encodeSubscribe(packetID, topic, QoS), packetID)
+        return True
+
+    def unsubscribe(self, topic):
+        self._subscriptions.pop(topic, None)
+        packetID = self._getPacketID()
+        self._sendAndWait(mqttPacket.encodeUnsubscribe(packetID, topic), packetID)
+        return True
+
+    def _getPacketID(self):
+        self._ackLock.acquire()
+        packetID = self._nextPacketID
+        self._nextPacketID = packetID % 65535 + 1
+        self._ackLock.release()
+        return packetID
+
+    def _send(self, srcPacket):
+        self._sendLock.acquire()
+        try:
+            if self._socket is None:
+                raise ValueError("Not connected.")
+            self._socket.sendall(srcPacket)
+        finally:
+            self._sendLock.release()
+
+    def _sendAndWait(self, srcPacket, srcPacketID):
+        # Send and wait for the acknowledgement of this packet ID, if any
+        if srcPacketID == 0:
+            self._send(srcPacket)
+            return
+        ackEvent = threading.Event()
+        self._ackLock.acquire()
+        self._pendingAcks[srcPacketID] = ackEvent
+        self._ackLock.release()
+        try:
+            self._send(srcPacket)
+            if not ackEvent.wait(self._operationTimeoutSecond):
+                raise ValueError("Operation timed out.")
+        finally:
+            self._ackLock.acquire()
+            self._pendingAcks.pop(srcPacketID, None)
+            self._ackLock.release()
+
+    def _networkLoop(self, srcSocket):
+        reader = mqttPacket.packetReader(srcSocket)
+        while True:
+            try:
+                currentPacket = reader.readPacket()
+            except socket.error:
+                currentPacket = None
+            if currentPacket is None:
+                break
+            packetType, flags, body = currentPacket
+            if packetType == mqttPacket.CONNACK:
+                self._connackEvent.set()
+            elif packetType in [mqttPacket.PUBACK, mqttPacket.SUBACK, mqttPacket.UNSUBACK]:
+                self._ackLock.acquire()
+                ackEvent = self._pendingAcks.get(mqttPacket.decodePacketID(body))
+                self._ackLock.release()
+                if ackEvent is not None:
+                    ackEvent.set()
+            elif packetType == mqttPacket.PUBLISH:
+                topic, payload, qos, packetID = mqttPacket.decodePublish(flags, body)
+                if qos > 0:
+                    try:
+                        self._send(mqttPacket.encodePacketID(mqttPacket.PUBACK, packetID))
+                    except (ValueError, socket.error):
+                        pass
+                self._dispatch(_message(topic, payload, qos))
+
+    def _dispatch(self, srcMessage):
+        for topicFilter, callback in list(self._subscriptions.items()):
+            if mqttPacket.isTopicMatched(topicFilter, srcMessage.topic):
+                callback(self, None, srcMessage)
+
+
+class deviceShadow:
+    # Shadow requests go to $aws/things/<name>/shadow/<action>, responses come back on /accepted or /rejected
+    # Response callbacks: callback(payload, "accepted"|"rejected"|"timeout", token)
+    # Delta callback: callback(payload, "delta/<name>", None)
+    # Response topics of an action are subscribed before its first request. Without persistent subscription,
+    # they are unsubscribed once no request is waiting for a response
+
+    def __init__(self, srcShadowName, srcIsPersistentSubscribe, srcMQTTClient):
+        self._shadowName = srcShadowName
+        self._isPersistentSubscribe = srcIsPersistentSubscribe
+        self._mqttClient = srcMQTTClient
+        self._topicPrefix = "$aws/things/" + srcShadowName + "/shadow/"
+        self._shadowLock = threading.Condition()
+        self._pendingRequests = dict()  # token -> (action, callback)
+        self._deadlines = []  # Heap of (deadline, token), for the requests that may time out
+        self._subscribedActions = set()
+        self._isTimeoutThreadRunning = False  # ONE thread times out the requests, while there are any
+
+    def shadowGet(self, srcCallback, srcTimeout):
+        return self._request("get", dict(), srcCallback, srcTimeout)
+
+    def shadowDelete(self, srcCallback, srcTimeout):
+        return self._request("delete", dict(), srcCallback, srcTimeout)
+
+    def shadowUpdate(self, srcJSONPayload, srcCallback, srcTimeout):
+        # Raise ValueError if the payload is not valid JSON
+        return self._request("update", json.loads(srcJSONPayload), srcCallback, srcTimeout)
+
+    def shadowRegisterDeltaCallback(self, srcCallback):
+        self._mqttClient.subscribe(self._topicPrefix + "update/delta", 0, lambda client, userdata, message: srcCallback(message.payload, "delta/" + self._shadowName, None))
+
+    def shadowUnregisterDeltaCallback(self):
+        self._mqttClient.unsubscribe(self._topicPrefix + "update/delta")
+
+    def _request(self, srcAction, srcPayload, srcCallback, srcTimeout):
+        token = str(uuid.uuid4())
+        srcPayload["clientToken"] = token
+        self._shadowLock.acquire()
+        isSubscribed = srcAction in self._subscribedActions
+        self._subscribedActions.add(srcAction)
+        self._shadowLock.release()
+        if not isSubscribed:
+            for status in ["accepted", "rejected"]:
+                self._mqttClient.subscribe(self._topicPrefix + srcAction + "/" + status, 0, self._responseCallback)
+        self._shadowLock.acquire()
+        self._pendingRequests[token] = (srcAction, srcCallback)
+        heapq.heappush(self._deadlines, (time.time() + srcTimeout, token))
+        isTimeoutThreadNeeded = not self._isTimeoutThreadRunning
+        self._isTimeoutThreadRunning = True
+        self._shadowLock.notify()
+        self._shadowLock.release()
+        if isTimeoutThreadNeeded:
+            # Not a daemon thread, as the timers of the SDK: the process exits once the pending requests are done
+            threading.Thread(target=self._timeoutLoop).start()
+        self._mqttClient.publish(self._topicPrefix + srcAction, json.dumps(srcPayload), 0)
+        return token
+
+    def _takeRequest(self, srcToken):
+        # Return (action, callback), None if the request is not pending anymore
+        self._shadowLock.acquire()
+        pendingRequest = self._pendingRequests.pop(srcToken, None)
+        self._shadowLock.notify()  # Its deadline goes, the timeout thread may be done
+        isUnsubscribeNeeded = False
+        if pendingRequest is not None and not self._isPersistentSubscribe:
+            isUnsubscribeNeeded = all(action != pendingRequest[0] for action, callback in self._pendingRequests.values())
+            if isUnsubscribeNeeded:
+                self._subscribedActions.discard(pendingRequest[0])
+        self._shadowLock.release()
+        if pendingRequest is None:
+            return None
+        if isUnsubscribeNeeded:  # Not in the network thread, which gets the acknowledgement
+            unsubscribeThread = threading.Thread(target=self._unsubscribeAction, args=(pendingRequest[0],))
+            unsubscribeThread.daemon = True
+            unsubscribeThread.start()
+        return pendingRequest
+
+    def _unsubscribeAction(self, srcAction):
+        for status in ["accepted", "rejected"]:
+            try:
+                self._mqttClient.unsubscribe(self._topicPrefix + srcAction + "/" + status)
+            except (ValueError, socket.error):
+                pass
+
+    def _responseCallback(self, client, userdata, message):
+        try:
+            token = json.loads(message.payload).get("clientToken")
+        except ValueError:
+            return
+        pendingRequest = self._takeRequest(token)
+        if pendingRequest is not None:
+            pendingRequest[1](message.payload, message.topic.rsplit("/", 1)[1], token)
+
+    def _timeoutLoop(self):
+        while True:
+            self._shadowLock.acquire()
+            # Deadlines of the requests already answered are dropped on the way
+            while len(self._deadlines) != 0 and self._deadlines[0][1] not in self._pendingRequests:
+                heapq.heappop(self._deadlines)
+            if len(self._deadlines) == 0:  # Nothing left to time out
+                self._isTimeoutThreadRunning = False
+                self._shadowLock.release()
+                break
+            if self._deadlines[0][0] > time.time():
+                self._shadowLock.wait(self._deadlines[0][0] - time.time())
+                expiredToken = None
+            else:
+                expiredToken = heapq.heappop(self._deadlines)[1]
+            self._shadowLock.release()
+            if expiredToken is not None:
+                pendingRequest = self._takeRequest(expiredToken)
+                if pendingRequest is not None:
+                    pendingRequest[1]("REQUEST TIME OUT", "timeout", expiredToken)
+
+
+class AWSIoTMQTTShadowClient:
+
+    def __init__(self, clientID, protocolType=MQTTv3_1_1, useWebsocket=False, cleanSession=True):
+        self._mqttClient = AWSIoTMQTTClient(clientID, protocolType, useWebsocket, cleanSession)
+
+    def configureEndpoint(self, hostName, portNumber):
+        self._mqttClient.configureEndpoint(hostName, portNumber)
+
+    def configureCredentials(self, CAFilePath, KeyPath="", CertificatePath=""):
+        self._mqttClient.configureCredentials(CAFilePath, KeyPath, CertificatePath)
+
+    def configureAutoReconnectBackoffTime(self, baseReconnectQuietTimeSecond, maxReconnectQuietTimeSecond, stableConnectionTimeSecond):
+        self._mqttClient.configureAutoReconnectBackoffTime(baseReconnectQuietTimeSecond, maxReconnectQuietTimeSecond, stableConnectionTimeSecond)
+
+    def configureConnectDisconnectTimeout(self, timeoutSecond):
+        self._mqttClient.configureConnectDisconnectTimeout(timeoutSecond)
+
+    def configureMQTTOperationTimeout(self, timeoutSecond):
+        self._mqttClient.configureMQTTOperationTimeout(timeoutSecond)
+
+    def connect(self, keepAliveIntervalSecond=30):
+        return self._mqttClient.connect(keepAliveIntervalSecond)
+
+    def disconnect(self):
+        return self._mqttClient.disconnect()
+
+    def getMQTTConnection(self):
+        return self._mqttClient
+
+    def createShadowHandlerWithName(self, shadowName, isPersistentSubscribe):
+        return deviceShadow(shadowName, isPersistentSubscribe, self._mqttClient)
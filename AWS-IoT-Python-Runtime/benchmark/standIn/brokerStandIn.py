@@ -0,0 +1,328 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import json
+import time
+import socket
+import threading
+import mqttPacket
+
+
+class _clientConnection:
+    # One connected MQTT client, with its subscriptions
+
+    def __init__(self, srcSocket):
+        self.socket = srcSocket
+        self.clientID = None
+        self.subscriptions = dict()  # topic filter -> QoS
+        self.nextPacketID = 1
+        self.sendLock = threading.Lock()
+
+
+class _shadowDocument:
+    # One thing shadow, as kept by the shadow service
+
+    def __init__(self):
+        self.state = {"desired": {}, "reported": {}}
+        self.version = 0
+
+
+class brokerStandIn:
+    # This is a localhost stand-in for the AWS IoT message broker and its thing shadow service, for benchmarks
+    # MQTT 3.1.1 over plain TCP, QoS 0/1, no TLS, no authentication, no retained messages, no persistent sessions
+    # Publishes go to all matching subscriptions at the lower of the two QoS
+    # Publishes to $aws/things/<thing>/shadow/update|get|delete are served by the shadow service, which answers on
+    # <request topic>/accepted or <request topic>/rejected and publishes update/delta when desired and reported differ:
+    # update: state merged into the document, null values delete keys, rejected with 400 for invalid JSON or
+    # no state, 409 for a version conflict
+    # get: the document, rejected with 404 if there is none
+    # delete: the document is removed, rejected with 404 if there is none
+    # clientToken of the request is echoed in the response
+    # Traffic is counted in bytes both ways, and publishes from clients are recorded with their arrival time
+    _shadowTopicPrefix = "$aws/things/"
+
+    def __init__(self, srcHost="127.0.0.1", srcPort=0):
+        self._host = srcHost
+        self._port = srcPort
+        self._serverSocket = None
+        self._isRunning = False
+        self._clients = []
+        self._shadows = dict()  # thing name -> _shadowDocument
+        self._brokerLock = threading.Lock()
+        self._publishRecord = []  # (arrival time, topic, payload), from clients, shadow requests included
+        self._publishCondition = threading.Condition(self._brokerLock)
+        self.numberOfBytesIn = 0
+        self.numberOfBytesOut = 0
+        self.numberOfPublishesOut = 0
+
+    def start(self):
+        # Start accepting clients, return the port
+        self._serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._serverSocket.bind((self._host, self._port))
+        self._serverSocket.listen(16)
+        self._port = self._serverSocket.getsockname()[1]
+        self._isRunning = True
+        self._startThread(self._acceptLoop)
+        return self._port
+
+    def stop(self):
+        self._isRunning = False
+        try:
+            self._serverSocket.close()
+        except socket.error:
+            pass
+        self._brokerLock.acquire()
+        currentClients = list(self._clients)
+        self._brokerLock.release()
+        for currentClient in currentClients:
+            self._closeClient(currentClient)
+
+    def getPort(self):
+        return self._port
+
+    def getPublishRecord(self):
+        self._brokerLock.acquire()
+        currentRecord = list(self._publishRecord)
+        self._brokerLock.release()
+        return currentRecord
+
+    def clearPublishRecord(self):
+        self._brokerLock.acquire()
+        self._publishRecord = []
+        self._brokerLock.release()
+
+    def waitForPublishes(self, srcTopicFilter, srcNumberOfPublishes, srcTimeoutSecond):
+        # Wait until this many publishes matching the topic filter are recorded, return the matching records
+        deadline = time.time() + srcTimeoutSecond
+        self._publishCondition.acquire()
+        try:
+            while True:
+                matchedRecord = [record for record in self._publishRecord if mqttPacket.isTopicMatched(srcTopicFilter, record[1])]
+                remainingSecond = deadline - time.time()
+                if len(matchedRecord) >= srcNumberOfPublishes or remainingSecond <= 0:
+                    return matchedRecord
+                self._publishCondition.wait(remainingSecond)
+        finally:
+            self._publishCondition.release()
+
+    def publish(self, srcTopic, srcPayload, srcQoS=0):
+        # Publish from the broker itself, e.g. messages for the subscribers under test
+        self._route(srcTopic, srcPayload, srcQoS)
+
+    def _startThread(self, srcTarget, *args):
+        currentThread = threading.Thread(target=srcTarget, args=args)
+        currentThread.daemon = True
+        currentThread.start()
+
+    def _acceptLoop(self):
+        while self._isRunning:
+            try:
+                clientSocket = self._serverSocket.accept()[0]
+            except socket.error:
+                break
+            clientSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            currentClient = _clientConnection(clientSocket)
+            self._brokerLock.acquire()
+            self._clients.append(currentClient)
+            self._brokerLock.release()
+            self._startThread(self._clientLoop, currentClient)
+
+    def _closeClient(self, srcClient):
+        self._brokerLock.acquire()
+        if srcClient in self._clients:
+            self._clients.remove(srcClient)
+        self._brokerLock.release()
+        try:
+            srcClient.socket.close()
+        except socket.error:
+            pass
+
+    def _send(self, srcClient, srcPacket):
+        srcClient.sendLock.acquire()
+        try:
+            srcClient.socket.sendall(srcPacket)
+            self.numberOfBytesOut += len(srcPacket)
+        except socket.error:
+            pass
+        finally:
+            srcClient.sendLock.release()
+
+    def _clientLoop(self, srcClient):
+        reader = mqttPacket.packetReader(srcClient.socket)
+        lastNumberOfBytes = 0
+        while self._isRunning:
+            try:
+                currentPacket = reader.readPacket()
+            except socket.error:
+                currentPacket = None
+            self.numberOfBytesIn += reader.numberOfBytes - lastNumberOfBytes
+            lastNumberOfBytes = reader.numberOfBytes
+            if currentPacket is None:
+                break
+            packetType, flags, body = currentPacket
+            if packetType == mqttPacket.CONNECT:
+                srcClient.clientID = mqttPacket.decodeConnect(body)[0]
+                self._send(srcClient, mqttPacket.encodePacket(mqttPacket.CONNACK, 0, b"\x00\x00"))
+            elif packetType == mqttPacket.PUBLISH:
+                topic, payload, qos, packetID = mqttPacket.decodePublish(flags, body)
+                if qos > 0:
+                    self._send(srcClient, mqttPacket.encodePacketID(mqttPacket.PUBACK, packetID))
+                self._recordPublish(topic, payload)
+                if not self._serveShadowRequest(topic, payload):
+                    self._route(topic, payload, qos)
+            elif packetType == mqttPacket.SUBSCRIBE:
+                packetID, subscriptions = mqttPacket.decodeSubscribe(body)
+                grantedQoS = b""
+                for topicFilter, qos in subscriptions:
+                    srcClient.subscriptions[topicFilter] = min(qos, 1)
+                    grantedQoS += bytes(bytearray([min(qos, 1)]))
+                self._send(srcClient, mqttPacket.encodePacket(mqttPacket.SUBACK, 0, body[0:2] + grantedQoS))
+            elif packetType == mqttPacket.UNSUBSCRIBE:
+                packetID, topicFilters = mqttPacket.decodeUnsubscribe(body)
+                for topicFilter in topicFilters:
+                    srcClient.subscriptions.pop(topicFilter, None)
+                self._send(srcClient, mqttPacket.encodePacketID(mqttPacket.UNSUBACK, packetID))
+            elif packetType == mqttPacket.PINGREQ:
+                self._send(srcClient, mqttPacket.encodePacket(mqttPacket.PINGRESP, 0, b""))
+            elif packetType == mqttPacket.DISCONNECT:
+                break
+            # PUBACK from clients needs nothing, no redelivery here
+        self._closeClient(srcClient)
+
+    def _recordPublish(self, srcTopic, srcPayload):
+        self._publishCondition.acquire()
+        self._publishRecord.append((time.time(), srcTopic, srcPayload))
+        self._publishCondition.notify_all()
+        self._publishCondition.release()
+
+    def _route(self, srcTopic, srcPayload, srcQoS):
+        # Deliver ONE publish to all the matching subscriptions, ONE time per client
+        self._brokerLock.acquire()
+        currentClients = list(self._clients)
+        self._brokerLock.release()
+        for currentClient in currentClients:
+            matchedQoS = [qos for topicFilter, qos in list(currentClient.subscriptions.items()) if mqttPacket.isTopicMatched(topicFilter, srcTopic)]
+            if len(matchedQoS) == 0:
+                continue
+            qos = min(srcQoS, max(matchedQoS))
+            packetID = 0
+            if qos > 0:
+                packetID = currentClient.nextPacketID
+                currentClient.nextPacketID = packetID % 65535 + 1
+            self._send(currentClient, mqttPacket.encodePublish(srcTopic, srcPayload, qos, packetID))
+            self.numberOfPublishesOut += 1
+
+    # Shadow service
+    def _serveShadowRequest(self, srcTopic, srcPayload):
+        # Return False if this is not a shadow request
+        if not srcTopic.startswith(self._shadowTopicPrefix):
+            return False
+        fragments = srcTopic[len(self._shadowTopicPrefix):].split("/")
+        if len(fragments) != 3 or fragments[1] != "shadow" or fragments[2] not in ["update", "get", "delete"]:
+            return False
+        thingName = fragments[0]
+        action = fragments[2]
+        try:
+            request = json.loads(srcPayload) if srcPayload.strip() != "" else dict()
+            if not isinstance(request, dict):
+                raise ValueError("Not a JSON object.")
+        except ValueError:
+            self._rejectShadowRequest(srcTopic, None, 400, "Payload contains invalid json")
+            return True
+        clientToken = request.get("clientToken")
+        self._brokerLock.acquire()
+        currentShadow = self._shadows.get(thingName)
+        responses = []  # (topic, payload), published once the lock is released
+        if action == "update":
+            responses = self._updateShadow(thingName, currentShadow, srcTopic, request, clientToken)
+        elif currentShadow is None:
+            responses.append(self._getShadowRejection(srcTopic, clientToken, 404, "No shadow exists with name: '" + thingName + "'"))
+        elif action == "get":
+            responses.append((srcTopic + "/accepted", self._getShadowResponse(currentShadow.state, currentShadow.version, clientToken)))
+        else:
+            del self._shadows[thingName]
+            responses.append((srcTopic + "/accepted", self._getShadowResponse(None, currentShadow.version, clientToken)))
+        self._brokerLock.release()
+        for topic, payload in responses:
+            self._route(topic, payload, 0)
+        return True
+
+    def _updateShadow(self, srcThingName, srcShadow, srcTopic, srcRequest, srcClientToken):
+        # Merge the update into the document, with the lock held, return the responses
+        requestState = srcRequest.get("state")
+        if not isinstance(requestState, dict):
+            return [self._getShadowRejection(srcTopic, srcClientToken, 400, "Missing required node: state")]
+        if srcShadow is not None and "version" in srcRequest and srcRequest["version"] != srcShadow.version:
+            return [self._getShadowRejection(srcTopic, srcClientToken, 409, "Version conflict")]
+        if srcShadow is None:
+            srcShadow = _shadowDocument()
+            self._shadows[srcThingName] = srcShadow
+        for section in ["desired", "reported"]:
+            if section in requestState:
+                if requestState[section] is None:
+                    srcShadow.state[section] = dict()
+                else:
+                    self._mergeState(srcShadow.state[section], requestState[section])
+        srcShadow.version += 1
+        responses = [(srcTopic + "/accepted", self._getShadowResponse(requestState, srcShadow.version, srcClientToken))]
+        deltaState = self._getDeltaState(srcShadow.state["desired"], srcShadow.state["reported"])
+        if "desired" in requestState and len(deltaState) != 0:
+            deltaPayload = {"state": deltaState, "version": srcShadow.version, "timestamp": int(time.time())}
+            responses.append((srcTopic + "/delta", json.dumps(deltaPayload)))
+        return responses
+
+    def _mergeState(self, srcDocumentState, srcUpdateState):
+        # Merge in place, null values delete keys
+        for key, value in srcUpdateState.items():
+            if value is None:
+                srcDocumentState.pop(key, None)
+            elif isinstance(value, dict) and isinstance(srcDocumentState.get(key), dict):
+                self._mergeState(srcDocumentState[key], value)
+            else:
+                srcDocumentState[key] = value
+
+    def _getDeltaState(self, srcDesiredState, srcReportedState):
+        # Desired values that are not reported as they are
+        deltaState = dict()
+        for key, value in srcDesiredState.items():
+            reportedValue = srcReportedState.get(key)
+            if isinstance(value, dict) and isinstance(reportedValue, dict):
+                nestedDeltaState = self._getDeltaState(value, reportedValue)
+                if len(nestedDeltaState) != 0:
+                    deltaState[key] = nestedDeltaState
+            elif value != reportedValue:
+                deltaState[key] = value
+        return deltaState
+
+    def _getShadowResponse(self, srcState, srcVersion, srcClientToken):
+        response = {"version": srcVersion, "timestamp": int(time.time())}
+        if srcState is not None:
+            response["state"] = srcState
+        if srcClientToken is not None:
+            response["clientToken"] = srcClientToken
+        return json.dumps(response)
+
+    def _getShadowRejection(self, srcTopic, srcClientToken, srcCode, srcMessage):
+        response = {"code": srcCode, "message": srcMessage, "timestamp": int(time.time())}
+        if srcClientToken is not None:
+            response["clientToken"] = srcClientToken
+        return srcTopic + "/rejected", json.dumps(response)
+
+    def _rejectShadowRequest(self, srcTopic, srcClientToken, srcCode, srcMessage):
+        topic, payload = self._getShadowRejection(srcTopic, srcClientToken, srcCode, srcMessage)
+        self._route(topic, payload, 0)
@@ -0,0 +1,203 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import struct
+
+# Encoding/decoding of MQTT 3.1.1 control packets, the subset used by the AWS IoT stand-ins:
+# CONNECT, CONNACK, PUBLISH (QoS 0/1), PUBACK, SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT
+# Packets are (packet type, flags, body), body being the bytes after the fixed header
+# Topics and payloads are native strings, UTF-8 on the wire
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+_isBytesNativeString = str is bytes
+
+
+def toBytes(srcString):
+    if _isBytesNativeString or isinstance(srcString, bytes):
+        return srcString
+    return srcString.encode("utf-8")
+
+
+def toNativeString(srcBytes):
+    if _isBytesNativeString:
+        return srcBytes
+    return srcBytes.decode("utf-8", "replace")
+
+
+def encodeString(srcString):
+    encodedString = toBytes(srcString)
+    return struct.pack(">H", len(encodedString)) + encodedString
+
+
+def decodeString(srcBody, srcOffset):
+    # Return the string and the offset after it
+    length = struct.unpack(">H", srcBody[srcOffset:srcOffset + 2])[0]
+    return toNativeString(srcBody[srcOffset + 2:srcOffset + 2 + length]), srcOffset + 2 + length
+
+
+def encodePacket(srcPacketType, srcFlags, srcBody):
+    header = bytearray([(srcPacketType << 4) | srcFlags])
+    remainingLength = len(srcBody)
+    while True:  # Variable length encoding, 7 bits per byte
+        encodedByte = remainingLength % 128
+        remainingLength //= 128
+        if remainingLength > 0:
+            encodedByte |= 0x80
+        header.append(encodedByte)
+        if remainingLength == 0:
+            break
+    return bytes(header) + srcBody
+
+
+def encodeConnect(srcClientID, srcKeepAliveSecond, srcProtocol=4, srcCleanSession=True):
+    protocolName = "MQTT" if srcProtocol == 4 else "MQIsdp"
+    connectFlags = 0x02 if srcCleanSession else 0x00
+    body = encodeString(protocolName) + struct.pack(">BBH", srcProtocol, connectFlags, srcKeepAliveSecond) + encodeString(srcClientID)
+    return encodePacket(CONNECT, 0, body)
+
+
+def decodeConnect(srcBody):
+    # Return the client ID and the keepAlive interval
+    offset = decodeString(srcBody, 0)[1]
+    keepAliveSecond = struct.unpack(">H", srcBody[offset + 2:offset + 4])[0]
+    clientID = decodeString(srcBody, offset + 4)[0]
+    return clientID, keepAliveSecond
+
+
+def encodePublish(srcTopic, srcPayload, srcQoS=0, srcPacketID=0, srcRetain=False):
+    flags = (srcQoS << 1) | (1 if srcRetain else 0)
+    body = encodeString(srcTopic)
+    if srcQoS > 0:
+        body += struct.pack(">H", srcPacketID)
+    return encodePacket(PUBLISH, flags, body + toBytes(srcPayload))
+
+
+def decodePublish(srcFlags, srcBody):
+    # Return the topic, the payload, the QoS and the packet ID (0 for QoS 0)
+    qos = (srcFlags >> 1) & 0x03
+    topic, offset = decodeString(srcBody, 0)
+    packetID = 0
+    if qos > 0:
+        packetID = struct.unpack(">H", srcBody[offset:offset + 2])[0]
+        offset += 2
+    return topic, toNativeString(srcBody[offset:]), qos, packetID
+
+
+def encodePacketID(srcPacketType, srcPacketID, srcFlags=0):
+    # PUBACK, UNSUBACK
+    return encodePacket(srcPacketType, srcFlags, struct.pack(">H", srcPacketID))
+
+
+def decodePacketID(srcBody):
+    return struct.unpack(">H", srcBody[0:2])[0]
+
+
+def encodeSubscribe(srcPacketID, srcTopicFilter, srcQoS):
+    body = struct.pack(">H", srcPacketID) + encodeString(srcTopicFilter) + struct.pack(">B", srcQoS)
+    return encodePacket(SUBSCRIBE, 0x02, body)
+
+
+def decodeSubscribe(srcBody):
+    # Return the packet ID and the list of (topic filter, QoS)
+    packetID = decodePacketID(srcBody)
+    offset = 2
+    subscriptions = []
+    while offset < len(srcBody):
+        topicFilter, offset = decodeString(srcBody, offset)
+        subscriptions.append((topicFilter, bytearray(srcBody[offset:offset + 1])[0]))
+        offset += 1
+    return packetID, subscriptions
+
+
+def encodeUnsubscribe(srcPacketID, srcTopicFilter):
+    return encodePacket(UNSUBSCRIBE, 0x02, struct.pack(">H", srcPacketID) + encodeString(srcTopicFilter))
+
+
+def decodeUnsubscribe(srcBody):
+    # Return the packet ID and the list of topic filters
+    packetID = decodePacketID(srcBody)
+    offset = 2
+    topicFilters = []
+    while offset < len(srcBody):
+        topicFilter, offset = decodeString(srcBody, offset)
+        topicFilters.append(topicFilter)
+    return packetID, topicFilters
+
+
+def isTopicMatched(srcTopicFilter, srcTopic):
+    # MQTT topic filter matching, with '+' for one level and '#' for all remaining levels
+    filterLevels = srcTopicFilter.split("/")
+    topicLevels = srcTopic.split("/")
+    for i in range(0, len(filterLevels)):
+        if filterLevels[i] == "#":
+            return True
+        if i >= len(topicLevels) or (filterLevels[i] != "+" and filterLevels[i] != topicLevels[i]):
+            return False
+    return len(filterLevels) == len(topicLevels)
+
+
+class packetReader:
+    # Read whole packets from a connected socket
+
+    def __init__(self, srcSocket):
+        self._socket = srcSocket
+        self._rxBuf = b""
+        self.numberOfBytes = 0  # Bytes read so far
+
+    def _read(self, srcLength):
+        # Return None on EOF
+        while len(self._rxBuf) < srcLength:
+            content = self._socket.recv(65536)
+            if not content:
+                return None
+            self._rxBuf += content
+            self.numberOfBytes += len(content)
+        content = self._rxBuf[:srcLength]
+        self._rxBuf = self._rxBuf[srcLength:]
+        return content
+
+    def readPacket(self):
+        # Return (packet type, flags, body), None on EOF
+        header = self._read(1)
+        if header is None:
+            return None
+        firstByte = bytearray(header)[0]
+        remainingLength = 0
+        multiplier = 1
+        while True:
+            encodedByte = self._read(1)
+            if encodedByte is None:
+                return None
+            encodedByte = bytearray(encodedByte)[0]
+            remainingLength += (encodedByte & 0x7F) * multiplier
+            multiplier *= 128
+            if encodedByte & 0x80 == 0:
+                break
+        body = self._read(remainingLength) if remainingLength > 0 else b""
+        if body is None:
+            return None
+        return firstByte >> 4, firstByte & 0x0F, body
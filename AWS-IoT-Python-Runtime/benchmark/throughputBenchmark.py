@@ -0,0 +1,209 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import getopt
+import time
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "standIn"))
+from brokerStandIn import brokerStandIn
+from runtimeDriver import runtimeDriver
+
+# Run the Python runtime against a localhost stand-in for AWS IoT, driven through its serial protocol, and report:
+# publish rate: sketch publishes per second, from the first "p" to the last publish arriving at the broker
+# yield drain rate: messages per second out of the yield queue, with the messages already queued in the runtime
+# bytes per delivered message: serial (both ways, yield requests included) and MQTT (broker to runtime)
+# shadow round trip: from a shadow update request to its accepted response yielded to the sketch
+# No AWS account, SDK or network is needed: the SDK is replaced by a stand-in that talks to the broker stand-in
+_topicPrefix = "benchmark/"
+_thingName = "benchmarkThing"
+_messageSlot = 1
+_shadowSlot = 2
+
+
+class throughputBenchmark:
+
+    _usage = """Usage:
+
+    Measure the throughput of the Python runtime against a localhost stand-in for AWS IoT:
+    python throughputBenchmark.py -n <number of messages> -l <payload length>
+
+    Type "python throughputBenchmark.py -h" for detailed command line options.
+
+
+    """
+
+    _helpInfo = """Available command line options:
+    -n, --messages: Number of messages to publish, and to yield, 200 by default
+    -l, --length: Payload length in bytes, 100 by default
+    -q, --qos: QoS for publishes and the subscription, 0 by default
+    -b, --burst-size: Chunks per yield request, 1 by default
+    -r, --round-trips: Number of shadow round trips, 20 by default
+    -w, --settle: Seconds to let incoming messages get queued before draining, 1.0 by default
+    -k, --link: Model of the serial link of the Yun in front of the runtime, e.g. "yun" or "baud=115200,loss=0.0001",
+                none by default (see yunBridgeTransport)
+    -p, --python: Python interpreter for the runtime, this one by default
+    -h, --help: Help infomation
+
+
+    """
+
+    def __init__(self):
+        self._numberOfMessages = 200
+        self._payloadLength = 100
+        self._qos = 0
+        self._burstSize = 1
+        self._numberOfRoundTrips = 20
+        self._settleSecond = 1.0
+        self._pythonPath = sys.executable
+        self._linkSpec = None
+        self._broker = None
+        self._driver = None
+
+    # Return False if the command line inputs are malformed, or only help is requested
+    def checkInputs(self):
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "hn:l:q:b:r:w:k:p:", ["messages=", "length=", "qos=", "burst-size=", "round-trips=", "settle=", "link=", "python=", "help"])
+            for opt, arg in opts:
+                if opt in ("-n", "--messages"):
+                    self._numberOfMessages = int(arg)
+                if opt in ("-l", "--length"):
+                    self._payloadLength = int(arg)
+                if opt in ("-q", "--qos"):
+                    self._qos = int(arg)
+                if opt in ("-b", "--burst-size"):
+                    self._burstSize = int(arg)
+                if opt in ("-r", "--round-trips"):
+                    self._numberOfRoundTrips = int(arg)
+                if opt in ("-w", "--settle"):
+                    self._settleSecond = float(arg)
+                if opt in ("-k", "--link"):
+                    self._linkSpec = arg
+                if opt in ("-p", "--python"):
+                    self._pythonPath = arg
+                if opt in ("-h", "--help"):
+                    print(self._helpInfo)
+                    return False
+        except (getopt.GetoptError, ValueError):
+            print(self._usage)
+            return False
+        return self._numberOfMessages > 0 and self._payloadLength > 0 and self._qos in [0, 1] and self._burstSize > 0
+
+    def _expect(self, srcReply, srcExpectedReply):
+        # Raise RuntimeError if the runtime does not answer as expected
+        if srcReply != srcExpectedReply:
+            raise RuntimeError("Expected " + srcExpectedReply + ", got: " + str(srcReply))
+
+    def _measurePublishRate(self):
+        payload = "x" * self._payloadLength
+        topic = _topicPrefix + "publish"
+        self._broker.clearPublishRecord()
+        startTime = time.time()
+        for i in range(0, self._numberOfMessages):
+            self._expect(self._driver.command("p", [topic, payload, self._qos, 0]), "P T")
+        commandSecond = time.time() - startTime
+        publishRecord = self._broker.waitForPublishes(topic, self._numberOfMessages, 30)
+        if len(publishRecord) < self._numberOfMessages:
+            raise RuntimeError("Publishes arrived at the broker: " + str(len(publishRecord)) + "/" + str(self._numberOfMessages))
+        totalSecond = publishRecord[-1][0] - startTime
+        print("Publish rate: %.1f msg/s (%d messages of %d bytes, QoS %d, %.2f ms per publish command)" %
+              (self._numberOfMessages / totalSecond, self._numberOfMessages, self._payloadLength, self._qos, commandSecond * 1000 / self._numberOfMessages))
+
+    def _measureYieldDrain(self):
+        topic = _topicPrefix + "yield"
+        self._expect(self._driver.command("s", [topic, self._qos, _messageSlot]), "S T")
+        payload = "y" * self._payloadLength
+        mqttBytesStart = self._broker.numberOfBytesOut
+        for i in range(0, self._numberOfMessages):
+            self._broker.publish(topic, payload, self._qos)
+        time.sleep(self._settleSecond)  # Let the runtime get all of them into the yield queue
+        self._driver.resetCounters()
+        startTime = time.time()
+        numberOfMessages = 0
+        while numberOfMessages < self._numberOfMessages and time.time() - startTime < 60:
+            chunks = self._driver.drainYield(self._burstSize)
+            numberOfMessages += len([chunk for chunk in chunks if chunk.startswith("Y " + str(_messageSlot) + " 0 ")])
+        drainSecond = time.time() - startTime
+        if numberOfMessages < self._numberOfMessages:
+            raise RuntimeError("Messages yielded: " + str(numberOfMessages) + "/" + str(self._numberOfMessages))
+        mqttBytes = self._broker.numberOfBytesOut - mqttBytesStart
+        print("Yield drain rate: %.1f msg/s (%d messages of %d bytes, burst size %d, %d requests)" %
+              (numberOfMessages / drainSecond, numberOfMessages, self._payloadLength, self._burstSize, self._driver.numberOfRequests))
+        print("Bytes per delivered message: serial %.1f (%.1f to the runtime, %.1f from the runtime), MQTT %.1f" %
+              (float(self._driver.numberOfBytesToRuntime + self._driver.numberOfBytesFromRuntime) / numberOfMessages,
+               float(self._driver.numberOfBytesToRuntime) / numberOfMessages,
+               float(self._driver.numberOfBytesFromRuntime) / numberOfMessages,
+               float(mqttBytes) / numberOfMessages))
+
+    def _waitForShadowResponse(self, srcTimeoutSecond):
+        # Yield until the response for the shadow slot comes in, return the chunk
+        deadline = time.time() + srcTimeoutSecond
+        while time.time() < deadline:
+            for chunk in self._driver.drainYield(self._burstSize):
+                if chunk.startswith("Y " + str(_shadowSlot) + " 0 "):
+                    return chunk
+            time.sleep(0.001)
+        return None
+
+    def _measureShadowRoundTrip(self):
+        self._expect(self._driver.command("si", [_thingName, 1]), "SI T")
+        roundTripSeconds = []
+        for i in range(0, self._numberOfRoundTrips):
+            payload = json.dumps({"state": {"reported": {"count": i}}})
+            startTime = time.time()
+            self._expect(self._driver.command("su", [_thingName, payload, _shadowSlot, 5]), "SU T")
+            if self._waitForShadowResponse(10) is None:
+                raise RuntimeError("No shadow response for round trip " + str(i + 1))
+            roundTripSeconds.append(time.time() - startTime)
+        roundTripSeconds.sort()
+        print("Shadow round trip: min %.2f ms, median %.2f ms, p95 %.2f ms, max %.2f ms (%d updates)" %
+              (roundTripSeconds[0] * 1000, roundTripSeconds[len(roundTripSeconds) // 2] * 1000,
+               roundTripSeconds[min(int(len(roundTripSeconds) * 0.95), len(roundTripSeconds) - 1)] * 1000,
+               roundTripSeconds[-1] * 1000, len(roundTripSeconds)))
+
+    def run(self):
+        # Return the exit code
+        self._broker = brokerStandIn()
+        port = self._broker.start()
+        self._driver = runtimeDriver(self._pythonPath, srcLinkSpec=self._linkSpec)
+        self._driver.start()
+        try:
+            for reply, expectedReply in zip(self._driver.setUp("throughputBenchmark", "127.0.0.1", port), ["I T", "G T", "C T"]):
+                self._expect(reply, expectedReply)
+            self._expect(self._driver.command("bs", [self._burstSize]), "BS T")
+            self._measurePublishRate()
+            self._measureYieldDrain()
+            if self._numberOfRoundTrips > 0:
+                self._measureShadowRoundTrip()
+        except RuntimeError as e:
+            print("FAILED: " + str(e))
+            return 2
+        except (IOError, OSError) as e:  # Runtime is gone, e.g. timed out waiting for lines lost on the link
+            print("FAILED: runtime exited, " + str(e))
+            return 2
+        finally:
+            self._driver.stop()
+            self._broker.stop()
+        return 0
+
+# Main
+if __name__ == '__main__':
+    thisThroughputBenchmark = throughputBenchmark()
+    if not thisThroughputBenchmark.checkInputs():
+        sys.exit(2)
+    sys.exit(thisThroughputBenchmark.run())
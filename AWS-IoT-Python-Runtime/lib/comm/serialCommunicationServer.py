@@ -15,49 +15,278 @@
  */
  '''
 
-import sys
-sys.path.insert(0, "../lib/util/")
-sys.path.insert(0, "../lib/exception/")
 import communicationServer
-import AWSIoTExceptions
+from serialTransport import serialTransport
+from util import yieldMessageQueue
+from exception import AWSIoTExceptions
 import Queue
-import signal
+import os
+import time
+import heapq
 import logging
+import struct
+import binascii
+
+
+# Monotonic clock for deadlines, elapsed real time on Python 2
+_monotonic = getattr(time, "monotonic", lambda: os.times()[4])
+
+
+class _eventLoopTimer:
+    # ONE task scheduled on the event loop of serialCommunicationServer, periodic if it has an interval
+
+    def __init__(self, srcDueTime, srcIntervalSecond, srcFunction, srcArgs):
+        self.dueTime = srcDueTime
+        self.intervalSecond = srcIntervalSecond
+        self.function = srcFunction
+        self.args = srcArgs
+        self.isCancelled = False
+
+    def cancel(self):
+        self.isCancelled = True
 
 
 class serialCommunicationServer(communicationServer.communicationServer):
+    # Input is read by an event loop over the transport (stdin/stdout unless given to init), with monotonic deadlines
+    # The event loop runs the timers that are due, in the main thread, between reads while waiting for input
+    # and once per accept, so that a steady stream of commands does not hold them back
+    # Timers are scheduled by callLater (ONE shot) or addPeriodicTask, and can be cancelled
+    # Messages are exchanged either in the line protocol (default) or in the framed mode, negotiated by the remote client
+    # Frame layout in the framed mode, all lengths are 2-byte big endian:
+    # Remote client -> server: <STX> <command ID> <number of parameters> (<length> <parameter>)*
+    # Server -> remote client: <STX> <length> <message>
+    # Frames are binary-safe. Terminal (if any) is switched to raw mode so that no bytes get echoed/translated
+    # Optionally, frames are exchanged over a reliable transport, with a sequence number and a CRC per frame:
+    # Remote client -> server: <STX> <sequence> <ack> <command ID> <number of parameters> (<length> <parameter>)* <CRC>
+    # Server -> remote client: <STX> <sequence> <length> <message> <CRC>
+    # CRC is CRC-16/CCITT (0x1021, initial value 0xFFFF) over everything between STX and CRC
+    # Frames sent for a command are kept until the next command comes in, which acknowledges all of them
+    # A frame with command ID 0 asks for the frames after the cumulative ack in it to be resent, those lost/damaged
+    # Frames from the remote client are only taken in sequence, and must come in whole within frameTimeoutSecond
+    # Damaged/out of sequence frames are answered with "R F <sequence expected>: <reason>", the remote client takes the sequence number
+    # A frame sent again (same sequence number and content as the last one) is answered with the frames sent for it, not run again
+    # A byte other than STX starts a damaged frame, unless a line protocol probe ("ra", "~") comes, from a restarted remote client
+    # In any mode, several protocol commands can be sent as a batch: "b", then the commands one after another, then "e"
+    # The whole batch is received in ONE accept, and answered with ONE combined reply
+    # Within a batch in reliable mode, damaged/lost frames are kept as invalid commands and a resend request ends the batch
+    _frameStart = "\x02"
+    _maxFrameParameters = 32  # Beyond these limits, the frame is taken as damaged
+    _maxFrameParameterLength = 4096
+    _frameTimeoutSecond = 1  # Time for a frame to come in whole in reliable mode, once its STX is in
+    _lineProbeNames = ["ra", "~"]  # Commands taken as the remote client being back to the line protocol in reliable mode
+    # Command ID -> protocol name, shared with the remote client
+    _frameCommandNames = {1: "i", 2: "g", 3: "c", 4: "d", 5: "p", 6: "s", 7: "u", 8: "y", 9: "z",
+                          10: "si", 11: "sg", 12: "su", 13: "sd", 14: "s_rd", 15: "s_ud",
+                          16: "j", 17: "jm", 18: "bf", 19: "pq", 20: "di", 21: "bs", 22: "fm", 23: "~",
+                          24: "b", 25: "e", 26: "pb", 27: "pg", 28: "yb", 29: "yd", 30: "yw", 31: "yc",
+                          32: "ra", 33: "dm"}
 
-    def __init__(self):
+    def __init__(self, srcTransport=None):
         self._log = logging.getLogger(__name__)
         self._protocolMessageQueue = Queue.Queue(0)
-        self._yieldMessageQueue = Queue.Queue(0)
-        self._jsonBuf = ""
+        self._yieldMessageQueue = yieldMessageQueue.yieldMessageQueue(self._formatDropNotice)  # Unbounded until configured
+        self._jsonBuf = []  # Retained JSON payload, as pre-split frames
+        self._jsonCursor = 0  # Index of the next frame to be sent in jsonBuf
         self._txBuf = ""
         self._acceptTimeout = 0  # Never timeout
+        self._isDaemonMode = False  # Keep accepting beyond the accept timeout
         self._chunkSize = 50  # Biggest chunk of data that can be sent over serial1
+        self._burstSize = 1  # Number of chunks to be sent out for ONE yield/JSON request, negotiated by the remote client
         self._returnList = []
-        self._currentElementOut = ""  # Retained message that needs to be sent out in chunks
+        self._currentElementOut = []  # Retained message (pre-split frames) that needs to be sent out in chunks
+        self._currentElementCursor = 0  # Index of the next frame to be sent in currentElementOut
         self._lockedQueueSize = 0  # Number of messages to be transmitted in this yield
-        # Register timeout signal handler
-        signal.signal(signal.SIGALRM, self._timeoutHandler)
-        signal.alarm(0)  # disable SIGALRM
-        self._log.debug("Register timeout signal handler.")
+        self._framedMode = False
+        self._reliableMode = False
+        self._pendingFramedMode = None  # (framed, reliable) mode to switch to once the current reply is out
+        self._txSequence = 0  # Sequence number of the last frame sent in reliable mode
+        self._rxSequence = 0  # Sequence number of the last frame received in reliable mode
+        self._rxFrameBody = None  # Last frame received in reliable mode, to tell when it is sent again
+        self._numberOfLostCommands = 0  # Commands lost before the current one in a batch in reliable mode
+        self._sentFrames = []  # (sequence, frame) sent for the current command, until acknowledged
+        self._inBatch = False  # Is a batch of commands being received
+        self._transport = serialTransport() if srcTransport is None else srcTransport
+        self._rxBuf = ""  # Input read from the remote client, not consumed yet
+        self._isInputClosed = False
+        self._acceptDeadline = None  # Monotonic time when the current accept times out, None for never
+        self._frameDeadline = None  # Monotonic time when the frame being read times out in reliable mode, None for never
+        self._timers = []  # Heap of (due time, sequence #, _eventLoopTimer)
+        self._timerSequenceNumber = 0  # Timers due at the same time run in the order they are scheduled
         self._log.debug("serialCommunicationServer init.")
 
-    def _timeoutHandler(self, signal, frame):
-        self._log.debug("Raise a custom exception for accept timeout.")
-        raise AWSIoTExceptions.acceptTimeoutException()
+    def callLater(self, srcDelaySecond, srcFunction, *srcArgs):
+        # Run srcFunction(*srcArgs) ONCE in the event loop, after srcDelaySecond
+        # Return the timer, which can be cancelled
+        return self._scheduleTimer(_eventLoopTimer(_monotonic() + srcDelaySecond, None, srcFunction, srcArgs))
+
+    def addPeriodicTask(self, srcIntervalSecond, srcFunction, *srcArgs):
+        # Run srcFunction(*srcArgs) in the event loop, every srcIntervalSecond
+        # Return the timer, which can be cancelled
+        if srcIntervalSecond <= 0:
+            raise ValueError("Interval must be positive.")
+        return self._scheduleTimer(_eventLoopTimer(_monotonic() + srcIntervalSecond, srcIntervalSecond, srcFunction, srcArgs))
+
+    def _scheduleTimer(self, srcTimer):
+        self._timerSequenceNumber += 1
+        heapq.heappush(self._timers, (srcTimer.dueTime, self._timerSequenceNumber, srcTimer))
+        return srcTimer
+
+    def runDueTasks(self):
+        # Run the timers that are due, return the number of seconds until the next one, None if there is none
+        while len(self._timers) != 0:
+            dueTime, sequenceNumber, currentTimer = self._timers[0]
+            if currentTimer.isCancelled:
+                heapq.heappop(self._timers)
+                continue
+            now = _monotonic()
+            if dueTime > now:
+                return dueTime - now
+            heapq.heappop(self._timers)
+            if currentTimer.intervalSecond is not None:  # Next run, without drifting
+                currentTimer.dueTime = max(dueTime + currentTimer.intervalSecond, now)
+                self._scheduleTimer(currentTimer)
+            try:
+                currentTimer.function(*currentTimer.args)
+            except Exception as e:  # Tasks never break the event loop
+                self._log.debug("Exception in event loop task: " + str(type(e)) + str(e))
+        return None
+
+    def _receive(self, srcTimeoutSecond):
+        # Wait up to srcTimeoutSecond (None for ever) for input from the remote client
+        # Return what is read, "" on EOF, None if nothing came in before the timeout
+        return self._transport.receive(srcTimeoutSecond)
+
+    def _waitForInput(self):
+        # Event loop: run the timers that are due while waiting for more input in rxBuf, until the accept/frame deadline
+        # Return False on EOF
+        # Throw acceptTimeoutException, frameTimeoutException
+        while not self._isInputClosed:
+            nextTaskTimeout = self.runDueTasks()
+            timeout = nextTaskTimeout
+            if self._acceptDeadline is not None:
+                deadlineTimeout = self._acceptDeadline - _monotonic()
+                if deadlineTimeout <= 0:
+                    self._log.debug("Raise a custom exception for accept timeout.")
+                    raise AWSIoTExceptions.acceptTimeoutException()
+                timeout = deadlineTimeout if timeout is None else min(timeout, deadlineTimeout)
+            if self._frameDeadline is not None:
+                deadlineTimeout = self._frameDeadline - _monotonic()
+                if deadlineTimeout <= 0:
+                    raise AWSIoTExceptions.frameTimeoutException()
+                timeout = deadlineTimeout if timeout is None else min(timeout, deadlineTimeout)
+            content = self._receive(timeout)
+            if content == "":
+                self._isInputClosed = True
+            elif content is not None:
+                self._rxBuf += content
+                return True
+        return False
 
     def _basicInput(self):
-        return raw_input()
+        # Read ONE line, without the line break
+        while "\n" not in self._rxBuf:
+            if not self._waitForInput():
+                if self._rxBuf == "":
+                    raise EOFError("EOF when reading a line")
+                content, self._rxBuf = self._rxBuf, ""  # Last line without a line break
+                return content
+        content, self._rxBuf = self._rxBuf.split("\n", 1)
+        return content
 
     def _basicOutput(self, srcContent):
-        print(srcContent)
+        self._transport.writeLine(srcContent)
+
+    def _basicRead(self, srcLength):
+        while len(self._rxBuf) < srcLength:
+            if not self._waitForInput():
+                raise EOFError("EOF when reading a frame")
+        content = self._rxBuf[:srcLength]
+        self._rxBuf = self._rxBuf[srcLength:]
+        return content
+
+    def _basicWrite(self, srcContent):
+        self._transport.write(srcContent)
+
+    def _writeOut(self, srcContent):
+        # Send ONE message to the remote client, as a line or as a frame
+        if self._framedMode:
+            if isinstance(srcContent, unicode):
+                srcContent = srcContent.encode("utf-8")
+            if self._reliableMode:
+                frame = self._writeReliableFrame(srcContent)
+                self._sentFrames.append((self._txSequence, frame))
+            else:
+                self._basicWrite(self._frameStart + struct.pack(">H", len(srcContent)) + srcContent)
+        else:
+            self._basicOutput(srcContent)
+        if self._pendingFramedMode is not None:
+            self._applyFramedMode(*self._pendingFramedMode)
+
+    def _writeReliableFrame(self, srcContent):
+        # Send ONE message as a frame with the next sequence number, return the frame for any later resend
+        self._txSequence = (self._txSequence + 1) % 256
+        frameBody = chr(self._txSequence) + struct.pack(">H", len(srcContent)) + srcContent
+        frame = self._frameStart + frameBody + struct.pack(">H", binascii.crc_hqx(frameBody, 0xFFFF))
+        self._basicWrite(frame)
+        return frame
+
+    def _resendFrames(self, srcAck=None):
+        # Resend the frames sent after the cumulative ack (all of them if None), in order
+        # If there is nothing to resend, answer with "R F" so that the remote client does not wait for it
+        resendCount = 0
+        for sequence, frame in self._sentFrames:
+            if srcAck is None or 0 < (sequence - srcAck) % 256 < 128:
+                self._basicWrite(frame)
+                resendCount += 1
+        self._log.debug("Resend frames after ack " + str(srcAck) + ". Frames: " + str(resendCount))
+        if resendCount == 0:
+            self._writeReliableFrame("R F: No frames to resend.")
+
+    def _rejectFrame(self, srcReason):
+        # Answer a frame that is not run, with the sequence number expected for the next one
+        self._log.debug("Reject frame: " + srcReason + " Sequence expected: " + str((self._rxSequence + 1) % 256))
+        self._writeReliableFrame("R F " + str((self._rxSequence + 1) % 256) + ": " + srcReason)
+
+    def _applyFramedMode(self, srcFramedMode, srcReliableMode=False):
+        self._transport.flush()
+        self._transport.setRawMode(srcFramedMode)
+        self._framedMode = srcFramedMode
+        self._reliableMode = srcFramedMode and srcReliableMode
+        self._txSequence = 0
+        self._rxSequence = 0
+        self._rxFrameBody = None
+        self._sentFrames = []
+        self._pendingFramedMode = None
+        self._log.debug("serialCommunicationServer set framed mode to " + str(self._framedMode) + ", reliable: " + str(self._reliableMode))
 
     def setAcceptTimeout(self, srcTimeout):
         self._acceptTimeout = srcTimeout
         self._log.debug("serialCommunicationServer set accept timeout to " + str(self._acceptTimeout))
 
+    def isDaemonMode(self):
+        return self._isDaemonMode
+
+    def setDaemonMode(self, srcDaemonMode):
+        # In daemon mode, accept waits for input with no timeout, timers keep running
+        self._isDaemonMode = srcDaemonMode
+        self._log.debug("serialCommunicationServer set daemon mode to " + str(self._isDaemonMode))
+
+    def resetSession(self):
+        # Forget what is left for the previous sketch, when a restarted sketch reattaches
+        # Back to the line protocol and ONE chunk per burst, with no feedback/yield/JSON waiting to be sent
+        # Timers, the accept timeout and the daemon mode stay as they are
+        self._applyFramedMode(False)
+        self._burstSize = 1
+        while not self._protocolMessageQueue.empty():
+            self._protocolMessageQueue.get()
+        self._yieldMessageQueue.clear()
+        self._lockedQueueSize = 0
+        self._currentElementOut = []
+        self._currentElementCursor = 0
+        self._jsonBuf = []
+        self._jsonCursor = 0
+        self._log.debug("serialCommunicationServer reset the session.")
+
     def getChunkSize(self):
         return self._chunkSize
 
@@ -65,6 +294,54 @@ class serialCommunicationServer(communicationServer.communicationServer):
         self._chunkSize = srcChunkSize
         self._log.debug("serialCommunicationServer set chunk size to " + str(self._chunkSize))
 
+    def getBurstSize(self):
+        return self._burstSize
+
+    def setBurstSize(self, srcBurstSize):
+        if srcBurstSize <= 0:
+            raise ValueError("Burst size must be positive.")
+        self._burstSize = srcBurstSize
+        self._log.debug("serialCommunicationServer set burst size to " + str(self._burstSize))
+
+    def isFramedMode(self):
+        return self._framedMode
+
+    def isReliableMode(self):
+        return self._reliableMode
+
+    def setFramedMode(self, srcFramedMode, srcReliableMode=False):
+        # Switch to the new framing mode once the reply to the current command is sent out
+        self._pendingFramedMode = (srcFramedMode, srcReliableMode)
+
+    def resetFramedMode(self):
+        # Back to the line protocol right away, restoring the terminal
+        self._applyFramedMode(False)
+
+    def configureYieldQueue(self, srcMaxMessages, srcMaxBytes, srcSlotQuota, srcDropPolicy):
+        # Raise ValueError if the configuration is invalid
+        self._yieldMessageQueue.configure(srcMaxMessages, srcMaxBytes, srcSlotQuota, srcDropPolicy)
+        self._log.debug("serialCommunicationServer set yield queue bounds to " + str(srcMaxMessages) + " messages, " + str(srcMaxBytes) + " bytes, " + str(srcSlotQuota) + " messages per slot, drop policy: " + str(srcDropPolicy))
+
+    def configureYieldSlot(self, srcSketchSlotNumber, srcPriority, srcWeight):
+        # Raise ValueError if the configuration is invalid
+        self._yieldMessageQueue.configureSlot(srcSketchSlotNumber, srcPriority, srcWeight)
+        self._log.debug("serialCommunicationServer set yield priority of sketch slot " + str(srcSketchSlotNumber) + " to " + str(srcPriority) + ", weight: " + str(srcWeight))
+
+    def configureYieldConflation(self, srcSketchSlotNumber, srcConflation):
+        # Raise ValueError if the configuration is invalid
+        self._yieldMessageQueue.configureSlotConflation(srcSketchSlotNumber, srcConflation)
+        self._log.debug("serialCommunicationServer set yield conflation of sketch slot " + str(srcSketchSlotNumber) + " to " + str(srcConflation))
+
+    def resetYieldSlot(self, srcSketchSlotNumber):
+        self._yieldMessageQueue.resetSlot(srcSketchSlotNumber)
+
+    def getNumberOfYieldDrops(self):
+        return self._yieldMessageQueue.getNumberOfDrops()
+
+    def _formatDropNotice(self, srcSketchSlotNumber):
+        # ONE chunk telling the sketch slot that messages were dropped, with "2" as the hasMore flag
+        return ["Y " + str(srcSketchSlotNumber) + " 2 "]
+
     def updateLockedQueueSize(self):
         self._lockedQueueSize = self._yieldMessageQueue.qsize()
 
@@ -72,17 +349,70 @@ class serialCommunicationServer(communicationServer.communicationServer):
         return self._lockedQueueSize
 
     def accept(self):
-        # Messages are passed from remote client to server line by line
+        # Messages are passed from remote client to server line by line, or as ONE frame in the framed mode
         # A number representing the number of lines to receive will be passed first
         # Then serialCommunicationServer should loop the exact time to receive the following lines
-        # All these reads add up tp ONE timeout: acceptTimeout. Once exceeded, this timeout will trigger a callback raising an exception
+        # All these reads add up tp ONE timeout: acceptTimeout. Once exceeded, an exception is raised
+        # In daemon mode, there is no timeout
+        # Timers that are due run first, then while waiting
         # Throw acceptTimeoutException, ValueError
         # Store the incoming parameters into an internal data structure
+        self.runDueTasks()
         self._returnList = []
         self._log.debug("Clear internal list. Size: " + str(len(self._returnList)))
-        signal.alarm(self._acceptTimeout)  # Enable SIGALRM
+        if self._acceptTimeout > 0 and not self._isDaemonMode:
+            self._acceptDeadline = _monotonic() + self._acceptTimeout
         self._log.debug("Accept-timer starts, with acceptTimeout: " + str(self._acceptTimeout) + " second(s).")
-        numLines = int(self._basicInput())  # Get number of lines to receive
+        try:
+            self._acceptCommand()
+            if self._returnList[:1] in (["b"], ["e"]):  # End of batch without its start is taken as an empty batch
+                self._acceptBatch()
+        finally:
+            self._acceptDeadline = None
+        self._log.debug("Finish reading from remote client. Accept-timer ends.")
+        return self._returnList
+
+    def _acceptCommand(self):
+        # Read ONE protocol command into the internal list, in the current mode
+        if self._framedMode and self._reliableMode:
+            self._acceptReliableCommand(self._basicRead(1))
+        elif self._framedMode:
+            frameStart = self._basicRead(1)
+            if frameStart == self._frameStart:
+                self._acceptFrame()
+            else:  # Remote client is back to the line protocol (e.g. sketch reset), follow it
+                self._log.debug("Line protocol detected in framed mode. Switch back to line protocol.")
+                self._applyFramedMode(False)
+                if frameStart == "\n":
+                    self._acceptLines("")
+                else:
+                    self._acceptLines(frameStart + self._basicInput())
+        else:
+            self._acceptLines(self._basicInput())
+
+    def _acceptBatch(self):
+        # Read the rest of a batch, until "e"
+        # The internal list becomes ["b", [protocol command], [protocol command], ...], each like what accept returns
+        # If the remote client goes back to the line protocol meanwhile, the batch is dropped for its command
+        batchList = ["b"]
+        self._inBatch = self._returnList[0] == "b"
+        while self._inBatch:
+            self._returnList = []
+            self._acceptCommand()
+            batchList.extend([["x"] for i in range(0, self._numberOfLostCommands)])
+            self._numberOfLostCommands = 0
+            if not self._inBatch:
+                self._log.debug("Batch dropped. Commands: " + str(len(batchList) - 1))
+                return
+            if self._returnList[:1] == ["e"]:
+                self._inBatch = False
+            else:
+                batchList.append(self._returnList)
+        self._returnList = batchList
+        self._log.debug("Batch received. Commands: " + str(len(batchList) - 1))
+
+    def _acceptLines(self, srcFirstLine):
+        numLines = int(srcFirstLine)  # Get number of lines to receive
         self._log.debug(str(numLines) + " lines to be received. Loop begins.")
         loopCount = 1
         while(loopCount <= numLines):
@@ -90,44 +420,178 @@ class serialCommunicationServer(communicationServer.communicationServer):
             self._returnList.append(currElementIn)
             self._log.debug("Received: " + str(loopCount) + "/" + str(numLines) + " Message is: " + currElementIn)
             loopCount += 1
-        signal.alarm(0)  # Finish reading from remote client, disable SIGALRM
-        self._log.debug("Finish reading from remote client. Accept-timer ends.")
-        return self._returnList
+
+    def _acceptFrame(self):
+        # Unknown command ID is taken as an unsupported protocol name, after the whole frame is read
+        commandID, numParameters = struct.unpack("BB", self._basicRead(2))
+        self._returnList.append(self._frameCommandNames.get(commandID, "x"))
+        self._log.debug("Frame received. Command ID: " + str(commandID) + " Parameters: " + str(numParameters))
+        loopCount = 1
+        while(loopCount <= numParameters):
+            parameterLength = struct.unpack(">H", self._basicRead(2))[0]
+            self._returnList.append(self._basicRead(parameterLength))
+            loopCount += 1
+
+    def _skipToFrameStart(self, srcSkipped=""):
+        # Skip what is left of a damaged frame, up to and including the next STX
+        # Return the protocol name if a line protocol probe comes instead, None otherwise
+        skipped = "\n" + srcSkipped
+        while True:
+            currentChar = self._basicRead(1)
+            if currentChar == self._frameStart:
+                return None
+            skipped = (skipped + currentChar)[-16:]
+            for protocolName in self._lineProbeNames:
+                if skipped.endswith("\n1\n" + protocolName + "\n"):
+                    return protocolName
+
+    def _acceptReliableCommand(self, srcFrameStart):
+        # Read frames in reliable mode until ONE new command is in the internal list
+        # Resend requests, frames sent again, damaged and out of sequence frames are answered on the way
+        frameStart = srcFrameStart
+        while True:
+            if frameStart == self._frameStart:
+                frame = self._readReliableFrame()
+                if frame is not None:
+                    if self._acceptReliableFrame(*frame):
+                        return
+                    frameStart = self._basicRead(1)
+                    continue
+            self._log.debug("Damaged frame received.")
+            if not self._inBatch:
+                self._rejectFrame("Damaged frame.")
+            protocolName = self._skipToFrameStart(frameStart if frameStart != self._frameStart else "")
+            if protocolName is not None:
+                self._log.debug("Line protocol probe received in reliable framed mode. Switch back to line protocol.")
+                self._applyFramedMode(False)
+                self._inBatch = False
+                self._returnList.append(protocolName)
+                return
+            if self._inBatch:  # Keep the place of this command in the batch, as an invalid one
+                self._rxBuf = self._frameStart + self._rxBuf
+                self._rxSequence = (self._rxSequence + 1) % 256
+                self._returnList.append("x")
+                return
+            frameStart = self._frameStart
+
+    def _readReliableFrame(self):
+        # Read ONE frame in reliable mode, STX excluded, within frameTimeoutSecond
+        # Return (sequence, ack, command ID, parameters, frame body), None if the frame is damaged
+        self._frameDeadline = _monotonic() + self._frameTimeoutSecond
+        try:
+            frameBody = self._basicRead(4)
+            sequence, ack, commandID, numParameters = struct.unpack("BBBB", frameBody)
+            if numParameters > self._maxFrameParameters:
+                return None
+            parameterList = []
+            while len(parameterList) < numParameters:
+                parameterLengthBytes = self._basicRead(2)
+                parameterLength = struct.unpack(">H", parameterLengthBytes)[0]
+                if parameterLength > self._maxFrameParameterLength:
+                    return None
+                parameter = self._basicRead(parameterLength)
+                frameBody += parameterLengthBytes + parameter
+                parameterList.append(parameter)
+            if struct.unpack(">H", self._basicRead(2))[0] != binascii.crc_hqx(frameBody, 0xFFFF):
+                return None
+            return sequence, ack, commandID, parameterList, frameBody
+        except AWSIoTExceptions.frameTimeoutException:
+            self._log.debug("Frame timeout.")
+            return None
+        finally:
+            self._frameDeadline = None
+
+    def _acceptReliableFrame(self, srcSequence, srcAck, srcCommandID, srcParameterList, srcFrameBody):
+        # Take ONE good frame in reliable mode
+        # Return True if a new command is received, False if the frame is handled here
+        numberOfLostFrames = (srcSequence - self._rxSequence - 1) % 256
+        if srcSequence == self._rxSequence and srcFrameBody == self._rxFrameBody:  # Feedback did not make it, answer again
+            self._log.debug("Frame received again. Sequence: " + str(srcSequence))
+            if not self._inBatch:
+                self._resendFrames()
+            return False
+        if numberOfLostFrames >= 128 or (numberOfLostFrames != 0 and not self._inBatch):  # Old, or frames lost before it
+            self._log.debug("Out of sequence frame received. Sequence: " + str(srcSequence))
+            if not self._inBatch:
+                self._rejectFrame("Out of sequence.")
+            return False
+        if numberOfLostFrames != 0:  # Keep the place of the commands lost in the batch, as invalid ones
+            self._log.debug("Frames lost in batch before sequence " + str(srcSequence))
+            self._numberOfLostCommands = numberOfLostFrames
+        self._rxSequence = srcSequence
+        self._rxFrameBody = srcFrameBody
+        if srcCommandID == 0 and self._inBatch:  # Remote client is waiting for the reply, the end of batch got lost
+            self._log.debug("Resend request received in batch. End the batch.")
+            self._returnList.append("e")
+            return True
+        if srcCommandID == 0:
+            self._resendFrames(srcAck)
+            return False
+        self._sentFrames = []  # All acknowledged by this new command
+        self._returnList.append(self._frameCommandNames.get(srcCommandID, "x"))
+        self._returnList.extend(srcParameterList)
+        self._log.debug("Frame received. Sequence: " + str(srcSequence) + " Command ID: " + str(srcCommandID) + " Parameters: " + str(len(srcParameterList)))
+        return True
 
     def writeToInternalProtocol(self, srcContent):
         self._protocolMessageQueue.put(srcContent)
         self._log.debug("Updated serialCommunicationServer internal protocolMessageQueue by inserting a new message. Size: " + str(self._protocolMessageQueue.qsize()))
 
-    def writeToInternalYield(self, srcContent):
-        self._yieldMessageQueue.put(srcContent)
-        self._log.debug("Updated serialCommunicationServer internal yieldMessageQueue by inserting a new message. Size: " + str(self._yieldMessageQueue.qsize()))
+    def readFromInternalProtocol(self):
+        # Take the next protocol message out of the internal queue, instead of sending it to the remote client
+        # If there are no protocol messages, None will be returned
+        if self._protocolMessageQueue.empty():
+            return None
+        return self._protocolMessageQueue.get()
+
+    def writeToInternalYield(self, srcContent, srcSketchSlotNumber=-1, srcIsDroppable=True):
+        # Messages that are not droppable are always queued, regardless of the bounds of the queue
+        if self._yieldMessageQueue.put(srcContent, srcSketchSlotNumber, srcIsDroppable):
+            self._log.debug("Updated serialCommunicationServer internal yieldMessageQueue by inserting a new message. Size: " + str(self._yieldMessageQueue.qsize()))
+        else:
+            self._log.debug("Dropped a new message for yieldMessageQueue. Drops: " + str(self._yieldMessageQueue.getNumberOfDrops()))
 
     def writeToInternalJSON(self, srcContent):
+        # srcContent is a list of frames, each of which will be sent out as ONE chunk
         self._jsonBuf = srcContent
-        self._log.debug("Updated serialCommunicationServer internal json buffer with a new JSON payload of size: " + str(len(self._jsonBuf)))
+        self._jsonCursor = 0
+        self._log.debug("Updated serialCommunicationServer internal json buffer with a new JSON payload of frames: " + str(len(self._jsonBuf)))
 
     def writeToExternalYield(self):
-        # Write ONE chunk to the remote client
-        # If no retained chunks, pick ONE new message from the given messageQueue and start again
-        # Messages in the internal messageQueue should be well-formated for yield messages, serialCommunicationServer will do nothing to format it
-        if self._lockedQueueSize > 0 or self._currentElementOut != "":
-            if self._currentElementOut == "":  # No more chunks left for current retained?
-                self._currentElementOut = self._yieldMessageQueue.get()
-                self._lockedQueueSize -= 1
-                self._log.debug("Start sending a new message to remote client: " + self._currentElementOut)
-            self._txBuf = self._currentElementOut[0:self._chunkSize]
-            self._basicOutput(self._txBuf)
-            self._log.debug("Send through serial to remote client. Chunk: " + self._txBuf + " Size: " + str(len(self._txBuf)))
-            self._currentElementOut = self._currentElementOut[self._chunkSize:]
-        else:
-            self._basicOutput("Y F: No messages.")
-            self._log.debug("No more messages for yield. Exiting writeToExternalYield.")
+        # Write up to burstSize chunks to the remote client, one chunk per line
+        # If no retained chunks, pick ONE new message from the given messageQueue and carry on
+        # The last chunk of a message ends the burst, so that the remote client can run the callback with nothing left to read
+        # If there are no more messages before burstSize chunks are sent, end this burst with a "Y F" line
+        # Messages in the internal messageQueue should be lists of well-formated frames for yield messages, serialCommunicationServer will do nothing to format it
+        chunkCount = 0
+        while chunkCount < self._burstSize:
+            if self._lockedQueueSize > 0 or self._currentElementCursor < len(self._currentElementOut):
+                if self._currentElementCursor == len(self._currentElementOut):  # No more chunks left for current retained?
+                    nextElementOut = self._yieldMessageQueue.get()
+                    self._lockedQueueSize -= 1
+                    if nextElementOut is None:  # Messages were dropped after the queue size was locked
+                        self._lockedQueueSize = 0
+                        continue
+                    self._currentElementOut = nextElementOut
+                    self._currentElementCursor = 0
+                    self._log.debug("Start sending a new message to remote client. Frames: " + str(len(self._currentElementOut)))
+                self._txBuf = self._currentElementOut[self._currentElementCursor]
+                self._currentElementCursor += 1
+                self._writeOut(self._txBuf)
+                self._log.debug("Send through serial to remote client. Chunk: " + self._txBuf + " Size: " + str(len(self._txBuf)))
+                chunkCount += 1
+                if self._currentElementCursor == len(self._currentElementOut):
+                    break
+            else:
+                self._writeOut("Y F: No messages.")
+                self._log.debug("No more messages for yield. Exiting writeToExternalYield.")
+                break
 
     def writeToExternalProtocol(self):
         # Wrapper for protocol serial communitation
         if not self._protocolMessageQueue.empty():
             thisProtocolMessage = self._protocolMessageQueue.get()
-            self._basicOutput(thisProtocolMessage)
+            self._writeOut(thisProtocolMessage)
             self._log.debug("Send through serial to remote client: " + thisProtocolMessage + " Size: " + str(len(thisProtocolMessage)))
         else:
             self._log.debug("No protocol messages available. Exiting writeToExternalProtocol.")
@@ -135,11 +599,20 @@ class serialCommunicationServer(communicationServer.communicationServer):
     def writeToExternalJSON(self):
         # Wrapper for JSON serial communication
         # Only ONE JSON payload will be tracked, this method will be called in a loop util there is not more chunks for THIS payload
-        if self._jsonBuf != "":
-            self._txBuf = self._jsonBuf[0:self._chunkSize]
-            self._basicOutput(self._txBuf)
-            self._log.debug("JSON: Send through serial to remote client. Chunk: " + self._txBuf + " Size: " + str(len(self._txBuf)))
-            self._jsonBuf = self._jsonBuf[self._chunkSize:]
-        else:
-            self._basicOutput("J0F: No JSON chunks.")
-            self._log.debug("No more chunks for this JSON payload. Exiting writeToExternalJSON.")
+        # Up to burstSize chunks are written per call, one chunk per line
+        # If the payload runs out before burstSize chunks are sent, end this burst with a "J0F" line
+        chunkCount = 0
+        while chunkCount < self._burstSize:
+            if self._jsonCursor < len(self._jsonBuf):
+                self._txBuf = self._jsonBuf[self._jsonCursor]
+                self._jsonCursor += 1
+                self._writeOut(self._txBuf)
+                self._log.debug("JSON: Send through serial to remote client. Chunk: " + self._txBuf + " Size: " + str(len(self._txBuf)))
+                chunkCount += 1
+                if not self._txBuf.startswith("J "):  # Error feedback, remote client stops reading here
+                    self._jsonCursor = len(self._jsonBuf)
+                    break
+            else:
+                self._writeOut("J0F: No JSON chunks.")
+                self._log.debug("No more chunks for this JSON payload. Exiting writeToExternalJSON.")
+                break
@@ -0,0 +1,67 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import sys
+import os
+import select
+import errno
+import termios
+import tty
+
+
+# Byte transport of serialCommunicationServer: stdin/stdout, which is the Linux console wired to Serial1 on the Yun
+# receive waits for input, writeLine/write send ONE line/raw bytes, setRawMode switches the terminal (if any) for frames
+# Link models that sit between the runtime and the remote client extend this class
+class serialTransport:
+
+    def __init__(self):
+        self._inputFileDescriptor = sys.stdin.fileno()
+        self._savedTerminalAttributes = None  # Terminal settings before switching to raw mode
+
+    def receive(self, srcTimeoutSecond):
+        # Wait up to srcTimeoutSecond (None for ever) for input from the remote client
+        # Return what is read, "" on EOF, None if nothing came in before the timeout
+        try:
+            readable = select.select([self._inputFileDescriptor], [], [], srcTimeoutSecond)[0]
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return None
+            raise
+        if len(readable) == 0:
+            return None
+        return os.read(self._inputFileDescriptor, 4096)
+
+    def writeLine(self, srcContent):
+        print(srcContent)
+        sys.stdout.flush()
+
+    def write(self, srcContent):
+        sys.stdout.write(srcContent)
+        sys.stdout.flush()
+
+    def flush(self):
+        # Return once everything written is out
+        sys.stdout.flush()
+
+    def setRawMode(self, srcRawMode):
+        # No echo/translation of bytes in raw mode, for frames
+        if srcRawMode and self._savedTerminalAttributes is None and sys.stdin.isatty():
+            self._savedTerminalAttributes = termios.tcgetattr(sys.stdin.fileno())
+            tty.setraw(sys.stdin.fileno(), termios.TCSADRAIN)
+        elif not srcRawMode and self._savedTerminalAttributes is not None:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, self._savedTerminalAttributes)
+            self._savedTerminalAttributes = None
@@ -0,0 +1,217 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import time
+import random
+import logging
+import threading
+from collections import deque
+from serialTransport import serialTransport
+
+
+class _linkDirection:
+    # ONE direction of the link: segments on their way, each with the time it is through
+
+    def __init__(self):
+        self.pendingSegments = deque()  # (due time, content), in order
+        self.numberOfPendingBytes = 0
+        self.wireFreeTime = 0.0  # Time the last byte put on the wire is through
+        self.lastDueTime = 0.0
+
+
+class yunBridgeTransport(serialTransport):
+    # Model of the serial link between the sketch and the runtime on the Yun, in front of stdin/stdout
+    # Serial1 of the sketch at the baud rate (8N1, 10 bits per byte) is wired to the Linux console the runtime runs on:
+    # Bytes take their wire time both ways, each line break adds the line latency and a random jitter on top
+    # In line mode, the console echoes the input and turns each line break out into "\r\n": this takes wire time on the
+    # way out, but is not sent, the remote client here does not expect it
+    # Console buffers: writes block while the output buffer is full, input that comes in while the input buffer is full
+    # is lost (overrun)
+    # Bytes are lost or corrupted (ONE bit flipped) at random, at the given rates, both ways
+    # Settings come as a link spec: "yun" for the defaults, or "<key>=<value>,..." to change some of them:
+    # baud, latency (ms per line), jitter (ms per line, up to), rx/tx (console input/output buffer in bytes),
+    # loss/corruption (rate per byte), seed (for the random jitter/loss/corruption)
+    # Line latency and jitter of the console are estimates
+    # Output goes out at its time from a writer thread, timing uses wall clock time
+    _defaultSettings = {"baud": 250000, "latency": 1.0, "jitter": 1.0, "rx": 4096, "tx": 4096, "loss": 0.0, "corruption": 0.0, "seed": None}
+
+    def __init__(self, srcLinkSpec="yun"):
+        # Raise ValueError if the link spec is malformed
+        serialTransport.__init__(self)
+        self._log = logging.getLogger(__name__)
+        settings = self._parseLinkSpec(srcLinkSpec)
+        self._byteSecond = 10.0 / settings["baud"]
+        self._lineLatencySecond = settings["latency"] / 1000.0
+        self._jitterSecond = settings["jitter"] / 1000.0
+        self._rxBufferSize = settings["rx"]
+        self._txBufferSize = settings["tx"]
+        self._lossRate = settings["loss"]
+        self._corruptionRate = settings["corruption"]
+        self._random = random.Random(settings["seed"])
+        self._rx = _linkDirection()
+        self._tx = _linkDirection()
+        self._isRawMode = False
+        self._isInputClosed = False
+        self.numberOfBytesLost = 0
+        self.numberOfBytesCorrupted = 0
+        self.numberOfBytesOverrun = 0
+        self._condition = threading.Condition()
+        self._writerThread = threading.Thread(target=self._writeOnTime)
+        self._writerThread.daemon = True
+        self._writerThread.start()
+        self._log.debug("yunBridgeTransport init with " + str(sorted(settings.items())))
+
+    def _parseLinkSpec(self, srcLinkSpec):
+        settings = dict(self._defaultSettings)
+        for setting in srcLinkSpec.split(","):
+            setting = setting.strip()
+            if setting in ["", "yun"]:
+                continue
+            key, separator, value = setting.partition("=")
+            if separator == "" or key not in settings:
+                raise ValueError("Unknown link setting: " + setting)
+            if key in ["baud", "rx", "tx", "seed"]:
+                settings[key] = int(value)
+            else:
+                settings[key] = float(value)
+        if settings["baud"] <= 0 or settings["rx"] <= 0 or settings["tx"] <= 0:
+            raise ValueError("Baud rate and buffer sizes must be positive.")
+        if settings["latency"] < 0 or settings["jitter"] < 0 or not (0 <= settings["loss"] <= 1 and 0 <= settings["corruption"] <= 1):
+            raise ValueError("Latency, jitter and rates must not be negative, rates not more than 1.")
+        return settings
+
+    def _damage(self, srcContent):
+        # Drop/corrupt bytes at random
+        if self._lossRate == 0 and self._corruptionRate == 0:
+            return srcContent
+        damagedContent = []
+        for character in srcContent:
+            if self._random.random() < self._lossRate:
+                self.numberOfBytesLost += 1
+            elif self._random.random() < self._corruptionRate:
+                self.numberOfBytesCorrupted += 1
+                damagedContent.append(chr(ord(character) ^ (1 << self._random.randint(0, 7))))
+            else:
+                damagedContent.append(character)
+        return "".join(damagedContent)
+
+    def _putOnWire(self, srcDirection, srcContent, srcStartTime, srcExtraBytesPerLine):
+        # Schedule the content, line by line, to be through the link at the time it takes, once the wire is free
+        wireTime = max(srcStartTime, srcDirection.wireFreeTime)
+        for segment in srcContent.splitlines(True):
+            isLineEnd = segment.endswith("\n")
+            wireTime += (len(segment) + (srcExtraBytesPerLine if isLineEnd else 0)) * self._byteSecond
+            dueTime = wireTime
+            if isLineEnd:
+                dueTime += self._lineLatencySecond + self._random.uniform(0, self._jitterSecond)
+            dueTime = max(dueTime, srcDirection.lastDueTime)  # Jitter never reorders bytes
+            segment = self._damage(segment)
+            srcDirection.pendingSegments.append((dueTime, segment))
+            srcDirection.numberOfPendingBytes += len(segment)
+            srcDirection.lastDueTime = dueTime
+        srcDirection.wireFreeTime = wireTime
+
+    def _takeDueInput(self, srcCurrentTime):
+        # Input through the link by now, beyond the input buffer size is lost
+        dueSegments = []
+        while len(self._rx.pendingSegments) != 0 and self._rx.pendingSegments[0][0] <= srcCurrentTime:
+            dueTime, segment = self._rx.pendingSegments.popleft()
+            self._rx.numberOfPendingBytes -= len(segment)
+            dueSegments.append(segment)
+        content = "".join(dueSegments)
+        if len(content) > self._rxBufferSize:
+            self.numberOfBytesOverrun += len(content) - self._rxBufferSize
+            self._log.debug("yunBridgeTransport input overrun, bytes lost: " + str(len(content) - self._rxBufferSize))
+            content = content[:self._rxBufferSize]
+        return content
+
+    def receive(self, srcTimeoutSecond):
+        # Input is read as soon as it comes in, and handed over once it is through the link
+        deadline = None if srcTimeoutSecond is None else time.time() + srcTimeoutSecond
+        while True:
+            currentTime = time.time()
+            with self._condition:
+                content = self._takeDueInput(currentTime)
+                if content != "":
+                    return content
+                if self._isInputClosed and len(self._rx.pendingSegments) == 0:
+                    return ""
+                timeoutSecond = None if deadline is None else deadline - currentTime
+                if len(self._rx.pendingSegments) != 0:
+                    dueSecond = self._rx.pendingSegments[0][0] - currentTime
+                    timeoutSecond = dueSecond if timeoutSecond is None else min(timeoutSecond, dueSecond)
+            if deadline is not None and currentTime >= deadline:
+                return None
+            if self._isInputClosed:
+                time.sleep(max(timeoutSecond, 0))
+                continue
+            content = serialTransport.receive(self, max(timeoutSecond, 0) if timeoutSecond is not None else None)
+            if content is None:
+                continue
+            with self._condition:
+                if content == "":
+                    self._isInputClosed = True
+                    continue
+                startTime = max(time.time(), self._rx.wireFreeTime)
+                self._putOnWire(self._rx, content, startTime, 0)
+                if not self._isRawMode:  # Echo goes out as the input comes in, full duplex
+                    self._tx.wireFreeTime = max(self._tx.wireFreeTime, startTime) + (len(content) + content.count("\n")) * self._byteSecond
+
+    def writeLine(self, srcContent):
+        self.write(srcContent + "\n")
+
+    def write(self, srcContent):
+        # Block while the output buffer is full
+        if isinstance(srcContent, unicode):
+            srcContent = srcContent.encode("utf-8")
+        with self._condition:
+            while self._tx.numberOfPendingBytes != 0 and self._tx.numberOfPendingBytes + len(srcContent) > self._txBufferSize:
+                self._condition.wait()
+            self._putOnWire(self._tx, srcContent, time.time(), 0 if self._isRawMode else 1)
+            self._condition.notifyAll()
+
+    def flush(self):
+        with self._condition:
+            while self._tx.numberOfPendingBytes != 0 or len(self._tx.pendingSegments) != 0:
+                self._condition.wait()
+        serialTransport.flush(self)
+
+    def setRawMode(self, srcRawMode):
+        serialTransport.setRawMode(self, srcRawMode)
+        self._isRawMode = srcRawMode
+
+    def _writeOnTime(self):
+        # Writer thread: send each segment once it is through the link
+        while True:
+            with self._condition:
+                while len(self._tx.pendingSegments) == 0:
+                    self._condition.wait()
+                dueTime = self._tx.pendingSegments[0][0]
+            waitSecond = dueTime - time.time()
+            if waitSecond > 0:
+                time.sleep(waitSecond)
+            with self._condition:
+                dueSegments = []
+                while len(self._tx.pendingSegments) != 0 and self._tx.pendingSegments[0][0] <= time.time():
+                    dueSegments.append(self._tx.pendingSegments.popleft()[1])
+            try:
+                serialTransport.write(self, "".join(dueSegments))
+            except (IOError, OSError) as e:
+                self._log.debug("yunBridgeTransport output failed: " + str(e))
+            with self._condition:
+                self._tx.numberOfPendingBytes -= sum(len(segment) for segment in dueSegments)
+                self._condition.notifyAll()
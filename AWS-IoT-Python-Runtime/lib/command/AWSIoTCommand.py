@@ -31,6 +31,10 @@ class AWSIoTCommand:
         else:
             return len(self._parameterList) == self._desiredNumberOfParameters
 
+    def setParameterList(self, srcParameterList):
+        # Reuse this command for a new protocol message
+        self._parameterList = srcParameterList
+
     def getCommandProtocolName(self):
         return self._commandProtocolName
 
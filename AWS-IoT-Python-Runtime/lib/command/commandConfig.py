@@ -22,12 +22,15 @@ class commandConfig(AWSIoTCommand.AWSIoTCommand):
     # Target API:
     # AWSIoTMQTTShadowClient.configureEndpoint(srcHost, srcPort)
     # AWSIoTMQTTShadowClient.configureCredentials(srcCAFile, srcKey, srcCert)
+    # Client session record is shared with the runtimeHub: "config" is the last configuration applied
+    # A client reused by a reattached sketch is already configured, with the same configuration it is left as it is
 
-    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowClient):
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowClient, srcClientSessionRecord):
         self._commandProtocolName = "g"
         self._parameterList = srcParameterList
         self._serialCommServerHandler = srcSerialCommuteServer
         self._shadowClientHandler = srcShadowClient
+        self._clientSessionRecord = srcClientSessionRecord
         self._desiredNumberOfParameters = 5
 
     def _validateCommand(self):
@@ -40,8 +43,10 @@ class commandConfig(AWSIoTCommand.AWSIoTCommand):
             returnMessage = "G1F: " + "No setup."
         else:
             try:
-                self._shadowClientHandler.configureEndpoint(self._parameterList[0], int(self._parameterList[1]))
-                self._shadowClientHandler.configureCredentials(self._parameterList[2], self._parameterList[3], self._parameterList[4])
+                if not (self._clientSessionRecord.get("isReused") and self._clientSessionRecord.get("config") == self._parameterList):
+                    self._shadowClientHandler.configureEndpoint(self._parameterList[0], int(self._parameterList[1]))
+                    self._shadowClientHandler.configureCredentials(self._parameterList[2], self._parameterList[3], self._parameterList[4])
+                    self._clientSessionRecord["config"] = list(self._parameterList)
             except TypeError as e:
                 returnMessage = "G2F: " + str(e.message)
             except Exception as e:
@@ -20,12 +20,15 @@ from ssl import SSLError
 
 class commandConnect(AWSIoTCommand.AWSIoTCommand):
     # Target API: AWSIoTMQTTShadowClient.connect(keepAliveInterval)
+    # Client session record is shared with the runtimeHub: "keepAlive" is kept while connected
+    # A client reused by a reattached sketch is already connected, with the same keepAlive it is not connected again
 
-    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowClient):
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowClient, srcClientSessionRecord):
         self._commandProtocolName = "c"
         self._parameterList = srcParameterList
         self._serialCommServerHandler = srcSerialCommuteServer
         self._shadowClientHandler = srcShadowClient
+        self._clientSessionRecord = srcClientSessionRecord
         self._desiredNumberOfParameters = 1
 
     def _validateCommand(self):
@@ -38,7 +41,11 @@ class commandConnect(AWSIoTCommand.AWSIoTCommand):
             returnMessage = "C1F: " + "No setup."
         else:
             try:
-                self._shadowClientHandler.connect(int(self._parameterList[0]))
+                keepAliveInterval = int(self._parameterList[0])
+                isConnected = self._clientSessionRecord.get("keepAlive") == keepAliveInterval
+                if not (self._clientSessionRecord.get("isReused") and isConnected):
+                    self._shadowClientHandler.connect(keepAliveInterval)
+                    self._clientSessionRecord["keepAlive"] = keepAliveInterval
             except TypeError as e:
                 returnMessage = "C2F: " + str(e.message)
             except SSLError as e:
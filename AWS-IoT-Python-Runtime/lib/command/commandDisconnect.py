@@ -19,12 +19,16 @@ import AWSIoTCommand
 
 class commandDisconnect(AWSIoTCommand.AWSIoTCommand):
     # Target API: AWSIoTMQTTShadowClient.disconnect()
+    # Client session record is shared with the runtimeHub: "keepAlive" is removed once disconnected
+    # Pending publish batches are sent out first, their publishes are already answered with "P T"
 
-    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowClient):
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowClient, srcClientSessionRecord, srcPublishBatcher=None):
         self._commandProtocolName = "d"
         self._parameterList = srcParameterList
         self._serialCommServerHandler = srcSerialCommuteServer
         self._shadowClientHandler = srcShadowClient
+        self._clientSessionRecord = srcClientSessionRecord
+        self._publishBatcherHandler = srcPublishBatcher
         self._desiredNumberOfParameters = 0
 
     def _validateCommand(self):
@@ -37,7 +41,10 @@ class commandDisconnect(AWSIoTCommand.AWSIoTCommand):
             returnMessage = "D1F: " + "No setup."
         else:
             try:
+                if self._publishBatcherHandler is not None:
+                    self._publishBatcherHandler.flushAll()
                 self._shadowClientHandler.disconnect()
+                self._clientSessionRecord.pop("keepAlive", None)
             except Exception as e:
                 returnMessage = "DFF: " + "Unknown error."
         self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
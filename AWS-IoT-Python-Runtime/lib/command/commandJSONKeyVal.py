@@ -35,20 +35,22 @@ class commandJSONKeyVal(AWSIoTCommand.AWSIoTCommand):
 
     def _formatValueIntoChunks(self, srcValue):
         # J <JSON Payload>
+        # Return a list of frames, each of which will be sent over serial as ONE chunk
         # Generate the meta data
         metaData = "J "
         # Get configured chunk size
         configuredChunkSize = self._serialCommuteServerHandler.getChunkSize()
         # Divide the payload into smaller chunks plus  meta data
         messageChunkSize = configuredChunkSize - len(metaData)
-        chunks = [metaData + srcValue[i:i + messageChunkSize] for i in range(0, len(srcValue), messageChunkSize)]
-        # Concat them together
-        return "".join(chunks)
+        return [metaData + srcValue[i:i + messageChunkSize] for i in range(0, len(srcValue), messageChunkSize)]
 
     def execute(self):
         returnMessage = "J T"  # Placeholder for a successful RPC
+        returnFrames = None
         if not self._validateCommand():
-            returnMessage = "J1F: No setup."
+            # Parameters may be missing, always answer so that the sketch does not wait for a timeout
+            if self._serialCommuteServerHandler is not None:
+                self._serialCommuteServerHandler.writeToInternalJSON(["J1F: No setup."])
         else:
             try:
                 # Check to see if this is the first get JSON command
@@ -56,11 +58,10 @@ class commandJSONKeyVal(AWSIoTCommand.AWSIoTCommand):
                     # If it is, load in a new JSON payload using the provided identifier/key information
                     JSONWanted = self._jsonManagerHandler.retrieveJSONByKey(self._parameterList[0])
                     if JSONWanted is not None:
-                        ValueWanted = self._jsonManagerHandler.getValueByKeyInJSON(JSONWanted, self._parameterList[1])
+                        ValueWanted = self._jsonManagerHandler.getValueByKeyInStoredJSON(self._parameterList[0], self._parameterList[1])
                         if ValueWanted is not None:
                             # Format the ValueWanted into chunks
-                            ValueWantedFormatted = self._formatValueIntoChunks(ValueWanted)
-                            returnMessage = ValueWantedFormatted
+                            returnFrames = self._formatValueIntoChunks(ValueWanted)
                         else:
                             returnMessage = "J3F: " + "No such key."
                         # If not, this is a chunk-wise communication from the previous JSON payload
@@ -69,5 +70,7 @@ class commandJSONKeyVal(AWSIoTCommand.AWSIoTCommand):
                         returnMessage = "J2F: " + "No such JSON identifier."
             except Exception:
                 returnMessage = "JFF: " + "Unknown error."
-        if self._parameterList[2] == '1':
-            self._serialCommuteServerHandler.writeToInternalJSON(returnMessage)
+            if self._parameterList[2] == '1':
+                if returnFrames is None:  # Error feedback goes out as ONE chunk
+                    returnFrames = [returnMessage]
+                self._serialCommuteServerHandler.writeToInternalJSON(returnFrames)
@@ -0,0 +1,83 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+from commandJSONKeyVal import commandJSONKeyVal
+
+
+class commandJSONMultiKeyVal(commandJSONKeyVal):
+    # Target API: getValuesByKeys(JSONIdentifier, keys, numberOfKeys, externalJSONBuf, bufSize, keyStatus)
+    # Parameter list: <JSONIdentifier> <isFirstLoad> <key1> ... <keyN>
+    # Keys are only needed when isFirstLoad is 1
+    # Values of all keys are sent back as ONE JSON payload of records, in the same order as the keys:
+    # <status><length>:<value>, status being T (found), N (no such key) or E (error), length in bytes
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcJSONManager):
+        self._commandProtocolName = "jm"
+        self._parameterList = srcParameterList
+        self._serialCommuteServerHandler = srcSerialCommuteServer
+        self._jsonManagerHandler = srcJSONManager
+        self._desiredNumberOfParameters = 2  # Minimum number of parameters
+
+    def _validateCommand(self):
+        ret = self._serialCommuteServerHandler is not None and self._parameterList is not None
+        if ret:
+            if self._isFirstLoad():
+                ret = len(self._parameterList) > self._desiredNumberOfParameters
+            else:
+                ret = len(self._parameterList) == self._desiredNumberOfParameters
+        return ret
+
+    def _isFirstLoad(self):
+        return len(self._parameterList) >= self._desiredNumberOfParameters and self._parameterList[1] == '1'
+
+    def _formatKeyRecord(self, srcKey):
+        # <status><length>:<value>
+        try:
+            value = self._jsonManagerHandler.getValueByKeyInStoredJSON(self._parameterList[0], srcKey)
+        except Exception:
+            return "E0:"
+        if value is None:
+            return "N0:"
+        else:
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            return "T" + str(len(value)) + ":" + value
+
+    def execute(self):
+        returnMessage = "J T"  # Placeholder for a successful RPC
+        returnFrames = None
+        isValid = self._validateCommand()
+        if not isValid:
+            returnMessage = "J1F: No setup."
+        else:
+            try:
+                # Check to see if this is the first get JSON command
+                if self._isFirstLoad():
+                    # If it is, look up all the keys in the JSON payload with the provided identifier
+                    if self._jsonManagerHandler.retrieveJSONByKey(self._parameterList[0]) is not None:
+                        records = [self._formatKeyRecord(key) for key in self._parameterList[2:]]
+                        returnFrames = self._formatValueIntoChunks("".join(records))
+                    else:
+                        returnMessage = "J2F: " + "No such JSON identifier."
+                # If not, this is a chunk-wise communication from the previous JSON payload
+                # Do nothing
+            except Exception:
+                returnMessage = "JFF: " + "Unknown error."
+        if not isValid or self._isFirstLoad():
+            if returnFrames is None:  # Error feedback goes out as ONE chunk
+                returnFrames = [returnMessage]
+            self._serialCommuteServerHandler.writeToInternalJSON(returnFrames)
@@ -19,12 +19,14 @@ import AWSIoTCommand
 
 class commandPublish(AWSIoTCommand.AWSIoTCommand):
     # Target API: AWSIoTMQTTClient.publish(topic, payload, qos)
+    # With publish batching enabled: publishBatcher.add(MQTTCore, topic, payload, qos), sent later as part of a batch
 
-    def __init__(self, srcParameterList, srcSerialCommuteServer, srcMQTTCore):
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcMQTTCore, srcPublishBatcher=None):
         self._commandProtocolName = "p"
         self._parameterList = srcParameterList
         self._serialCommServerHandler = srcSerialCommuteServer
         self._mqttCoreHandler = srcMQTTCore
+        self._publishBatcherHandler = srcPublishBatcher
         self._desiredNumberOfParameters = 4
 
     def _validateCommand(self):
@@ -38,7 +40,10 @@ class commandPublish(AWSIoTCommand.AWSIoTCommand):
         else:
             try:
                 # Retain flag is ignored
-                self._mqttCoreHandler.publish(self._parameterList[0], self._parameterList[1], int(self._parameterList[2]))
+                if self._publishBatcherHandler is not None and self._publishBatcherHandler.isEnabled():
+                    self._publishBatcherHandler.add(self._mqttCoreHandler, self._parameterList[0], self._parameterList[1], int(self._parameterList[2]))
+                else:
+                    self._mqttCoreHandler.publish(self._parameterList[0], self._parameterList[1], int(self._parameterList[2]))
             except TypeError as e:
                 returnMessage = "P2F: " + str(e.message)
             except Exception as e:
@@ -0,0 +1,53 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetConflation(AWSIoTCommand.AWSIoTCommand):
+    # Target API: serialCommunicationServer.configureYieldConflation(srcSketchSlotNumber, srcConflation)
+    # Parameter list: <topic> <conflation>
+    # Sketch slot is found by the topic of an MQTT subscription
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcMQTTSubscribeTable):
+        self._commandProtocolName = "yc"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._mqttSubscribeTable = srcMQTTSubscribeTable
+        self._desiredNumberOfParameters = 2
+
+    def _validateCommand(self):
+        ret = self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "YC T"
+        if not self._validateCommand():
+            returnMessage = "YC1F: " + "No setup."
+        else:
+            try:
+                thisSubscribeUnit = self._mqttSubscribeTable.get(self._parameterList[0])
+                if thisSubscribeUnit is None:
+                    raise ValueError("No subscription.")
+                self._serialCommServerHandler.configureYieldConflation(thisSubscribeUnit.getSketchSlotNumber(), int(self._parameterList[1]))
+            except TypeError as e:
+                returnMessage = "YC2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "YC3F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "YCFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
@@ -0,0 +1,51 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetDaemonMode(AWSIoTCommand.AWSIoTCommand):
+    # Target API: serialCommunicationServer.setDaemonMode(srcDaemonMode)
+    # Parameter list: <daemonMode>, 0 to exit the runtime after the accept timeout with no input, 1 to keep it running
+    # In daemon mode, the MQTT connection and subscriptions survive idle gaps and sketch resets
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer):
+        self._commandProtocolName = "dm"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._desiredNumberOfParameters = 1
+
+    def _validateCommand(self):
+        ret = self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "DM T"
+        if not self._validateCommand():
+            returnMessage = "DM1F: " + "No setup."
+        else:
+            try:
+                if self._parameterList[0] not in ["0", "1"]:
+                    raise ValueError("Daemon mode must be 0 or 1.")
+                self._serialCommServerHandler.setDaemonMode(self._parameterList[0] == "1")
+            except TypeError as e:
+                returnMessage = "DM2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "DM3F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "DMFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
@@ -0,0 +1,51 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetFramingMode(AWSIoTCommand.AWSIoTCommand):
+    # Target API: serialCommunicationServer.setFramedMode(srcFramedMode, srcReliableMode)
+    # Parameter list: <framingMode>, 0 for line protocol, 1 for framed mode, 2 for framed mode over reliable transport
+    # The reply to this command is still sent in the current mode, the new mode applies from the next command
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer):
+        self._commandProtocolName = "fm"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._desiredNumberOfParameters = 1
+
+    def _validateCommand(self):
+        ret = self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "FM T"
+        if not self._validateCommand():
+            returnMessage = "FM1F: " + "No setup."
+        else:
+            try:
+                if self._parameterList[0] not in ["0", "1", "2"]:
+                    raise ValueError("Framing mode must be 0, 1 or 2.")
+                self._serialCommServerHandler.setFramedMode(self._parameterList[0] != "0", self._parameterList[0] == "2")
+            except TypeError as e:
+                returnMessage = "FM2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "FM3F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "FMFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
@@ -0,0 +1,48 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetPublishBatchGroup(AWSIoTCommand.AWSIoTCommand):
+    # Target API: publishBatcher.configureTopicGroup(topicFilter, destinationTopic)
+    # Parameter list: <topicFilter> <destinationTopic>
+    # Empty destination topic removes the topic group
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcPublishBatcher):
+        self._commandProtocolName = "pg"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._publishBatcherHandler = srcPublishBatcher
+        self._desiredNumberOfParameters = 2
+
+    def _validateCommand(self):
+        ret = self._publishBatcherHandler is not None and self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "PG T"
+        if not self._validateCommand():
+            returnMessage = "PG1F: " + "No setup."
+        else:
+            try:
+                self._publishBatcherHandler.configureTopicGroup(self._parameterList[0], self._parameterList[1])
+            except TypeError as e:
+                returnMessage = "PG2F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "PGFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
@@ -0,0 +1,51 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetPublishBatching(AWSIoTCommand.AWSIoTCommand):
+    # Target API: publishBatcher.configure(windowMillisecond, byteLimit, format, sketchSlotNumber)
+    # Parameter list: <windowMillisecond> <byteLimit> <format> <sketchSlotNumber>
+    # Format: 0 for no batching, 1 for JSON array, 2 for newline-delimited JSON
+    # Flush status of each batch is delivered to the sketch slot through yield, -1 for none
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcPublishBatcher):
+        self._commandProtocolName = "pb"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._publishBatcherHandler = srcPublishBatcher
+        self._desiredNumberOfParameters = 4
+
+    def _validateCommand(self):
+        ret = self._publishBatcherHandler is not None and self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "PB T"
+        if not self._validateCommand():
+            returnMessage = "PB1F: " + "No setup."
+        else:
+            try:
+                self._publishBatcherHandler.configure(int(self._parameterList[0]), int(self._parameterList[1]), int(self._parameterList[2]), int(self._parameterList[3]))
+            except TypeError as e:
+                returnMessage = "PB2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "PB3F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "PBFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
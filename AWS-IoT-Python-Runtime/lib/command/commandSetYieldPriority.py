@@ -0,0 +1,58 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetYieldPriority(AWSIoTCommand.AWSIoTCommand):
+    # Target API: serialCommunicationServer.configureYieldSlot(srcSketchSlotNumber, srcPriority, srcWeight)
+    # Parameter list: <topic/deviceShadowName> <isShadowDelta> <priority> <weight>
+    # Sketch slot is found by the topic of an MQTT subscription, or by the deviceShadow name of a delta callback
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcMQTTSubscribeTable, srcShadowSubscribeRecord):
+        self._commandProtocolName = "yw"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._mqttSubscribeTable = srcMQTTSubscribeTable
+        self._shadowSubscribeRecord = srcShadowSubscribeRecord
+        self._desiredNumberOfParameters = 4
+
+    def _validateCommand(self):
+        ret = self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "YW T"
+        if not self._validateCommand():
+            returnMessage = "YW1F: " + "No setup."
+        else:
+            try:
+                if int(self._parameterList[1]) == 1:
+                    sketchSlotNumber = self._shadowSubscribeRecord.get(self._parameterList[0])
+                else:
+                    thisSubscribeUnit = self._mqttSubscribeTable.get(self._parameterList[0])
+                    sketchSlotNumber = None if thisSubscribeUnit is None else thisSubscribeUnit.getSketchSlotNumber()
+                if sketchSlotNumber is None:
+                    raise ValueError("No subscription.")
+                self._serialCommServerHandler.configureYieldSlot(sketchSlotNumber, int(self._parameterList[2]), int(self._parameterList[3]))
+            except TypeError as e:
+                returnMessage = "YW2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "YW3F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "YWFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
@@ -0,0 +1,48 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import AWSIoTCommand
+
+
+class commandSetYieldQueue(AWSIoTCommand.AWSIoTCommand):
+    # Target API: serialCommunicationServer.configureYieldQueue(srcMaxMessages, srcMaxBytes, srcSlotQuota, srcDropPolicy)
+    # Parameter list: <maxMessages> <maxBytes> <slotQuota> <dropPolicy>
+
+    def __init__(self, srcParameterList, srcSerialCommuteServer):
+        self._commandProtocolName = "yb"
+        self._parameterList = srcParameterList
+        self._serialCommServerHandler = srcSerialCommuteServer
+        self._desiredNumberOfParameters = 4
+
+    def _validateCommand(self):
+        ret = self._serialCommServerHandler is not None
+        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+
+    def execute(self):
+        returnMessage = "YB T"
+        if not self._validateCommand():
+            returnMessage = "YB1F: " + "No setup."
+        else:
+            try:
+                self._serialCommServerHandler.configureYieldQueue(int(self._parameterList[0]), int(self._parameterList[1]), int(self._parameterList[2]), int(self._parameterList[3]))
+            except TypeError as e:
+                returnMessage = "YB2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "YB3F: " + str(e.message)
+            except Exception as e:
+                returnMessage = "YBFF: " + "Unknown error."
+        self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
@@ -21,14 +21,14 @@ class commandShadowDelete(AWSIoTCommand.AWSIoTCommand):
     # Target API: deviceShadow.shadowDelete(srcCallback, srcTimeout)
     # Parameters: deviceShadowName, sketchSubscribeSlot, srcTimeout, callback
 
-    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowRegistrationTable, srcShadowSubscribeRecord):
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowRegistrationTable, srcShadowRequestTable):
         self._commandProtocolName = "sd"
         self._parameterList = srcParameterList
         self._serialCommServerHandler = srcSerialCommuteServer
         # To get the corresponding registered deviceShadow instance
         self._shadowRegistrationTable = srcShadowRegistrationTable
-        # To get update the sketch slot information
-        self._shadowSubscribeRecord = srcShadowSubscribeRecord
+        # To register the sketch slot information for this request
+        self._shadowRequestTable = srcShadowRequestTable
         self._desiredNumberOfParameters = 4
 
     def _validateCommand(self):
@@ -46,11 +46,12 @@ class commandShadowDelete(AWSIoTCommand.AWSIoTCommand):
         else:
             try:
                 currentDeviceShadow = self._shadowRegistrationTable.get(self._parameterList[0])  # By this time, currentDeviceShadow should never be None
+                sketchSlotNumber = int(self._parameterList[1])
                 # Real shadow delete
                 tokenForThisRequest = currentDeviceShadow.shadowDelete(self._parameterList[3], int(self._parameterList[2]))
-                # Update sketch subscribe slot number
-                self._shadowSubscribeRecord[tokenForThisRequest] = int(self._parameterList[1])
-                # A waiting will be performed in the callback to wait until the data structure is ready for device shadow name registration
+                # Register sketch subscribe slot number
+                # A response that already came back for this token will be delivered now
+                self._shadowRequestTable.registerRequest(tokenForThisRequest, sketchSlotNumber)
             except TypeError as e:
                 returnMessage = "SD2F: " + str(e.message)
             except Exception as e:
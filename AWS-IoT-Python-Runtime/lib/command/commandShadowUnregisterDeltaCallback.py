@@ -49,8 +49,8 @@ class commandShadowUnregisterDeltaCallback(AWSIoTCommand.AWSIoTCommand):
                 currentDeviceShadow = self._shadowRegistrationTable.get(self._parameterList[0])  # By this time, currentDeviceShadow should never be None
                 # Real shadow unregister delta callback
                 currentDeviceShadow.shadowUnregisterDeltaCallback()
-                # Update sketch subscribe slot number, using deviceShadow name
-                del self._shadowSubscribeRecord[self._parameterList[0]]
+                # Update sketch subscribe slot number, using deviceShadow name, the freed slot gets the default yield priority
+                self._serialCommServerHandler.resetYieldSlot(self._shadowSubscribeRecord.pop(self._parameterList[0]))
             except TypeError as e:
                 returnMessage = "S_UD2F: " + str(e.message)
             except Exception as e:
@@ -21,14 +21,14 @@ class commandShadowUpdate(AWSIoTCommand.AWSIoTCommand):
     # Target API: deviceShadow.shadowUpdate(srcJSONPayload, srcCallback, srcTimeout)
     # Parameters: deviceShadowName, JSONPayload, sketchSubscribeSlot, srcTimeout, callback
 
-    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowRegistrationTable, srcShadowSubscribeRecord):
+    def __init__(self, srcParameterList, srcSerialCommuteServer, srcShadowRegistrationTable, srcShadowRequestTable):
         self._commandProtocolName = "su"
         self._parameterList = srcParameterList
         self._serialCommServerHandler = srcSerialCommuteServer
         # To get the corresponding registered deviceShadow instance
         self._shadowRegistrationTable = srcShadowRegistrationTable
-        # To get update the sketch slot information
-        self._shadowSubscribeRecord = srcShadowSubscribeRecord
+        # To register the sketch slot information for this request
+        self._shadowRequestTable = srcShadowRequestTable
         self._desiredNumberOfParameters = 5
 
     def _validateCommand(self):
@@ -46,11 +46,12 @@ class commandShadowUpdate(AWSIoTCommand.AWSIoTCommand):
         else:
             try:
                 currentDeviceShadow = self._shadowRegistrationTable.get(self._parameterList[0])  # By this time, currentDeviceShadow should never be None
+                sketchSlotNumber = int(self._parameterList[2])
                 # Real shadow update
                 tokenForThisRequest = currentDeviceShadow.shadowUpdate(self._parameterList[1], self._parameterList[4], int(self._parameterList[3]))
-                # Update sketch subscribe slot number
-                self._shadowSubscribeRecord[tokenForThisRequest] = int(self._parameterList[2])
-                # A waiting will be performed in the callback to wait until the data structure is ready for device shadow name registration
+                # Register sketch subscribe slot number
+                # A response that already came back for this token will be delivered now
+                self._shadowRequestTable.registerRequest(tokenForThisRequest, sketchSlotNumber)
             except TypeError as e:
                 returnMessage = "SU2F: " + str(e.message)
             except ValueError as e:
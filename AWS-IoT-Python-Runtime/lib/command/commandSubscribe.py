@@ -19,7 +19,9 @@ import AWSIoTCommand
 
 class commandSubscribe(AWSIoTCommand.AWSIoTCommand):
     # Target API: AWSIoTMQTTClient.subscribe(topic, qos, callback)
-    # Parameter list: <topic> <qos> <ino_id> <mqttSubscribeUnit>
+    # Parameter list: <topic> <qos> <ino_id> [<filter> [<projectionFormat> <key1> ... <keyN>]] <mqttSubscribeUnit>
+    # Optional filter is compiled on subscribe, see messageFilter, empty for none
+    # Optional projection is compiled on subscribe, see jsonProjection
 
     def __init__(self, srcParameterList, srcSerialCommuteServer, srcMQTTCore, srcMQTTSubscribeTable):
         self._commandProtocolName = "s"
@@ -32,7 +34,10 @@ class commandSubscribe(AWSIoTCommand.AWSIoTCommand):
 
     def _validateCommand(self):
         ret = self._mqttCoreHandler is not None and self._serialCommServerHandler is not None
-        return ret and AWSIoTCommand.AWSIoTCommand._validateCommand(self)
+        if ret and self._parameterList is not None:
+            numberOfParameters = len(self._parameterList)
+            return numberOfParameters in [self._desiredNumberOfParameters, self._desiredNumberOfParameters + 1] or numberOfParameters > self._desiredNumberOfParameters + 2
+        return False
 
     def execute(self):
         returnMessage = "S T"
@@ -41,9 +46,13 @@ class commandSubscribe(AWSIoTCommand.AWSIoTCommand):
         else:
             try:
                 # Init the mqttSubscribeUnit
-                self._mqttSubscribeUnit = self._parameterList[3]
+                self._mqttSubscribeUnit = self._parameterList[-1]
                 self._mqttSubscribeUnit.setTopicName(self._parameterList[0])
                 self._mqttSubscribeUnit.setSketchSlotNumber(int(self._parameterList[2]))
+                if len(self._parameterList) > self._desiredNumberOfParameters:
+                    self._mqttSubscribeUnit.setMessageFilter(self._parameterList[3])
+                if len(self._parameterList) > self._desiredNumberOfParameters + 2:
+                    self._mqttSubscribeUnit.setProjection(int(self._parameterList[4]), self._parameterList[5:-1])
                 self._mqttSubscribeUnit.setSerialCommunicationServerHub(self._serialCommServerHandler)
                 # Real subscription
                 self._mqttCoreHandler.subscribe(self._parameterList[0], int(self._parameterList[1]), self._mqttSubscribeUnit.individualCallback)
@@ -51,6 +60,8 @@ class commandSubscribe(AWSIoTCommand.AWSIoTCommand):
                 self._mqttSubscribeTable[self._parameterList[0]] = self._mqttSubscribeUnit
             except TypeError as e:
                 returnMessage = "S2F: " + str(e.message)
+            except ValueError as e:
+                returnMessage = "S2F: " + str(e.message)
             except Exception as e:
                 returnMessage = "SFF: " + "Unknown error."
         self._serialCommServerHandler.writeToInternalProtocol(returnMessage)
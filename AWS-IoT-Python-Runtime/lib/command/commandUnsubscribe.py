@@ -45,6 +45,8 @@ class commandUnsubscribe(AWSIoTCommand.AWSIoTCommand):
                 self._mqttCoreHandler.unsubscribe(self._parameterList[0])
                 # Update mqttSubscribeTable
                 del self._mqttSubscribeTable[self._parameterList[0]]
+                # The sketch slot is free, back to the default yield priority
+                self._serialCommServerHandler.resetYieldSlot(thisSubscribeUnit.getSketchSlotNumber())
             except KeyError as e:
                 pass  # Ignore unsubscribe to a topic that never been subscribed
             except TypeError as e:
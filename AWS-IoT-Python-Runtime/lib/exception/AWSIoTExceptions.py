@@ -24,3 +24,7 @@ class acceptTimeoutException(Exception):
     def __init__(self, msg="Accept Timeout"):
         self.message = msg
 
+
+class frameTimeoutException(Exception):
+    def __init__(self, msg="Frame Timeout"):
+        self.message = msg
@@ -0,0 +1,79 @@
+import mmap
+from collections import OrderedDict
+from threading import Lock
+
+
+class jsonFileStore:
+    # This is the file backend for jsonManager to keep the JSON history out of the Python heap
+    # JSON payloads are appended one after another into a memory-mapped file of fixed size, used as a ring
+    # When the end of the file is reached, writing starts over from the beginning of the file
+    # The oldest entries in the way of a new entry are dropped to reuse their space
+    # Only the index of the entries stays on the heap: key -> (offset, length) in the file, oldest first
+    # Raise ValueError on init if the file size is invalid
+
+    def __init__(self, srcFilePath, srcFileSize):
+        if srcFileSize <= 0:
+            raise ValueError('File size too small.')
+        self._fileSize = srcFileSize
+        self._file = open(srcFilePath, "w+b")
+        self._file.truncate(self._fileSize)
+        self._map = mmap.mmap(self._file.fileno(), self._fileSize)
+        self._index = OrderedDict()
+        self._indexLock = Lock()  # Entries are stored from SDK threads and retrieved from the main thread
+        self._writeOffset = 0
+
+    def _dropOldest(self):
+        # Drop the oldest entry and return its key
+        return self._index.popitem(last=False)[0]
+
+    def _isOldestAt(self, srcOffset, srcEndOffset):
+        # Check if the oldest entry starts within [srcOffset, srcEndOffset)
+        if len(self._index) == 0:
+            return False
+        oldestOffset = next(iter(self._index.values()))[0]
+        return srcOffset <= oldestOffset < srcEndOffset
+
+    def store(self, srcKey, srcJSONPayload):
+        # Append the JSON payload with this key into the file
+        # Return the list of keys of the entries dropped to get the space
+        # JSON payload that is larger than the file will not be stored
+        if isinstance(srcJSONPayload, unicode):
+            srcJSONPayload = srcJSONPayload.encode("utf-8")
+        droppedKeys = list()
+        payloadLength = len(srcJSONPayload)
+        self._indexLock.acquire()
+        self._index.pop(srcKey, None)
+        if payloadLength > self._fileSize:
+            self._indexLock.release()
+            return droppedKeys
+        # Entries are laid out in the order they come in, so the oldest one is always the next in the way
+        if self._writeOffset + payloadLength > self._fileSize:
+            while self._isOldestAt(self._writeOffset, self._fileSize):  # Tail of the file is skipped
+                droppedKeys.append(self._dropOldest())
+            self._writeOffset = 0
+        while self._isOldestAt(self._writeOffset, self._writeOffset + payloadLength):
+            droppedKeys.append(self._dropOldest())
+        self._map[self._writeOffset:self._writeOffset + payloadLength] = srcJSONPayload
+        self._index[srcKey] = (self._writeOffset, payloadLength)
+        self._writeOffset += payloadLength
+        self._indexLock.release()
+        return droppedKeys
+
+    def retrieve(self, srcKey):
+        # Get the JSON payload by key
+        # If key is not present, None will be returned
+        self._indexLock.acquire()
+        location = self._index.get(srcKey)
+        if location is None:
+            JSONPayload = None
+        else:
+            JSONPayload = self._map[location[0]:location[0] + location[1]]
+        self._indexLock.release()
+        return JSONPayload
+
+    def getNumberOfEntries(self):
+        return len(self._index)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
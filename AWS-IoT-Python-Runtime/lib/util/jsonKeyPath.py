@@ -0,0 +1,105 @@
+class jsonKeyPath:
+    # This is the compiled form of a key path used to retrieve a value in a JSON document
+    # Key path grammar:
+    # - Nested keys are separated by '"', empty keys are skipped, each key is taken as it is: state"reported"firmware.version
+    # - A part between '"' that starts with '$.' or '$[' is an extended key path, '$' being the value reached so far:
+    #   state"reported"$.sensors[3].value or $.state.reported.sensors[3].value
+    # Extended key path grammar, used for the whole key path if compiled as extended (e.g. for filters), '$' prefix optional:
+    # - Nested keys are separated by '"' or '.', empty keys are skipped: state.desired.property
+    # - [n] indexes an array, negative index counts from the end: state.reported.sensors[3].value
+    # - A '*' key or [*] matches all the values in an object/array: state.reported.sensors[*].value
+    # - '\' escapes the next character so that it is taken as part of a key: property\.with\.dots
+    # A key path is tokenized once on compile. Evaluation is a walk on the parsed JSON document
+    # Raise ValueError on compile if the key path is malformed
+    _TYPE_KEY = 0
+    _TYPE_INDEX = 1
+    _TYPE_WILDCARD = 2
+    _separators = '".['
+
+    def __init__(self, srcKeyPath, srcIsExtended=False):
+        self._steps = []
+        self._hasWildcard = False
+        if srcIsExtended:
+            self._compileExtended(self._stripRoot(srcKeyPath))
+        else:
+            self._compile(srcKeyPath)
+
+    def _stripRoot(self, srcKeyPath):
+        # Extended key path without its '$' prefix, if any
+        if srcKeyPath == "$" or srcKeyPath.startswith("$.") or srcKeyPath.startswith("$["):
+            return srcKeyPath[1:]
+        return srcKeyPath
+
+    def _addKeyStep(self, srcKeyChars):
+        if len(srcKeyChars) != 0:
+            self._steps.append((self._TYPE_KEY, "".join(srcKeyChars)))
+
+    def _compile(self, srcKeyPath):
+        for keyPart in srcKeyPath.split('"'):
+            if keyPart.startswith("$.") or keyPart.startswith("$["):
+                self._compileExtended(keyPart[1:])
+            else:
+                self._addKeyStep(keyPart)
+
+    def _compileExtended(self, srcKeyPath):
+        currentKeyChars = []
+        i = 0
+        pathLength = len(srcKeyPath)
+        while i < pathLength:
+            currentChar = srcKeyPath[i]
+            if currentChar == '\\' and i + 1 < pathLength:  # Escaped character
+                i += 1
+                currentKeyChars.append(srcKeyPath[i])
+            elif currentChar == '"' or currentChar == '.':  # End of a key
+                self._addKeyStep(currentKeyChars)
+                currentKeyChars = []
+            elif currentChar == '[':  # Array index or wildcard
+                self._addKeyStep(currentKeyChars)
+                currentKeyChars = []
+                indexEnd = srcKeyPath.find(']', i)
+                if indexEnd == -1:
+                    raise ValueError("Unclosed '[' in key path.")
+                indexContent = srcKeyPath[i + 1:indexEnd].strip()
+                if indexContent == '*':
+                    self._steps.append((self._TYPE_WILDCARD, None))
+                    self._hasWildcard = True
+                else:
+                    self._steps.append((self._TYPE_INDEX, int(indexContent)))
+                i = indexEnd
+            elif currentChar == '*' and len(currentKeyChars) == 0 and (i + 1 == pathLength or srcKeyPath[i + 1] in self._separators):
+                self._steps.append((self._TYPE_WILDCARD, None))
+                self._hasWildcard = True
+            else:
+                currentKeyChars.append(currentChar)
+            i += 1
+        self._addKeyStep(currentKeyChars)
+
+    def hasWildcard(self):
+        return self._hasWildcard
+
+    def evaluate(self, parsedJSON):
+        # Get the value at this key path in the parsed JSON document
+        # If the key path is not present, None will be returned
+        # If the key path has wildcards, a list of all the values matched will be returned
+        currentNodes = [parsedJSON]
+        for stepType, stepValue in self._steps:
+            nextNodes = []
+            for node in currentNodes:
+                if stepType == self._TYPE_KEY:
+                    if isinstance(node, dict) and stepValue in node:
+                        nextNodes.append(node[stepValue])
+                elif stepType == self._TYPE_INDEX:
+                    if isinstance(node, list) and -len(node) <= stepValue < len(node):
+                        nextNodes.append(node[stepValue])
+                else:
+                    if isinstance(node, dict):
+                        nextNodes.extend(node.values())
+                    elif isinstance(node, list):
+                        nextNodes.extend(node)
+            if len(nextNodes) == 0:
+                return None
+            currentNodes = nextNodes
+        if self._hasWildcard:
+            return currentNodes
+        else:
+            return currentNodes[0]
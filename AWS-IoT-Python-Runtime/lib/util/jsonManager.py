@@ -1,93 +1,195 @@
 import json
+from collections import OrderedDict
+from threading import Lock
+from jsonKeyPath import jsonKeyPath
 
 
 class jsonManager:
     # This is the JSON Manager that stores all the complete JSON payload
     # JSON payload can be accessed by keys provided when inserting them
-    # History limits can be configured to control the memory consumption
+    # Accepted/rejected/delta JSON payloads are kept in their own ring buffer, each with its own history limit
     # For those entries that are exceeding the history limit, they will be overwritten
+    # A total byte budget on all the JSON payloads can be set. Oldest entries are dropped to stay within it
+    # Optionally, JSON payloads can be kept in a history store (jsonFileStore) instead of the Python heap
+    # In that case, the history store decides which entries to drop and the byte budget does not apply
+    # Keys are interleaved by type: JSON-0, JSON-3, ... for accepted, JSON-1, JSON-4, ... for rejected
+    # and JSON-2, JSON-5, ... for delta, so the ring buffer slot of a key is known without any lookup
+    # Parsed forms of the most recently accessed entries are cached so that repeated key lookups skip json.loads
     _prefix = "JSON-"
+    _typeIndices = {'accepted': 0, 'rejected': 1}  # Anything else is delta
+    _numberOfTypes = 3
+    _parsedCacheLimits = 8
+    # Key paths are compiled once and cached by key string
+    _compiledKeyPathLimits = 64
 
-    def __init__(self, srcHistoryLimits):
-        self._records = dict()
-        self._historyLimits = srcHistoryLimits  # 0 means unlimited history
-        self._internalCountAccepted = -3
-        self._internalCountRejected = -2
-        self._internalCountDelta = -1
-        # If there is a restriction on JSON history length,
-        # initialize these items with None value
-        if self._historyLimits >= 3:  # Limited dict
-            for i in range(0, self._historyLimits):
-                self._records[self._prefix + str(i)] = None
-        elif self._historyLimits == 0:  # Unlimited dict
-            pass
-        else:  # Invalid JSON history length, negative
-            raise ValueError('History limits too small.')
-        # Set limits for accepted/rejected/delta JSON
-        if self._historyLimits % 3 == 0:
-            self._acceptedHistoryLimits = self._historyLimits - 3
-            self._rejectedHistoryLimits = self._historyLimits - 2
-            self._deltaHistoryLimits = self._historyLimits - 1
-        elif self._historyLimits % 3 == 1:
-            self._acceptedHistoryLimits = self._historyLimits - 1
-            self._rejectedHistoryLimits = self._historyLimits - 3
-            self._deltaHistoryLimits = self._historyLimits - 2
-        else:
-            self._acceptedHistoryLimits = self._historyLimits - 2
-            self._rejectedHistoryLimits = self._historyLimits - 1
-            self._deltaHistoryLimits = self._historyLimits - 3
+    def __init__(self, srcAcceptedHistoryLimits, srcRejectedHistoryLimits, srcDeltaHistoryLimits, srcHistoryByteBudget=0, srcHistoryStore=None):
+        # 0 means unlimited history/byte budget
+        self._historyLimits = [srcAcceptedHistoryLimits, srcRejectedHistoryLimits, srcDeltaHistoryLimits]
+        for historyLimits in self._historyLimits:
+            if historyLimits < 0:  # Invalid JSON history length, negative
+                raise ValueError('History limits too small.')
+        if srcHistoryByteBudget < 0:
+            raise ValueError('History byte budget too small.')
+        self._historyByteBudget = srcHistoryByteBudget
+        self._historyStore = srcHistoryStore
+        # Ring buffers grow as new entries come in, up to their history limits
+        self._historyRings = [[] for i in range(0, self._numberOfTypes)]
+        self._historyRingCursors = [0] * self._numberOfTypes  # Next slot to write for each type
+        self._historyAges = OrderedDict()  # key -> size of the JSON payload, oldest first
+        self._historyBytes = 0
+        self._parsedRecords = OrderedDict()  # key -> (JSON payload, parsed JSON), least recently used first
+        self._parsedRecordsLock = Lock()  # Entries are stored from SDK threads and retrieved from the main thread
+        self._compiledKeyPaths = dict()  # key string -> jsonKeyPath
+
+    def _locateKey(self, key):
+        # Get the (type index, slot) of this key
+        # If the key is not a valid JSON identifier, None will be returned
+        if key is None or not key.startswith(self._prefix):
+            return None
+        keyNumber = key[len(self._prefix):]
+        if not keyNumber.isdigit():
+            return None
+        slot, typeIndex = divmod(int(keyNumber), self._numberOfTypes)
+        return typeIndex, slot
+
+    def _dropEntry(self, key):
+        # Remove the entry with this key from the ring buffer, the age records and the parsed cache
+        typeIndex, slot = self._locateKey(key)
+        self._historyRings[typeIndex][slot] = None
+        self._historyBytes -= self._historyAges.pop(key)
+        self._parsedRecordsLock.acquire()
+        self._parsedRecords.pop(key, None)
+        self._parsedRecordsLock.release()
 
     def storeNewJSON(self, JSONPayload, Type):
-        # Store a new JSON entry into the dictonary
+        # Store a new JSON entry into the ring buffer of its type
         # Return the key to access this JSON payload
         if JSONPayload == "REQUEST TIME OUT":
             return "JSON-X"
         else:
-            tempCount = -1
-            if Type == 'accepted':
-                if self._historyLimits != 0 and self._internalCountAccepted >= self._acceptedHistoryLimits:
-                    self._internalCountAccepted = 0
-                else:
-                    self._internalCountAccepted += 3
-                tempCount = self._internalCountAccepted
-            elif Type == 'rejected':
-                if self._historyLimits != 0 and self._internalCountRejected >= self._rejectedHistoryLimits:
-                    self._internalCountRejected = 1
-                else:
-                    self._internalCountRejected += 3
-                tempCount = self._internalCountRejected
-            else:
-                if self._historyLimits != 0 and self._internalCountDelta >= self._deltaHistoryLimits:
-                    self._internalCountDelta = 2
-                else:
-                    self._internalCountDelta += 3
-                tempCount = self._internalCountDelta
+            typeIndex = self._typeIndices.get(Type, 2)
+            if self._historyStore is not None:
+                return self._storeNewJSONInHistoryStore(JSONPayload, typeIndex)
+            currRing = self._historyRings[typeIndex]
+            currSlot = self._historyRingCursors[typeIndex]
             # Format key
-            currKey = self._prefix + str(tempCount)
-            # Insert the key-value
-            self._records[currKey] = JSONPayload
+            currKey = self._prefix + str(currSlot * self._numberOfTypes + typeIndex)
+            # Insert the key-value, dropping the overwritten entry
+            if currSlot < len(currRing):
+                if currRing[currSlot] is not None:
+                    self._dropEntry(currKey)
+                currRing[currSlot] = JSONPayload
+            else:
+                currRing.append(JSONPayload)
+            self._historyAges[currKey] = len(JSONPayload)
+            self._historyBytes += len(JSONPayload)
+            # Move on to the next slot, wrap around on history limit
+            currSlot += 1
+            if currSlot == self._historyLimits[typeIndex]:
+                currSlot = 0
+            self._historyRingCursors[typeIndex] = currSlot
+            # Drop the oldest entries until the byte budget is met, the new entry is always kept
+            if self._historyByteBudget != 0:
+                while self._historyBytes > self._historyByteBudget and len(self._historyAges) > 1:
+                    self._dropEntry(next(iter(self._historyAges)))
             # Return the assigned key
             return currKey
 
+    def _storeNewJSONInHistoryStore(self, JSONPayload, typeIndex):
+        # Store a new JSON entry into the history store, only the cursor of the ring buffer of its type is used
+        # Return the key to access this JSON payload
+        currSlot = self._historyRingCursors[typeIndex]
+        currKey = self._prefix + str(currSlot * self._numberOfTypes + typeIndex)
+        droppedKeys = self._historyStore.store(currKey, JSONPayload)
+        currSlot += 1
+        if currSlot == self._historyLimits[typeIndex]:
+            currSlot = 0
+        self._historyRingCursors[typeIndex] = currSlot
+        # Drop the parsed forms of the overwritten/dropped entries
+        self._parsedRecordsLock.acquire()
+        self._parsedRecords.pop(currKey, None)
+        for droppedKey in droppedKeys:
+            self._parsedRecords.pop(droppedKey, None)
+        self._parsedRecordsLock.release()
+        return currKey
+
+    def getHistoryBytes(self):
+        # Size of the JSON payloads kept on the Python heap
+        return self._historyBytes
+
+    def getNumberOfHistoryEntries(self):
+        if self._historyStore is not None:
+            return self._historyStore.getNumberOfEntries()
+        else:
+            return len(self._historyAges)
+
     def retrieveJSONByKey(self, key):
         # Get the JSON payload by key
         # If key is not present, None will be returned
-        return self._records.get(key)
+        if self._historyStore is not None:
+            return self._historyStore.retrieve(key)
+        location = self._locateKey(key)
+        if location is None:
+            return None
+        typeIndex, slot = location
+        currRing = self._historyRings[typeIndex]
+        if slot < len(currRing):
+            return currRing[slot]
+        else:
+            return None
+
+    def retrieveParsedJSONByKey(self, key):
+        # Get the parsed JSON payload by key, parse it on the first access
+        # If key is not present, None will be returned
+        # Raise ValueError if the JSON payload is invalid
+        JSONPayload = self.retrieveJSONByKey(key)
+        if JSONPayload is None:
+            return None
+        self._parsedRecordsLock.acquire()
+        cachedRecord = self._parsedRecords.pop(key, None)
+        self._parsedRecordsLock.release()
+        if cachedRecord is None or cachedRecord[0] != JSONPayload:  # Not cached or stale
+            cachedRecord = (JSONPayload, json.loads(JSONPayload))
+        self._parsedRecordsLock.acquire()
+        self._parsedRecords[key] = cachedRecord  # Now the most recently used
+        if len(self._parsedRecords) > self._parsedCacheLimits:
+            self._parsedRecords.popitem(last=False)
+        self._parsedRecordsLock.release()
+        return cachedRecord[1]
+
+    def getValueByKeyInStoredJSON(self, JSONIdentifier, key):
+        # Get the value using the key in the stored JSON with this identifier
+        # If JSON identifier/key is not present/Invalid JSON input detected, None will be returned
+        try:
+            return self._getValueByKeyInParsedJSON(self.retrieveParsedJSONByKey(JSONIdentifier), key)
+        except ValueError:
+            return None
 
     def getValueByKeyInJSON(self, JSONPayload, key):
         # Get the value using the key in JSON
         # If key is not present/Invalid JSON input detected, None will be returned
-        # ***Need to work on property that contains ':'
         try:
-            levels = key.split('"')
-            tempDict = json.loads(JSONPayload)
-            returnValue = tempDict
-            for i in range(0, len(levels)):
-                if levels[i] != '':
-                    if returnValue is not None:
-                        returnValue = returnValue.get(levels[i])
-                    else:
-                        break
+            return self._getValueByKeyInParsedJSON(json.loads(JSONPayload), key)
+        except ValueError:
+            return None
+
+    def _compileKeyPath(self, key):
+        # Get the compiled key path from the cache, compile it if it is not there
+        # Raise ValueError if the key path is malformed
+        compiledKeyPath = self._compiledKeyPaths.get(key)
+        if compiledKeyPath is None:
+            compiledKeyPath = jsonKeyPath(key)
+            if len(self._compiledKeyPaths) >= self._compiledKeyPathLimits:
+                self._compiledKeyPaths.clear()
+            self._compiledKeyPaths[key] = compiledKeyPath
+        return compiledKeyPath
+
+    def _getValueByKeyInParsedJSON(self, parsedJSON, key):
+        # Key path grammar is described in jsonKeyPath
+        if parsedJSON is None:
+            return None
+        else:
+            returnValue = self._compileKeyPath(key).evaluate(parsedJSON)
             if returnValue is None:
                 return None
             else:
@@ -95,5 +197,3 @@ class jsonManager:
                     return returnValue
                 else:
                     return json.dumps(returnValue)
-        except ValueError:
-            return None
@@ -0,0 +1,38 @@
+import json
+from collections import OrderedDict
+from jsonKeyPath import jsonKeyPath
+
+
+class jsonProjection:
+    # This is the projection of subscribed JSON payloads onto a list of key paths, to forward only the fields needed
+    # formatObject: compact JSON object, keyed by the key paths as given and in the same order, fields not present are left out
+    # formatList: compact JSON array of the values, in the same order as the key paths, null for fields not present
+    # Key paths follow the extended grammar of jsonKeyPath, with wildcards the value is the list of all the values matched
+    # Payloads that are not valid JSON are forwarded as they are
+    # Key paths are compiled once on subscribe. Raise ValueError on compile if a key path is malformed
+    formatObject = 0
+    formatList = 1
+    _compactSeparators = (",", ":")
+
+    def __init__(self, srcFormat, srcKeyPaths):
+        if srcFormat not in [self.formatObject, self.formatList]:
+            raise ValueError("Invalid projection format.")
+        if len(srcKeyPaths) == 0:
+            raise ValueError("No key paths to project.")
+        self._format = srcFormat
+        self._keyPaths = [(keyPath, jsonKeyPath(keyPath, True)) for keyPath in srcKeyPaths]
+
+    def project(self, srcPayload, srcParsedJSON):
+        # Return the projected payload
+        # srcParsedJSON is the payload parsed as JSON, None if it is not valid JSON
+        if srcParsedJSON is None:
+            return srcPayload
+        if self._format == self.formatList:
+            projectedJSON = [compiledKeyPath.evaluate(srcParsedJSON) for keyPath, compiledKeyPath in self._keyPaths]
+        else:
+            projectedJSON = OrderedDict()
+            for keyPath, compiledKeyPath in self._keyPaths:
+                value = compiledKeyPath.evaluate(srcParsedJSON)
+                if value is not None:
+                    projectedJSON[keyPath] = value
+        return json.dumps(projectedJSON, separators=self._compactSeparators)
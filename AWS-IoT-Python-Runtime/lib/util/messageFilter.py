@@ -0,0 +1,94 @@
+import json
+import re
+from jsonKeyPath import jsonKeyPath
+
+
+class messageFilter:
+    # This is the compiled form of a content filter on the payload of subscribed messages
+    # Filter grammar, clauses joined by " && " must all match:
+    # - <keyPath> <op> <value>: compare a field of a JSON payload, op is one of ==, !=, <, <=, >, >=
+    #   value is JSON (number, "string", true, false), or taken as a plain string if it is not valid JSON
+    #   <, <=, >, >= are thresholds, for numbers compared to numbers and strings compared to strings only
+    # - <keyPath> ~ <regex>: search a regular expression in a field of a JSON payload, converted to a string
+    # - ~ <regex>: search a regular expression in the whole payload
+    # Key paths follow the extended grammar of jsonKeyPath. With wildcards in the key path, the clause matches if any of the values does
+    # Payloads that are not valid JSON, or without the field, never match field clauses
+    # A filter is compiled once on subscribe. Raise ValueError on compile if the filter is malformed
+    _comparators = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b
+    }
+
+    def __init__(self, srcFilter):
+        self._clauses = []  # (jsonKeyPath or None for the whole payload, op, value or compiled regex)
+        self._needsJSON = False
+        self._compile(srcFilter)
+
+    def _compile(self, srcFilter):
+        for clause in srcFilter.split(" && "):
+            clause = clause.strip()
+            if clause.startswith("~"):
+                self._clauses.append((None, "~", self._compileRegex(clause[1:].strip())))
+                continue
+            fragments = clause.split(None, 2)
+            if len(fragments) != 3:
+                raise ValueError("Malformed filter clause: " + clause)
+            keyPath = jsonKeyPath(fragments[0], True)
+            if fragments[1] == "~":
+                self._clauses.append((keyPath, "~", self._compileRegex(fragments[2])))
+            elif fragments[1] in self._comparators:
+                try:
+                    value = json.loads(fragments[2])
+                except ValueError:
+                    value = fragments[2]
+                self._clauses.append((keyPath, fragments[1], value))
+            else:
+                raise ValueError("Unknown filter operator: " + fragments[1])
+            self._needsJSON = True
+
+    def _compileRegex(self, srcRegex):
+        try:
+            return re.compile(srcRegex)
+        except re.error as e:
+            raise ValueError("Malformed regex: " + str(e))
+
+    def _isNumber(self, srcValue):
+        return isinstance(srcValue, (int, long, float)) and not isinstance(srcValue, bool)
+
+    def _isValueMatched(self, srcOp, srcOperand, srcValue):
+        if srcOp == "~":
+            text = srcValue if isinstance(srcValue, basestring) else json.dumps(srcValue)
+            return srcOperand.search(text) is not None
+        if srcOp not in ["==", "!="]:  # Thresholds only make sense between numbers, or between strings
+            isNumbers = self._isNumber(srcValue) and self._isNumber(srcOperand)
+            isStrings = isinstance(srcValue, basestring) and isinstance(srcOperand, basestring)
+            if not isNumbers and not isStrings:
+                return False
+        return self._comparators[srcOp](srcValue, srcOperand)
+
+    def needsJSON(self):
+        # Does this filter look into the fields of JSON payloads
+        return self._needsJSON
+
+    def matches(self, srcPayload, srcParsedJSON):
+        # Return True if the payload matches all the clauses of this filter
+        # srcParsedJSON is the payload parsed as JSON if needsJSON, None if it is not valid JSON
+        if self._needsJSON and srcParsedJSON is None:
+            return False
+        for keyPath, op, operand in self._clauses:
+            if keyPath is None:
+                if operand.search(srcPayload) is None:
+                    return False
+                continue
+            values = keyPath.evaluate(srcParsedJSON)
+            if values is None:
+                return False
+            if not keyPath.hasWildcard():
+                values = [values]
+            if not any(self._isValueMatched(op, operand, value) for value in values):
+                return False
+        return True
@@ -0,0 +1,163 @@
+import json
+from threading import Lock
+
+
+class _publishBatch:
+    # Pending records for one destination topic
+
+    def __init__(self, srcMQTTCore):
+        self.mqttCore = srcMQTTCore
+        self.records = []
+        self.numberOfBytes = 0
+        self.qos = 0
+        self.timer = None
+
+
+class publishBatcher:
+    # This is the publish batcher that merges publishes into fewer MQTT messages
+    # Publishes are kept in a pending batch per destination topic, until the batching window since the first one
+    # is over, or until the batch reaches the byte limit. Then the batch is sent as ONE MQTT message
+    # Publishes to topics that match a topic group filter go to the batch of the destination topic of that group
+    # Records are the payloads, kept as they are if they are valid JSON, or as JSON strings otherwise
+    # Records in a topic group batch are {"topic": <topic>, "payload": <record>}
+    # Merged payload is a JSON array of the records, or the records one per line (newline-delimited JSON)
+    # Once a batch is sent, its flush status is reported through the function provided when creating the batcher:
+    # report(flushStatus, sketchSlotNumber), with flushStatus as "<result code> <number of records> <topic>"
+    # Batching windows are timed by the function provided when creating the batcher:
+    # callLater(delaySecond, function, *args), returning a timer that can be cancelled
+    formatNone = 0  # Batching disabled
+    formatJSONArray = 1
+    formatNewlineDelimited = 2
+
+    def __init__(self, srcReportFunctionPointer, srcCallLaterFunctionPointer):
+        self._report = srcReportFunctionPointer
+        self._callLater = srcCallLaterFunctionPointer
+        self._format = self.formatNone
+        self._windowSecond = 0
+        self._byteLimit = 0  # 0 means no byte limit
+        self._sketchSlotNumber = -1  # No flush status reported
+        self._topicGroups = []  # (topic filter, destination topic), first match wins
+        self._pendingBatches = dict()  # destination topic -> _publishBatch
+        self._batcherLock = Lock()  # Batches can be sent from any thread
+
+    def configure(self, srcWindowMillisecond, srcByteLimit, srcFormat, srcSketchSlotNumber):
+        # Configure the batching, pending batches are sent out first
+        # Raise ValueError if the configuration is invalid
+        if srcFormat not in [self.formatNone, self.formatJSONArray, self.formatNewlineDelimited]:
+            raise ValueError("Invalid batch format.")
+        if srcFormat != self.formatNone and srcWindowMillisecond <= 0:
+            raise ValueError("Batching window must be positive.")
+        if srcByteLimit < 0:
+            raise ValueError("Byte limit must not be negative.")
+        self.flushAll()
+        self._format = srcFormat
+        self._windowSecond = srcWindowMillisecond / 1000.0
+        self._byteLimit = srcByteLimit
+        self._sketchSlotNumber = srcSketchSlotNumber
+
+    def configureTopicGroup(self, srcTopicFilter, srcDestinationTopic):
+        # Merge publishes to topics matching this filter into the batch of the destination topic
+        # Empty destination topic removes the topic group
+        self._topicGroups = [topicGroup for topicGroup in self._topicGroups if topicGroup[0] != srcTopicFilter]
+        if srcDestinationTopic != "":
+            self._topicGroups.append((srcTopicFilter, srcDestinationTopic))
+
+    def reset(self):
+        # Back to batching disabled with no topic groups, pending batches are sent out first
+        self.configure(0, 0, self.formatNone, -1)
+        self._topicGroups = []
+
+    def isEnabled(self):
+        return self._format != self.formatNone
+
+    def getNumberOfPendingBatches(self):
+        return len(self._pendingBatches)
+
+    def _isTopicMatched(self, srcTopicFilter, srcTopic):
+        # MQTT topic filter matching, with '+' for one level and '#' for all remaining levels
+        filterLevels = srcTopicFilter.split("/")
+        topicLevels = srcTopic.split("/")
+        for i in range(0, len(filterLevels)):
+            if filterLevels[i] == "#":
+                return True
+            if i >= len(topicLevels) or (filterLevels[i] != "+" and filterLevels[i] != topicLevels[i]):
+                return False
+        return len(filterLevels) == len(topicLevels)
+
+    def _formatRecord(self, srcPayload):
+        # Valid JSON payloads in ONE line are kept as they are
+        try:
+            json.loads(srcPayload)
+            if "\n" not in srcPayload:
+                return srcPayload
+        except ValueError:
+            pass
+        return json.dumps(srcPayload)
+
+    def add(self, srcMQTTCore, srcTopic, srcPayload, srcQoS):
+        # Add ONE publish into the pending batch of its destination topic
+        # The batch is sent right away if it reaches the byte limit
+        destinationTopic = srcTopic
+        record = self._formatRecord(srcPayload)
+        for topicFilter, groupDestinationTopic in self._topicGroups:
+            if self._isTopicMatched(topicFilter, srcTopic):
+                destinationTopic = groupDestinationTopic
+                record = "{\"topic\": " + json.dumps(srcTopic) + ", \"payload\": " + record + "}"
+                break
+        fullBatches = []
+        self._batcherLock.acquire()
+        currentBatch = self._pendingBatches.get(destinationTopic)
+        if currentBatch is not None and self._byteLimit != 0 and currentBatch.numberOfBytes + len(record) + 1 > self._byteLimit:
+            fullBatches.append(self._takeBatch(destinationTopic))  # No room for this record, send what is there first
+            currentBatch = None
+        if currentBatch is None:
+            currentBatch = _publishBatch(srcMQTTCore)
+            currentBatch.timer = self._callLater(self._windowSecond, self._flushOnTimer, destinationTopic, currentBatch)
+            self._pendingBatches[destinationTopic] = currentBatch
+        currentBatch.records.append(record)
+        currentBatch.numberOfBytes += len(record) + 1  # Record separator included
+        currentBatch.qos = max(currentBatch.qos, srcQoS)
+        if self._byteLimit != 0 and currentBatch.numberOfBytes >= self._byteLimit:
+            fullBatches.append(self._takeBatch(destinationTopic))
+        self._batcherLock.release()
+        for fullBatch in fullBatches:
+            self._send(destinationTopic, fullBatch)
+
+    def _takeBatch(self, srcDestinationTopic):
+        # Remove the pending batch of this destination topic, with the lock held
+        currentBatch = self._pendingBatches.pop(srcDestinationTopic)
+        currentBatch.timer.cancel()
+        return currentBatch
+
+    def _flushOnTimer(self, srcDestinationTopic, srcBatch):
+        self._batcherLock.acquire()
+        isPending = self._pendingBatches.get(srcDestinationTopic) is srcBatch  # Not sent on byte limit already
+        if isPending:
+            self._pendingBatches.pop(srcDestinationTopic)
+        self._batcherLock.release()
+        if isPending:
+            self._send(srcDestinationTopic, srcBatch)
+
+    def flushAll(self):
+        # Send all the pending batches right away
+        self._batcherLock.acquire()
+        pendingBatches = [(destinationTopic, self._takeBatch(destinationTopic)) for destinationTopic in list(self._pendingBatches.keys())]
+        self._batcherLock.release()
+        for destinationTopic, currentBatch in pendingBatches:
+            self._send(destinationTopic, currentBatch)
+
+    def _send(self, srcDestinationTopic, srcBatch):
+        # Publish the merged payload and report the flush status
+        if self._format == self.formatNewlineDelimited:
+            mergedPayload = "\n".join(srcBatch.records)
+        else:
+            mergedPayload = "[" + ",".join(srcBatch.records) + "]"
+        resultCode = "P T"
+        try:
+            srcBatch.mqttCore.publish(srcDestinationTopic, mergedPayload, srcBatch.qos)
+        except TypeError:
+            resultCode = "P2F"
+        except Exception:
+            resultCode = "PFF"
+        if self._sketchSlotNumber >= 0:
+            self._report(resultCode + " " + str(len(srcBatch.records)) + " " + srcDestinationTopic, self._sketchSlotNumber)
@@ -0,0 +1,63 @@
+from threading import Lock
+
+
+class shadowRequestTable:
+    # This is the table that keeps track of the in-flight shadow get/update/delete requests
+    # Each request is registered with its token and the sketch slot that is waiting for the response
+    # Responses can come back (in SDK threads) before the token gets registered. These responses are
+    # parked and get delivered as soon as the registration is done, so no one waits on the other
+    # Delivery is done through the function provided when creating the table: deliver(JSONHandler, sketchSlotNumber)
+    # Parked responses whose request never gets registered (e.g. the sketch was reset) are expired periodically:
+    # those already parked at the previous expiry are dropped
+
+    def __init__(self, srcDeliverFunctionPointer):
+        self._deliver = srcDeliverFunctionPointer
+        self._pendingRequests = dict()  # token -> sketch slot #
+        self._parkedResponses = dict()  # token -> JSON handler of the response
+        self._staleTokens = set()  # Tokens of the responses parked at the previous expiry
+        self._tableLock = Lock()
+
+    def registerRequest(self, srcToken, srcSketchSlotNumber):
+        # Register the sketch slot for the request with this token
+        # Deliver the response right away if it is already here
+        self._tableLock.acquire()
+        parkedJSONHandler = self._parkedResponses.pop(srcToken, None)
+        if parkedJSONHandler is None:
+            self._pendingRequests[srcToken] = srcSketchSlotNumber
+        self._tableLock.release()
+        if parkedJSONHandler is not None:
+            self._deliver(parkedJSONHandler, srcSketchSlotNumber)
+
+    def resolveRequest(self, srcToken, srcJSONHandler):
+        # Deliver the response to the sketch slot registered with this token
+        # Park the response if the request is not registered yet
+        self._tableLock.acquire()
+        sketchSlotNumber = self._pendingRequests.pop(srcToken, None)
+        if sketchSlotNumber is None:
+            self._parkedResponses[srcToken] = srcJSONHandler
+        self._tableLock.release()
+        if sketchSlotNumber is not None:
+            self._deliver(srcJSONHandler, sketchSlotNumber)
+
+    def clearRequests(self):
+        # Forget the registered requests, when the sketch slots waiting for them are gone
+        # Their responses get parked, and expired like the others
+        self._tableLock.acquire()
+        self._pendingRequests.clear()
+        self._tableLock.release()
+
+    def expireParkedResponses(self):
+        # Drop the responses that have been parked since the previous expiry, return the number of them
+        self._tableLock.acquire()
+        expiredTokens = [token for token in self._staleTokens if token in self._parkedResponses]
+        for token in expiredTokens:
+            del self._parkedResponses[token]
+        self._staleTokens = set(self._parkedResponses.keys())
+        self._tableLock.release()
+        return len(expiredTokens)
+
+    def getNumberOfPendingRequests(self):
+        return len(self._pendingRequests)
+
+    def getNumberOfParkedResponses(self):
+        return len(self._parkedResponses)
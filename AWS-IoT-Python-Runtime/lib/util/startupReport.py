@@ -0,0 +1,73 @@
+import os
+import time
+
+
+class startupReport:
+    # This is the report of where the startup time of the runtime goes, written to a file once the first reply is out
+    # Stages are marked one after another, each one takes the time since the previous mark:
+    # interpreter: from the start of the process to the first line of the script (Linux only, from /proc)
+    # imports: from the first line of the script to the creation of the runtimeHub
+    # init: creation of the runtimeHub
+    # idle: waiting for the first command, which is up to the sketch and not counted in the total
+    # firstCommand <protocol name>: execution of the first command, modules loaded on first use included
+    # Modules loaded on first use are listed with their load time, until the report is written
+    # The file is overwritten on each startup, with ONE line for the last one
+    _idleStageName = "idle"
+
+    def __init__(self, srcReportFilePath, srcScriptStartTime=None):
+        self._reportFilePath = srcReportFilePath
+        self._stages = []  # (stage name, seconds), in order
+        self._loads = []  # (module name, seconds), in order
+        self._isWritten = False
+        currentTime = time.time()
+        if srcScriptStartTime is not None:
+            processAge = self._getProcessAge()
+            if processAge is not None:
+                self._stages.append(("interpreter", max(srcScriptStartTime - (currentTime - processAge), 0.0)))
+            self._stages.append(("imports", currentTime - srcScriptStartTime))
+        self._lastMarkTime = currentTime
+
+    def _getProcessAge(self):
+        # Seconds since this process started, None if unknown
+        try:
+            with open("/proc/self/stat") as statFile:
+                # Fields after the command name, which can have spaces, start with the state (field 3)
+                startTimeTicks = int(statFile.read().rsplit(")", 1)[1].split()[19])
+            with open("/proc/uptime") as uptimeFile:
+                uptimeSecond = float(uptimeFile.read().split()[0])
+            return uptimeSecond - startTimeTicks / float(os.sysconf("SC_CLK_TCK"))
+        except (IOError, OSError, ValueError, IndexError):
+            return None
+
+    def mark(self, srcStageName):
+        # End the current stage, the next one starts now
+        currentTime = time.time()
+        if not self._isWritten:
+            self._stages.append((srcStageName, currentTime - self._lastMarkTime))
+        self._lastMarkTime = currentTime
+
+    def addLoad(self, srcModuleName, srcLoadSecond):
+        if not self._isWritten:
+            self._loads.append((srcModuleName, srcLoadSecond))
+
+    def isWritten(self):
+        return self._isWritten
+
+    def getTotalSecond(self):
+        return sum(second for stageName, second in self._stages if stageName != self._idleStageName)
+
+    def format(self):
+        # "startup: <stage> <seconds>s, ..., total <seconds>s, loaded: <module> <seconds>s, ..."
+        fragments = [stageName + " %.3fs" % second for stageName, second in self._stages]
+        fragments.append("total %.3fs" % self.getTotalSecond())
+        report = "startup: " + ", ".join(fragments)
+        if len(self._loads) != 0:
+            report += ", loaded: " + ", ".join(moduleName + " %.3fs" % second for moduleName, second in self._loads)
+        return report
+
+    def write(self):
+        # Write the report, ONE time
+        # Raise IOError if the file cannot be written
+        self._isWritten = True
+        with open(self._reportFilePath, "w") as reportFile:
+            reportFile.write(time.strftime("%Y-%m-%d %H:%M:%S ") + self.format() + "\n")
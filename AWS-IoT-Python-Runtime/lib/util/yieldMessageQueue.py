@@ -0,0 +1,263 @@
+from collections import deque
+from threading import Lock
+
+
+class _slotSchedule:
+    # Queued messages and scheduling settings for one sketch slot
+
+    def __init__(self, srcPriority, srcWeight, srcConflation):
+        self.messages = deque()  # Oldest first
+        self.priority = srcPriority
+        self.weight = srcWeight
+        self.currentWeight = 0  # Smooth weighted round-robin state
+        self.conflation = srcConflation
+
+
+class yieldMessageQueue:
+    # This is the queue of messages waiting to be transmitted in yield requests
+    # Each message is a list of pre-split frames, with the sketch slot it goes to
+    # Messages that are not droppable (e.g. shadow responses that free sketch slots) and drop notices are urgent:
+    # they are sent first, oldest first
+    # Other messages are kept in a queue per sketch slot, and the slots are drained by priority:
+    # slots with a higher priority are always drained first, slots with the same priority take turns in
+    # weighted round-robin, one message per turn, so that a slot with weight 3 gets 3 turns for every turn of weight 1
+    # A slot can be conflated, for latest-value topics: a new message replaces the one of the same slot still in the queue
+    # conflateInPlace: the new message takes the place of the queued one
+    # conflateToBack: the queued one is removed and the new message goes to the back of the queue, it is not sent
+    # before the older messages of the slots with the same priority
+    # Replaced messages are not counted as drops
+    # The queue can be bounded in number of messages, in bytes and in number of messages per sketch slot
+    # When a new message does not fit, the drop policy decides:
+    # dropOldest: oldest messages (of the same slot, if it is over its quota) are dropped to make room
+    # dropNewest: the new message is dropped
+    # reject: the new message is dropped and a drop notice is queued for its slot, ONE per slot until it is sent
+    # Drop notices are formatted by the function provided when creating the queue: formatDropNotice(sketchSlotNumber)
+    # Urgent messages are always queued and never dropped
+    # 0 means unlimited
+    dropOldest = 0
+    dropNewest = 1
+    reject = 2
+    defaultPriority = 0
+    defaultWeight = 1
+    conflateNone = 0
+    conflateInPlace = 1
+    conflateToBack = 2
+
+    def __init__(self, srcFormatDropNoticeFunctionPointer):
+        self._formatDropNotice = srcFormatDropNoticeFunctionPointer
+        self._maxMessages = 0
+        self._maxBytes = 0
+        self._slotQuota = 0
+        self._dropPolicy = self.dropOldest
+        self._urgentMessages = deque()  # [sequence #, sketch slot #, frames, size in bytes], oldest first
+        self._slotSchedules = dict()  # sketch slot # -> _slotSchedule
+        self._sequenceNumber = 0  # Age of messages across slots
+        self._numberOfMessages = 0
+        self._numberOfBytes = 0
+        self._numberOfDrops = 0
+        self._pendingNotices = dict()  # Sketch slot # -> its drop notice in the queue
+        self._queueLock = Lock()  # Messages are put from SDK threads and taken from the main thread
+
+    def configure(self, srcMaxMessages, srcMaxBytes, srcSlotQuota, srcDropPolicy):
+        # Raise ValueError if the configuration is invalid
+        # Messages already in the queue are kept, the new bounds apply from the next message on
+        if srcMaxMessages < 0 or srcMaxBytes < 0 or srcSlotQuota < 0:
+            raise ValueError("Queue bounds must not be negative.")
+        if srcDropPolicy not in [self.dropOldest, self.dropNewest, self.reject]:
+            raise ValueError("Invalid drop policy.")
+        self._queueLock.acquire()
+        self._maxMessages = srcMaxMessages
+        self._maxBytes = srcMaxBytes
+        self._slotQuota = srcSlotQuota
+        self._dropPolicy = srcDropPolicy
+        self._queueLock.release()
+
+    def configureSlot(self, srcSketchSlotNumber, srcPriority, srcWeight):
+        # Set the priority and the round-robin weight of a sketch slot, messages already queued included
+        # Raise ValueError if the configuration is invalid
+        if srcPriority < 0:
+            raise ValueError("Priority must not be negative.")
+        if srcWeight <= 0:
+            raise ValueError("Weight must be positive.")
+        self._queueLock.acquire()
+        currentSchedule = self._getSlotSchedule(srcSketchSlotNumber)
+        currentSchedule.priority = srcPriority
+        currentSchedule.weight = srcWeight
+        currentSchedule.currentWeight = 0
+        self._queueLock.release()
+
+    def configureSlotConflation(self, srcSketchSlotNumber, srcConflation):
+        # Set the conflation of a sketch slot, from the next message on
+        # Raise ValueError if the configuration is invalid
+        if srcConflation not in [self.conflateNone, self.conflateInPlace, self.conflateToBack]:
+            raise ValueError("Invalid conflation.")
+        self._queueLock.acquire()
+        self._getSlotSchedule(srcSketchSlotNumber).conflation = srcConflation
+        self._queueLock.release()
+
+    def resetSlot(self, srcSketchSlotNumber):
+        # Back to the default priority, weight and conflation, when the sketch slot is freed
+        self.configureSlot(srcSketchSlotNumber, self.defaultPriority, self.defaultWeight)
+        self.configureSlotConflation(srcSketchSlotNumber, self.conflateNone)
+
+    def clear(self):
+        # Drop all the messages and slot settings, when the sketch they are for is gone
+        # Bounds and the drop count are kept, cleared messages are not counted as drops
+        self._queueLock.acquire()
+        self._urgentMessages.clear()
+        self._slotSchedules.clear()
+        self._pendingNotices.clear()
+        self._numberOfMessages = 0
+        self._numberOfBytes = 0
+        self._queueLock.release()
+
+    def _getSlotSchedule(self, srcSketchSlotNumber):
+        currentSchedule = self._slotSchedules.get(srcSketchSlotNumber)
+        if currentSchedule is None:
+            currentSchedule = _slotSchedule(self.defaultPriority, self.defaultWeight, self.conflateNone)
+            self._slotSchedules[srcSketchSlotNumber] = currentSchedule
+        return currentSchedule
+
+    def _newMessage(self, srcSketchSlotNumber, srcFrames):
+        self._sequenceNumber += 1
+        return [self._sequenceNumber, srcSketchSlotNumber, srcFrames, sum(len(frame) for frame in srcFrames)]
+
+    def _appendUrgent(self, srcSketchSlotNumber, srcFrames):
+        message = self._newMessage(srcSketchSlotNumber, srcFrames)
+        self._urgentMessages.append(message)
+        self._numberOfMessages += 1
+        self._numberOfBytes += message[3]
+        return message
+
+    def _append(self, srcSketchSlotNumber, srcFrames):
+        message = self._newMessage(srcSketchSlotNumber, srcFrames)
+        self._getSlotSchedule(srcSketchSlotNumber).messages.append(message)
+        self._numberOfMessages += 1
+        self._numberOfBytes += message[3]
+
+    def _dropOldest(self, srcSchedule):
+        message = srcSchedule.messages.popleft()
+        self._numberOfMessages -= 1
+        self._numberOfBytes -= message[3]
+        self._numberOfDrops += 1
+
+    def _conflate(self, srcSchedule, srcFrames, srcSize):
+        # Replace the queued message of a conflated slot in place, keeping its age
+        # Bounds are not applied, the number of messages stays the same, only the size changes
+        message = srcSchedule.messages[-1]
+        self._numberOfBytes += srcSize - message[3]
+        message[2] = srcFrames
+        message[3] = srcSize
+
+    def _isOverSlotQuota(self, srcSketchSlotNumber):
+        currentSchedule = self._slotSchedules.get(srcSketchSlotNumber)
+        return self._slotQuota != 0 and currentSchedule is not None and len(currentSchedule.messages) >= self._slotQuota
+
+    def _isOverBounds(self, srcSize):
+        isOverMessages = self._maxMessages != 0 and self._numberOfMessages >= self._maxMessages
+        isOverBytes = self._maxBytes != 0 and self._numberOfBytes + srcSize > self._maxBytes
+        return isOverMessages or isOverBytes
+
+    def _findOldestSchedule(self):
+        # Slot with the oldest droppable message, across all slots
+        oldestSchedule = None
+        for currentSchedule in self._slotSchedules.values():
+            if len(currentSchedule.messages) != 0:
+                if oldestSchedule is None or currentSchedule.messages[0][0] < oldestSchedule.messages[0][0]:
+                    oldestSchedule = currentSchedule
+        return oldestSchedule
+
+    def put(self, srcFrames, srcSketchSlotNumber=-1, srcIsDroppable=True):
+        # Put ONE message into the queue, applying the bounds and the drop policy
+        # Return True if the message is queued
+        size = sum(len(frame) for frame in srcFrames)
+        isQueued = True
+        self._queueLock.acquire()
+        currentSchedule = self._slotSchedules.get(srcSketchSlotNumber)
+        isConflated = srcIsDroppable and currentSchedule is not None and currentSchedule.conflation != self.conflateNone and len(currentSchedule.messages) != 0
+        if not srcIsDroppable:
+            self._appendUrgent(srcSketchSlotNumber, srcFrames)
+        elif isConflated and currentSchedule.conflation == self.conflateInPlace:
+            self._conflate(currentSchedule, srcFrames, size)
+        else:
+            if isConflated:  # conflateToBack, the queued one makes room for the new message
+                while len(currentSchedule.messages) != 0:
+                    message = currentSchedule.messages.popleft()
+                    self._numberOfMessages -= 1
+                    self._numberOfBytes -= message[3]
+            if self._dropPolicy == self.dropOldest:
+                if self._isOverSlotQuota(srcSketchSlotNumber):
+                    currentSchedule = self._slotSchedules[srcSketchSlotNumber]
+                    while len(currentSchedule.messages) >= self._slotQuota:
+                        self._dropOldest(currentSchedule)
+                while self._isOverBounds(size):
+                    oldestSchedule = self._findOldestSchedule()
+                    if oldestSchedule is None:
+                        break
+                    self._dropOldest(oldestSchedule)
+            isQueued = not self._isOverSlotQuota(srcSketchSlotNumber) and not self._isOverBounds(size)
+            if isQueued:
+                self._append(srcSketchSlotNumber, srcFrames)
+            else:
+                self._numberOfDrops += 1
+                if self._dropPolicy == self.reject and srcSketchSlotNumber not in self._pendingNotices:
+                    self._pendingNotices[srcSketchSlotNumber] = self._appendUrgent(srcSketchSlotNumber, self._formatDropNotice(srcSketchSlotNumber))
+        self._queueLock.release()
+        return isQueued
+
+    def _scheduleNext(self):
+        # Pick the slot for the next message: highest priority first, smooth weighted round-robin within it
+        topPriority = None
+        for currentSchedule in self._slotSchedules.values():
+            if len(currentSchedule.messages) != 0 and (topPriority is None or currentSchedule.priority > topPriority):
+                topPriority = currentSchedule.priority
+        # A conflateToBack slot is held back while another slot of the same priority has an older message,
+        # so that its message goes out after the ones that arrived before it
+        oldestSequenceNumber = None
+        for currentSchedule in self._slotSchedules.values():
+            if len(currentSchedule.messages) != 0 and currentSchedule.priority == topPriority:
+                if oldestSequenceNumber is None or currentSchedule.messages[0][0] < oldestSequenceNumber:
+                    oldestSequenceNumber = currentSchedule.messages[0][0]
+        nextSchedule = None
+        totalWeight = 0
+        for currentSchedule in self._slotSchedules.values():
+            if len(currentSchedule.messages) != 0 and currentSchedule.priority == topPriority:
+                if currentSchedule.conflation == self.conflateToBack and currentSchedule.messages[0][0] != oldestSequenceNumber:
+                    continue
+                currentSchedule.currentWeight += currentSchedule.weight
+                totalWeight += currentSchedule.weight
+                if nextSchedule is None or currentSchedule.currentWeight > nextSchedule.currentWeight:
+                    nextSchedule = currentSchedule
+        if nextSchedule is not None:
+            nextSchedule.currentWeight -= totalWeight
+        return nextSchedule
+
+    def get(self):
+        # Take the next message out of the queue: urgent ones first, then by slot priority and weight
+        # If the queue is empty, None will be returned
+        frames = None
+        self._queueLock.acquire()
+        message = None
+        if len(self._urgentMessages) != 0:
+            message = self._urgentMessages.popleft()
+            if self._pendingNotices.get(message[1]) is message:  # New drops for this slot get a new notice
+                del self._pendingNotices[message[1]]
+        else:
+            nextSchedule = self._scheduleNext()
+            if nextSchedule is not None:
+                message = nextSchedule.messages.popleft()
+        if message is not None:
+            self._numberOfMessages -= 1
+            self._numberOfBytes -= message[3]
+            frames = message[2]
+        self._queueLock.release()
+        return frames
+
+    def qsize(self):
+        return self._numberOfMessages
+
+    def getNumberOfBytes(self):
+        return self._numberOfBytes
+
+    def getNumberOfDrops(self):
+        return self._numberOfDrops
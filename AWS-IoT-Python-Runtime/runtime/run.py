@@ -15,7 +15,29 @@
  */
  '''
 
+import time
+scriptStartTime = time.time()  # Startup report starts from here
+import sys
+import getopt
 from runtimeHub import *
 
-AWSIoTMQTTArduinoPyHub = runtimeHub("AWSIoTMQTTArduinoHub", "../log/")
+# Started as "python run.py" by the sketch
+# "-l <link spec>" puts a model of the serial link of the Yun in front of stdin/stdout, for benchmarks off the board
+# "-s <bytes>" keeps the JSON history in a memory-mapped file of this size instead of the Python heap
+# "-f <path>" is the path of that file, ../log/JSONHistory.bin by default
+serialTransport = None
+JSONHistoryFileSize = 0
+JSONHistoryFilePath = None
+opts, args = getopt.getopt(sys.argv[1:], "l:s:f:", ["link=", "history-size=", "history-file="])
+for opt, arg in opts:
+    if opt in ("-l", "--link"):
+        from comm.yunBridgeTransport import yunBridgeTransport
+        serialTransport = yunBridgeTransport(arg)
+    if opt in ("-s", "--history-size"):
+        JSONHistoryFileSize = int(arg)
+    if opt in ("-f", "--history-file"):
+        JSONHistoryFilePath = arg
+
+AWSIoTMQTTArduinoPyHub = runtimeHub("AWSIoTMQTTArduinoHub", "../log/", JSONHistoryFileSize, srcScriptStartTime=scriptStartTime, srcSerialTransport=serialTransport,
+                                    srcJSONHistoryFilePath=JSONHistoryFilePath)
 AWSIoTMQTTArduinoPyHub.run()
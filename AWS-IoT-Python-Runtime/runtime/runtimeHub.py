@@ -17,37 +17,28 @@
 
 import os
 import sys
+import json
+import time
+import importlib
 sys.path.insert(0, "../lib/")
-import AWSIoTPythonSDK
-sys.path.insert(0, os.path.abspath(AWSIoTPythonSDK.__file__))
 import logging
 from threading import Lock
 from util.jsonManager import jsonManager
-from exception.AWSIoTExceptions import *
-from comm.serialCommunicationServer import *
-from command.AWSIoTCommand import *
-from command.commandConnect import *
-from command.commandDisconnect import *
-from command.commandConfig import *
-from command.commandPublish import *
-from command.commandSubscribe import *
-from command.commandUnsubscribe import *
-from command.commandShadowGet import *
-from command.commandShadowDelete import *
-from command.commandShadowUpdate import *
-from command.commandShadowRegisterDeltaCallback import *
-from command.commandShadowUnregisterDeltaCallback import *
-from command.commandYield import *
-from command.commandLockSize import *
-from command.commandJSONKeyVal import *
-from command.commandSetBackoffTiming import *
-from command.commandSetOfflinePublishQueueing import *
-from command.commandSetDrainingIntervalSecond import *
-# Use IoT Python SDK as backend
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTShadowClient
-from AWSIoTPythonSDK.MQTTLib import MQTTv3_1, MQTTv3_1_1
+from util.shadowRequestTable import shadowRequestTable
+from util.publishBatcher import publishBatcher
+from util.startupReport import startupReport
+from exception import AWSIoTExceptions
+from comm.serialCommunicationServer import serialCommunicationServer
+from command import AWSIoTCommand
+from command.commandYield import commandYield
+from command.commandLockSize import commandLockSize
+# Other command modules, the IoT Python SDK as backend and the utilities of optional features are loaded on first use
 # import traceback
 
+# Same as AWSIoTPythonSDK.MQTTLib.MQTTv3_1/MQTTv3_1_1, available before the SDK is loaded
+_MQTTv3_1 = 3
+_MQTTv3_1_1 = 4
+
 
 # Object for each MQTT subscription to hold the sketch info (slot #)
 class _mqttSubscribeUnit:
@@ -58,6 +49,8 @@ class _mqttSubscribeUnit:
         self._formatPayloadForYield = None
         self._serialCommunicationServerHub = None
         self._formatPayloadForYield = srcFormatPayloadForYieldFunctionPointer
+        self._messageFilter = None  # Forward all messages
+        self._jsonProjection = None  # Forward messages in full
 
     def setTopicName(self, srcTopicName):
         self._topicName = srcTopicName
@@ -74,6 +67,18 @@ class _mqttSubscribeUnit:
     def getSketchSlotNumber(self):
         return self._sketchSlotNumber
 
+    def setMessageFilter(self, srcFilter):
+        # Compile the content filter, empty filter forwards all messages
+        # Raise ValueError if the filter is malformed
+        from util.messageFilter import messageFilter
+        self._messageFilter = messageFilter(srcFilter) if srcFilter != "" else None
+
+    def setProjection(self, srcFormat, srcKeyPaths):
+        # Compile the projection of JSON payloads onto these key paths
+        # Raise ValueError if the projection is invalid
+        from util.jsonProjection import jsonProjection
+        self._jsonProjection = jsonProjection(srcFormat, srcKeyPaths)
+
     def individualCallback(self, client, userdata, message):
         # Process the incoming non-shadow messages for a specific MQTT subscription
         # Parse them into protocol-style chunks that can be transmitted over the serial
@@ -83,12 +88,29 @@ class _mqttSubscribeUnit:
         # Get the topic
         currentTopic = str(message.topic)
         # Find the sketch slot related to this topic name, ignore if not exist any more
+        # Subscriptions of a sketch that was reset are detached (-1) until the reattached sketch subscribes again
+        currentSketchSlotNumber = self._sketchSlotNumber
+        if currentSketchSlotNumber < 0:
+            return
+        currentPayload = str(message.payload)
+        # JSON payloads are parsed once, for both the filter and the projection
+        parsedJSON = None
+        if self._jsonProjection is not None or (self._messageFilter is not None and self._messageFilter.needsJSON()):
+            try:
+                parsedJSON = json.loads(currentPayload)
+            except ValueError:
+                pass  # Not valid JSON
+        # Messages filtered out never cross the serial
+        if self._messageFilter is not None and not self._messageFilter.matches(currentPayload, parsedJSON):
+            return
+        # Only the projected fields cross the serial
+        if self._jsonProjection is not None:
+            currentPayload = self._jsonProjection.project(currentPayload, parsedJSON)
         try:
-            currentSketchSlotNumber = self._sketchSlotNumber
             # Refactor the payload by adding protocol head and dividing into reasonable chunks
-            formattedPayload = self._formatPayloadForYield(str(message.payload), currentSketchSlotNumber)
+            formattedPayload = self._formatPayloadForYield(currentPayload, currentSketchSlotNumber)
             # Put it into the internal queue of serialCommunicationServer
-            self._serialCommunicationServerHub.writeToInternalYield(formattedPayload)
+            self._serialCommunicationServerHub.writeToInternalYield(formattedPayload, currentSketchSlotNumber)
             # This message will get to be transmitted in future Yield requests
         except KeyError:
             pass  # Ignore messages coming between callback and unsubscription
@@ -97,159 +119,327 @@ class _mqttSubscribeUnit:
 class runtimeHub:
     
     #### Methods start here ####
-    def __init__(self, srcFileName, srcLogDirectory):
-        # Init with basic interface for serial communication
+    def __init__(self, srcFileName, srcLogDirectory, srcJSONHistoryFileSize=0, srcScriptStartTime=None, srcSerialTransport=None, srcJSONHistoryFilePath=None):
+        # Init with basic interface for serial communication, over srcSerialTransport if given, stdin/stdout if not
+        # JSON history is kept in a file of srcJSONHistoryFileSize bytes if given, <srcLogDirectory>/JSONHistory.bin by default
         self._log = logging.getLogger(__name__)
-        self._serialCommunicationServerHub = serialCommunicationServer()
+        # Startup time goes to <srcFileName>.startup.log in the log directory, from the script start if given
+        self._startupReport = startupReport(os.path.join(srcLogDirectory, srcFileName + ".startup.log"), srcScriptStartTime)
+        self._loadedModules = dict()  # Module name -> module, loaded on first use
+        self._commandClasses = dict()  # Command name -> command class, loaded on first use
+        self._serialCommunicationServerHub = serialCommunicationServer(srcSerialTransport)
         self._serialCommunicationServerHub.setAcceptTimeout(10)
         self._serialCommunicationServerHub.setChunkSize(50)
-        self._jsonManagerHub = jsonManager(512*3)  # Default history limits is set to be 512*3, 512 for accepted, 512 for rejected and 512 for deltas
+        self._configureDefaultYieldQueue()
+        self._jsonHistoryStore = None  # Closed on exit
+        if srcJSONHistoryFileSize == 0:
+            # Default history limits is set to be 512 for accepted, 512 for rejected and 512 for deltas
+            # Default history byte budget is set to be 2 MB in total, oldest JSON documents are dropped beyond that
+            self._jsonManagerHub = jsonManager(512, 512, 512, 2*1024*1024)
+        else:
+            # JSON history is kept in a file, oldest JSON documents are dropped when it is full
+            from util.jsonFileStore import jsonFileStore
+            if srcJSONHistoryFilePath is None:
+                srcJSONHistoryFilePath = os.path.join(srcLogDirectory, "JSONHistory.bin")
+            self._jsonHistoryStore = jsonFileStore(srcJSONHistoryFilePath, srcJSONHistoryFileSize)
+            self._jsonManagerHub = jsonManager(0, 0, 0, 0, self._jsonHistoryStore)
         # Keep the record of MQTT subscribe sketch info (slot #), in forms of individual object
         self._mqttSubscribeTable = dict()
-        # Keep the record of shadow subscribe sketch info (slot #)
+        # Keep the record of shadow delta subscribe sketch info (slot #), by deviceShadow name
         self._shadowSubscribeRecord = dict()
+        # Keep the record of in-flight shadow get/update/delete sketch info (slot #), by token
+        self._shadowRequestTable = shadowRequestTable(self._deliverShadowMessage)
+        # Parked shadow responses that no request claims are dropped after 30 to 60 seconds
+        self._serialCommunicationServerHub.addPeriodicTask(30, self._shadowRequestTable.expireParkedResponses)
         # Keep track of the deviceShadow instances for each individual deviceShadow name
         self._shadowRegistrationTable = dict()
+        # Merge publishes into batches when configured, flush status goes to the sketch through yield
+        # Batching windows are timed by the event loop of the serialCommunicationServer
+        self._publishBatcherHub = publishBatcher(self._deliverPublishFlushStatus, self._serialCommunicationServerHub.callLater)
         # MQTT Connection
         self._mqttClientHub = None  # Init when requested
         self._shadowClientHub = None  # Init when requested
-        # ShadowCallback Lock
+        self._mqttInitParameterList = None  # Parameters of the MQTT init the client was created with
+        # Keep the record of the client session, shared with connect/config/disconnect commands:
+        # isReused: the client is reused by a reattached sketch, config: last configuration, keepAlive: while connected
+        self._clientSessionRecord = dict()
+        self._isReattachPending = False  # A restarted sketch reattached, its MQTT init may reuse the client
+        # ShadowCallback Lock, for JSON history access from SDK threads
         self._shadowCallbackLock = Lock()
+        # Command dispatch table, by protocol name
+        self._initCommandTable()
+        self._startupReport.mark("init")
+
+    def _configureDefaultYieldQueue(self):
+        # Default yield queue bound is set to be 4 MB, oldest messages are dropped beyond that
+        self._serialCommunicationServerHub.configureYieldQueue(0, 4*1024*1024, 0, 0)
+
+    def _loadModule(self, srcModuleName):
+        # Import a module on first use, its load time goes to the startup report
+        # Raise ImportError if the module cannot be loaded
+        loadedModule = self._loadedModules.get(srcModuleName)
+        if loadedModule is None:
+            loadStartTime = time.time()
+            loadedModule = importlib.import_module(srcModuleName)
+            self._startupReport.addLoad(srcModuleName, time.time() - loadStartTime)
+            self._loadedModules[srcModuleName] = loadedModule
+        return loadedModule
+
+    def _loadCommandClass(self, srcCommandName):
+        # Command class commandXXX is defined in the command module of the same name
+        commandClass = self._commandClasses.get(srcCommandName)
+        if commandClass is None:
+            commandClass = getattr(self._loadModule("command." + srcCommandName), srcCommandName)
+            self._commandClasses[srcCommandName] = commandClass
+        return commandClass
 
     def _getAWSIoTMQTTShadowClient(self, clientID, protocol, useWebsocket, cleanSession):
-        return AWSIoTMQTTShadowClient(clientID, protocol, useWebsocket, cleanSession)
+        return self._loadModule("AWSIoTPythonSDK.MQTTLib").AWSIoTMQTTShadowClient(clientID, protocol, useWebsocket, cleanSession)
+
+    def _initCommandTable(self):
+        # Protocol name -> (command handler, number of parameters, write back function)
+        # Command handler takes the parameter list and returns an AWSIoTCommand
+        # Number of parameters is what the sketch sends, None if it varies and is checked by the command itself
+        # Write back function transmits the result of the command over serial
+        # Hot commands (yield, lock size) reuse one preconstructed command object
+        self._yieldCommand = commandYield([], self._serialCommunicationServerHub)
+        self._lockSizeCommand = commandLockSize([], self._serialCommunicationServerHub)
+        writeToExternalProtocol = self._serialCommunicationServerHub.writeToExternalProtocol
+        writeToExternalYield = self._serialCommunicationServerHub.writeToExternalYield
+        writeToExternalJSON = self._serialCommunicationServerHub.writeToExternalJSON
+        self._commandTable = {
+            "y": (self._getYieldCommand, 0, writeToExternalYield),  # Oh the GREAT yield...
+            "z": (self._getLockSizeCommand, 0, writeToExternalProtocol),  # Lock message size
+            "p": (self._getPublishCommand, 4, writeToExternalProtocol),
+            "j": (self._getJSONKeyValCommand, 3, writeToExternalJSON),  # JSON Key-Value Retrieve
+            "jm": (self._getJSONMultiKeyValCommand, None, writeToExternalJSON),  # JSON Multi-Key-Value Retrieve
+            "i": (self._getMQTTInitCommand, 4, writeToExternalProtocol),
+            "g": (self._getConfigCommand, 5, writeToExternalProtocol),
+            "c": (self._getConnectCommand, 1, writeToExternalProtocol),
+            "d": (self._getDisconnectCommand, 0, writeToExternalProtocol),
+            "s": (self._getSubscribeCommand, None, writeToExternalProtocol),
+            "u": (self._getUnsubscribeCommand, 1, writeToExternalProtocol),
+            "si": (self._getShadowInitCommand, 2, writeToExternalProtocol),
+            "sg": (self._getShadowGetCommand, 3, writeToExternalProtocol),
+            "su": (self._getShadowUpdateCommand, 4, writeToExternalProtocol),
+            "sd": (self._getShadowDeleteCommand, 3, writeToExternalProtocol),
+            "s_rd": (self._getShadowRegisterDeltaCallbackCommand, 2, writeToExternalProtocol),
+            "s_ud": (self._getShadowUnregisterDeltaCallbackCommand, 1, writeToExternalProtocol),
+            "bf": (self._getSetBackoffTimingCommand, 3, writeToExternalProtocol),  # Backoff Timing Config
+            "pq": (self._getSetOfflinePublishQueueingCommand, 2, writeToExternalProtocol),  # Offline Publish Queue Config
+            "di": (self._getSetDrainingIntervalSecondCommand, 1, writeToExternalProtocol),  # Draining Interval Config
+            "bs": (self._getSetBurstSizeCommand, 1, writeToExternalProtocol),  # Burst Size Config
+            "fm": (self._getSetFramingModeCommand, 1, writeToExternalProtocol),  # Framing Mode Config
+            "pb": (self._getSetPublishBatchingCommand, 4, writeToExternalProtocol),  # Publish Batching Config
+            "pg": (self._getSetPublishBatchGroupCommand, 2, writeToExternalProtocol),  # Publish Batch Topic Group Config
+            "yb": (self._getSetYieldQueueCommand, 4, writeToExternalProtocol),  # Yield Queue Bounds Config
+            "yd": (self._getYieldDropsCommand, 0, writeToExternalProtocol),  # Yield Queue Drop Count
+            "yw": (self._getSetYieldPriorityCommand, 4, writeToExternalProtocol),  # Yield Priority Config
+            "yc": (self._getSetConflationCommand, 2, writeToExternalProtocol),  # Latest-Value Conflation Config
+            "dm": (self._getSetDaemonModeCommand, 1, writeToExternalProtocol),  # Daemon Mode Config
+            "ra": (self._getReattachCommand, 0, writeToExternalProtocol),  # Reattach a restarted sketch
+            "b": (self._getBatchCommand, None, writeToExternalProtocol),  # Batch of commands, ONE combined reply
+            "~": (self._getExitCommand, None, writeToExternalProtocol)  # Exit the runtimeHub
+        }
 
     def _findCommand(self, srcProtocolMessage):
         # Whatever comes out of this method should be an AWSIoTCommand
         # Invalid command will have a protocol name of "x"
         # Never raise exceptions
         retCommand = None
-        if srcProtocolMessage is None:
+        if not srcProtocolMessage:  # None or empty
             retCommand = AWSIoTCommand.AWSIoTCommand()
         else:
-            # MQTT init
-            if srcProtocolMessage[0] == "i":
-                retCommand = AWSIoTCommand.AWSIoTCommand("i")
-                if len(srcProtocolMessage[1:]) == 4:
-                    clientID = srcProtocolMessage[1]
-                    cleanSession = srcProtocolMessage[2] == "1"
-                    protocol = MQTTv3_1
-                    if srcProtocolMessage[3] == "4":
-                        protocol = MQTTv3_1_1
-                    useWebsocket = srcProtocolMessage[4] == "1"
-                    try:
-                        self._shadowClientHub = self._getAWSIoTMQTTShadowClient(clientID, protocol, useWebsocket, cleanSession)
-                        self._shadowClientHub.configureConnectDisconnectTimeout(10)
-                        self._shadowClientHub.configureMQTTOperationTimeout(5)
-                        self._mqttClientHub = self._shadowClientHub.getMQTTConnection()
-                    except TypeError:
-                        retCommand.setInitSuccess(False)  # Error in Init, set flag 
-                else:
-                    retCommand.setInitSuccess(False)  # Error in obtain parameters for Init
-            # Config
-            elif srcProtocolMessage[0] == "g":
-                retCommand = commandConfig(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowClientHub)
-            # Connect
-            elif srcProtocolMessage[0] == "c":
-                retCommand = commandConnect(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowClientHub)
-            # Disconnect
-            elif srcProtocolMessage[0] == "d":
-                retCommand = commandDisconnect(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowClientHub)
-            # Publish
-            elif srcProtocolMessage[0] == "p":
-                retCommand = commandPublish(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._mqttClientHub)
-            # Subscribe
-            elif srcProtocolMessage[0] == "s":
-                newMQTTSubscribeUnit = _mqttSubscribeUnit(self._formatPayloadForYield)  # Init an individual object for this subscribe
-                newSrcProtocolMessage = srcProtocolMessage
-                newSrcProtocolMessage.append(newMQTTSubscribeUnit)
-                retCommand = commandSubscribe(newSrcProtocolMessage[1:], self._serialCommunicationServerHub, self._mqttClientHub, self._mqttSubscribeTable)
-            # Unsubscribe
-            elif srcProtocolMessage[0] == "u":
-                retCommand = commandUnsubscribe(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._mqttClientHub, self._mqttSubscribeTable)
-            # Shadow init
-            elif srcProtocolMessage[0] == "si":
-                retCommand = AWSIoTCommand.AWSIoTCommand("si")
-                if self._shadowClientHub is None:
-                    # Should have init a mqttCore and got it connected
-                    retCommand.setInitSuccess(False)
-                else:
-                    # Now register the requested deviceShadow name
-                    if len(srcProtocolMessage[1:]) == 2:
-                        srcShadowName = srcProtocolMessage[1]
-                        srcIsPersistentSubscribe = srcProtocolMessage[2] == "1"
-                        try:
-                            newDeviceShadow = self._shadowClientHub.createShadowHandlerWithName(srcShadowName, srcIsPersistentSubscribe)
-                            # Now update the registration table
-                            self._shadowRegistrationTable[srcShadowName] = newDeviceShadow
-                        except TypeError:
-                            retCommand.setInitSuccess(False)
-                    else:
-                        retCommand.setInitSuccess(False)
-            # Shadow get
-            elif srcProtocolMessage[0] == "sg":
-                newSrcProtocolMessage = srcProtocolMessage
-                newSrcProtocolMessage.append(self._shadowCallback)
-                retCommand = commandShadowGet(newSrcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
-            # Shadow update
-            elif srcProtocolMessage[0] == "su":
-                newSrcProtocolMessage = srcProtocolMessage
-                newSrcProtocolMessage.append(self._shadowCallback)
-                retCommand = commandShadowUpdate(newSrcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
-            # Shadow delete
-            elif srcProtocolMessage[0] == "sd":
-                newSrcProtocolMessage = srcProtocolMessage
-                newSrcProtocolMessage.append(self._shadowCallback)
-                retCommand = commandShadowDelete(newSrcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
-            # Shadow register delta
-            elif srcProtocolMessage[0] == "s_rd":
-                newSrcProtocolMessage = srcProtocolMessage
-                newSrcProtocolMessage.append(self._shadowCallback)
-                retCommand = commandShadowRegisterDeltaCallback(newSrcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
-            # Shadow unregister delta
-            elif srcProtocolMessage[0] == "s_ud":
-                retCommand = commandShadowUnregisterDeltaCallback(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
-            # Lock message size
-            elif srcProtocolMessage[0] == "z":
-                retCommand = commandLockSize(srcProtocolMessage[1:], self._serialCommunicationServerHub)
-            # Oh the GREAT yield...
-            elif srcProtocolMessage[0] == "y":
-                retCommand = commandYield(srcProtocolMessage[1:], self._serialCommunicationServerHub)
-            # JSON Key-Value Retrieve
-            elif srcProtocolMessage[0] == 'j':
-                retCommand = commandJSONKeyVal(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._jsonManagerHub)
-            # Backoff Timing Config
-            elif srcProtocolMessage[0] == 'bf':
-                retCommand = commandSetBackoffTiming(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._mqttClientHub)
-            # Offline Publish Queue Config
-            elif srcProtocolMessage[0] == 'pq':
-                retCommand = commandSetOfflinePublishQueueing(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._mqttClientHub)
-            # Draining Interval Config
-            elif srcProtocolMessage[0] == 'di':
-                retCommand = commandSetDrainingIntervalSecond(srcProtocolMessage[1:], self._serialCommunicationServerHub, self._mqttClientHub)
-            # Exit the runtimeHub
-            elif srcProtocolMessage[0] == "~":
-                retCommand = AWSIoTCommand.AWSIoTCommand("~")
+            commandEntry = self._commandTable.get(srcProtocolMessage[0])
             # Unsupported protocol
-            else:
+            if commandEntry is None:
                 retCommand = AWSIoTCommand.AWSIoTCommand()
+            else:
+                parameterList = srcProtocolMessage[1:]
+                # Wrong number of parameters, the command will fail its validation and report its own error
+                if commandEntry[1] is not None and len(parameterList) != commandEntry[1]:
+                    parameterList = None
+                retCommand = commandEntry[0](parameterList)
+        return retCommand
+
+    def _getYieldCommand(self, srcParameterList):
+        self._yieldCommand.setParameterList(srcParameterList)
+        return self._yieldCommand
+
+    def _getLockSizeCommand(self, srcParameterList):
+        self._lockSizeCommand.setParameterList(srcParameterList)
+        return self._lockSizeCommand
+
+    def _getPublishCommand(self, srcParameterList):
+        return self._loadCommandClass("commandPublish")(srcParameterList, self._serialCommunicationServerHub, self._mqttClientHub, self._publishBatcherHub)
+
+    def _getJSONKeyValCommand(self, srcParameterList):
+        return self._loadCommandClass("commandJSONKeyVal")(srcParameterList, self._serialCommunicationServerHub, self._jsonManagerHub)
+
+    def _getJSONMultiKeyValCommand(self, srcParameterList):
+        return self._loadCommandClass("commandJSONMultiKeyVal")(srcParameterList, self._serialCommunicationServerHub, self._jsonManagerHub)
+
+    def _getMQTTInitCommand(self, srcParameterList):
+        retCommand = AWSIoTCommand.AWSIoTCommand("i")
+        isReattachPending = self._isReattachPending
+        self._isReattachPending = False
+        if isReattachPending and self._shadowClientHub is not None and srcParameterList == self._mqttInitParameterList:
+            # Same client as before the sketch was reset, keep it with its connection and subscriptions
+            self._clientSessionRecord["isReused"] = True
+        elif srcParameterList is not None:
+            clientID = srcParameterList[0]
+            cleanSession = srcParameterList[1] == "1"
+            protocol = _MQTTv3_1
+            if srcParameterList[2] == "4":
+                protocol = _MQTTv3_1_1
+            useWebsocket = srcParameterList[3] == "1"
+            # A client still connected, e.g. left by a sketch that was reset, is replaced together with its subscriptions
+            if self._clientSessionRecord.get("keepAlive") is not None:
+                try:
+                    self._shadowClientHub.disconnect()
+                except Exception as e:
+                    self._log.debug("Exception in disconnecting the replaced client: " + str(type(e)) + str(e.message))
+                self._clientSessionRecord.clear()
+                self._mqttSubscribeTable.clear()
+                self._shadowRegistrationTable.clear()
+            try:
+                self._shadowClientHub = self._getAWSIoTMQTTShadowClient(clientID, protocol, useWebsocket, cleanSession)
+                self._shadowClientHub.configureConnectDisconnectTimeout(10)
+                self._shadowClientHub.configureMQTTOperationTimeout(5)
+                self._mqttClientHub = self._shadowClientHub.getMQTTConnection()
+                self._mqttInitParameterList = srcParameterList
+                self._clientSessionRecord.clear()
+            except (TypeError, ImportError):
+                retCommand.setInitSuccess(False)  # Error in Init (or no SDK to init with), set flag 
+        else:
+            retCommand.setInitSuccess(False)  # Error in obtain parameters for Init
         return retCommand
 
+    def _getConfigCommand(self, srcParameterList):
+        return self._loadCommandClass("commandConfig")(srcParameterList, self._serialCommunicationServerHub, self._shadowClientHub, self._clientSessionRecord)
+
+    def _getConnectCommand(self, srcParameterList):
+        return self._loadCommandClass("commandConnect")(srcParameterList, self._serialCommunicationServerHub, self._shadowClientHub, self._clientSessionRecord)
+
+    def _getDisconnectCommand(self, srcParameterList):
+        return self._loadCommandClass("commandDisconnect")(srcParameterList, self._serialCommunicationServerHub, self._shadowClientHub, self._clientSessionRecord,
+                                                           self._publishBatcherHub)
+
+    def _getSubscribeCommand(self, srcParameterList):
+        if srcParameterList is not None:
+            newMQTTSubscribeUnit = _mqttSubscribeUnit(self._formatPayloadForYield)  # Init an individual object for this subscribe
+            srcParameterList.append(newMQTTSubscribeUnit)
+        return self._loadCommandClass("commandSubscribe")(srcParameterList, self._serialCommunicationServerHub, self._mqttClientHub, self._mqttSubscribeTable)
+
+    def _getUnsubscribeCommand(self, srcParameterList):
+        return self._loadCommandClass("commandUnsubscribe")(srcParameterList, self._serialCommunicationServerHub, self._mqttClientHub, self._mqttSubscribeTable)
+
+    def _getShadowInitCommand(self, srcParameterList):
+        retCommand = AWSIoTCommand.AWSIoTCommand("si")
+        if self._shadowClientHub is None:
+            # Should have init a mqttCore and got it connected
+            retCommand.setInitSuccess(False)
+        else:
+            # Now register the requested deviceShadow name
+            if srcParameterList is not None:
+                srcShadowName = srcParameterList[0]
+                srcIsPersistentSubscribe = srcParameterList[1] == "1"
+                # A reused client keeps its deviceShadow instances, with their subscriptions
+                if self._clientSessionRecord.get("isReused") and srcShadowName in self._shadowRegistrationTable:
+                    return retCommand
+                try:
+                    newDeviceShadow = self._shadowClientHub.createShadowHandlerWithName(srcShadowName, srcIsPersistentSubscribe)
+                    # Now update the registration table
+                    self._shadowRegistrationTable[srcShadowName] = newDeviceShadow
+                except TypeError:
+                    retCommand.setInitSuccess(False)
+            else:
+                retCommand.setInitSuccess(False)
+        return retCommand
+
+    def _getShadowGetCommand(self, srcParameterList):
+        if srcParameterList is not None:
+            srcParameterList.append(self._shadowCallback)
+        return self._loadCommandClass("commandShadowGet")(srcParameterList, self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowRequestTable)
+
+    def _getShadowUpdateCommand(self, srcParameterList):
+        if srcParameterList is not None:
+            srcParameterList.append(self._shadowCallback)
+        return self._loadCommandClass("commandShadowUpdate")(srcParameterList, self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowRequestTable)
+
+    def _getShadowDeleteCommand(self, srcParameterList):
+        if srcParameterList is not None:
+            srcParameterList.append(self._shadowCallback)
+        return self._loadCommandClass("commandShadowDelete")(srcParameterList, self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowRequestTable)
+
+    def _getShadowRegisterDeltaCallbackCommand(self, srcParameterList):
+        if srcParameterList is not None:
+            srcParameterList.append(self._shadowCallback)
+        return self._loadCommandClass("commandShadowRegisterDeltaCallback")(srcParameterList, self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
+
+    def _getShadowUnregisterDeltaCallbackCommand(self, srcParameterList):
+        return self._loadCommandClass("commandShadowUnregisterDeltaCallback")(srcParameterList, self._serialCommunicationServerHub, self._shadowRegistrationTable, self._shadowSubscribeRecord)
+
+    def _getSetBackoffTimingCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetBackoffTiming")(srcParameterList, self._serialCommunicationServerHub, self._mqttClientHub)
+
+    def _getSetOfflinePublishQueueingCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetOfflinePublishQueueing")(srcParameterList, self._serialCommunicationServerHub, self._mqttClientHub)
+
+    def _getSetDrainingIntervalSecondCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetDrainingIntervalSecond")(srcParameterList, self._serialCommunicationServerHub, self._mqttClientHub)
+
+    def _getSetBurstSizeCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetBurstSize")(srcParameterList, self._serialCommunicationServerHub)
+
+    def _getSetFramingModeCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetFramingMode")(srcParameterList, self._serialCommunicationServerHub)
+
+    def _getSetPublishBatchingCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetPublishBatching")(srcParameterList, self._serialCommunicationServerHub, self._publishBatcherHub)
+
+    def _getSetPublishBatchGroupCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetPublishBatchGroup")(srcParameterList, self._serialCommunicationServerHub, self._publishBatcherHub)
+
+    def _getSetYieldQueueCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetYieldQueue")(srcParameterList, self._serialCommunicationServerHub)
+
+    def _getYieldDropsCommand(self, srcParameterList):
+        return self._loadCommandClass("commandGetYieldDrops")(srcParameterList, self._serialCommunicationServerHub)
+
+    def _getSetYieldPriorityCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetYieldPriority")(srcParameterList, self._serialCommunicationServerHub, self._mqttSubscribeTable, self._shadowSubscribeRecord)
+
+    def _getSetConflationCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetConflation")(srcParameterList, self._serialCommunicationServerHub, self._mqttSubscribeTable)
+
+    def _getSetDaemonModeCommand(self, srcParameterList):
+        return self._loadCommandClass("commandSetDaemonMode")(srcParameterList, self._serialCommunicationServerHub)
+
+    def _getReattachCommand(self, srcParameterList):
+        return AWSIoTCommand.AWSIoTCommand("ra")
+
+    def _getBatchCommand(self, srcParameterList):
+        return AWSIoTCommand.AWSIoTCommand("b")
+
+    def _getExitCommand(self, srcParameterList):
+        return AWSIoTCommand.AWSIoTCommand("~")
+
     def _formatPayloadForYield(self, srcPayload, srcSketchSlotNumber):
         # Generate the formatted payload for Yield requests
+        # Return a list of frames, each of which will be sent over serial as ONE chunk
         ####
-        # Generate the meta data
-        hasMore = 1
-        metaData = "Y " + str(srcSketchSlotNumber) + " " + str(hasMore) + " "
+        # Generate the meta data, hasMore flag is 1 for all chunks but the last one
+        metaData = "Y " + str(srcSketchSlotNumber) + " 1 "
+        lastMetaData = "Y " + str(srcSketchSlotNumber) + " 0 "
         # Get configured chunk size
         configuredChunkSize = self._serialCommunicationServerHub.getChunkSize()
         # Divide the payload into smaller chunks plus  meta data
         messageChunkSize = configuredChunkSize - len(metaData)
-        chunks = [metaData + srcPayload[i:i+messageChunkSize] for i in range(0, len(srcPayload), messageChunkSize)]
-        # Change hasMore flag for the last chunk
-        chunks[len(chunks)-1] = "Y " + str(srcSketchSlotNumber) + " 0 " + chunks[len(chunks)-1][len(metaData):]
-        # Concat them together
-        return "".join(chunks)        
+        lastChunkStart = max(len(srcPayload) - 1, 0) // messageChunkSize * messageChunkSize
+        chunks = [metaData + srcPayload[i:i+messageChunkSize] for i in range(0, lastChunkStart, messageChunkSize)]
+        chunks.append(lastMetaData + srcPayload[lastChunkStart:])
+        return chunks
 
     # Callbacks
     def _shadowCallback(self, srcPayload, srcCurrentType, srcCurrentToken):
@@ -264,31 +454,113 @@ class runtimeHub:
         # srcCurrentType: accepted//rejected//<deviceShadowName>/delta
         self._shadowCallbackLock.acquire()
         currentJSONHandler = self._jsonManagerHub.storeNewJSON(srcPayload, srcCurrentType)
-        currentSketchSlotNumber = -1
-        try:
-            # Wait util internal data structure is updated
-            if srcCurrentToken is not None:
-                while srcCurrentToken not in self._shadowSubscribeRecord.keys():
-                    pass
-            # accepted//rejected: Find the sketch slot number by token
-            if srcCurrentType in ["accepted", "rejected", "timeout"]:
-                currentSketchSlotNumber = self._shadowSubscribeRecord[srcCurrentToken]
-                del self._shadowSubscribeRecord[srcCurrentToken]  # Retrieve the memory in dict
-            # delta/<deviceShadowName>: Find the sketch slot number by deviceShadowName
-            else:
-                fragments = srcCurrentType.split("/")
-                deviceShadowNameForDelta = fragments[1]
-                currentSketchSlotNumber = self._shadowSubscribeRecord[deviceShadowNameForDelta]
-            # Refactor the JSONHandler by adding protocol head and dividing into reasonable chunks
-            formattedPayload = self._formatPayloadForYield(currentJSONHandler, currentSketchSlotNumber)
-            # Put it into the internal queue of the serialCommunicationServer
-            self._serialCommunicationServerHub.writeToInternalYield(formattedPayload)
-            # This message will get to be transmitted in future Yield requests
-        except KeyError as e:
-            self._shadowCallbackLock.release()
-            return
-            # Ignore messages coming between callback and unregister delta 
         self._shadowCallbackLock.release()
+        # accepted//rejected: Find the sketch slot number by token
+        # If the request is not registered yet, the response is parked and delivered upon registration
+        if srcCurrentType in ["accepted", "rejected", "timeout"]:
+            self._shadowRequestTable.resolveRequest(srcCurrentToken, currentJSONHandler)
+        # delta/<deviceShadowName>: Find the sketch slot number by deviceShadowName
+        else:
+            fragments = srcCurrentType.split("/")
+            deviceShadowNameForDelta = fragments[1]
+            currentSketchSlotNumber = self._shadowSubscribeRecord.get(deviceShadowNameForDelta)
+            if currentSketchSlotNumber is not None:  # Ignore messages coming between callback and unregister delta
+                self._deliverShadowMessage(currentJSONHandler, currentSketchSlotNumber, True)
+
+    def _resetSketchSession(self):
+        # A restarted sketch reattaches to this runtime, e.g. kept running in daemon mode
+        # The MQTT client, its connection, subscriptions and deviceShadow instances stay for the sketch to reuse
+        # Whatever is left for the previous sketch goes: its sketch slots, queued messages and session settings
+        self._publishBatcherHub.reset()
+        self._serialCommunicationServerHub.resetSession()
+        self._configureDefaultYieldQueue()
+        for currentMQTTSubscribeUnit in self._mqttSubscribeTable.values():
+            currentMQTTSubscribeUnit.setSketchSlotNumber(-1)
+        self._shadowSubscribeRecord.clear()
+        self._shadowRequestTable.clearRequests()
+        self._clientSessionRecord.pop("isReused", None)
+        self._isReattachPending = True
+
+    def _deliverShadowMessage(self, srcJSONHandler, srcSketchSlotNumber, srcIsDroppable=False):
+        # Refactor the JSONHandler by adding protocol head and dividing into reasonable chunks
+        formattedPayload = self._formatPayloadForYield(srcJSONHandler, srcSketchSlotNumber)
+        # Put it into the internal queue of the serialCommunicationServer
+        # Shadow get/update/delete responses free the sketch slot of the request, so they are never dropped
+        self._serialCommunicationServerHub.writeToInternalYield(formattedPayload, srcSketchSlotNumber, srcIsDroppable)
+        # This message will get to be transmitted in future Yield requests
+
+    def _deliverPublishFlushStatus(self, srcFlushStatus, srcSketchSlotNumber):
+        # Flush status of a publish batch, "<result code> <number of records> <topic>"
+        # The sketch has had "P T" for each of these publishes, so the flush status is never dropped
+        formattedPayload = self._formatPayloadForYield(srcFlushStatus, srcSketchSlotNumber)
+        self._serialCommunicationServerHub.writeToInternalYield(formattedPayload, srcSketchSlotNumber, srcIsDroppable=False)
+
+    def _executeCommand(self, srcCommand):
+        # Execute ONE command, its feedback is left in the internal queue/buffer of the serialCommunicationServer
+        # See if the command is an init (MQTT/Shadow) that needs data structure operations
+        currentCommandProtocolName = srcCommand.getCommandProtocolName()
+        if currentCommandProtocolName == "i":  # MQTT init
+            if srcCommand.getInitSuccess():
+                self._serialCommunicationServerHub.writeToInternalProtocol("I T")
+            else:
+                self._serialCommunicationServerHub.writeToInternalProtocol("I F")
+        elif currentCommandProtocolName == "ra":  # Reattach
+            self._resetSketchSession()
+            self._serialCommunicationServerHub.writeToInternalProtocol("RA T")
+        elif currentCommandProtocolName == "si":  # Shadow init
+            if srcCommand.getInitSuccess():
+                self._serialCommunicationServerHub.writeToInternalProtocol("SI T")
+            else:
+                self._serialCommunicationServerHub.writeToInternalProtocol("SI F")
+        else:  # Other command
+            srcCommand.execute()
+
+    def _runBatch(self, srcProtocolMessageList):
+        # Execute the commands of a batch one after another and write back ONE combined reply:
+        # "B T <result code>;<result code>;...", with the result code of each command in the batch, in order
+        # Result code is the feedback of the command up to the ':', e.g. "P T", "P3F", "SU1F"
+        # A command with a chunked feedback (yield/JSON) gets "<NAME> T" and its feedback follows the combined reply
+        # Only one of them is allowed in a batch, as the last command. Commands after it are not executed
+        # Invalid commands, and those that cannot be batched (batch, framing mode, exit, reattach), get "X F"
+        resultCodeList = []
+        chunkedWriteBack = None
+        writeToExternalProtocol = self._serialCommunicationServerHub.writeToExternalProtocol
+        for protocolMessage in srcProtocolMessageList:
+            currentCommand = self._findCommand(protocolMessage)
+            currentCommandProtocolName = currentCommand.getCommandProtocolName()
+            commandEntry = self._commandTable.get(currentCommandProtocolName)
+            if commandEntry is None or currentCommandProtocolName in ["b", "fm", "~", "ra"] or chunkedWriteBack is not None:
+                resultCodeList.append("X F")
+                continue
+            try:
+                self._executeCommand(currentCommand)
+            except Exception as e:  # Keep going with the rest of the batch
+                self._log.debug("Exception in batch: " + str(type(e)) + str(e.message))
+                self._serialCommunicationServerHub.readFromInternalProtocol()
+                resultCodeList.append("X F")
+                continue
+            if commandEntry[2] == writeToExternalProtocol:
+                feedback = self._serialCommunicationServerHub.readFromInternalProtocol()
+                if feedback is None:
+                    resultCodeList.append("X F")
+                else:
+                    resultCodeList.append(feedback.split(":", 1)[0])
+            else:
+                resultCodeList.append(currentCommandProtocolName.upper() + " T")
+                chunkedWriteBack = commandEntry[2]
+        self._serialCommunicationServerHub.writeToInternalProtocol("B T " + ";".join(resultCodeList))
+        writeToExternalProtocol()
+        if chunkedWriteBack is not None:
+            chunkedWriteBack()
+
+    def _writeStartupReport(self, srcFirstCommandProtocolName):
+        # Startup is over once the first command is answered
+        self._startupReport.mark("firstCommand " + srcFirstCommandProtocolName)
+        try:
+            self._startupReport.write()
+        except IOError as e:
+            self._log.debug("Exception in writing the startup report: " + str(e))
+        self._log.debug(self._startupReport.format())
 
     # Runtime function
     def run(self):
@@ -297,40 +569,37 @@ class runtimeHub:
                 # Start the serialCommunicationServer and accepts protocol messages
                 # Raises AWSIoTExceptions.acceptTimeoutException
                 currentProtocolMessage = self._serialCommunicationServerHub.accept()
+                if not self._startupReport.isWritten():
+                    self._startupReport.mark("idle")
                 # Find with command request this is
                 currentCommand = self._findCommand(currentProtocolMessage)
-                # See if the command is an init (MQTT/Shadow) that needs data structure operations
                 currentCommandProtocolName = currentCommand.getCommandProtocolName()
                 if currentCommandProtocolName == "x":
                     pass # Ignore invalid protocol command
-                if currentCommandProtocolName == "i":  # MQTT init
-                    if currentCommand.getInitSuccess():
-                        self._serialCommunicationServerHub.writeToInternalProtocol("I T")
-                    else:
-                        self._serialCommunicationServerHub.writeToInternalProtocol("I F")
-                    self._serialCommunicationServerHub.writeToExternalProtocol()
-                elif currentCommandProtocolName == "si":  # Shadow init
-                    if currentCommand.getInitSuccess():
-                        self._serialCommunicationServerHub.writeToInternalProtocol("SI T")
-                    else:
-                        self._serialCommunicationServerHub.writeToInternalProtocol("SI F")
-                    self._serialCommunicationServerHub.writeToExternalProtocol()
                 elif currentCommandProtocolName == "~":  # Exit
                     break
-                else:  # Other command
+                elif currentCommandProtocolName == "b":  # Batch
+                    self._runBatch(currentProtocolMessage[1:])
+                else:
                     # Execute the command
-                    currentCommand.execute()
+                    self._executeCommand(currentCommand)
                     # Write the result back through serial (detailed error code is transmitted here)
-                    if currentCommandProtocolName == "y":
-                        self._serialCommunicationServerHub.writeToExternalYield()
-                    elif currentCommandProtocolName == "j":
-                        self._serialCommunicationServerHub.writeToExternalJSON()
-                    else:
-                        self._serialCommunicationServerHub.writeToExternalProtocol()
+                    self._commandTable[currentCommandProtocolName][2]()
+                if not self._startupReport.isWritten():
+                    self._writeStartupReport(currentCommandProtocolName)
 
             except AWSIoTExceptions.acceptTimeoutException as e:
                 self._log.debug(str(e.message))
                 break
+            except EOFError as e:  # Nothing more will come in, even in daemon mode
+                self._log.debug(str(e.message))
+                break
             except Exception as e:
                 self._log.debug("Exception in run: " + str(type(e)) + str(e.message))
                 # traceback.print_exc(file, sys.stdout)
+        # Send out what is left in publish batches
+        self._publishBatcherHub.flushAll()
+        # Leave the terminal as it was found
+        self._serialCommunicationServerHub.resetFramedMode()
+        if self._jsonHistoryStore is not None:
+            self._jsonHistoryStore.close()
@@ -0,0 +1,62 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import json
+import unittest
+
+_testDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_testDirectory, "..", "lib"))
+from util.jsonKeyPath import jsonKeyPath
+from util.jsonManager import jsonManager
+
+# Run with: python -m unittest discover -s test, from AWS-IoT-Python-Runtime
+_shadowDocument = {"state": {"reported": {"firmware.version": "1.2", "sensors": [{"value": 20}, {"value": 21}, {"value": 23}],
+                                          "firmware": {"version": "2.0"}, "a*b": 1, "c[0]": 2, "d\\e": 3}}}
+
+
+class testJsonKeyPath(unittest.TestCase):
+
+    def test_quotedKeysAreTakenAsTheyAre(self):
+        # Key paths with '"' only, as sketches have always sent them
+        self.assertEqual(jsonKeyPath('state"reported"firmware.version').evaluate(_shadowDocument), "1.2")
+        self.assertEqual(jsonKeyPath('state"reported"a*b').evaluate(_shadowDocument), 1)
+        self.assertEqual(jsonKeyPath('state"reported"c[0]').evaluate(_shadowDocument), 2)
+        self.assertEqual(jsonKeyPath('state"reported"d\\e').evaluate(_shadowDocument), 3)
+        self.assertEqual(jsonKeyPath('"state""reported"firmware"version').evaluate(_shadowDocument), "2.0")
+        self.assertEqual(jsonKeyPath("firmware.version").evaluate(_shadowDocument["state"]["reported"]), "1.2")
+
+    def test_extendedPart(self):
+        self.assertEqual(jsonKeyPath('state"reported"$.sensors[2].value').evaluate(_shadowDocument), 23)
+        self.assertEqual(jsonKeyPath('state"reported"$.sensors[*].value').evaluate(_shadowDocument), [20, 21, 23])
+        self.assertEqual(jsonKeyPath("$.state.reported.firmware\\.version").evaluate(_shadowDocument), "1.2")
+        self.assertEqual(jsonKeyPath("$.state.reported.firmware.version").evaluate(_shadowDocument), "2.0")
+        self.assertRaises(ValueError, jsonKeyPath, 'state"reported"$[sensors]')
+
+    def test_extendedKeyPath(self):
+        self.assertEqual(jsonKeyPath("state.reported.sensors[-1].value", True).evaluate(_shadowDocument), 23)
+        self.assertEqual(jsonKeyPath("$.state.reported.sensors[0].value", True).evaluate(_shadowDocument), 20)
+        self.assertRaises(ValueError, jsonKeyPath, "state.reported.sensors[0", True)
+
+    def test_jsonManagerKeepsQuotedKeys(self):
+        currentJSONManager = jsonManager(8, 8, 8)
+        self.assertEqual(currentJSONManager.getValueByKeyInJSON(json.dumps(_shadowDocument), 'state"reported"firmware.version'), "1.2")
+
+
+if __name__ == "__main__":
+    unittest.main()
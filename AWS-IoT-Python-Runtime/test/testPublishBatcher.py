@@ -0,0 +1,171 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import unittest
+
+_testDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_testDirectory, "..", "lib"))
+from util.publishBatcher import publishBatcher
+from command.commandDisconnect import commandDisconnect
+
+# Run with: python -m unittest discover -s test, from AWS-IoT-Python-Runtime
+
+
+class _fakeTimer:
+    # Batching window that only fires when the test says so
+
+    def __init__(self, srcDelaySecond, srcFunctionPointer, srcArgs):
+        self.delaySecond = srcDelaySecond
+        self.isCancelled = False
+        self._function = srcFunctionPointer
+        self._args = srcArgs
+
+    def cancel(self):
+        self.isCancelled = True
+
+    def fire(self):
+        self._function(*self._args)
+
+
+class _fakeMQTTCore:
+
+    def __init__(self):
+        self.publishes = []  # (topic, payload, QoS)
+
+    def publish(self, srcTopic, srcPayload, srcQoS):
+        self.publishes.append((srcTopic, srcPayload, srcQoS))
+
+
+class _fakeMQTTClient:
+
+    def __init__(self, srcMQTTCore):
+        self._mqttCore = srcMQTTCore
+
+    def disconnect(self):
+        self._mqttCore.publishes.append(("disconnect", None, None))
+
+
+class _fakeServer:
+
+    def __init__(self):
+        self.replies = []
+
+    def writeToInternalProtocol(self, srcMessage):
+        self.replies.append(srcMessage)
+
+
+class testPublishBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self._timers = []
+        self._flushStatuses = []  # (flush status, sketch slot #)
+        self._mqttCore = _fakeMQTTCore()
+        self._batcher = publishBatcher(self._report, self._callLater)
+
+    def _report(self, srcFlushStatus, srcSketchSlotNumber):
+        self._flushStatuses.append((srcFlushStatus, srcSketchSlotNumber))
+
+    def _callLater(self, srcDelaySecond, srcFunctionPointer, *args):
+        self._timers.append(_fakeTimer(srcDelaySecond, srcFunctionPointer, args))
+        return self._timers[-1]
+
+    def test_invalidConfigurationIsRefused(self):
+        self.assertRaises(ValueError, self._batcher.configure, 100, 0, 3, 0)
+        self.assertRaises(ValueError, self._batcher.configure, 0, 0, publishBatcher.formatJSONArray, 0)
+        self.assertRaises(ValueError, self._batcher.configure, 100, -1, publishBatcher.formatJSONArray, 0)
+        self.assertFalse(self._batcher.isEnabled())
+
+    def test_batchIsSentWhenTheWindowIsOver(self):
+        self._batcher.configure(200, 0, publishBatcher.formatJSONArray, 3)
+        self._batcher.add(self._mqttCore, "t", "{\"a\": 1}", 0)
+        self._batcher.add(self._mqttCore, "t", "text", 1)
+        self.assertEqual(len(self._timers), 1)  # The window starts with the first publish
+        self.assertEqual(self._timers[0].delaySecond, 0.2)
+        self.assertEqual(self._mqttCore.publishes, [])
+        self._timers[0].fire()
+        self.assertEqual(self._mqttCore.publishes, [("t", "[{\"a\": 1},\"text\"]", 1)])
+        self.assertEqual(self._flushStatuses, [("P T 2 t", 3)])
+        self.assertEqual(self._batcher.getNumberOfPendingBatches(), 0)
+
+    def test_eachTopicHasItsOwnBatch(self):
+        self._batcher.configure(200, 0, publishBatcher.formatNewlineDelimited, 0)
+        self._batcher.add(self._mqttCore, "t1", "1", 0)
+        self._batcher.add(self._mqttCore, "t2", "2", 0)
+        self._batcher.add(self._mqttCore, "t1", "3", 0)
+        self.assertEqual(self._batcher.getNumberOfPendingBatches(), 2)
+        for timer in self._timers:
+            timer.fire()
+        self.assertEqual(self._mqttCore.publishes, [("t1", "1\n3", 0), ("t2", "2", 0)])
+
+    def test_batchIsSentWhenItReachesTheByteLimit(self):
+        # Each record takes its length plus one separator
+        self._batcher.configure(200, 6, publishBatcher.formatJSONArray, 0)
+        self._batcher.add(self._mqttCore, "t", "11", 0)
+        self._batcher.add(self._mqttCore, "t", "22", 0)
+        self.assertEqual(self._mqttCore.publishes, [("t", "[11,22]", 0)])
+        self.assertTrue(self._timers[0].isCancelled)
+        self._timers[0].fire()  # A timer that fires late does not send the batch again
+        self.assertEqual(len(self._mqttCore.publishes), 1)
+
+    def test_recordThatDoesNotFitGoesToTheNextBatch(self):
+        self._batcher.configure(200, 8, publishBatcher.formatJSONArray, 0)
+        self._batcher.add(self._mqttCore, "t", "111", 0)
+        self._batcher.add(self._mqttCore, "t", "2222", 0)
+        self.assertEqual(self._mqttCore.publishes, [("t", "[111]", 0)])
+        self.assertEqual(self._batcher.getNumberOfPendingBatches(), 1)
+        self._timers[1].fire()
+        self.assertEqual(self._mqttCore.publishes[1], ("t", "[2222]", 0))
+
+    def test_topicGroupMergesIntoItsDestination(self):
+        self._batcher.configure(200, 0, publishBatcher.formatJSONArray, 0)
+        self._batcher.configureTopicGroup("sensor/+/temp", "sensor/all")
+        self._batcher.add(self._mqttCore, "sensor/a/temp", "1", 0)
+        self._batcher.add(self._mqttCore, "sensor/b/temp", "2", 0)
+        self._batcher.add(self._mqttCore, "sensor/b/humidity", "3", 0)
+        self._batcher.flushAll()
+        self.assertEqual(sorted(self._mqttCore.publishes), [
+            ("sensor/all", "[{\"topic\": \"sensor/a/temp\", \"payload\": 1},{\"topic\": \"sensor/b/temp\", \"payload\": 2}]", 0),
+            ("sensor/b/humidity", "[3]", 0)])
+
+    def test_noFlushStatusWithoutSlot(self):
+        self._batcher.configure(200, 0, publishBatcher.formatJSONArray, -1)
+        self._batcher.add(self._mqttCore, "t", "1", 0)
+        self._batcher.flushAll()
+        self.assertEqual(len(self._mqttCore.publishes), 1)
+        self.assertEqual(self._flushStatuses, [])
+
+    def test_configureSendsPendingBatchesFirst(self):
+        self._batcher.configure(200, 0, publishBatcher.formatJSONArray, 0)
+        self._batcher.add(self._mqttCore, "t", "1", 0)
+        self._batcher.reset()
+        self.assertEqual(self._mqttCore.publishes, [("t", "[1]", 0)])
+        self.assertFalse(self._batcher.isEnabled())
+
+    def test_disconnectSendsPendingBatchesFirst(self):
+        self._batcher.configure(200, 0, publishBatcher.formatJSONArray, 0)
+        self._batcher.add(self._mqttCore, "t", "1", 0)
+        server = _fakeServer()
+        commandDisconnect([], server, _fakeMQTTClient(self._mqttCore), {"keepAlive": 10}, self._batcher).execute()
+        self.assertEqual(self._mqttCore.publishes, [("t", "[1]", 0), ("disconnect", None, None)])
+        self.assertEqual(self._flushStatuses, [("P T 1 t", 0)])
+        self.assertEqual(server.replies, ["D T"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import struct
+import binascii
+import unittest
+
+_testDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_testDirectory, "..", "lib"))
+from comm.serialCommunicationServer import serialCommunicationServer
+
+# Run with: python -m unittest discover -s test, from AWS-IoT-Python-Runtime
+_commandIDs = dict((name, commandID) for commandID, name in serialCommunicationServer._frameCommandNames.items())
+_commandIDs["resend"] = 0
+
+
+class _fakeTransport:
+    # Input is given as a list of strings, each one read at a time, then EOF
+    # Everything written goes to output
+
+    def __init__(self):
+        self.input = []
+        self.output = ""
+        self.isRawMode = False
+
+    def receive(self, srcTimeoutSecond):
+        if len(self.input) == 0:
+            return ""
+        return self.input.pop(0)
+
+    def writeLine(self, srcContent):
+        self.output += srcContent + "\n"
+
+    def write(self, srcContent):
+        self.output += srcContent
+
+    def flush(self):
+        pass
+
+    def setRawMode(self, srcRawMode):
+        self.isRawMode = srcRawMode
+
+
+def _commandFrame(srcSequence, srcAck, srcProtocolName, srcParameterList=()):
+    # <STX> <sequence> <ack> <command ID> <number of parameters> (<length> <parameter>)* <CRC>
+    frameBody = struct.pack("BBBB", srcSequence, srcAck, _commandIDs[srcProtocolName], len(srcParameterList))
+    for parameter in srcParameterList:
+        frameBody += struct.pack(">H", len(parameter)) + parameter
+    return "\x02" + frameBody + struct.pack(">H", binascii.crc_hqx(frameBody, 0xFFFF))
+
+
+def _damage(srcFrame):
+    # Same frame with a wrong CRC
+    return srcFrame[:-1] + chr(ord(srcFrame[-1]) ^ 0xFF)
+
+
+def _replyFrames(srcOutput):
+    # Split the output into (sequence, message) pairs, checking each CRC
+    replies = []
+    while srcOutput != "":
+        sequence, length = struct.unpack(">BH", srcOutput[1:4])
+        frameBody = srcOutput[1:4 + length]
+        assert srcOutput[0] == "\x02"
+        assert struct.unpack(">H", srcOutput[4 + length:6 + length])[0] == binascii.crc_hqx(frameBody, 0xFFFF)
+        replies.append((sequence, frameBody[3:]))
+        srcOutput = srcOutput[6 + length:]
+    return replies
+
+
+class testReliableFraming(unittest.TestCase):
+
+    def setUp(self):
+        self._transport = _fakeTransport()
+        self._server = serialCommunicationServer(self._transport)
+        # Switch to reliable framed mode the way the "fm" command does, once its feedback is out
+        self._server.setFramedMode(True, True)
+        self._server.writeToInternalProtocol("FM T")
+        self._server.writeToExternalProtocol()
+        self._transport.output = ""
+
+    def _reply(self, srcMessage):
+        self._server.writeToInternalProtocol(srcMessage)
+        self._server.writeToExternalProtocol()
+
+    def _acceptAll(self):
+        # Accept until EOF, answering each command with "<NAME> T"
+        # Return the commands, each one as accept returns it
+        commands = []
+        while True:
+            try:
+                command = self._server.accept()
+            except EOFError:
+                return commands
+            commands.append(command)
+            self._reply(command[0].upper() + " T")
+
+    def test_commandFrameIsTakenAndAnswered(self):
+        self.assertTrue(self._server.isReliableMode())
+        self.assertTrue(self._transport.isRawMode)
+        self._transport.input = [_commandFrame(1, 0, "p", ["topic", "payload", "0", "0"])]
+        self.assertEqual(self._acceptAll(), [["p", "topic", "payload", "0", "0"]])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "P T")])
+
+    def test_commandFrameComesInPieces(self):
+        frame = _commandFrame(1, 0, "p", ["topic", "payload", "0", "0"])
+        self._transport.input = [frame[:3], frame[3:9], frame[9:]]
+        self.assertEqual(self._acceptAll(), [["p", "topic", "payload", "0", "0"]])
+
+    def test_damagedFrameIsRejected(self):
+        self._transport.input = [_damage(_commandFrame(1, 0, "p", ["topic", "payload", "0", "0"])), _commandFrame(1, 0, "z")]
+        self.assertEqual(self._acceptAll(), [["z"]])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "R F 1: Damaged frame."), (2, "Z T")])
+
+    def test_outOfSequenceFrameIsRejected(self):
+        self._transport.input = [_commandFrame(2, 0, "y"), _commandFrame(1, 0, "z")]
+        self.assertEqual(self._acceptAll(), [["z"]])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "R F 1: Out of sequence."), (2, "Z T")])
+
+    def test_frameSentAgainIsAnsweredNotRunAgain(self):
+        frame = _commandFrame(1, 0, "p", ["topic", "payload", "0", "0"])
+        self._transport.input = [frame, frame, _commandFrame(2, 1, "z")]
+        self.assertEqual(self._acceptAll(), [["p", "topic", "payload", "0", "0"], ["z"]])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "P T"), (1, "P T"), (2, "Z T")])
+
+    def test_resendRequestGoesBackToTheAck(self):
+        self._transport.input = [_commandFrame(1, 0, "y")]
+        self._server.accept()
+        for message in ["Y 0 0 first", "Y 1 0 second", "Y F: No messages."]:
+            self._reply(message)
+        self._transport.output = ""
+        # Frame 1 made it, 2 and 3 did not
+        self._transport.input = [_commandFrame(2, 1, "resend"), _commandFrame(3, 3, "z")]
+        self.assertEqual(self._acceptAll(), [["z"]])
+        self.assertEqual(_replyFrames(self._transport.output), [(2, "Y 1 0 second"), (3, "Y F: No messages."), (4, "Z T")])
+
+    def test_resendRequestWithNothingToResend(self):
+        self._transport.input = [_commandFrame(1, 0, "resend")]
+        self.assertEqual(self._acceptAll(), [])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "R F: No frames to resend.")])
+
+    def test_lineProbeGoesBackToLineProtocol(self):
+        # A restarted sketch probes with the line protocol
+        self._transport.input = ["1\nra\n"]
+        self.assertEqual(self._server.accept(), ["ra"])
+        self.assertFalse(self._server.isFramedMode())
+        self.assertFalse(self._transport.isRawMode)
+        self._transport.output = ""
+        self._reply("RA T")
+        self.assertEqual(self._transport.output, "RA T\n")
+
+    def test_garbageIsNotTakenForLineProbe(self):
+        self._transport.input = ["1\nxx\n", _commandFrame(1, 0, "z")]
+        self.assertEqual(self._acceptAll(), [["z"]])
+        self.assertTrue(self._server.isReliableMode())
+
+    def test_framesLostInBatchAreKeptAsInvalidCommands(self):
+        # Frame 2 is lost, frame 4 is damaged
+        self._transport.input = [_commandFrame(1, 0, "b"), _commandFrame(3, 0, "p", ["a", "1", "0", "0"]),
+                                 _damage(_commandFrame(4, 0, "p", ["b", "2", "0", "0"])), _commandFrame(5, 0, "p", ["c", "3", "0", "0"]),
+                                 _commandFrame(6, 0, "e")]
+        self.assertEqual(self._acceptAll(), [["b", ["x"], ["p", "a", "1", "0", "0"], ["x"], ["p", "c", "3", "0", "0"]]])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "B T")])  # No rejections within the batch
+
+    def test_frameSentAgainInBatchIsNotRunAgain(self):
+        frame = _commandFrame(2, 0, "p", ["a", "1", "0", "0"])
+        self._transport.input = [_commandFrame(1, 0, "b"), frame, frame, _commandFrame(3, 0, "e")]
+        self.assertEqual(self._acceptAll(), [["b", ["p", "a", "1", "0", "0"]]])
+
+    def test_resendRequestEndsBatch(self):
+        # End of batch got lost, the sketch asks for the reply
+        self._transport.input = [_commandFrame(1, 0, "b"), _commandFrame(2, 0, "p", ["a", "1", "0", "0"]), _commandFrame(3, 0, "resend")]
+        self.assertEqual(self._acceptAll(), [["b", ["p", "a", "1", "0", "0"]]])
+        self.assertEqual(_replyFrames(self._transport.output), [(1, "B T")])
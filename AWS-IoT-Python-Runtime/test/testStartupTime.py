@@ -0,0 +1,99 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import time
+import select
+import subprocess
+import unittest
+
+_testDirectory = os.path.dirname(os.path.abspath(__file__))
+_runtimeDirectory = os.path.join(_testDirectory, "..", "runtime")
+_standInDirectory = os.path.join(_testDirectory, "..", "benchmark", "standIn")
+_startupReportPath = os.path.join(_testDirectory, "..", "log", "AWSIoTMQTTArduinoHub.startup.log")
+
+# Run with: python -m unittest discover -s test, from AWS-IoT-Python-Runtime
+# Start the runtime the way setup_exec does, several times, and time it until the first reply to an MQTT init
+# The budget is for the median cold start on the Arduino Yun, set AWSIOT_STARTUP_BUDGET (in seconds) to change it
+# The stand-in SDK in benchmark/standIn is used when the AWS IoT Python SDK is not installed
+_budgetSecond = float(os.environ.get("AWSIOT_STARTUP_BUDGET", "3.0"))
+_numberOfRuns = 3
+_replyTimeoutSecond = 60
+_initRequest = "5\ni\nstartupTimeCheck\n1\n4\n0\n"
+_exitRequest = "1\n~\n"
+
+
+def _isSDKInstalled():
+    try:
+        import AWSIoTPythonSDK
+    except ImportError:
+        return False
+    return True
+
+
+class testStartupTime(unittest.TestCase):
+
+    def _readReply(self, srcProcess):
+        # First line from the runtime, None if it does not come in time
+        readable = select.select([srcProcess.stdout], [], [], _replyTimeoutSecond)[0]
+        if len(readable) == 0:
+            return None
+        return srcProcess.stdout.readline().strip()
+
+    def _timeOneStart(self):
+        # Seconds from the start of the runtime process to its reply to the MQTT init
+        environment = dict(os.environ)
+        if not _isSDKInstalled():
+            environment["PYTHONPATH"] = _standInDirectory + os.pathsep + environment.get("PYTHONPATH", "")
+        startTime = time.time()
+        runtimeProcess = subprocess.Popen([sys.executable, "-u", "run.py"], cwd=_runtimeDirectory, env=environment,
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        runtimeProcess.stdin.write(_initRequest)
+        runtimeProcess.stdin.flush()
+        reply = self._readReply(runtimeProcess)
+        startupSecond = time.time() - startTime
+        try:
+            runtimeProcess.stdin.write(_exitRequest)
+            runtimeProcess.stdin.close()
+        except IOError:
+            pass
+        if reply is None:
+            runtimeProcess.kill()
+        runtimeProcess.wait()
+        runtimeProcess.stdout.close()
+        self.assertEqual(reply, "I T")
+        return startupSecond
+
+    def _readStartupReport(self):
+        try:
+            with open(_startupReportPath) as reportFile:
+                return reportFile.read().strip()
+        except IOError:
+            return "No startup report."
+
+    def test_coldStartIsWithinBudget(self):
+        startupSeconds = []
+        for i in range(0, _numberOfRuns):
+            startupSeconds.append(self._timeOneStart())
+        startupSeconds.sort()
+        medianSecond = startupSeconds[len(startupSeconds) // 2]
+        self.assertTrue(medianSecond <= _budgetSecond, "Median cold start %.3fs is over the budget of %.3fs\n%s" % (medianSecond, _budgetSecond, self._readStartupReport()))
+
+
+if __name__ == "__main__":
+    unittest.main()
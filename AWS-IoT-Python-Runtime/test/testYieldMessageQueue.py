@@ -0,0 +1,217 @@
+'''
+/*
+ * Copyright 2010-2016 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *  http://aws.amazon.com/apache2.0
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+ '''
+
+import os
+import sys
+import unittest
+
+_testDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_testDirectory, "..", "lib"))
+from util.yieldMessageQueue import yieldMessageQueue
+
+# Run with: python -m unittest discover -s test, from AWS-IoT-Python-Runtime
+
+
+def _formatDropNotice(srcSketchSlotNumber):
+    return ["Y " + str(srcSketchSlotNumber) + " 2 "]
+
+
+class testYieldMessageQueue(unittest.TestCase):
+
+    def setUp(self):
+        self._queue = yieldMessageQueue(_formatDropNotice)
+
+    def _getAll(self):
+        # Take everything out of the queue, each message as its first frame
+        messages = []
+        frames = self._queue.get()
+        while frames is not None:
+            messages.append(frames[0])
+            frames = self._queue.get()
+        return messages
+
+    def test_unboundedQueueKeepsEverything(self):
+        for i in range(0, 100):
+            self.assertTrue(self._queue.put([str(i)], 1))
+        self.assertEqual(self._queue.qsize(), 100)
+        self.assertEqual(self._getAll(), [str(i) for i in range(0, 100)])
+        self.assertEqual(self._queue.getNumberOfDrops(), 0)
+        self.assertEqual(self._queue.getNumberOfBytes(), 0)
+
+    def test_invalidConfigurationIsRefused(self):
+        self.assertRaises(ValueError, self._queue.configure, -1, 0, 0, yieldMessageQueue.dropOldest)
+        self.assertRaises(ValueError, self._queue.configure, 0, 0, 0, 3)
+        self.assertRaises(ValueError, self._queue.configureSlot, 1, -1, 1)
+        self.assertRaises(ValueError, self._queue.configureSlot, 1, 0, 0)
+        self.assertRaises(ValueError, self._queue.configureSlotConflation, 1, 3)
+
+    def test_dropOldestMakesRoom(self):
+        self._queue.configure(2, 0, 0, yieldMessageQueue.dropOldest)
+        for message in ["a", "b", "c"]:
+            self.assertTrue(self._queue.put([message], 1))
+        self.assertEqual(self._queue.qsize(), 2)
+        self.assertEqual(self._queue.getNumberOfDrops(), 1)
+        self.assertEqual(self._getAll(), ["b", "c"])
+
+    def test_dropOldestTakesTheOldestAcrossSlots(self):
+        self._queue.configure(2, 0, 0, yieldMessageQueue.dropOldest)
+        self._queue.put(["a"], 1)
+        self._queue.put(["b"], 2)
+        self._queue.put(["c"], 2)
+        self.assertEqual(self._getAll(), ["b", "c"])
+
+    def test_byteBoundDropsUntilTheMessageFits(self):
+        self._queue.configure(0, 10, 0, yieldMessageQueue.dropOldest)
+        self._queue.put(["aaaa"], 1)
+        self._queue.put(["bbbb"], 1)
+        self._queue.put(["cccccc"], 1)
+        self.assertEqual(self._queue.getNumberOfBytes(), 10)
+        self.assertEqual(self._queue.getNumberOfDrops(), 1)
+        self.assertEqual(self._getAll(), ["bbbb", "cccccc"])
+
+    def test_messageLargerThanTheByteBoundIsDropped(self):
+        self._queue.configure(0, 4, 0, yieldMessageQueue.dropOldest)
+        self._queue.put(["aa"], 1)
+        self.assertFalse(self._queue.put(["bbbbbb"], 1))
+        self.assertEqual(self._queue.getNumberOfDrops(), 2)
+        self.assertEqual(self._queue.qsize(), 0)
+
+    def test_dropNewestKeepsTheQueue(self):
+        self._queue.configure(2, 0, 0, yieldMessageQueue.dropNewest)
+        self.assertTrue(self._queue.put(["a"], 1))
+        self.assertTrue(self._queue.put(["b"], 1))
+        self.assertFalse(self._queue.put(["c"], 1))
+        self.assertEqual(self._queue.getNumberOfDrops(), 1)
+        self.assertEqual(self._getAll(), ["a", "b"])
+
+    def test_rejectQueuesOneNoticePerSlot(self):
+        self._queue.configure(1, 0, 0, yieldMessageQueue.reject)
+        self._queue.put(["a"], 1)
+        self.assertFalse(self._queue.put(["b"], 1))
+        self.assertFalse(self._queue.put(["c"], 1))
+        self.assertFalse(self._queue.put(["d"], 2))
+        self.assertEqual(self._queue.getNumberOfDrops(), 3)
+        # Notices are urgent, they go out first
+        self.assertEqual(self._getAll(), ["Y 1 2 ", "Y 2 2 ", "a"])
+
+    def test_rejectQueuesNewNoticeOnceTheLastOneIsSent(self):
+        self._queue.configure(1, 0, 0, yieldMessageQueue.reject)
+        self._queue.put(["a"], 1)
+        self._queue.put(["b"], 1)
+        self.assertEqual(self._queue.get(), ["Y 1 2 "])
+        self._queue.put(["c"], 1)
+        self.assertEqual(self._getAll(), ["Y 1 2 ", "a"])
+
+    def test_urgentMessagesAreNeverDropped(self):
+        self._queue.configure(1, 0, 0, yieldMessageQueue.dropNewest)
+        self._queue.put(["a"], 1)
+        self.assertTrue(self._queue.put(["b"], 2, False))
+        self.assertTrue(self._queue.put(["c"], 3, False))
+        self.assertEqual(self._queue.getNumberOfDrops(), 0)
+        self.assertEqual(self._getAll(), ["b", "c", "a"])
+
+    def test_slotQuotaDropsOnlyFromThatSlot(self):
+        self._queue.configure(0, 0, 2, yieldMessageQueue.dropOldest)
+        self._queue.put(["a"], 1)
+        self._queue.put(["x"], 2)
+        self._queue.put(["b"], 1)
+        self._queue.put(["c"], 1)
+        self.assertEqual(self._queue.getNumberOfDrops(), 1)
+        self.assertEqual(sorted(self._getAll()), ["b", "c", "x"])
+
+    def test_slotQuotaWithDropNewest(self):
+        self._queue.configure(0, 0, 1, yieldMessageQueue.dropNewest)
+        self.assertTrue(self._queue.put(["a"], 1))
+        self.assertFalse(self._queue.put(["b"], 1))
+        self.assertTrue(self._queue.put(["x"], 2))
+        self.assertEqual(self._queue.getNumberOfDrops(), 1)
+
+    def test_clearKeepsTheDropCount(self):
+        self._queue.configure(1, 0, 0, yieldMessageQueue.dropNewest)
+        self._queue.put(["a"], 1)
+        self._queue.put(["b"], 1)
+        self._queue.clear()
+        self.assertEqual(self._queue.qsize(), 0)
+        self.assertEqual(self._queue.getNumberOfBytes(), 0)
+        self.assertEqual(self._queue.getNumberOfDrops(), 1)
+        self.assertEqual(self._queue.get(), None)
+
+    def test_higherPriorityIsDrainedFirst(self):
+        self._queue.configureSlot(2, 1, 1)
+        self._queue.put(["a1"], 1)
+        self._queue.put(["a2"], 1)
+        self._queue.put(["b1"], 2)
+        self._queue.put(["b2"], 2)
+        self.assertEqual(self._getAll(), ["b1", "b2", "a1", "a2"])
+
+    def test_samePriorityTakesTurns(self):
+        for i in range(1, 4):
+            self._queue.put(["a" + str(i)], 1)
+        for i in range(1, 4):
+            self._queue.put(["b" + str(i)], 2)
+        self.assertEqual(self._getAll(), ["a1", "b1", "a2", "b2", "a3", "b3"])
+
+    def test_weightGivesMoreTurns(self):
+        self._queue.configureSlot(1, 0, 3)
+        for i in range(0, 6):
+            self._queue.put(["a"], 1)
+            self._queue.put(["b"], 2)
+        messages = self._getAll()
+        self.assertEqual(messages[:4].count("a"), 3)
+        self.assertEqual(messages[4:8].count("a"), 3)
+        self.assertEqual(messages[8:], ["b"] * 4)  # Slot 1 has run out of messages
+
+    def test_resetSlotGoesBackToTheDefaults(self):
+        self._queue.configureSlot(1, 1, 1)
+        self._queue.resetSlot(1)
+        self._queue.put(["b"], 2)
+        self._queue.put(["a"], 1)
+        self._queue.put(["b"], 2)
+        self.assertEqual(self._getAll()[:2].count("b"), 1)
+
+    def test_conflateInPlaceKeepsTheAge(self):
+        self._queue.configureSlotConflation(1, yieldMessageQueue.conflateInPlace)
+        self._queue.put(["x"], 1)
+        self._queue.put(["y"], 2)
+        self._queue.put(["x2"], 1)
+        self.assertEqual(self._queue.qsize(), 2)
+        self.assertEqual(self._queue.getNumberOfDrops(), 0)
+        self.assertEqual(self._getAll(), ["x2", "y"])
+
+
+    def test_conflateToBackGoesAfterTheMessagesInBetween(self):
+        self._queue.configureSlotConflation(1, yieldMessageQueue.conflateToBack)
+        self._queue.put(["x"], 1)
+        self._queue.put(["y"], 2)
+        self._queue.put(["x2"], 1)
+        self.assertEqual(self._queue.qsize(), 2)
+        self.assertEqual(self._queue.getNumberOfDrops(), 0)
+        self.assertEqual(self._getAll(), ["y", "x2"])
+
+    def test_conflateToBackGoesAfterEveryOlderMessageOfItsPriority(self):
+        self._queue.configureSlotConflation(1, yieldMessageQueue.conflateToBack)
+        self._queue.configureSlot(3, 1, 1)
+        self._queue.put(["x"], 1)
+        self._queue.put(["y1"], 2)
+        self._queue.put(["y2"], 2)
+        self._queue.put(["x2"], 1)
+        self._queue.put(["y3"], 2)
+        self._queue.put(["z"], 3)  # Higher priority still goes first
+        self.assertEqual(self._getAll(), ["z", "y1", "y2", "x2", "y3"])
+
+if __name__ == "__main__":
+    unittest.main()
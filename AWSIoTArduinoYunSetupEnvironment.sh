@@ -35,6 +35,8 @@ expect "*~#" { send "opkg install distribute\r" }
 expect "*~#" { send "opkg install python-openssl\r" }
 expect "*~#" { send "easy_install pip\r" }
 expect "*~#" { send "pip install AWSIoTPythonSDK==1.0.0\r" }
+# Precompile the Python runtime, so that it does not get compiled on its first start
+expect "*~#" { send "python -m compileall -q /root/AWS-IoT-Python-Runtime\r" }
 expect "*~#" { send "exit\r" }
 # End of installation
 interact